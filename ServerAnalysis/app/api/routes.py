@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from datetime import date
 import logging
+import uuid
 
 from pydantic import BaseModel
 
 from app.local_database.connection import get_db
 from app.services.database_service import DatabaseService
 from app.services.orchestration_service import OrchestrationService
-from app.core.tasks.user_analysis_tasks import run_daily_analysis_task
+from app.core.tasks.user_analysis_tasks import run_daily_analysis_task, run_range_analysis
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,11 @@ router = APIRouter()
 class AnalysisRequest(BaseModel):
     date: str
 
+class RangeAnalysisRequest(BaseModel):
+    start_date: str
+    end_date: str
+    users: Optional[List[str]] = None  # None for all the users
+
 # Endpoint to start a daily-analysis
 @router.post("/analysis/daily")
 async def start_daily_analysis(request: AnalysisRequest, db = Depends(get_db)) -> Dict[str, Any]:
@@ -31,6 +38,66 @@ async def start_daily_analysis(request: AnalysisRequest, db = Depends(get_db)) -
 
     return {"status": "analysis started", "date": request.date, "result": result}
 
+# Endpoint to get the status of a daily-analysis run (makespan, throughput and per-user results once completed)
+@router.get("/analysis/runs/{run_id}")
+async def get_analysis_run(run_id: str, db = Depends(get_db)) -> Dict[str, Any]:
+    try:
+        run = DatabaseService(db).get_analysis_run(run_id)
+    except Exception as e:
+        logger.error(f"Error getting analysis run {run_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Analysis run {run_id} not found")
+
+    return run
+
+# Endpoint to start the analysis of a range of days (backfill), the progress is available at /analysis/ranges/{run_id}
+@router.post("/analysis/range")
+async def start_range_analysis(request: RangeAnalysisRequest, db = Depends(get_db)) -> Dict[str, Any]:
+    try:
+        start_date = date.fromisoformat(request.start_date)
+        end_date = date.fromisoformat(request.end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Please provide dates in YYYY-MM-DD format.")
+
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be before or equal to end_date.")
+
+    try:
+        run_id = uuid.uuid4().hex
+        if not DatabaseService(db).create_range_run(run_id, start_date, end_date):
+            raise HTTPException(status_code=500, detail="Failed to create the record of the range run.")
+
+        job = run_range_analysis.delay(request.start_date, request.end_date, request.users, run_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting range analysis: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "status": "range analysis started",
+        "start_date": request.start_date,
+        "end_date": request.end_date,
+        "run_id": run_id,
+        "job_id": job.id
+    }
+
+# Endpoint to get the progress of a range analysis run
+@router.get("/analysis/ranges/{run_id}")
+async def get_range_analysis_run(run_id: str, db = Depends(get_db)) -> Dict[str, Any]:
+    try:
+        run = DatabaseService(db).get_range_run(run_id)
+    except Exception as e:
+        logger.error(f"Error getting range run {run_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Range run {run_id} not found")
+
+    return run
+
 # NOTE: This is to trigger the task for daily analysis (like the scheduler will do)
 # ONLY FOR TESTING
 # @router.post("/analysis/trigger-daily-task")
@@ -2,6 +2,7 @@
 Celery application configuration and initialization.
 """
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 from app.config import settings
 
 # Initialize Celery app
@@ -18,6 +19,12 @@ celery_app.conf.task_routes = settings.task_routes
 celery_app.conf.task_default_queue = settings.task_default_queue
 celery_app.conf.task_create_missing_queues = settings.task_create_missing_queues
 
+# Serialization configuration
+celery_app.conf.task_serializer = settings.task_serializer
+celery_app.conf.result_serializer = settings.result_serializer
+celery_app.conf.accept_content = settings.accept_content
+celery_app.conf.result_accept_content = settings.result_accept_content
+
 # Result configuration
 celery_app.conf.task_ignore_result = settings.task_ignore_result
 celery_app.conf.task_store_eager_result = settings.task_store_eager_result
@@ -34,4 +41,16 @@ celery_app.conf.worker_task_log_format = settings.worker_task_log_format
 celery_app.autodiscover_tasks(['app.core.tasks'])
 
 # Set up schedule for Celery beat
-celery_app.conf.beat_schedule = settings.beat_schedule
\ No newline at end of file
+celery_app.conf.beat_schedule = settings.beat_schedule
+
+# Services of each worker process (Firebase/Supabase clients and database connection pool), reused by all the tasks
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    # Import here to avoid circular import
+    from app.services.service_container import init_service_container
+    init_service_container()
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    from app.services.service_container import close_service_container
+    close_service_container()
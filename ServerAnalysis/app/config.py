@@ -23,10 +23,15 @@ class Settings:
     FIREBASE_EMULATOR_PORT = int(os.getenv("FIREBASE_EMULATOR_PORT", "8080"))
     # USE_FIREBASE_EMULATOR = bool(os.getenv("USE_FIREBASE_EMULATOR", "false").lower() == "true") # cuncomment this when you define the environment variable USE_FIREBASE_EMULATOR
     USE_FIREBASE_EMULATOR = False
+    FIREBASE_FETCH_MAX_WORKERS: int = int(os.getenv("FIREBASE_FETCH_MAX_WORKERS", "16"))  # Concurrent Firestore queries of a process
+    FIREBASE_ASYNC_INGESTION: bool = os.getenv("FIREBASE_ASYNC_INGESTION", "false").lower() == "true"  # Stream the LogMyself events with the async client
+    FIREBASE_PAGE_SIZE: int = int(os.getenv("FIREBASE_PAGE_SIZE", "500"))  # Documents of each page of the async client
 
     # Supabase settings
     SUPABASE_URL: str = os.getenv("SUPABASE_URL")
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY")
+    SUPABASE_BATCH_CHUNK_SIZE: int = int(os.getenv("SUPABASE_BATCH_CHUNK_SIZE", "500"))  # Rows of each batched request
+    SUPABASE_WRITE_BUFFER_MAX_ROWS: int = int(os.getenv("SUPABASE_WRITE_BUFFER_MAX_ROWS", "2000"))  # Buffered rows of a user task before a flush
 
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise ValueError("Supabase URL and Key must be set in environment variables.")
@@ -45,25 +50,65 @@ class Settings:
     # Timezone settings
     DEFAULT_TIMEZONE: str = os.getenv("DEFAULT_TIMEZONE", "Europe/Athens")
 
+    # Typing baseline settings
+    TYPING_BASELINE_ENGINE: bool = os.getenv("TYPING_BASELINE_ENGINE", "true").lower() == "true"  # Compute the typing baselines from the local daily states (RPC if false)
+    TYPING_BASELINE_SKETCH_SIZE: int = int(os.getenv("TYPING_BASELINE_SKETCH_SIZE", "256"))  # Centroids of the quantile sketch of a metric
+
+    # Baseline cache settings
+    BASELINE_CACHE_ENABLED: bool = os.getenv("BASELINE_CACHE_ENABLED", "true").lower() == "true"  # Cache the latest baseline records (in-process LRU + Redis)
+    BASELINE_CACHE_MAX_ENTRIES: int = int(os.getenv("BASELINE_CACHE_MAX_ENTRIES", "10000"))  # (user, metric) records of the in-process LRU
+    BASELINE_CACHE_REFRESH_DAYS: int = int(os.getenv("BASELINE_CACHE_REFRESH_DAYS", "15"))  # A record expires when its baseline can be refreshed (MIN_DAYS_SINCE_LAST_SESSION)
+    BASELINE_CACHE_MIN_TTL_SECONDS: int = int(os.getenv("BASELINE_CACHE_MIN_TTL_SECONDS", "300"))  # TTL of the missing and refreshable baselines
+
+    # Local database settings
+    LOCAL_PARTITION_TTL_HOURS: int = int(os.getenv("LOCAL_PARTITION_TTL_HOURS", "48"))  # Partitions not used for longer than this are purged
+    LOCAL_BULK_INSERT_BATCH_SIZE: int = int(os.getenv("LOCAL_BULK_INSERT_BATCH_SIZE", "1000"))  # Events of each multi-row INSERT (one transaction)
+    TYPING_RAW_TIMINGS_ENABLED: bool = os.getenv("TYPING_RAW_TIMINGS_ENABLED", "false").lower() == "true"  # Store the raw IKI/pause arrays of the typing sessions (typing_session_timings)
+
+    # Worker settings
+    WORKER_DB_POOL_SIZE: int = int(os.getenv("WORKER_DB_POOL_SIZE", "10"))  # Connections kept open by each worker process
+    WORKER_DB_MAX_OVERFLOW: int = int(os.getenv("WORKER_DB_MAX_OVERFLOW", "30"))  # Extra connections a worker process can open (ex. threads worker)
+
+    # Range analysis (backfill) settings
+    RANGE_ANALYSIS_CONCURRENCY: int = int(os.getenv("RANGE_ANALYSIS_CONCURRENCY", "8"))  # Maximum (user, day) pairs analyzed at the same time
+
     ## Celery settings ##
     beat_schedule = {
         'daily-analysis-at-17-59': {
             'task': 'app.core.tasks.user_analysis_tasks.run_daily_analysis_task',
             'schedule': crontab(hour=17, minute=59),  # Run daily at 17:59
         },
+        'sweep-expired-local-partitions': {
+            'task': 'app.core.tasks.maintenance_tasks.sweep_expired_partitions_task',
+            'schedule': crontab(minute=30),  # Run every hour at xx:30
+        },
     }
     broker_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     result_backend = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
     # Task Routing
+    # I/O bound stages (Firestore, local database, Supabase) go to the 'io' queue, served by a threads worker,
+    # CPU bound stages go to the 'cpu' queue, served by a prefork worker (one process per core)
     task_routes = {
-        'app.core.tasks.user_analysis_tasks.analyze_user_data': {'queue': 'default'},
+        'app.core.tasks.user_analysis_tasks.ingest_user_data': {'queue': 'io'},
+        'app.core.tasks.user_analysis_tasks.analyze_and_publish_typing_data': {'queue': 'io'},
+        'app.core.tasks.user_analysis_tasks.publish_user_analysis': {'queue': 'io'},
+        'app.core.tasks.user_analysis_tasks.analyze_user_category': {'queue': 'cpu'},
+        'app.core.tasks.user_analysis_tasks.record_range_progress': {'queue': 'io'},
+        'app.core.tasks.user_analysis_tasks.run_range_analysis': {'queue': 'default'},
     }
 
     # Queue Configuration
     task_default_queue = 'default'
     task_create_missing_queues = True
 
+    # Serialization Configuration
+    # JSON only, the results of the analysis stages are converted to plain values (see HelperService.to_json_value)
+    task_serializer = 'json'
+    result_serializer = 'json'
+    accept_content = ['json']
+    result_accept_content = ['json']
+
     # Result Configuration
     task_ignore_result = False
     task_store_eager_result = True
@@ -2,6 +2,7 @@
 Celery tasks module.
 """
 from app.core.tasks import user_analysis_tasks
+from app.core.tasks import maintenance_tasks
 
-__all__ = ['user_analysis_tasks']
+__all__ = ['user_analysis_tasks', 'maintenance_tasks']
 
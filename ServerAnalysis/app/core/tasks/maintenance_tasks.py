@@ -0,0 +1,32 @@
+import logging
+
+from app.celery_app import celery_app
+from app.config import settings
+from app.services.database_service import DatabaseService
+from app.services.service_container import get_service_container
+
+# Celery tasks related to the maintenance of the local database
+
+logger = logging.getLogger(__name__)
+
+@celery_app.task
+def sweep_expired_partitions_task():
+    """
+    Scheduled Celery task that removes the local database partitions (analysis day, user)
+    that have not been used for more than LOCAL_PARTITION_TTL_HOURS.
+
+    Returns:
+        dict: Number of partitions purged
+    """
+    db = get_service_container().session()
+    try:
+        db_service = DatabaseService(db)
+        purged = db_service.purge_expired_partitions(settings.LOCAL_PARTITION_TTL_HOURS)
+
+        if purged is None:
+            return {"success": False, "error": "Failed to purge expired partitions"}
+
+        logger.info(f"Sweeper purged {purged} expired partitions (TTL: {settings.LOCAL_PARTITION_TTL_HOURS} hours)")
+        return {"success": True, "purged_partitions": purged}
+    finally:
+        db.close()
@@ -1,176 +1,465 @@
+import asyncio
 import logging
-from datetime import datetime, timedelta
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 import pytz
+from celery import chain, chord, group
 
 from app.celery_app import celery_app
 from app.config import settings
 from app.services.firebase_service import FirebaseService
+from app.services.firebase_async_service import AsyncFirebaseService
 from app.services.supabase_service import SupabaseService
+from app.services.supabase_write_buffer import SupabaseWriteBuffer
 from app.services.analysis_service import AnalysisService
+from app.services.baseline_engine import TypingBaselineEngine
 from app.services.database_service import DatabaseService
-from app.local_database.connection import SessionLocal
+from app.services.service_container import get_service_container
+from app.services.helper_service import HelperService
 
 # Celery tasks related for user analysis data
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@celery_app.task
-def analyze_user_data(user_uid: str, app_origin: str, user_email: str, analysis_start_datetime_iso: str, analysis_end_datetime_iso: str):
+# --- Stage tasks ---
+# The analysis of a user is split in stages, so that the I/O bound stages (Firestore fetch, local database writes
+# and Supabase publishing) run on the 'io' queue and the CPU bound stages (LogMyself analysis per data category)
+# run on the 'cpu' queue (see settings.task_routes). The stages are connected by build_user_analysis_workflow and
+# they share the data through the local database partition of (day, user).
+
+def build_user_analysis_workflow(user_uid: str, app_origin: str, user_email: str, analysis_start_datetime_iso: str, analysis_end_datetime_iso: str):
     """
-    Celery task to analyze user data for a specific user.
-    
+    Build the Celery workflow of the stage tasks that analyze the data of a user for a day.
+        - LogBoard: ingest_user_data -> analyze_and_publish_typing_data
+        - LogMyself: ingest_user_data -> analyze_user_category (one for each data category, in parallel) -> publish_user_analysis
+
     Args:
         user_uid: User unique identifier
         app_origin: Origin of the app (LogBoard or LogMyself)
         user_email: User email
         analysis_start_datetime_iso: Start datetime in ISO format string
         analysis_end_datetime_iso: End datetime in ISO format string
-    
+
     Returns:
-        str: Success message
+        Signature: The workflow, its result is the result of the user analysis
     """
-    logger.info(f"\033[92m\n\n-----------Processing user {user_uid} (email: {user_email}, origin: {app_origin})-----------\033[0m\n\n")
+    # Immutable, so that the workflow can follow another task in a chain (ex. the lanes of a range analysis)
+    ingest = ingest_user_data.si(user_uid, app_origin, user_email, analysis_start_datetime_iso, analysis_end_datetime_iso)
 
-    # Convert ISO datetime strings back to datetime objects
+    if app_origin == "LogBoard":
+        return chain(ingest, analyze_and_publish_typing_data.s(analysis_start_datetime_iso, analysis_end_datetime_iso))
+
+    if app_origin == "LogMyself":
+        category_tasks = group([
+            analyze_user_category.s(category, analysis_start_datetime_iso, analysis_end_datetime_iso)
+            for category in AnalysisService.LOGMYSELF_CATEGORIES
+        ])
+        return chain(ingest, chord(category_tasks, publish_user_analysis.s(analysis_start_datetime_iso, analysis_end_datetime_iso)))
+
+    return ingest
+
+@celery_app.task
+def ingest_user_data(user_uid: str, app_origin: str, user_email: str, analysis_start_datetime_iso: str, analysis_end_datetime_iso: str):
+    """
+    Stage task (I/O): fetch the data of the user from Firebase and store them in the local database partition.
+
+    Returns:
+        dict: Result of the user analysis so far, passed to the next stage
+    """
+    logger.info(f"\033[92m\n\n-----------Ingesting data of user {user_uid} (email: {user_email}, origin: {app_origin})-----------\033[0m\n\n")
+
+    user_result = _new_user_result(user_uid, app_origin)
     analysis_start_datetime = datetime.fromisoformat(analysis_start_datetime_iso)
     analysis_end_datetime = datetime.fromisoformat(analysis_end_datetime_iso)
 
-    # Create a database session for this task
-    db = SessionLocal()
+    db = get_service_container().session()
     try:
-        # Initialize services for this task
-        db_service = DatabaseService(db)
-        firebase_service = FirebaseService()
-        supabase_service = SupabaseService()
-        analysis_service = AnalysisService(db_service, supabase_service)
-        
-        if app_origin == "LogBoard":
-            logger.info(f"--LogBoard analysis for user: {user_uid}--")
-            # Fetch typing sessions
-            typing_sessions = firebase_service.fetch_typing_sessions(user_uid, analysis_start_datetime, analysis_end_datetime)
+        db_service, firebase_service, supabase_service, _ = _init_services(db, user_uid, analysis_start_datetime)
+        _ingest_user_data(user_result, db_service, firebase_service, supabase_service, analysis_start_datetime, analysis_end_datetime)
+        return user_result
+    except Exception as e:
+        logger.error(f"\033[91mError ingesting data of user {user_uid}: {e}\033[0m")
+        return _failed_user_result(user_result, str(e))
+    finally:
+        db.close()
 
-            if not typing_sessions:
-                return
-
-            # Store each typing session to local database
-            for session in typing_sessions:
-                session_uid = session.get('session_uid')
-                if db_service.store_typing_session_and_data(user_uid, session_uid, session):
-                    # Send session to Supabase
-                    logger.info("Sending typing session to Supabase...")
-                    session_date_utc = session.get('dateCreated').astimezone(pytz.timezone("Europe/Athens"))
-                    payload = {
-                        'session_uid': session_uid,
-                        'user_uid': user_uid,
-                        'session_date': session_date_utc.isoformat(),
-                        'cognitive_score': None,
-                        'cognitive_decision': None
-                    }
-
-                    if supabase_service.send_data(
-                        table_name="Typing_Sessions",
-                        unique_field="session_uid",
-                        unique_value=session_uid,
-                        payload=payload
-                    ):
-                        logger.info(f"Typing session {session_uid} sent to Supabase successfully")
-                    else:
-                        logger.error(f"Failed to send typing session {session_uid} to Supabase")
-
-            logger.info(f"\033[92mFinished processing user {user_uid} ({app_origin})\033[0m")
-
-            logboard_analysis_result = analysis_service.start_logboard_data_analysis(user_uid, analysis_start_datetime, analysis_end_datetime)
-            if logboard_analysis_result is not None:
-                if logboard_analysis_result['status'] == "error":
-                    logger.error(f"Error in logboard analysis for user {user_uid}: {logboard_analysis_result['error']}")
-                else:
-                    logger.info(f"\033[92m\n\nLogboard analysis for user {user_uid} completed successfully\n\n\033[0m")
-
-                    # Success with logboard analysis, so continue with updating the stats of the day
-                    day_analyzed = analysis_start_datetime.date().isoformat()
-                    _calc_stats_for_a_day(user_uid, app_origin, day_analyzed, analysis_service, supabase_service)
-        else:
-            logger.info(f"Skipping user {user_uid} with app origin {app_origin} as it is not supported for logboard analysis")
+@celery_app.task
+def analyze_user_category(user_result: dict, category: str, analysis_start_datetime_iso: str, analysis_end_datetime_iso: str):
+    """
+    Stage task (CPU): compute the analysis of one LogMyself data category from the local database partition.
+
+    Returns:
+        dict: The computed results of the category (as plain JSON values) together with the result of the user analysis so far,
+              and the error if the analysis raised
+    """
+    category_result = {'category': category, 'result': None, 'seconds': 0.0, 'error': None, 'user_result': user_result}
+
+    if not user_result.get('has_data'):
+        return category_result
+
+    user_uid = user_result['user_uid']
+    analysis_start_datetime = datetime.fromisoformat(analysis_start_datetime_iso)
+    analysis_end_datetime = datetime.fromisoformat(analysis_end_datetime_iso)
+
+    db = get_service_container().session()
+    try:
+        _, _, _, analysis_service = _init_services(db, user_uid, analysis_start_datetime)
+        category_result.update(_analyze_logmyself_category(analysis_service, category, user_uid, analysis_start_datetime, analysis_end_datetime))
+        # The result goes through the JSON serializer of the broker (numpy/pandas values are converted)
+        category_result['result'] = HelperService.to_json_value(category_result['result'])
+        return category_result
+    except Exception as e:
+        # The error is returned, the publish stage counts the category as failed
+        logger.error(f"\033[91mError analyzing {category} data of user {user_uid}: {e}\033[0m")
+        category_result['result'] = None
+        category_result['error'] = str(e)
+        return category_result
+    finally:
+        db.close()
+
+@celery_app.task
+def publish_user_analysis(category_results: list, analysis_start_datetime_iso: str, analysis_end_datetime_iso: str):
+    """
+    Stage task (I/O): publish the results of all the LogMyself data categories to Supabase,
+    update the behavioral baselines and score, and calculate the stats of the day.
+
+    Returns:
+        dict: Result of the user analysis
+    """
+    user_result = category_results[0]['user_result']
+    # Restore the DataFrames of the category results (see analyze_user_category)
+    category_results = [{**category_result, 'result': HelperService.from_json_value(category_result['result'])} for category_result in category_results]
+
+    if not user_result.get('has_data'):
+        return user_result
+
+    user_uid = user_result['user_uid']
+    analysis_start_datetime = datetime.fromisoformat(analysis_start_datetime_iso)
+
+    db = get_service_container().session()
+    try:
+        _, _, supabase_service, analysis_service = _init_services(db, user_uid, analysis_start_datetime)
+        _publish_logmyself_analysis(user_result, analysis_service, supabase_service, category_results, analysis_start_datetime)
+        return user_result
+    except Exception as e:
+        logger.error(f"\033[91mError publishing the analysis of user {user_uid}: {e}\033[0m")
+        return _failed_user_result(user_result, str(e))
+    finally:
+        db.close()
+
+@celery_app.task
+def analyze_and_publish_typing_data(user_result: dict, analysis_start_datetime_iso: str, analysis_end_datetime_iso: str):
+    """
+    Stage task (I/O): analyze the typing sessions of a LogBoard user and calculate the stats of the day.
+    NOTE: The typing metrics are sent to Supabase while they are computed, so this stage is mostly I/O bound.
+
+    Returns:
+        dict: Result of the user analysis
+    """
+    if not user_result.get('has_data'):
+        return user_result
+
+    user_uid = user_result['user_uid']
+    analysis_start_datetime = datetime.fromisoformat(analysis_start_datetime_iso)
+    analysis_end_datetime = datetime.fromisoformat(analysis_end_datetime_iso)
+
+    db = get_service_container().session()
+    try:
+        _, _, supabase_service, analysis_service = _init_services(db, user_uid, analysis_start_datetime)
+        _analyze_and_publish_typing_data(user_result, analysis_service, supabase_service, analysis_start_datetime, analysis_end_datetime)
+        return user_result
+    except Exception as e:
+        logger.error(f"\033[91mError analyzing typing data of user {user_uid}: {e}\033[0m")
+        return _failed_user_result(user_result, str(e))
+    finally:
+        db.close()
 
-        if app_origin == "LogMyself":
-            logger.info(f"--LogMyself analysis for user: {user_uid}--")
+# --- Stages ---
 
+def _init_services(db, user_uid: str, analysis_start_datetime: datetime):
+    """
+    Initialize the services of a task, the local database reads and writes are scoped to the partition of (day, user).
+    The Firebase and Supabase clients are the ones of the worker process (see ServiceContainer).
+
+    Returns:
+        tuple: (DatabaseService, FirebaseService, SupabaseService, AnalysisService)
+    """
+    services = get_service_container()
+    db_service = DatabaseService(db, DatabaseService.build_partition_key(user_uid, analysis_start_datetime.date()))
+    firebase_service = services.firebase_service
+    supabase_service = services.supabase_service
+    analysis_service = AnalysisService(db_service, supabase_service)
+    return db_service, firebase_service, supabase_service, analysis_service
+
+def _ingest_user_data(user_result: dict, db_service: DatabaseService, firebase_service: FirebaseService, supabase_service: SupabaseService,
+                      analysis_start_datetime: datetime, analysis_end_datetime: datetime) -> bool:
+    """
+    Fetch the data of the user from Firebase and store them in the local database partition
+    (the typing sessions are also sent to Supabase).
+
+    Returns:
+        bool: True if there are data to analyze, False otherwise
+    """
+    user_uid = user_result['user_uid']
+    app_origin = user_result['app_origin']
+    analysis_day = analysis_start_datetime.date()
+
+    if not db_service.register_partition(user_uid, analysis_day):
+        logger.error(f"Failed to register the local database partition for user {user_uid} on {analysis_day}")
+        _failed_user_result(user_result, f"Failed to register the local database partition on {analysis_day}")
+        return False
+
+    if app_origin == "LogBoard":
+        logger.info(f"--LogBoard analysis for user: {user_uid}--")
+        # Fetch typing sessions
+        with _stage_timer(user_result, 'fetch'):
+            typing_sessions = firebase_service.fetch_typing_sessions(user_uid, analysis_start_datetime, analysis_end_datetime)
+
+        if not typing_sessions:
+            # A day without sessions is still analyzed for the daily states of the typing baseline (not a day that failed to be fetched)
+            if typing_sessions is not None and settings.TYPING_BASELINE_ENGINE:
+                TypingBaselineEngine(db_service).update_day(user_uid, analysis_day)
+            user_result['message'] = "No typing sessions to analyze"
+            return False
+
+        # Store the typing sessions to local database
+        with _stage_timer(user_result, 'persist'):
+            stored_session_uids, failures = db_service.bulk_store_typing_sessions(user_uid, typing_sessions)
+            user_result['failures'] += failures
+
+            # Send the stored sessions to Supabase (the sessions that already exist are skipped)
+            logger.info(f"Sending {len(stored_session_uids)} typing sessions to Supabase...")
+            sessions_by_uid = {session.get('session_uid'): session for session in typing_sessions}
+            payloads = [
+                {
+                    'session_uid': session_uid,
+                    'user_uid': user_uid,
+                    'session_date': sessions_by_uid[session_uid].get('dateCreated').astimezone(pytz.timezone("Europe/Athens")).isoformat(),
+                    'cognitive_score': None,
+                    'cognitive_decision': None
+                }
+                for session_uid in stored_session_uids
+            ]
+            if payloads and supabase_service.send_data_batch("Typing_Sessions", payloads, on_conflict="session_uid") is None:
+                logger.error(f"Failed to send {len(payloads)} typing sessions to Supabase")
+                user_result['failures'] += len(payloads)
+            elif payloads:
+                logger.info(f"{len(payloads)} typing sessions sent to Supabase successfully")
+
+        logger.info(f"\033[92mFinished processing user {user_uid} ({app_origin})\033[0m")
+        user_result['has_data'] = True
+        return True
+
+    if app_origin == "LogMyself":
+        logger.info(f"--LogMyself analysis for user: {user_uid}--")
+
+        if settings.FIREBASE_ASYNC_INGESTION:
+            # Stream the events page by page and store each page while the next ones are fetched
+            with _stage_timer(user_result, 'ingest'):
+                asyncio.run(_stream_logmyself_events(user_result, db_service, user_uid, analysis_start_datetime, analysis_end_datetime))
+        else:
             # Fetch various events for the user from Firebase of logmyself app
-            gps_events = firebase_service.fetch_gps_events(user_uid, analysis_start_datetime, analysis_end_datetime)
-            sleep_events = firebase_service.fetch_sleep_events(user_uid, analysis_start_datetime, analysis_end_datetime)
-            screen_time_events = firebase_service.fetch_screen_time_events(user_uid, analysis_start_datetime, analysis_end_datetime)
-            device_unlock_events = firebase_service.fetch_device_unlock_events(user_uid, analysis_start_datetime, analysis_end_datetime)
-            user_activities_events = firebase_service.fetch_user_activities_events(user_uid, analysis_start_datetime, analysis_end_datetime)
-            call_events = firebase_service.fetch_call_events(user_uid, analysis_start_datetime, analysis_end_datetime)
-            device_drop_events = firebase_service.fetch_device_drop_events(user_uid, analysis_start_datetime, analysis_end_datetime)
-            low_light_events = firebase_service.fetch_low_light_events(user_uid, analysis_start_datetime, analysis_end_datetime)
+            with _stage_timer(user_result, 'fetch'):
+                logmyself_events = firebase_service.fetch_all_logmyself_events(user_uid, analysis_start_datetime, analysis_end_datetime)
 
             #  Now, store them in local database to be used later for analysis
-            logger.info(f"Storing GPS events for user {user_uid}, total events: {len(gps_events)}")
-            for event in gps_events:
-                event_id = event.get('event_id')
-                if event_id:
-                    db_service.store_gps_event(user_uid, event_id, event)
-
-            logger.info(f"Storing sleep events for user {user_uid}, total events: {len(sleep_events)}")
-            for event in sleep_events:
-                event_id = event.get('event_id')
-                if event_id:
-                    db_service.store_sleep_event(user_uid, event_id, event)
-
-            logger.info(f"Storing screen time events for user {user_uid}, total events: {len(screen_time_events)}")
-            for event in screen_time_events:
-                event_id = event.get('event_id')
-                if event_id:
-                    db_service.store_screen_time_event(user_uid, event_id, event)
-
-            logger.info(f"Storing device unlock events for user {user_uid}, total events: {len(device_unlock_events)}")
-            for event in device_unlock_events:
-                event_id = event.get('event_id')
-                if event_id:
-                    db_service.store_device_unlock_event(user_uid, event_id, event)
-
-            logger.info(f"Storing user activities events for user {user_uid}, total events: {len(user_activities_events)}")
-            for event in user_activities_events:
-                event_id = event.get('event_id')
-                if event_id:
-                    db_service.store_user_activity_event(user_uid, event_id, event)
-
-            logger.info(f"Storing call events for user {user_uid}, total events: {len(call_events)}")
-            for event in call_events:
-                event_id = event.get('event_id')
-                if event_id:
-                    db_service.store_call_event(user_uid, event_id, event)
-
-            logger.info(f"Storing device drop events for user {user_uid}, total events: {len(device_drop_events)}")
-            for event in device_drop_events:
-                event_id = event.get('event_id')
-                if event_id:
-                    db_service.store_device_drop_event(user_uid, event_id, event)
-
-            logger.info(f"Storing low light events for user {user_uid}, total events: {len(low_light_events)}")
-            for event in low_light_events:
-                event_id = event.get('event_id')
-                if event_id:
-                    db_service.store_low_light_event(user_uid, event_id, event)
-
-            logger.info(f"\033[92mFinished getting data for user {user_uid} ({app_origin})\033[0m")
-
-            logmyself_analysis_final_status = analysis_service.start_logmyself_data_analysis(user_uid, analysis_start_datetime, analysis_end_datetime)
-
-            logger.info(f"\033[93m\n\nLogmyself analysis final status results:\n {logmyself_analysis_final_status}\n\n\033[0m")
-
-            # Success with logmyself analysis, so continue with updating the stats of the day
-            day_analyzed = analysis_start_datetime.date().isoformat()
-            _calc_stats_for_a_day(user_uid, app_origin, day_analyzed, analysis_service, supabase_service)
+            with _stage_timer(user_result, 'persist'):
+                for collection in LOGMYSELF_COLLECTIONS:
+                    user_result['failures'] += _store_logmyself_events(db_service, user_uid, collection, getattr(logmyself_events, collection))
+
+        logger.info(f"\033[92mFinished getting data for user {user_uid} ({app_origin})\033[0m")
+        user_result['has_data'] = True
+        return True
+
+    logger.info(f"Skipping user {user_uid} with app origin {app_origin} as it is not supported for analysis")
+    user_result['message'] = f"App origin {app_origin} is not supported for analysis"
+    return False
+
+# The LogMyself collections, they are stored with DatabaseService.bulk_store_events
+LOGMYSELF_COLLECTIONS = [
+    'gps_events',
+    'sleep_events',
+    'screen_time_events',
+    'device_unlock_events',
+    'user_activities_events',
+    'call_events',
+    'device_drop_events',
+    'low_light_events',
+]
+
+def _store_logmyself_events(db_service: DatabaseService, user_uid: str, collection: str, events: list) -> int:
+    """
+    Store the events of a LogMyself collection in the local database partition (multi-row inserts, one transaction per batch).
+
+    Returns:
+        int: Number of events that failed to be stored
+    """
+    logger.info(f"Storing {collection.replace('_', ' ')} for user {user_uid}, total events: {len(events)}")
+    return db_service.bulk_store_events(collection, user_uid, events)
+
+async def _stream_logmyself_events(user_result: dict, db_service: DatabaseService, user_uid: str,
+                                   analysis_start_datetime: datetime, analysis_end_datetime: datetime):
+    """
+    Stream the events of all the LogMyself collections of a user with the async Firestore client and store them page by page.
+    The collections are streamed at the same time, the pages are stored one after the other (in a thread, so that
+    the event loop keeps fetching) because the database session of the task must not be used by two threads at once.
+    """
+    # At most one page of each collection waits to be stored
+    pages = asyncio.Queue(maxsize=len(LOGMYSELF_COLLECTIONS))
+
+    async with AsyncFirebaseService() as firebase:
+        async def produce(collection: str):
+            try:
+                async for events in firebase.stream_logmyself_events(collection, user_uid, analysis_start_datetime, analysis_end_datetime):
+                    await pages.put((collection, events))
+            except Exception as e:
+                logger.error(f"Error streaming {collection.replace('_', ' ')} for user {user_uid}: {e}")
+                user_result['failures'] += 1
+
+        async def produce_all():
+            try:
+                await asyncio.gather(*(produce(collection) for collection in LOGMYSELF_COLLECTIONS))
+            finally:
+                await pages.put(None)
+
+        producers = asyncio.ensure_future(produce_all())
+        try:
+            while (page := await pages.get()) is not None:
+                collection, events = page
+                user_result['failures'] += await asyncio.to_thread(_store_logmyself_events, db_service, user_uid, collection, events)
+        finally:
+            if not producers.done():
+                producers.cancel()
+            await asyncio.gather(producers, return_exceptions=True)
+
+def _analyze_and_publish_typing_data(user_result: dict, analysis_service: AnalysisService, supabase_service: SupabaseService,
+                                     analysis_start_datetime: datetime, analysis_end_datetime: datetime):
+    """Analyze the typing sessions of a LogBoard user (stored in the local database partition) and calculate the stats of the day."""
+    user_uid = user_result['user_uid']
+
+    with _stage_timer(user_result, 'analysis'):
+        logboard_analysis_result = analysis_service.start_logboard_data_analysis(user_uid, analysis_start_datetime, analysis_end_datetime)
+    if logboard_analysis_result is not None:
+        if logboard_analysis_result['status'] == "error":
+            logger.error(f"Error in logboard analysis for user {user_uid}: {logboard_analysis_result['error']}")
+            _failed_user_result(user_result, logboard_analysis_result['error'])
         else:
-            logger.info(f"Skipping user {user_uid} with app origin {app_origin} as it is not supported for logmyself analysis")
+            logger.info(f"\033[92m\n\nLogboard analysis for user {user_uid} completed successfully\n\n\033[0m")
+
+            # Success with logboard analysis, so continue with updating the stats of the day
+            day_analyzed = analysis_start_datetime.date().isoformat()
+            with _stage_timer(user_result, 'stats'):
+                stats_result = _calc_stats_for_a_day(user_uid, user_result['app_origin'], day_analyzed, analysis_service, supabase_service)
+            if stats_result and not stats_result.get('success'):
+                _failed_user_result(user_result, stats_result.get('error'))
+
+def _analyze_logmyself_category(analysis_service: AnalysisService, category: str, user_uid: str,
+                                analysis_start_datetime: datetime, analysis_end_datetime: datetime) -> dict:
+    """
+    Compute the analysis of one LogMyself data category.
+
+    Returns:
+        dict: The category, its computed results and the seconds it took
+    """
+    category_start = time.perf_counter()
+    result = analysis_service.compute_logmyself_category(category, user_uid, analysis_start_datetime, analysis_end_datetime)
+    return {'category': category, 'result': result, 'seconds': round(time.perf_counter() - category_start, 3)}
 
-        return "User data analyzed successfully"
+def _publish_logmyself_analysis(user_result: dict, analysis_service: AnalysisService, supabase_service: SupabaseService,
+                                category_results: list, analysis_start_datetime: datetime):
+    """
+    Publish the computed results of the LogMyself data categories (in the order of LOGMYSELF_CATEGORIES),
+    update the behavioral baselines and score, and calculate the stats of the day.
+    """
+    user_uid = user_result['user_uid']
+
+    # The analysis stage is the CPU time of all the categories (they may have run in parallel)
+    user_result['stage_timings']['analysis'] = round(sum(category_result['seconds'] for category_result in category_results), 3)
+
+    logmyself_analysis_final_status = {}
+    results_by_category = {category_result['category']: category_result['result'] for category_result in category_results}
+    # The categories whose analysis raised are failed, they are not published
+    for category_result in category_results:
+        if category_result.get('error') is not None:
+            logger.error(f"The {category_result['category']} analysis of user {user_uid} failed: {category_result['error']}")
+            logmyself_analysis_final_status[f"{category_result['category']}_analysis_success"] = False
+            # Like an error of the whole analysis, the user failed (the category is counted in the failures below)
+            user_result['success'] = False
+            user_result['message'] = f"The {category_result['category']} analysis failed: {category_result['error']}"
+    # The rows of the categories are collected per table and sent in batches (see SupabaseWriteBuffer)
+    write_buffer = SupabaseWriteBuffer(supabase_service)
+    with _stage_timer(user_result, 'publish'):
+        analysis_service.write_buffer = write_buffer
+        try:
+            for category in AnalysisService.LOGMYSELF_CATEGORIES:
+                if f"{category}_analysis_success" in logmyself_analysis_final_status:
+                    continue
+                analysis_service.publish_logmyself_category(category, user_uid, results_by_category.get(category), analysis_start_datetime, logmyself_analysis_final_status)
+            # The finalization reads back the published rows, so they are flushed before it
+            write_buffer.flush()
+        finally:
+            analysis_service.write_buffer = None
+            # If a category raised, the rows that are still buffered are not sent, they are counted as failed
+            write_buffer.discard()
+            # Each table with rows that were not sent is counted as a failure of the user
+            publish_failures = write_buffer.failures()
+            if publish_failures:
+                user_result['publish_failures'] = publish_failures
+                user_result['failures'] += len(publish_failures)
+
+        error_status = analysis_service.finalize_logmyself_data_analysis(user_uid, analysis_start_datetime)
+
+    logger.info(f"\033[93m\n\nLogmyself analysis final status results:\n {error_status or logmyself_analysis_final_status}\n\n\033[0m")
+
+    # Each data category that failed is counted as a failure of the user
+    user_result['failures'] += sum(1 for status in logmyself_analysis_final_status.values() if status is False)
+    if error_status is not None:
+        user_result['failures'] += 1
+
+    # Continue with updating the stats of the day
+    day_analyzed = analysis_start_datetime.date().isoformat()
+    with _stage_timer(user_result, 'stats'):
+        stats_result = _calc_stats_for_a_day(user_uid, user_result['app_origin'], day_analyzed, analysis_service, supabase_service)
+    if stats_result and not stats_result.get('success'):
+        _failed_user_result(user_result, stats_result.get('error'))
+
+def _new_user_result(user_uid: str, app_origin: str) -> dict:
+    """Create the result of a user analysis, it is passed through the stages and aggregated by the daily run."""
+    return {
+        'user_uid': user_uid,
+        'app_origin': app_origin,
+        'success': True,
+        'message': "User data analyzed successfully",
+        'has_data': False,
+        'failures': 0,
+        'stage_timings': {},
+    }
+
+@contextmanager
+def _stage_timer(user_result: dict, stage: str):
+    """
+    Measure the wall time of a stage of the user analysis and add it to the stage timings of the user result.
+
+    Args:
+        user_result: Result of the user analysis
+        stage: Name of the stage (fetch, persist, analysis, publish, stats)
+    """
+    stage_start = time.perf_counter()
+    try:
+        yield
     finally:
-        # Always close the database session
-        db.close()
+        elapsed = time.perf_counter() - stage_start
+        user_result['stage_timings'][stage] = round(user_result['stage_timings'].get(stage, 0.0) + elapsed, 3)
+
+def _failed_user_result(user_result: dict, error: str) -> dict:
+    """Mark the result of a user analysis as failed."""
+    user_result['success'] = False
+    user_result['message'] = error
+    user_result['failures'] += 1
+    return user_result
 
 def _calc_stats_for_a_day(user_uid: str, app_origin: str, day_to_analyze: str, 
                           analysis_service: AnalysisService, supabase_service: SupabaseService):
@@ -207,6 +496,86 @@ def _calc_stats_for_a_day(user_uid: str, app_origin: str, day_to_analyze: str,
     return None
 
 
+@celery_app.task
+def finalize_daily_analysis_run(user_results: list, run_id: str):
+    """
+    Chord callback of the daily run, executed once all the user tasks of the run are done.
+    Aggregates the per-user status, per-stage timings and failure counts into the run record.
+
+    Args:
+        user_results: Results of the user analysis workflows of the run (see build_user_analysis_workflow)
+        run_id: Unique identifier of the run
+
+    Returns:
+        dict: The completed run record (with makespan and throughput)
+    """
+    run_summary = _aggregate_user_results(user_results)
+
+    db = get_service_container().session()
+    try:
+        run_record = DatabaseService(db).complete_analysis_run(run_id, run_summary)
+
+        if run_record is None:
+            logger.error(f"Failed to complete the record of the daily run {run_id}")
+            return {"success": False, "error": f"Failed to complete the record of the daily run {run_id}", **run_summary}
+
+        logger.info(f"\033[96m\n\n{'='*80}\n")
+        logger.info(f"DAILY RUN {run_id} FOR {run_record['analysis_day']} COMPLETED")
+        logger.info(f"Users: {run_record['users_total']} (succeeded: {run_record['users_succeeded']}, failed: {run_record['users_failed']})")
+        logger.info(f"Makespan: {run_record['makespan_seconds']} seconds, throughput: {run_record['throughput_users_per_minute']} users/minute")
+        logger.info(f"{'='*80}\n\033[0m")
+
+        return {"success": True, **run_record}
+    finally:
+        db.close()
+
+def _aggregate_user_results(user_results: list) -> dict:
+    """
+    Aggregate the results of the user tasks of a run.
+
+    Args:
+        user_results: Results of the user analysis workflows (see build_user_analysis_workflow)
+
+    Returns:
+        dict: Number of succeeded and failed users, total failures, the rows that were not published per table
+              and the total/mean/max of each stage
+    """
+    # A task that returned nothing (ex. an older worker) is considered failed
+    user_results = [result for result in user_results if isinstance(result, dict)] + [
+        {'success': False, 'failures': 1, 'stage_timings': {}} for result in user_results if not isinstance(result, dict)
+    ]
+
+    stage_timings = {}
+    for result in user_results:
+        for stage, seconds in result.get('stage_timings', {}).items():
+            stage_timings.setdefault(stage, []).append(seconds)
+
+    return {
+        'users_succeeded': sum(1 for result in user_results if result.get('success')),
+        'users_failed': sum(1 for result in user_results if not result.get('success')),
+        'failures_total': sum(result.get('failures', 0) for result in user_results),
+        'publish_failures': _sum_publish_failures(user_results),
+        'stage_timings': {
+            stage: {
+                'total_seconds': round(sum(timings), 3),
+                'mean_seconds': round(sum(timings) / len(timings), 3),
+                'max_seconds': round(max(timings), 3),
+            }
+            for stage, timings in stage_timings.items()
+        },
+        'user_results': user_results,
+    }
+
+
+def _sum_publish_failures(user_results: list) -> dict:
+    """Sum the rows that were not published to each Supabase table, over the user results."""
+    publish_failures = {}
+    for result in user_results:
+        for table_name, failed_rows in result.get('publish_failures', {}).items():
+            publish_failures[table_name] = publish_failures.get(table_name, 0) + failed_rows
+    return publish_failures
+
+
 @celery_app.task
 def run_daily_analysis_task():
     """
@@ -229,7 +598,7 @@ def run_daily_analysis_task():
     logger.info(f"{'='*80}\n\033[0m")
     
     # Create a database session for this task
-    db = SessionLocal()
+    db = get_service_container().session()
     try:
         # Initialize services
         db_service = DatabaseService(db)
@@ -256,3 +625,73 @@ def run_daily_analysis_task():
     finally:
         # Always close the database session
         db.close()
+
+
+@celery_app.task
+def record_range_progress(user_result: dict, run_id: str):
+    """
+    Celery task that follows the workflow of each (user, day) pair in the lanes of a range analysis
+    and counts the pair as finished in the range run.
+
+    Args:
+        user_result: Result of the user analysis for the day
+        run_id: The unique identifier of the range run
+
+    Returns:
+        dict: Progress of the range run
+    """
+    success = isinstance(user_result, dict) and bool(user_result.get('success'))
+
+    db = get_service_container().session()
+    try:
+        range_run = DatabaseService(db).record_range_progress(run_id, success)
+        if range_run is None:
+            return {"success": False, "error": f"Failed to record the progress of range run {run_id}"}
+
+        logger.info(f"Range run {run_id}: {range_run['pairs_succeeded'] + range_run['pairs_failed']}/{range_run['pairs_total']} (user, day) pairs finished")
+        return {"success": True, "status": range_run['status'], "progress": range_run['progress']}
+    except Exception as e:
+        # Never raise, otherwise the rest of the lane will not be executed
+        logger.error(f"\033[91mError recording the progress of range run {run_id}: {e}\033[0m")
+        return {"success": False, "error": str(e)}
+    finally:
+        db.close()
+
+@celery_app.task
+def run_range_analysis(start_date: str, end_date: str, users: list | None = None, run_id: str | None = None):
+    """
+    Celery task to run the analysis of a range of days (backfill), the (user, day) pairs are analyzed
+    by a bounded number of lanes (RANGE_ANALYSIS_CONCURRENCY) and the days of each user in order.
+
+    Args:
+        start_date: The first day of the range in YYYY-MM-DD format
+        end_date: The last day of the range (inclusive) in YYYY-MM-DD format
+        users: The uids of the users to analyze, None for all the users
+        run_id: The unique identifier of the range run, if its record is already created (ex. by the API)
+
+    Returns:
+        dict: Result of the dispatch of the range analysis
+    """
+    # Import here to avoid circular import
+    from app.services.orchestration_service import OrchestrationService
+
+    logger.info(f"\033[96m\n\n{'='*80}\n")
+    logger.info(f"RANGE ANALYSIS STARTED FOR DATES: {start_date} - {end_date}")
+    logger.info(f"{'='*80}\n\033[0m")
+
+    db = get_service_container().session()
+    try:
+        db_service = DatabaseService(db)
+        if run_id is None:
+            run_id = uuid.uuid4().hex
+            if not db_service.create_range_run(run_id, date.fromisoformat(start_date), date.fromisoformat(end_date)):
+                return {"success": False, "error": f"Failed to create the record of the range run for {start_date} - {end_date}."}
+
+        orchestration_service = OrchestrationService(db_service)
+        return orchestration_service.run_range_analysis(run_id, start_date, end_date, users)
+    except Exception as e:
+        error_msg = f"Error in range analysis for {start_date} - {end_date}: {str(e)}"
+        logger.error(f"\033[91m{error_msg}\033[0m")
+        return {"success": False, "error": error_msg, "run_id": run_id}
+    finally:
+        db.close()
@@ -1,27 +1,123 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Time
+from sqlalchemy import Column, Integer, String, DateTime, Date, Float, ForeignKey, ForeignKeyConstraint, Time, UniqueConstraint, JSON, LargeBinary
 from app.local_database.connection import Base
 from datetime import datetime
 
 class User(Base):
     __tablename__ = "users"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     uid = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, index=True, nullable=False)
     app_origin = Column(String, nullable=False)  # LogBoard or LogMyself
 
+class AnalysisPartition(Base):
+    """
+    A partition of the local store, one for each (analysis day, user) pair.
+    Every event row carries the partition_key of the analysis that ingested it, this way
+    several days and users can be ingested and analyzed at the same time without dropping tables.
+    Partitions that are not used for a while are removed by the TTL sweeper.
+    """
+    __tablename__ = "analysis_partitions"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    partition_key = Column(String, nullable=False, unique=True, index=True)
+    user_uid = Column(String, ForeignKey('users.uid'), nullable=False)
+    analysis_day = Column(Date, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class AnalysisRun(Base):
+    """
+    One daily analysis run for the whole cohort of users. It is created when the run is dispatched
+    and completed by the chord callback with the aggregated results of all the user tasks.
+    """
+    __tablename__ = "analysis_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String, nullable=False, unique=True, index=True)
+    analysis_day = Column(Date, nullable=False)
+    status = Column(String, nullable=False)  # RUNNING or COMPLETED
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    users_total = Column(Integer, nullable=False)
+    users_succeeded = Column(Integer, nullable=True)
+    users_failed = Column(Integer, nullable=True)
+    failures_total = Column(Integer, nullable=True)
+    makespan_seconds = Column(Float, nullable=True)
+    throughput_users_per_minute = Column(Float, nullable=True)
+    stage_timings = Column(JSON, nullable=True)  # {stage: {total_seconds, mean_seconds, max_seconds}}
+    user_results = Column(JSON, nullable=True)  # The result of each user task
+
+class AnalysisRangeRun(Base):
+    """
+    One backfill of a range of days. The (user, day) pairs are analyzed by a bounded number of lanes,
+    each (user, day) that is finished updates the progress of the range run.
+    """
+    __tablename__ = "analysis_range_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String, nullable=False, unique=True, index=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    status = Column(String, nullable=False)  # PENDING, RUNNING, COMPLETED or FAILED
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    users_total = Column(Integer, nullable=False, default=0)
+    days_total = Column(Integer, nullable=False, default=0)
+    pairs_total = Column(Integer, nullable=False, default=0)
+    pairs_succeeded = Column(Integer, nullable=False, default=0)
+    pairs_failed = Column(Integer, nullable=False, default=0)
+
+class TypingBaselineState(Base):
+    """
+    The state of a typing metric of a user for one day (count, mean, M2 and quantile sketch of the values),
+    the typing baselines are computed by merging the states of the days of the baseline period (TypingBaselineEngine).
+    NOTE: The states are not partitioned, they are kept after the partition of the day is purged.
+    """
+    __tablename__ = "typing_baseline_states"
+    __table_args__ = (UniqueConstraint('user_uid', 'metric_name', 'day'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_uid = Column(String, nullable=False, index=True)
+    metric_name = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    count = Column(Integer, nullable=False)
+    mean = Column(Float, nullable=False)
+    m2 = Column(Float, nullable=False)
+    sketch = Column(JSON, nullable=False)  # {'means': [...], 'weights': [...]}
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class TypingBaselineDay(Base):
+    """
+    A day of a user whose typing sessions were analyzed into the daily states (TypingBaselineEngine), including
+    the days without sessions (they have no states). A baseline is computed from the states only if every day
+    of its period is recorded, otherwise some sessions of the period would be missing from the baseline.
+    """
+    __tablename__ = "typing_baseline_days"
+    __table_args__ = (UniqueConstraint('user_uid', 'day'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_uid = Column(String, nullable=False, index=True)
+    day = Column(Date, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 class TypingSession(Base):
     __tablename__ = "typing_sessions"
+    __table_args__ = (UniqueConstraint('partition_key', 'typing_session_id'),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    partition_key = Column(String, nullable=True, index=True)
     user_id = Column(String, ForeignKey('users.uid'), nullable=False)
-    typing_session_id = Column(String, nullable=False, unique=True)
+    typing_session_id = Column(String, nullable=False)
 
 class TypingSessionData(Base):
     __tablename__ = "typing_session_data"
+    __table_args__ = (UniqueConstraint('partition_key', 'typing_session_id'),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    typing_session_id = Column(String, nullable=False, unique=True)
+    partition_key = Column(String, nullable=True, index=True)
+    typing_session_id = Column(String, nullable=False)
     avg_pause_ctc_duration = Column(Float, nullable=False)
     avg_pause_wtw_duration = Column(Float, nullable=False)
     characters_typed = Column(Integer, nullable=False)
@@ -46,11 +142,33 @@ class TypingSessionData(Base):
     total_word_or_sentence_deletions = Column(Integer, nullable=False)
     words_typed = Column(Integer, nullable=False)
 
+class TypingSessionTimings(Base):
+    """
+    The raw timing arrays of a typing session (IKI, PauseCtC and PauseWtW durations), next to the aggregates of
+    TypingSessionData. Each array is one blob of float32 deltas (see typing_timings.encode_timings) instead of
+    a row per value, the sessions are decoded in bulk with TypingTimingsBatch.
+    """
+    __tablename__ = "typing_session_timings"
+    __table_args__ = (UniqueConstraint('partition_key', 'typing_session_id'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    partition_key = Column(String, nullable=True, index=True)
+    typing_session_id = Column(String, nullable=False)
+    encoding = Column(String, nullable=False)
+    iki_count = Column(Integer, nullable=False)
+    iki_deltas = Column(LargeBinary, nullable=False)
+    pause_ctc_count = Column(Integer, nullable=False)
+    pause_ctc_deltas = Column(LargeBinary, nullable=False)
+    pause_wtw_count = Column(Integer, nullable=False)
+    pause_wtw_deltas = Column(LargeBinary, nullable=False)
+
 class SleepData(Base):
     __tablename__ = "sleep_data"
+    __table_args__ = (UniqueConstraint('partition_key', 'sleep_event_id'),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    sleep_event_id = Column(String, nullable=False, unique=True)
+    partition_key = Column(String, nullable=True, index=True)
+    sleep_event_id = Column(String, nullable=False)
     user_id = Column(String, ForeignKey('users.uid'), nullable=False)
     confidence = Column(Float, nullable=False)
     light = Column(Float, nullable=False)
@@ -61,17 +179,27 @@ class SleepData(Base):
 
 class AppsSleepData(Base):
     __tablename__ = "apps_table"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ['partition_key', 'sleep_id'],
+            ['sleep_data.partition_key', 'sleep_data.sleep_event_id'],
+            ondelete='CASCADE'
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    sleep_id = Column(String, ForeignKey('sleep_data.sleep_event_id'), nullable=False)
+    partition_key = Column(String, nullable=True, index=True)
+    sleep_id = Column(String, nullable=False)
     app_name = Column(String, nullable=False)
     time_used = Column(Float, nullable=True)
 
 class ScreenTimeEvent(Base):
     __tablename__ = "screen_time_events"
-    
+    __table_args__ = (UniqueConstraint('partition_key', 'screen_time_event_id'),)
+
     id = Column(Integer, primary_key=True, index=True)
-    screen_time_event_id = Column(String, nullable = False, unique=True, index=True)
+    partition_key = Column(String, nullable=True, index=True)
+    screen_time_event_id = Column(String, nullable = False, index=True)
     user_uid = Column(String, ForeignKey("users.uid"), nullable=False)
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime, nullable=False)
@@ -79,17 +207,21 @@ class ScreenTimeEvent(Base):
 
 class DeviceUnlockEvent(Base):
     __tablename__ = "device_unlock_events"
-    
+    __table_args__ = (UniqueConstraint('partition_key', 'device_unlock_event_id'),)
+
     id = Column(Integer, primary_key=True, index=True)
-    device_unlock_event_id = Column(String,nullable = False, unique=True, index=True)
+    partition_key = Column(String, nullable=True, index=True)
+    device_unlock_event_id = Column(String,nullable = False, index=True)
     user_uid = Column(String, ForeignKey("users.uid"), nullable=False)
     timestamp = Column(DateTime, nullable=False)
 
 class UserActivityEvent(Base):
     __tablename__ = "user_activities_events"
-    
+    __table_args__ = (UniqueConstraint('partition_key', 'user_activity_event_id'),)
+
     id = Column(Integer, primary_key=True, index=True)
-    user_activity_event_id = Column(String, nullable = False, unique=True, index=True)
+    partition_key = Column(String, nullable=True, index=True)
+    user_activity_event_id = Column(String, nullable = False, index=True)
     user_uid = Column(String, ForeignKey("users.uid"), nullable=True)
     timestamp = Column(DateTime, nullable=True)
     activity_type = Column(String, nullable=True)
@@ -97,9 +229,11 @@ class UserActivityEvent(Base):
 
 class CallEvent(Base):
     __tablename__ = "call_events"
-    
+    __table_args__ = (UniqueConstraint('partition_key', 'call_event_id'),)
+
     id = Column(Integer, primary_key=True, index=True)
-    call_event_id = Column(String, nullable = False, unique=True, index=True)
+    partition_key = Column(String, nullable=True, index=True)
+    call_event_id = Column(String, nullable = False, index=True)
     user_uid = Column(String, ForeignKey("users.uid"), nullable=True)
     call_date = Column(DateTime, nullable=False)
     call_type = Column(String, nullable=True)  # incoming, outgoing, missed
@@ -108,9 +242,11 @@ class CallEvent(Base):
 
 class DeviceDropEvent(Base):
     __tablename__ = "device_drop_events"
-    
+    __table_args__ = (UniqueConstraint('partition_key', 'device_drop_event_id'),)
+
     id = Column(Integer, primary_key=True, index=True)
-    device_drop_event_id = Column(String, nullable = False, unique=True, index=True)
+    partition_key = Column(String, nullable=True, index=True)
+    device_drop_event_id = Column(String, nullable = False, index=True)
     user_uid = Column(String, ForeignKey("users.uid"), nullable = False)
     detected_fall_duration = Column(Integer, nullable=False)  # in milliseconds
     detected_magnitude = Column(Integer, nullable=False)
@@ -118,9 +254,11 @@ class DeviceDropEvent(Base):
 
 class LowLightEvent(Base):
     __tablename__ = "low_light_events"
-    
+    __table_args__ = (UniqueConstraint('partition_key', 'low_light_event_id'),)
+
     id = Column(Integer, primary_key=True, index=True)
-    low_light_event_id = Column(String, unique=True, index=True)
+    partition_key = Column(String, nullable=True, index=True)
+    low_light_event_id = Column(String, index=True)
     user_uid = Column(String, ForeignKey("users.uid"), nullable=False)
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime, nullable=False)
@@ -129,9 +267,11 @@ class LowLightEvent(Base):
 
 class GPSEvent(Base):
     __tablename__ = "gps_events"
+    __table_args__ = (UniqueConstraint('partition_key', 'gps_event_id'),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    gps_event_id = Column(String, nullable=False, unique=True)
+    partition_key = Column(String, nullable=True, index=True)
+    gps_event_id = Column(String, nullable=False)
     user_uid = Column(String, ForeignKey('users.uid'), nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
@@ -139,4 +279,20 @@ class GPSEvent(Base):
     bearing = Column(Float, nullable=False)
     speed = Column(Float, nullable=False)
     speed_accuracy_meters_per_second = Column(Float, nullable=False)
-    timestamp_now = Column(DateTime, nullable=False)
\ No newline at end of file
+    timestamp_now = Column(DateTime, nullable=False)
+
+# Tables that hold partitioned data, children first so that they can be purged in this order
+PARTITIONED_MODELS = [
+    AppsSleepData,
+    SleepData,
+    TypingSessionData,
+    TypingSessionTimings,
+    TypingSession,
+    ScreenTimeEvent,
+    DeviceUnlockEvent,
+    UserActivityEvent,
+    CallEvent,
+    DeviceDropEvent,
+    LowLightEvent,
+    GPSEvent,
+]
@@ -9,7 +9,7 @@ from fastapi import FastAPI
 from app.api.routes import router as api_router
 import logging
 
-from app.local_database.connection import create_tables, drop_tables
+from app.local_database.connection import create_tables
 
 # Configure logging with colors
 class ColoredFormatter(logging.Formatter):
@@ -68,8 +68,9 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
     yield
+    # NOTE: The local database is not dropped on shutdown, Celery workers may still use its partitions.
+    # Old partitions are purged by the sweeper task.
     logger.info("Shutting down application...")
-    drop_tables()
 
 app = FastAPI(
     title="LogMyself & LogBoard API",
@@ -1,15 +1,13 @@
-from cmath import log
 from datetime import datetime, timedelta, time, date
+import hashlib
 from annotated_types import Unit
 from pandas.core.dtypes.cast import dt
 from scipy.stats import entropy
 from typing import List
-from haversine import haversine, Unit
-from sklearn.metrics.pairwise import haversine_distances
-from math import radians
+from haversine import haversine_vector, Unit
 from sklearn.cluster import DBSCAN
+from sklearn.neighbors import BallTree
 from scipy.spatial import ConvexHull
-import pyproj
 from geopy.distance import distance
 from sklearn.decomposition import PCA
 import numpy as np
@@ -19,6 +17,10 @@ import pandas as pd
 
 from app.services.database_service import DatabaseService
 from app.services.supabase_service import SupabaseService
+from app.services.typing_metrics_engine import TypingMetricsEngine
+from app.services.baseline_engine import TypingBaselineEngine
+from app.services.gps_segmentation import GPSRouteSegments
+from app.services.gps_geometry import GPSGeometry
 
 import logging
 
@@ -31,6 +33,8 @@ class AnalysisService:
         self.timezone = settings.DEFAULT_TIMEZONE
         self.db_service = db_service
         self.supabase_service = supabase_service
+        # The write buffer of the user task (SupabaseWriteBuffer), if set the LogMyself rows are published through it
+        self.write_buffer = None
 
     def start_logboard_data_analysis(self, user_uid: str, analysis_start_datetime: datetime, analysis_end_datetime: datetime):
         logger.info(f"\n\n--Starting LogBoard data analysis, for user {user_uid}--\n\n")
@@ -47,57 +51,17 @@ class AnalysisService:
             logger.info(f"No typing sessions found for user {user_uid}.")
             return {"status": "no typing sessions found", "user_uid": user_uid}
 
-        # Pressure Intensity computation and storing in Supabase
-        # Get the latest baseline information for the user about the metric
-        bl_rec = self.supabase_service.get_user_baseline_metric_values(user_uid, 'PRESSURE_INTENSITY')
-        if bl_rec is None:
-            logger.warning(f"\033[93mBaseline record not found for user {user_uid} and metric PRESSURE_INTENSITY.\033[0m")
-        self._compute_and_store_pressure_intensity(user_uid, typing_sessions, bl_rec)
-
-        # Effort to Output Ration computation
-        bl_rec = self.supabase_service.get_user_baseline_metric_values(user_uid, 'EFFORT_TO_OUTPUT_RATIO')
-        if bl_rec is None:
-            logger.warning(f"\033[93mBaseline record not found for user {user_uid} and metric EFFORT_TO_OUTPUT_RATIO.\033[0m")
-        self._compute_and_store_effort_to_output_ratio(user_uid, typing_sessions, bl_rec)
-
-        # Typing Rhythm Stability
-        bl_rec = self.supabase_service.get_user_baseline_metric_values(user_uid, 'TYPING_RHYTHM_STABILITY')
-        if bl_rec is None:
-            logger.warning(f"\033[93mBaseline record not found for user {user_uid} and metric TYPING_RHYTHM_STABILITY.\033[0m")
-        self._compute_and_store_typing_rhythm_stability(user_uid, typing_sessions, bl_rec)
-
-        # Cognitive Processing Index
-        bl_rec = self.supabase_service.get_user_baseline_metric_values(user_uid, 'COGNITIVE_PROCESSING_INDEX')
-        if bl_rec is None:
-            logger.warning(f"\033[93mBaseline record not found for user {user_uid} and metric COGNITIVE_PROCESSING_INDEX.\033[0m")
-        self._compute_and_store_cognitive_processing_index(user_uid, typing_sessions, bl_rec)
-
-        # Pause to Production Ratio
-        bl_rec = self.supabase_service.get_user_baseline_metric_values(user_uid, 'PAUSE_TO_PRODUCTION_RATIO')
-        if bl_rec is None:
-            logger.warning(f"\033[93mBaseline record not found for user {user_uid} and metric PAUSE_TO_PRODUCTION_RATIO.\033[0m")
-        self._compute_and_store_pause_to_production_ratio(user_uid, typing_sessions, bl_rec)
-
-        # Correction Efficiency
-        bl_rec = self.supabase_service.get_user_baseline_metric_values(user_uid, 'CORRECTION_EFFICIENCY')
-        if bl_rec is None:
-            logger.warning(f"\033[93mBaseline record not found for user {user_uid} and metric CORRECTION_EFFICIENCY.\033[0m")
-        self._compute_and_store_correction_efficiency(user_uid, typing_sessions, bl_rec)
-
-        # Net Production Rate
-        bl_rec = self.supabase_service.get_user_baseline_metric_values(user_uid, 'NET_PRODUCTION_RATE')
-        if bl_rec is None:
-            logger.warning(f"\033[93mBaseline record not found for user {user_uid} and metric NET_PRODUCTION_RATE.\033[0m")
-        self._compute_and_store_net_production_rate(user_uid, typing_sessions, bl_rec)
-
-        # Cognitive Processing Efficiency
-        bl_rec = self.supabase_service.get_user_baseline_metric_values(user_uid, 'COGNITIVE_PROCESSING_EFFICIENCY')
-        if bl_rec is None:
-            logger.warning(f"\033[93mBaseline record not found for user {user_uid} and metric COGNITIVE_PROCESSING_EFFICIENCY.\033[0m")
-        self._compute_and_store_cognitive_processing_efficiency(user_uid, typing_sessions, bl_rec)
+        # Get the latest baseline information for the user about each typing metric
+        baselines = self.supabase_service.get_latest_baselines(user_uid, list(TypingMetricsEngine.METRIC_TABLES))
+        for metric_name, baseline in baselines.items():
+            if baseline is None:
+                logger.warning(f"\033[93mBaseline record not found for user {user_uid} and metric {metric_name}.\033[0m")
+
+        # Compute all the typing metrics of the sessions in one pass and store them in Supabase
+        self._compute_and_store_typing_metrics(user_uid, typing_sessions, baselines, analysis_start_datetime.date())
 
         # Update the baseline metrics
-        state = self._update_typing_baseline_metrics(user_uid)
+        state = self._update_typing_baseline_metrics(user_uid, analysis_start_datetime.date())
 
         # NOTE: state will be True in 3 cases:
         # 1) Creates New Baselines (No baselines exist)
@@ -115,149 +79,213 @@ class AnalysisService:
         
         return {"status": "success", "user_uid": user_uid}
 
+    # Data categories of the LogMyself analysis, in the order they are analyzed
+    LOGMYSELF_CATEGORIES = ['sleep', 'device_interaction', 'activity', 'call', 'gps']
+
     def start_logmyself_data_analysis(self, user_uid: str, analysis_start_datetime: datetime, analysis_end_datetime: datetime) -> dict | None:
         logger.info(f"\n\n--Starting LogMyself data analysis, for user {user_uid}--\n\n")
 
         # JSON that will hold the logmyself analysis results
         logmyself_analysis_final_status = {}
 
-        # Sleep Behavior Analysis
-        logger.info(f"\033[94m\n\n--Starting sleep behavior analysis for user {user_uid} at {analysis_start_datetime} and {analysis_end_datetime}--\033[0m")
-        all_sleep_analysis_results = self._calc_sleep_data(user_uid, analysis_start_datetime, analysis_end_datetime)
-        logger.info(f"\033[94m\n\n*Sleep behavior analysis results: {all_sleep_analysis_results}*\033[0m")
-        if all_sleep_analysis_results is not None and len(all_sleep_analysis_results) > 0:
-            # Send all sleep data to Supabase (both main sleep and naps)
-            sleep_data_analysis_ids = self.supabase_service.send_computed_sleep_info(user_uid, all_sleep_analysis_results, analysis_start_datetime.date())
-            
-            # Find main sleep for Z-score calculations
-            main_sleep_data = None
-            main_sleep_id = None
-            logger.info(f"Searching for main_sleep in {len(all_sleep_analysis_results)} sleep analysis results")
-            for i, sleep_data in enumerate(all_sleep_analysis_results):
-                logger.info(f"Sleep data {i}: type={sleep_data.get('type')}, sqs={sleep_data.get('sqs')}")
-                if sleep_data.get('type') == 'main_sleep':
-                    main_sleep_data = sleep_data
-                    logger.info(f"Found main_sleep at index {i}")
-                    if sleep_data_analysis_ids and isinstance(sleep_data_analysis_ids, list) and i < len(sleep_data_analysis_ids):
-                        main_sleep_id = sleep_data_analysis_ids[i]
-                        logger.info(f"Matched main_sleep_id: {main_sleep_id}")
-                    else:
-                        logger.error(f"Failed to match main_sleep_id: sleep_data_analysis_ids={sleep_data_analysis_ids}, index={i}")
-                    break
-            
-            if main_sleep_data is not None and main_sleep_id is not None:
-                logger.info(f"Computed sleep data stored successfully. Main sleep ID: {main_sleep_id}")
-                # Calculate the Z-Scores for main sleep data for the day analyzed
-                sleep_duration = main_sleep_data.get('estimated_end_date_time') - main_sleep_data.get('estimated_start_date_time')
-                logger.info(f"Calling Z-score calculation for main sleep with duration: {sleep_duration}")
-                self._calculate_z_scores_for_sleep_data(
-                    main_sleep_id,
-                    user_uid, 
-                    sleep_duration, 
-                    main_sleep_data.get('sqs'), 
-                    main_sleep_data.get('estimated_start_date_time'),
-                    main_sleep_data.get('estimated_end_date_time')
-                )
-                logmyself_analysis_final_status['sleep_analysis_success'] = True
+        for category in self.LOGMYSELF_CATEGORIES:
+            category_result = self.compute_logmyself_category(category, user_uid, analysis_start_datetime, analysis_end_datetime)
+            self.publish_logmyself_category(category, user_uid, category_result, analysis_start_datetime, logmyself_analysis_final_status)
+
+        error_status = self.finalize_logmyself_data_analysis(user_uid, analysis_start_datetime)
+        if error_status is not None:
+            return error_status
+
+        # Result like:
+        # {
+        #     "sleep_analysis_success": True,
+        #     "device_interaction_analysis_success": True,
+        #     "activity_analysis_success": True,
+        #     "call_analysis_success": True,
+        #     "gps_analysis_success": True
+        # }
+        return logmyself_analysis_final_status
+
+    def compute_logmyself_category(self, category: str, user_uid: str, analysis_start_datetime: datetime, analysis_end_datetime: datetime) -> dict | list | None:
+        """
+        Compute the analysis of a LogMyself data category from the local database (no Supabase writes).
+        Args:
+            category: str - One of LOGMYSELF_CATEGORIES
+            user_uid: str - The user's unique identifier
+            analysis_start_datetime: datetime - Start datetime for the analysis
+            analysis_end_datetime: datetime - End datetime for the analysis
+        Returns:
+            The computed results of the category, None if there is nothing to publish
+        """
+        calc_functions = {
+            'sleep': self._calc_sleep_data,
+            'device_interaction': self._calc_device_interaction_data,
+            'activity': self._calc_activity_data,
+            'call': self._calc_call_data,
+            'gps': self._calc_gps_data,
+        }
+
+        if category not in calc_functions:
+            logger.error(f"Unknown LogMyself data category: {category}")
+            return None
+
+        logger.info(f"\033[94m\n\n--Starting {category} analysis for user {user_uid} at {analysis_start_datetime} and {analysis_end_datetime}--\033[0m")
+        category_result = calc_functions[category](user_uid, analysis_start_datetime, analysis_end_datetime)
+        logger.info(f"\033[94m\n\n*{category} analysis results: {category_result}*\033[0m")
+        return category_result
+
+    def publish_logmyself_category(self, category: str, user_uid: str, category_result: dict | list | None, analysis_start_datetime: datetime, final_status: dict) -> None:
+        """
+        Send the computed results of a LogMyself data category to Supabase and calculate their Z-Scores.
+        Args:
+            category: str - One of LOGMYSELF_CATEGORIES
+            user_uid: str - The user's unique identifier
+            category_result: The results computed by compute_logmyself_category
+            analysis_start_datetime: datetime - Start datetime for the analysis
+            final_status: dict - The status of each category, updated with the status of this category
+        """
+        if category == 'sleep':
+            all_sleep_analysis_results = category_result
+            if all_sleep_analysis_results is not None and len(all_sleep_analysis_results) > 0:
+                # Send all sleep data to Supabase (both main sleep and naps)
+                sleep_data_analysis_ids = self.supabase_service.send_computed_sleep_info(user_uid, all_sleep_analysis_results, analysis_start_datetime.date(), write_buffer=self.write_buffer)
+                
+                # Find main sleep for Z-score calculations
+                main_sleep_data = None
+                main_sleep_id = None
+                logger.info(f"Searching for main_sleep in {len(all_sleep_analysis_results)} sleep analysis results")
+                for i, sleep_data in enumerate(all_sleep_analysis_results):
+                    logger.info(f"Sleep data {i}: type={sleep_data.get('type')}, sqs={sleep_data.get('sqs')}")
+                    if sleep_data.get('type') == 'main_sleep':
+                        main_sleep_data = sleep_data
+                        logger.info(f"Found main_sleep at index {i}")
+                        if sleep_data_analysis_ids and isinstance(sleep_data_analysis_ids, list) and i < len(sleep_data_analysis_ids):
+                            main_sleep_id = sleep_data_analysis_ids[i]
+                            logger.info(f"Matched main_sleep_id: {main_sleep_id}")
+                        else:
+                            logger.error(f"Failed to match main_sleep_id: sleep_data_analysis_ids={sleep_data_analysis_ids}, index={i}")
+                        break
+                
+                if main_sleep_data is not None and main_sleep_id is not None:
+                    logger.info(f"Computed sleep data stored successfully. Main sleep ID: {main_sleep_id}")
+                    # Calculate the Z-Scores for main sleep data for the day analyzed
+                    sleep_duration = main_sleep_data.get('estimated_end_date_time') - main_sleep_data.get('estimated_start_date_time')
+                    logger.info(f"Calling Z-score calculation for main sleep with duration: {sleep_duration}")
+                    self._calculate_z_scores_for_sleep_data(
+                        main_sleep_id,
+                        user_uid, 
+                        sleep_duration, 
+                        main_sleep_data.get('sqs'), 
+                        main_sleep_data.get('estimated_start_date_time'),
+                        main_sleep_data.get('estimated_end_date_time')
+                    )
+                    final_status['sleep_analysis_success'] = True
+                else:
+                    logger.error(f"   CRITICAL: No main sleep found or failed to store main sleep data.")
+                    logger.error(f"   main_sleep_data is None: {main_sleep_data is None}")
+                    logger.error(f"   main_sleep_id is None: {main_sleep_id is None}")
+                    logger.error(f"   sleep_data_analysis_ids: {sleep_data_analysis_ids}")
+                    final_status['sleep_analysis_success'] = False
             else:
-                logger.error(f"   CRITICAL: No main sleep found or failed to store main sleep data.")
-                logger.error(f"   main_sleep_data is None: {main_sleep_data is None}")
-                logger.error(f"   main_sleep_id is None: {main_sleep_id is None}")
-                logger.error(f"   sleep_data_analysis_ids: {sleep_data_analysis_ids}")
-                logmyself_analysis_final_status['sleep_analysis_success'] = False
+                logger.error(f"No sleep data found for analysis.")
+                final_status['sleep_analysis_success'] = False
+
+        elif category == 'device_interaction':
+            device_interaction_analysis_result = category_result
+            if device_interaction_analysis_result is not None:
+                interaction_data_analysis_id = self.supabase_service.send_computed_device_interaction_info(user_uid, device_interaction_analysis_result, analysis_start_datetime.date(), write_buffer=self.write_buffer)
+                if interaction_data_analysis_id is not None:
+                    logger.info(f"Computed device interaction data stored successfully.")
+                    # Calculate the Z-Scores for device interaction data for the day analyzed
+                    self._calculate_z_scores_for_device_interaction_data(
+                        interaction_data_analysis_id,
+                        user_uid, 
+                        device_interaction_analysis_result.get('screen_time_analysis_result'),
+                        device_interaction_analysis_result.get('low_light_day_time_result'),
+                        device_interaction_analysis_result.get('device_drop_events_result'),
+                    )
+                    final_status['device_interaction_analysis_success'] = True
+                else:
+                    logger.error(f"Failed to store computed device interaction data.")
+                    final_status['device_interaction_analysis_success'] = False
+
+        elif category == 'activity':
+            activity_analysis_result = category_result
+            if activity_analysis_result is not None:
+                activity_data_analysis_id = self.supabase_service.send_computed_activity_info(user_uid, activity_analysis_result, analysis_start_datetime.date(), write_buffer=self.write_buffer)
+                if activity_data_analysis_id is not None:
+                    logger.info(f"Computed activity data stored successfully.")
+                    # Calculate the Z-Scores for activity data for the day analyzed
+                    self._calculate_z_scores_for_activity_data(
+                        activity_data_analysis_id,
+                        user_uid,
+                        activity_analysis_result.get('daily_active_minutes'),
+                    )
+                    final_status['activity_analysis_success'] = True
+                else:
+                    logger.error(f"Failed to store computed activity data.")
+                    final_status['activity_analysis_success'] = False
+
+        elif category == 'call':
+            # Call Behavior Analysis - Social Interaction Behavior Analysis
+            call_analysis_result = category_result
+            if call_analysis_result is not None:
+                call_data_analysis_id = self.supabase_service.send_computed_call_info(user_uid, call_analysis_result, analysis_start_datetime.date(), write_buffer=self.write_buffer)
+                if call_data_analysis_id is not None:
+                    logger.info(f"Computed call data stored successfully.")
+                    # Calculate the Z-Scores for call data for the day analyzed
+                    self._calculate_z_scores_for_call_data(
+                        call_data_analysis_id,
+                        user_uid,
+                        call_analysis_result.get('missed_call_ratio'),
+                        call_analysis_result.get('avg_call_duration'),
+                        call_analysis_result.get('total_calls_in_a_day')
+                    )
+                    final_status['call_analysis_success'] = True
+                else:
+                    logger.error(f"Failed to store computed call data.")
+                    final_status['call_analysis_success'] = False
+
+        elif category == 'gps':
+            # GPS Behavior Analysis - Mobility Behavior Analysis
+            gps_analysis_result = category_result
+            if gps_analysis_result is not None:
+                gps_data_analysis_id = self.supabase_service.send_computed_gps_info(user_uid, gps_analysis_result, analysis_start_datetime.date(), write_buffer=self.write_buffer)
+                if gps_data_analysis_id is not None:
+                    logger.info(f"Computed GPS data stored successfully.")
+                    # Calculate the Z-Scores for GPS data for the day analyzed
+                    self._calculate_z_scores_for_gps_data(
+                        gps_data_analysis_id,
+                        user_uid,
+                        gps_analysis_result.get('total_time_spend_in_home_seconds'),
+                        gps_analysis_result.get('total_time_spend_traveling_seconds'),
+                        gps_analysis_result.get('total_time_spend_out_of_home_seconds'),
+                        gps_analysis_result.get('total_distance_traveled_km'),
+                        gps_analysis_result.get('average_time_spend_in_locations_hours'),
+                        gps_analysis_result.get('number_of_unique_locations'),
+                        gps_analysis_result.get('convex_hull', {}).get('area_m2'),
+                        gps_analysis_result.get('standard_deviation_ellipse', {}).get('area_m2'),
+                        gps_analysis_result.get('max_distance_from_home', {}).get('timestamp'),
+                        gps_analysis_result.get('entropy'),
+                    )
+                    final_status['gps_analysis_success'] = True
+                else:
+                    logger.error(f"Failed to store computed GPS data.")
+                    final_status['gps_analysis_success'] = False
+
         else:
-            logger.error(f"No sleep data found for analysis.")
-            logmyself_analysis_final_status['sleep_analysis_success'] = False
-
-        # Daily Device Interaction Behavior Analysis
-        logger.info(f"\033[94m\n\n--Starting daily device interaction analysis for user {user_uid} at {analysis_start_datetime} and {analysis_end_datetime}--\033[0m")
-        device_interaction_analysis_result = self._calc_device_interaction_data(user_uid, analysis_start_datetime, analysis_end_datetime)
-        logger.info(f"\033[94m\n\n*Daily device interaction analysis result: {device_interaction_analysis_result}*\033[0m")
-        if device_interaction_analysis_result is not None:
-            interaction_data_analysis_id = self.supabase_service.send_computed_device_interaction_info(user_uid, device_interaction_analysis_result, analysis_start_datetime.date())
-            if interaction_data_analysis_id is not None:
-                logger.info(f"Computed device interaction data stored successfully.")
-                # Calculate the Z-Scores for device interaction data for the day analyzed
-                self._calculate_z_scores_for_device_interaction_data(
-                    interaction_data_analysis_id,
-                    user_uid, 
-                    device_interaction_analysis_result.get('screen_time_analysis_result'),
-                    device_interaction_analysis_result.get('low_light_day_time_result'),
-                    device_interaction_analysis_result.get('device_drop_events_result'),
-                )
-                logmyself_analysis_final_status['device_interaction_analysis_success'] = True
-            else:
-                logger.error(f"Failed to store computed device interaction data.")
-                logmyself_analysis_final_status['device_interaction_analysis_success'] = False
-
-        # Activity Behavior Analysis
-        logger.info(f"\033[94m\n\n--Starting activity analysis for user {user_uid} at {analysis_start_datetime} and {analysis_end_datetime}--\033[0m")
-        activity_analysis_result = self._calc_activity_data(user_uid, analysis_start_datetime, analysis_end_datetime)
-        logger.info(f"\033[94m\n\n*Activity behavior analysis result: {activity_analysis_result}*\033[0m")
-        if activity_analysis_result is not None:
-            activity_data_analysis_id = self.supabase_service.send_computed_activity_info(user_uid, activity_analysis_result, analysis_start_datetime.date())
-            if activity_data_analysis_id is not None:
-                logger.info(f"Computed activity data stored successfully.")
-                # Calculate the Z-Scores for activity data for the day analyzed
-                self._calculate_z_scores_for_activity_data(
-                    activity_data_analysis_id,
-                    user_uid,
-                    activity_analysis_result.get('daily_active_minutes'),
-                )
-                logmyself_analysis_final_status['activity_analysis_success'] = True
-            else:
-                logger.error(f"Failed to store computed activity data.")
-                logmyself_analysis_final_status['activity_analysis_success'] = False
-
-        # Call Behavior Analysis - Social Interaction Behavior Analysis
-        logger.info(f"\033[94m\n\n--Starting call analysis for user {user_uid} at {analysis_start_datetime} and {analysis_end_datetime}--\033[0m")
-        call_analysis_result = self._calc_call_data(user_uid, analysis_start_datetime, analysis_end_datetime)
-        logger.info(f"\033[94m\n\n*Call behavior analysis result: {call_analysis_result}*\033[0m")
-        if call_analysis_result is not None:
-            call_data_analysis_id = self.supabase_service.send_computed_call_info(user_uid, call_analysis_result, analysis_start_datetime.date())
-            if call_data_analysis_id is not None:
-                logger.info(f"Computed call data stored successfully.")
-                # Calculate the Z-Scores for call data for the day analyzed
-                self._calculate_z_scores_for_call_data(
-                    call_data_analysis_id,
-                    user_uid,
-                    call_analysis_result.get('missed_call_ratio'),
-                    call_analysis_result.get('avg_call_duration'),
-                    call_analysis_result.get('total_calls_in_a_day')
-                )
-                logmyself_analysis_final_status['call_analysis_success'] = True
-            else:
-                logger.error(f"Failed to store computed call data.")
-                logmyself_analysis_final_status['call_analysis_success'] = False
-
-        # GPS Behavior Analysis - Mobility Behavior Analysis
-        logger.info(f"\033[94m\n\n--Starting GPS analysis for user {user_uid} at {analysis_start_datetime} and {analysis_end_datetime}--\033[0m")
-        gps_analysis_result = self._calc_gps_data(user_uid, analysis_start_datetime, analysis_end_datetime)
-        logger.info(f"\033[94m\n\n*GPS behavior analysis result: {gps_analysis_result}*\033[0m")
-        if gps_analysis_result is not None:
-            gps_data_analysis_id = self.supabase_service.send_computed_gps_info(user_uid, gps_analysis_result, analysis_start_datetime.date())
-            if gps_data_analysis_id is not None:
-                logger.info(f"Computed GPS data stored successfully.")
-                # Calculate the Z-Scores for GPS data for the day analyzed
-                self._calculate_z_scores_for_gps_data(
-                    gps_data_analysis_id,
-                    user_uid,
-                    gps_analysis_result.get('total_time_spend_in_home_seconds'),
-                    gps_analysis_result.get('total_time_spend_traveling_seconds'),
-                    gps_analysis_result.get('total_time_spend_out_of_home_seconds'),
-                    gps_analysis_result.get('total_distance_traveled_km'),
-                    gps_analysis_result.get('average_time_spend_in_locations_hours'),
-                    gps_analysis_result.get('number_of_unique_locations'),
-                    gps_analysis_result.get('convex_hull', {}).get('area_m2'),
-                    gps_analysis_result.get('standard_deviation_ellipse', {}).get('area_m2'),
-                    gps_analysis_result.get('max_distance_from_home', {}).get('timestamp'),
-                    gps_analysis_result.get('entropy'),
-                )
-                logmyself_analysis_final_status['gps_analysis_success'] = True
-            else:
-                logger.error(f"Failed to store computed GPS data.")
-                logmyself_analysis_final_status['gps_analysis_success'] = False
+            logger.error(f"Unknown LogMyself data category: {category}")
 
+    def finalize_logmyself_data_analysis(self, user_uid: str, analysis_start_datetime: datetime) -> dict | None:
+        """
+        Update the behavioral baseline metrics and the behavioral score and decision of the day,
+        after all the data categories have been published.
+        Args:
+            user_uid: str - The user's unique identifier
+            analysis_start_datetime: datetime - Start datetime for the analysis
+        Returns:
+            None on success, else a dict with the error
+        """
         # Update the baseline metrics
         state = self._update_behavioral_baseline_metrics(user_uid)
 
@@ -278,15 +306,7 @@ class AnalysisService:
         else:
             logger.warning(f"\033[93mCannot proceed with the update of the behavioral score and final decision for user {user_uid}.\033[0m")
 
-        # Result like:
-        # {
-        #     "sleep_analysis_success": True,
-        #     "device_interaction_analysis_success": True,
-        #     "activity_analysis_success": True,
-        #     "call_analysis_success": True,
-        #     "gps_analysis_success": True
-        # }
-        return logmyself_analysis_final_status
+        return None
     
     def _backfill_behavioral_zscores_and_decisions(self, user_uid: str, day_analyzed: date):
         """
@@ -312,9 +332,11 @@ class AnalysisService:
         logger.info(f"Updating the z-scores for sleep data for user {user_uid}")
 
         try:
+            # The latest baselines of all the metrics of the category, in one request
+            baselines = self.supabase_service.get_latest_baselines(user_uid, ['SLEEP_TIME', 'SQS', 'SLEEP_START_TIME', 'SLEEP_END_TIME'])
 
             # --- Sleep Time ---
-            bl_rec_sleep_time = self.supabase_service.get_user_baseline_metric_values(user_uid, 'SLEEP_TIME')
+            bl_rec_sleep_time = baselines.get('SLEEP_TIME')
             z_score_sleep_time = None
             if bl_rec_sleep_time is not None:
                 logger.info(f"Calculating z-score for sleep time for user {user_uid} with baseline record found with bl-data {bl_rec_sleep_time}")
@@ -323,7 +345,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for sleep time for user {user_uid}")
 
             # --- Sleep Quality Score ---
-            bl_rec_sqs = self.supabase_service.get_user_baseline_metric_values(user_uid, 'SQS')
+            bl_rec_sqs = baselines.get('SQS')
             z_score_sqs = 0
             if bl_rec_sqs is not None:
                 logger.info(f"Calculating z-score for sleep quality score for user {user_uid} with baseline record found with bl-data {bl_rec_sqs}")
@@ -351,7 +373,7 @@ class AnalysisService:
             current_start_time_minutes = to_minutes(start_time)
             logger.debug(f"Converted start_time {start_time} (type: {type(start_time)}) to {current_start_time_minutes} minutes")
             
-            bl_rec_sleep_start_time = self.supabase_service.get_user_baseline_metric_values(user_uid, 'SLEEP_START_TIME')
+            bl_rec_sleep_start_time = baselines.get('SLEEP_START_TIME')
             z_score_sleep_start_time = None
             if bl_rec_sleep_start_time:
                 try:
@@ -372,7 +394,7 @@ class AnalysisService:
             current_end_time_minutes = to_minutes(end_time)
             logger.debug(f"Converted end_time {end_time} (type: {type(end_time)}) to {current_end_time_minutes} minutes")
             
-            bl_rec_sleep_end_time = self.supabase_service.get_user_baseline_metric_values(user_uid, 'SLEEP_END_TIME')
+            bl_rec_sleep_end_time = baselines.get('SLEEP_END_TIME')
             z_score_sleep_end_time = None
             if bl_rec_sleep_end_time:
                 try:
@@ -413,7 +435,7 @@ class AnalysisService:
             z_score_sleep_end_time = z_score_sleep_end_time if z_score_sleep_end_time is not None else 0
             
             # Update the z-scores for the sleep data
-            status = self.supabase_service.create_z_scores_for_sleep_data(user_uid, sleep_data_analysis_id, z_score_sleep_time, z_score_sqs, z_score_sleep_start_time, z_score_sleep_end_time)
+            status = self.supabase_service.create_z_scores_for_sleep_data(user_uid, sleep_data_analysis_id, z_score_sleep_time, z_score_sqs, z_score_sleep_start_time, z_score_sleep_end_time, write_buffer=self.write_buffer)
             if status is False:
                 logger.error(f"Failed to create the z-scores for sleep data for user {user_uid}")
             return status
@@ -424,8 +446,11 @@ class AnalysisService:
         logger.info(f"Updating the z-scores for device interaction data for user {user_uid}")
 
         try:
+            # The latest baselines of all the metrics of the category, in one request
+            baselines = self.supabase_service.get_latest_baselines(user_uid, ['SCREEN_TIME', 'LOW_LIGHT_TIME', 'DEVICE_DROP_EVENTS'])
+
             # --- Screen Time ---
-            bl_rec_screen_time = self.supabase_service.get_user_baseline_metric_values(user_uid, 'SCREEN_TIME')
+            bl_rec_screen_time = baselines.get('SCREEN_TIME')
             z_score_screen_time = None
             if bl_rec_screen_time is not None:
                 try:
@@ -443,7 +468,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for screen time for user {user_uid}")
             
             # --- Low Light Time ---
-            bl_rec_low_light_day_time = self.supabase_service.get_user_baseline_metric_values(user_uid, 'LOW_LIGHT_TIME')
+            bl_rec_low_light_day_time = baselines.get('LOW_LIGHT_TIME')
             z_score_low_light_day_time = None
             if bl_rec_low_light_day_time is not None:
                 try:
@@ -461,7 +486,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for low light time for user {user_uid}")
             
             # --- Device Drop Events ---
-            bl_rec_device_drop_events = self.supabase_service.get_user_baseline_metric_values(user_uid, 'DEVICE_DROP_EVENTS')
+            bl_rec_device_drop_events = baselines.get('DEVICE_DROP_EVENTS')
             z_score_device_drop_events = None
             if bl_rec_device_drop_events is not None:
                 try:
@@ -499,7 +524,7 @@ class AnalysisService:
             z_score_device_drop_events = z_score_device_drop_events if z_score_device_drop_events is not None else 0
             
             # Update the z-scores for the device interaction data
-            status = self.supabase_service.create_z_scores_for_device_interaction_data(user_uid, interaction_data_analysis_id, z_score_screen_time, z_score_low_light_day_time, z_score_device_drop_events)
+            status = self.supabase_service.create_z_scores_for_device_interaction_data(user_uid, interaction_data_analysis_id, z_score_screen_time, z_score_low_light_day_time, z_score_device_drop_events, write_buffer=self.write_buffer)
             if status is False:
                 logger.error(f"Failed to create the z-scores for device interaction data for user {user_uid}")
             return status
@@ -510,8 +535,11 @@ class AnalysisService:
         logger.info(f"Updating the z-scores for activity data for user {user_uid}")
         
         try:
+            # The latest baselines of all the metrics of the category, in one request
+            baselines = self.supabase_service.get_latest_baselines(user_uid, ['ACTIVE_MINUTES'])
+
             # --- Daily Active Minutes ---
-            bl_rec_daily_active_minutes = self.supabase_service.get_user_baseline_metric_values(user_uid, 'ACTIVE_MINUTES')
+            bl_rec_daily_active_minutes = baselines.get('ACTIVE_MINUTES')
             z_score_daily_active_minutes = None
             if bl_rec_daily_active_minutes is not None:
                 try:
@@ -533,7 +561,7 @@ class AnalysisService:
             logger.info(f"Successfully calculated z-score for daily active minutes: {z_score_daily_active_minutes} for user {user_uid}")
 
             # Create the z-scores for the activity data
-            status = self.supabase_service.create_z_scores_for_activity_data(user_uid, activity_data_analysis_id, z_score_daily_active_minutes)
+            status = self.supabase_service.create_z_scores_for_activity_data(user_uid, activity_data_analysis_id, z_score_daily_active_minutes, write_buffer=self.write_buffer)
             if status is False:
                 logger.error(f"Failed to create the z-scores for activity data for user {user_uid}")
 
@@ -546,8 +574,11 @@ class AnalysisService:
         logger.info(f"Updating the z-scores for call data for user {user_uid}")
         
         try:
+            # The latest baselines of all the metrics of the category, in one request
+            baselines = self.supabase_service.get_latest_baselines(user_uid, ['MISSED_CALL_RATIO', 'AVG_CALL_DURATION', 'TOTAL_CALLS_IN_A_DAY'])
+
             # --- Missed Call Ratio ---
-            bl_rec_missed_call_ratio = self.supabase_service.get_user_baseline_metric_values(user_uid, 'MISSED_CALL_RATIO')
+            bl_rec_missed_call_ratio = baselines.get('MISSED_CALL_RATIO')
             z_score_missed_call_ratio = None
             if bl_rec_missed_call_ratio is not None:
                 try:
@@ -565,7 +596,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for missed call ratio for user {user_uid}")
             
             # --- Avg Call Duration ---
-            bl_rec_avg_call_duration = self.supabase_service.get_user_baseline_metric_values(user_uid, 'AVG_CALL_DURATION')
+            bl_rec_avg_call_duration = baselines.get('AVG_CALL_DURATION')
             z_score_avg_call_duration = None
             if bl_rec_avg_call_duration is not None:
                 try:
@@ -583,7 +614,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for avg call duration for user {user_uid}")
             
             # --- Total Calls in a Day ---
-            bl_rec_total_calls_in_a_day = self.supabase_service.get_user_baseline_metric_values(user_uid, 'TOTAL_CALLS_IN_A_DAY')
+            bl_rec_total_calls_in_a_day = baselines.get('TOTAL_CALLS_IN_A_DAY')
             z_score_total_calls_in_a_day = None
             if bl_rec_total_calls_in_a_day is not None:
                 try:
@@ -621,7 +652,7 @@ class AnalysisService:
             z_score_total_calls_in_a_day = z_score_total_calls_in_a_day if z_score_total_calls_in_a_day is not None else 0
             
             # Create the z-scores for the call data
-            status = self.supabase_service.create_z_scores_for_call_data(user_uid, call_data_analysis_id, z_score_missed_call_ratio, z_score_avg_call_duration, z_score_total_calls_in_a_day)
+            status = self.supabase_service.create_z_scores_for_call_data(user_uid, call_data_analysis_id, z_score_missed_call_ratio, z_score_avg_call_duration, z_score_total_calls_in_a_day, write_buffer=self.write_buffer)
             if status is False:
                 logger.error(f"Failed to create the z-scores for call data for user {user_uid}")
             return status
@@ -634,8 +665,11 @@ class AnalysisService:
         logger.info(f"GPS values: home_time={total_time_spend_in_home_seconds}, travel_time={total_time_spend_traveling_seconds}, out_time={total_time_spend_out_of_home_seconds}")
         logger.info(f"GPS values: distance={total_distance_traveled_km}, locations={number_of_unique_locations}, entropy={entropy}")
         try:
+            # The latest baselines of all the metrics of the category, in one request
+            baselines = self.supabase_service.get_latest_baselines(user_uid, ['TIME_SPEND_IN_HOME', 'TIME_SPEND_TRAVELLING', 'TIME_SPEND_OUT_OF_HOME', 'DISTANCE_TRAVELLED', 'AVERAGE_TIME_SPEND_IN_LOCATIONS', 'NUMBER_OF_UNIQUE_LOCATIONS', 'CONVEX_HULL_AREA', 'SDE_AREA_M2', 'MAX_DISTANCE_FROM_HOME_TIMESTAMP', 'ENTROPY'])
+
             # --- Total Time Spend in Home Seconds ---
-            bl_rec_total_time_spend_in_home_seconds = self.supabase_service.get_user_baseline_metric_values(user_uid, 'TIME_SPEND_IN_HOME')
+            bl_rec_total_time_spend_in_home_seconds = baselines.get('TIME_SPEND_IN_HOME')
             z_score_total_time_spend_in_home_seconds = None
             if bl_rec_total_time_spend_in_home_seconds is not None:
                 z_score_total_time_spend_in_home_seconds = self._calc_modified_z_score(total_time_spend_in_home_seconds, bl_rec_total_time_spend_in_home_seconds.get('baseline_median'), bl_rec_total_time_spend_in_home_seconds.get('baseline_mad'))
@@ -643,7 +677,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for total time spend in home seconds for user {user_uid}")
             
             # --- Total Time Spend Traveling Seconds ---
-            bl_rec_total_time_spend_traveling_seconds = self.supabase_service.get_user_baseline_metric_values(user_uid, 'TIME_SPEND_TRAVELLING')
+            bl_rec_total_time_spend_traveling_seconds = baselines.get('TIME_SPEND_TRAVELLING')
             z_score_total_time_spend_traveling_seconds = None
             if bl_rec_total_time_spend_traveling_seconds is not None:
                 z_score_total_time_spend_traveling_seconds = self._calc_modified_z_score(total_time_spend_traveling_seconds, bl_rec_total_time_spend_traveling_seconds.get('baseline_median'), bl_rec_total_time_spend_traveling_seconds.get('baseline_mad'))
@@ -651,7 +685,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for total time spend traveling seconds for user {user_uid}")
                 
             # --- Total Time Spend Out of Home Seconds ---
-            bl_rec_total_time_spend_out_of_home_seconds = self.supabase_service.get_user_baseline_metric_values(user_uid, 'TIME_SPEND_OUT_OF_HOME')
+            bl_rec_total_time_spend_out_of_home_seconds = baselines.get('TIME_SPEND_OUT_OF_HOME')
             z_score_total_time_spend_out_of_home_seconds = None
             if bl_rec_total_time_spend_out_of_home_seconds is not None:
                 z_score_total_time_spend_out_of_home_seconds = self._calc_modified_z_score(total_time_spend_out_of_home_seconds, bl_rec_total_time_spend_out_of_home_seconds.get('baseline_median'), bl_rec_total_time_spend_out_of_home_seconds.get('baseline_mad'))
@@ -659,7 +693,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for total time spend out of home seconds for user {user_uid}")
             
             # --- Total Distance Traveled KM ---
-            bl_rec_total_distance_traveled_km = self.supabase_service.get_user_baseline_metric_values(user_uid, 'DISTANCE_TRAVELLED')
+            bl_rec_total_distance_traveled_km = baselines.get('DISTANCE_TRAVELLED')
             z_score_total_distance_traveled_km = None
             if bl_rec_total_distance_traveled_km is not None:
                 z_score_total_distance_traveled_km = self._calc_modified_z_score(total_distance_traveled_km, bl_rec_total_distance_traveled_km.get('baseline_median'), bl_rec_total_distance_traveled_km.get('baseline_mad'))
@@ -667,7 +701,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for total distance traveled km for user {user_uid}")
             
             # --- Average Time Spend in Locations Hours ---
-            bl_rec_average_time_spend_in_locations_hours = self.supabase_service.get_user_baseline_metric_values(user_uid, 'AVERAGE_TIME_SPEND_IN_LOCATIONS')
+            bl_rec_average_time_spend_in_locations_hours = baselines.get('AVERAGE_TIME_SPEND_IN_LOCATIONS')
             z_score_average_time_spend_in_locations_hours = None
             if bl_rec_average_time_spend_in_locations_hours is not None:
                 z_score_average_time_spend_in_locations_hours = self._calc_modified_z_score(average_time_spend_in_locations_hours, bl_rec_average_time_spend_in_locations_hours.get('baseline_median'), bl_rec_average_time_spend_in_locations_hours.get('baseline_mad'))
@@ -675,7 +709,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for average time spend in locations hours for user {user_uid}")
 
             # --- Number of Unique Locations ---
-            bl_rec_number_of_unique_locations = self.supabase_service.get_user_baseline_metric_values(user_uid, 'NUMBER_OF_UNIQUE_LOCATIONS')
+            bl_rec_number_of_unique_locations = baselines.get('NUMBER_OF_UNIQUE_LOCATIONS')
             z_score_number_of_unique_locations = None
             if bl_rec_number_of_unique_locations is not None:
                 z_score_number_of_unique_locations = self._calc_modified_z_score(number_of_unique_locations, bl_rec_number_of_unique_locations.get('baseline_median'), bl_rec_number_of_unique_locations.get('baseline_mad'))
@@ -683,7 +717,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for number of unique locations for user {user_uid}")
 
             # --- Convex Hull Area M2 ---
-            bl_rec_convex_hull_area_m2 = self.supabase_service.get_user_baseline_metric_values(user_uid, 'CONVEX_HULL_AREA')
+            bl_rec_convex_hull_area_m2 = baselines.get('CONVEX_HULL_AREA')
             z_score_convex_hull_area_m2 = None
             if bl_rec_convex_hull_area_m2 is not None:
                 z_score_convex_hull_area_m2 = self._calc_modified_z_score(convex_hull_area_m2, bl_rec_convex_hull_area_m2.get('baseline_median'), bl_rec_convex_hull_area_m2.get('baseline_mad'))
@@ -691,7 +725,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for convex hull area m2 for user {user_uid}")
 
             # --- Standard Deviation Ellipse Area M2 ---
-            bl_rec_standard_deviation_ellipse_area_m2 = self.supabase_service.get_user_baseline_metric_values(user_uid, 'SDE_AREA_M2')
+            bl_rec_standard_deviation_ellipse_area_m2 = baselines.get('SDE_AREA_M2')
             z_score_standard_deviation_ellipse_area_m2 = None
             if bl_rec_standard_deviation_ellipse_area_m2 is not None:
                 z_score_standard_deviation_ellipse_area_m2 = self._calc_modified_z_score(standard_deviation_ellipse_area_m2, bl_rec_standard_deviation_ellipse_area_m2.get('baseline_median'), bl_rec_standard_deviation_ellipse_area_m2.get('baseline_mad'))
@@ -721,7 +755,7 @@ class AnalysisService:
                 logger.error(f"Unexpected timestamp format: {type(t)} - {t}")
                 return 0
             
-            bl_rec_max_distance_from_home_timestamp = self.supabase_service.get_user_baseline_metric_values(user_uid, 'MAX_DISTANCE_FROM_HOME_TIMESTAMP')
+            bl_rec_max_distance_from_home_timestamp = baselines.get('MAX_DISTANCE_FROM_HOME_TIMESTAMP')
             z_score_max_distance_from_home_timestamp = None
             
             if max_distance_from_home_timestamp is None:
@@ -742,7 +776,7 @@ class AnalysisService:
                 logger.info(f"No baseline record found for max distance from home timestamp for user {user_uid}")
             
             # --- Entropy ---
-            bl_rec_entropy = self.supabase_service.get_user_baseline_metric_values(user_uid, 'ENTROPY')
+            bl_rec_entropy = baselines.get('ENTROPY')
             z_score_entropy = None
             if bl_rec_entropy is not None:
                 z_score_entropy = self._calc_modified_z_score(entropy, bl_rec_entropy.get('baseline_median'), bl_rec_entropy.get('baseline_mad'))
@@ -788,7 +822,7 @@ class AnalysisService:
 
             # Create the z-scores for the GPS data
             logger.info(f"Saving GPS Z-scores to database for user {user_uid}")
-            status = self.supabase_service.create_z_scores_for_gps_data(user_uid, gps_data_analysis_id, z_score_total_time_spend_in_home_seconds, z_score_total_time_spend_traveling_seconds, z_score_total_time_spend_out_of_home_seconds, z_score_total_distance_traveled_km, z_score_average_time_spend_in_locations_hours, z_score_number_of_unique_locations, z_score_convex_hull_area_m2, z_score_standard_deviation_ellipse_area_m2, z_score_max_distance_from_home_timestamp, z_score_entropy)
+            status = self.supabase_service.create_z_scores_for_gps_data(user_uid, gps_data_analysis_id, z_score_total_time_spend_in_home_seconds, z_score_total_time_spend_traveling_seconds, z_score_total_time_spend_out_of_home_seconds, z_score_total_distance_traveled_km, z_score_average_time_spend_in_locations_hours, z_score_number_of_unique_locations, z_score_convex_hull_area_m2, z_score_standard_deviation_ellipse_area_m2, z_score_max_distance_from_home_timestamp, z_score_entropy, write_buffer=self.write_buffer)
             if status is False:
                 logger.error(f"Failed to create the z-scores for GPS data for user {user_uid}")
             else:
@@ -942,11 +976,11 @@ class AnalysisService:
     def _check_for_null_baseline_values(self, user_uid: str, metric_category_name: str, statistical_metrics_list: list) -> bool:
         """Check if any baseline values are NULL for the given metric category."""
         try:
+            # Get the latest baseline values of all the metrics, e.g., "SQS", "SCREEN_TIME", etc.
+            baselines = self.supabase_service.get_latest_baselines(user_uid, [metric[0] for metric in statistical_metrics_list])
             for metric in statistical_metrics_list:
-                metric_name = metric[0]  # e.g., "SQS", "SCREEN_TIME", etc.
-                
-                # Get the latest baseline values for this metric
-                baseline_data = self.supabase_service.get_user_baseline_metric_values(user_uid, metric_name)
+                metric_name = metric[0]
+                baseline_data = baselines.get(metric_name)
                 
                 if not baseline_data:
                     logger.info(f"No baseline data found for user {user_uid} and metric {metric_name}")
@@ -1378,7 +1412,7 @@ class AnalysisService:
             logger.error(f"Error calculating gps baseline metrics for user {user_uid}: {e}")
             return None
     
-    def _update_typing_baseline_metrics(self, user_uid: str):
+    def _update_typing_baseline_metrics(self, user_uid: str, analysis_day: date | None = None):
         logger.info(f"Updating baseline metrics for user {user_uid}")
 
         metrics = [
@@ -1404,18 +1438,18 @@ class AnalysisService:
 
             if not baseline_metrics_existed.data:
                 logger.warning(f"No baseline metrics found for user {user_uid}")
-                if not self._handle_no_baseline_typing_data(user_uid, metrics):
+                if not self._handle_no_baseline_typing_data(user_uid, metrics, analysis_day):
                     return False
             else:
                 logger.warning(f"Baseline data already exists for user {user_uid}")
-                if not self._handle_existing_baseline_typing_data(user_uid, baseline_metrics_existed.data, metrics):
+                if not self._handle_existing_baseline_typing_data(user_uid, baseline_metrics_existed.data, metrics, analysis_day):
                     return False
             return True
         except Exception as e:
             logger.error(f"Error updating baseline metrics for user {user_uid}: {e}")
             return False
 
-    def _handle_no_baseline_typing_data(self, user_uid: str, metrics: list) -> bool:
+    def _handle_no_baseline_typing_data(self, user_uid: str, metrics: list, analysis_day: date | None = None) -> bool:
     
         MIN_SESSION_SPAN_DAYS = 14
         MIN_DAYS_SINCE_FIRST_SESSION = 15
@@ -1478,7 +1512,7 @@ class AnalysisService:
             #     "start_date_param": first_date.isoformat(),
             #     "end_date_param": current_date.isoformat()
             # }).execute()
-            baseline_response = self.supabase_service._get_baseline_metrics_rpc_function(user_uid, first_date, current_date)
+            baseline_response = self._get_typing_baseline_metrics(user_uid, first_date, current_date, metrics, analysis_day)
 
             if baseline_response is None:
                 logger.error(f"Failed to get baseline metrics for user {user_uid}")
@@ -1490,7 +1524,7 @@ class AnalysisService:
             logger.error(f"Error handling no baseline data for user {user_uid}: {e}")
             return False
 
-    def _handle_existing_baseline_typing_data(self, user_uid: str, baseline_data: list, metrics: list) -> bool:
+    def _handle_existing_baseline_typing_data(self, user_uid: str, baseline_data: list, metrics: list, analysis_day: date | None = None) -> bool:
         """Handle case when baseline typing data already exists for a user."""
         
         MIN_DAYS_SINCE_LAST_SESSION = 15
@@ -1517,7 +1551,7 @@ class AnalysisService:
             #     "start_date": sess_end_date,
             #     "end_date": current_date_time.isoformat()
             # }).execute()
-            response_new = self.supabase_service._get_baseline_metrics_rpc_function(user_uid, sess_end_date, current_date_time)
+            response_new = self._get_typing_baseline_metrics(user_uid, sess_end_date, current_date_time, metrics, analysis_day)
 
             if response_new is None:
                 logger.error(f"Failed to get baseline metrics for user {user_uid}")
@@ -1530,6 +1564,19 @@ class AnalysisService:
             logger.error(f"Error handling existing baseline data for user {user_uid}: {e}")
             return False
 
+    def _get_typing_baseline_metrics(self, user_uid: str, start_date, end_date, metrics: list, analysis_day: date | None = None) -> list | None:
+        """
+        Get the typing baseline metrics of a period, from the local daily states (TypingBaselineEngine) if they cover
+        every day of the period up to the analyzed day, else with the get_baseline_metrics RPC of Supabase
+        (ex. days analyzed before the engine was enabled).
+        """
+        if settings.TYPING_BASELINE_ENGINE:
+            baseline = TypingBaselineEngine(self.db_service).compute_baseline(user_uid, start_date, end_date, metrics, analysis_day)
+            if baseline is not None:
+                logger.info(f"Typing baseline metrics of user {user_uid} computed from the local daily states")
+                return baseline
+        return self.supabase_service._get_baseline_metrics_rpc_function(user_uid, start_date, end_date)
+
     def _calculate_typing_score_and_decision(self, user_uid: str, analysis_start_datetime: datetime, analysis_end_datetime: datetime):
         logger.info(f"Updating the cognitive score and final decision for user {user_uid}")
 
@@ -1556,32 +1603,30 @@ class AnalysisService:
             
             session_ids = [record.typing_session_id for record in results]
 
-            # Calculate the cognitive score for each session
-            for session_id in session_ids:
-                score = 0
-                
-                # For the session get all the z-scores calculated for each metric from Supabase
-                z_scores = self.supabase_service.get_z_scores_of_a_typing_session(session_id)
-                if z_scores is None:
-                    logger.error(f"No z-scores found for session {session_id}.")
-                    return False
+            # For all the sessions get the z-scores calculated for each metric from Supabase
+            z_scores = self.supabase_service.get_z_scores_of_typing_sessions(session_ids, list(metrics_direction))
+            if z_scores is None:
+                logger.error(f"No z-scores found for the sessions of user {user_uid}.")
+                return False
 
-                for metric, z_score in z_scores.items():
-                    if pd.isna(z_score):
-                        continue
-                    # Normalize based on bad direction
-                    normalized_score = z_score if metrics_direction[metric] == 'low' else -z_score
-                    score += weights[metric] * normalized_score
+            # Calculate the cognitive score of all the sessions, a row per session and a column per metric (NaN for the missing z-scores)
+            z_scores_df = pd.DataFrame({metric: pd.Series(z_scores[metric], dtype=float) for metric in metrics_direction}).reindex(session_ids)
+            # Normalize based on bad direction
+            normalized_weights = np.array([weights[metric] * (1 if metrics_direction[metric] == 'low' else -1) for metric in z_scores_df.columns])
+            scores = z_scores_df.fillna(0).to_numpy() @ normalized_weights
+            decisions = self._classify_decisions(scores)
 
+            for session_id, score in zip(session_ids, scores):
                 logger.info(f"Cognitive score for session {session_id} is {score:.4f}")
-                decision = self._classify_decision(score)
-
-                # Update the score and decision in the Supabase
-                status = self.supabase_service.update_scores_and_decisions_of_a_typing_session(session_id, score, decision)
 
-                if status is not True:
-                    logger.error(f"Failed to update the cognitive score and final decision for session {session_id}.")
-                    return False
+            # Update the scores and decisions in the Supabase
+            status = self.supabase_service.update_scores_and_decisions_of_typing_sessions(
+                dict(zip(session_ids, scores.tolist())),
+                dict(zip(session_ids, decisions.tolist()))
+            )
+            if status is not True:
+                logger.error(f"Failed to update the cognitive score and final decision of the sessions of user {user_uid}.")
+                return False
             return True
         except Exception as e:
             logger.error(f"Error updating the cognitive score and final decision for user {user_uid}: {e}")
@@ -1598,6 +1643,15 @@ class AnalysisService:
             return "Very Bad"
         return "Normal"
 
+    @staticmethod
+    def _classify_decisions(scores: np.ndarray) -> np.ndarray:
+        """Vectorized _classify_decision over an array of scores."""
+        return np.select(
+            [scores > 0.965, scores > 0.586, scores < -0.952, scores < -0.575],
+            ["Excellent", "Very Good", "Critical", "Very Bad"],
+            default="Normal"
+        )
+
     def _calculate_behavioral_score_and_decision(self, user_uid: str, day_analyzed: datetime):
         logger.info(f"Updating the behavioral score and final decision for user {user_uid}")
 
@@ -1710,441 +1764,52 @@ class AnalysisService:
             logger.error(f"Error updating the behavioral score and final decision for user {user_uid}: {e}")
             return False
 
-    def _compute_and_store_pressure_intensity(self, user_uid: str, typing_sessions, baseline_values_for_metric):
-        """
-        This function computes the pressure intensity for a user.
-        Args:
-            user_uid: str - The user's unique identifier
-            typing_sessions: list - A list of typing sessions
-            baseline_values_for_metric: dict - A dictionary containing the baseline values for the metric
-        Returns:
-            dict - A dictionary containing the status and error message
-        """
-        logger.info(f"Computing pressure intensity for user {user_uid}")
-
-        try:
-            for typing_session in typing_sessions:
-                logger.info(f"Processing session {typing_session.typing_session_id} for user {user_uid}")
-
-                total_pressure = typing_session.total_pressure_by_times_counter
-                characters_typed = typing_session.characters_typed
-
-                if characters_typed and characters_typed > 0:
-                    pressure_intensity = total_pressure / characters_typed
-
-                    if baseline_values_for_metric is not None:
-                        z_score = self._calc_modified_z_score(
-                            pressure_intensity,
-                            baseline_values_for_metric.get('baseline_median'),
-                            baseline_values_for_metric.get('baseline_mad')
-                        )
-                    else: 
-                        z_score = 0
-
-                    payload =  { # Return the payload
-                        'session_uid': typing_session.typing_session_id,
-                        'analysis_date': datetime.now().isoformat(),
-                        'value': pressure_intensity,
-                        'modified_z_score': z_score,
-                        'included_baseline_metric': baseline_values_for_metric.get('id') if baseline_values_for_metric is not None else None
-                    }
-
-                    # Store the result in Supabase
-                    result = self.supabase_service.send_data(
-                        "Pressure_Intensity_Data",
-                        "session_uid",
-                        typing_session.typing_session_id,
-                        payload
-                    )
-
-                    if result:
-                        logger.info(f"Pressure intensity for session {typing_session.typing_session_id} stored successfully.")
-                    else:
-                        logger.error(f"Failed to store pressure intensity for session {typing_session.typing_session_id}.")
-
-                else:
-                    logger.info(f"No characters typed in session {typing_session.typing_session_id} for user {user_uid}. Skipping pressure intensity computation.")
-        except Exception as e:
-            logger.error(f"Error computing pressure intensity for user {user_uid}: {e}")
-            return {"status": "error", "error": str(e)}
-
-    def _compute_and_store_effort_to_output_ratio(self, user_uid: str, typing_sessions, baseline_values_for_metric):
-        """
-        This function computes the effort to output ratio for a user.
-        Args:
-            user_uid: str - The user's unique identifier
-            typing_sessions: list - A list of typing sessions
-            baseline_values_for_metric: dict - A dictionary containing the baseline values for the metric
-        Returns:
-            dict - A dictionary containing the status and error message
-        """
-        logger.info(f"Computing Effort to Output Ratio for user {user_uid}")
-
-        try:
-            for typing_session in typing_sessions:
-                logger.info(f"Processing session {typing_session.typing_session_id} for user {user_uid}")
-
-                total_pressure = typing_session.total_pressure_by_times_counter
-                characters_typed = typing_session.characters_typed
-                characters_deleted = typing_session.total_characters_deleted
-
-                if characters_typed and characters_typed > 0 and characters_deleted and characters_deleted > 0:
-                    effort_to_output_ratio = total_pressure / (characters_typed - characters_deleted)
-                    
-                    if baseline_values_for_metric is not None:
-                        z_score = self._calc_modified_z_score(
-                            effort_to_output_ratio,
-                            baseline_values_for_metric.get('baseline_median'),
-                            baseline_values_for_metric.get('baseline_mad')
-                        )
-                    else:
-                        z_score = 0
-
-                    payload =  {
-                        'session_uid': typing_session.typing_session_id,
-                        'analysis_date': datetime.now().isoformat(),
-                        'value': effort_to_output_ratio,
-                        'modified_z_score': z_score,
-                        'included_baseline_metric': baseline_values_for_metric.get('id') if baseline_values_for_metric is not None else None
-                    }
-
-                    result = self.supabase_service.send_data(
-                        "Effort_To_Output_Ratio_Data",
-                        'session_uid',
-                        typing_session.typing_session_id,
-                        payload
-                    )
-
-                    if result:
-                        logger.info(f"Effort to Output Ratio for session {typing_session.typing_session_id} stored successfully.")
-                    else:
-                        logger.error(f"Failed to store Effort to Output Ratio for session {typing_session.typing_session_id}.")
-
-                else:
-                    logger.info(f"Insufficient data in session {typing_session.typing_session_id} for user {user_uid}. Skipping Effort to Output Ratio computation.")
-            return None
-        except Exception as e:
-            logger.error(f"Error computing Effort to Output Ratio for user {user_uid}: {e}")
-            return {"status": "error", "error": str(e)}
-
-    def _compute_and_store_typing_rhythm_stability(self, user_uid: str, typing_sessions, baseline_values_for_metric):
-        """
-        This function computes the typing rhythm stability for a user.
-        Args:
-            user_uid: str - The user's unique identifier
-            typing_sessions: list - A list of typing sessions
-            baseline_values_for_metric: dict - A dictionary containing the baseline values for the metric
-        Returns:
-            dict - A dictionary containing the status and error message
-        """
-        logger.info(f"Computing Typing Rhythm Stability for user {user_uid}")
-
-        try:
-            for typing_session in typing_sessions:
-                logger.info(f"Processing session {typing_session.typing_session_id} for user {user_uid}")
-
-                mean_iki = typing_session.mean_iki
-                std_dev_iki = typing_session.std_dev_iki
-
-                if mean_iki and std_dev_iki and (mean_iki + std_dev_iki) > 0:
-                    trs = mean_iki / (mean_iki + std_dev_iki)
-
-                    if baseline_values_for_metric is not None:
-                        z_score = self._calc_modified_z_score(trs, baseline_values_for_metric.get('baseline_median'), baseline_values_for_metric.get('baseline_mad'))
-                    else:
-                        z_score = 0
-
-                    payload = {
-                        'session_uid': typing_session.typing_session_id,
-                        'analysis_date': datetime.now().isoformat(),
-                        'value': trs,
-                        'modified_z_score': z_score,
-                        'included_baseline_metric': baseline_values_for_metric.get('id') if baseline_values_for_metric is not None else None
-                    }
-
-                    result = self.supabase_service.send_data(
-                        "Typing_Rhythm_Stability_Data",
-                        'session_uid',
-                        typing_session.typing_session_id,
-                        payload
-                    )
-
-                    if result:
-                        logger.info(f"Typing Rhythm Stability for session {typing_session.typing_session_id} stored successfully.")
-                    else:
-                        logger.error(f"Failed to store Typing Rhythm Stability for session {typing_session.typing_session_id}.")
-                else:
-                    logger.info(f"Insufficient data in session {typing_session.typing_session_id} for user {user_uid}. Skipping Typing Rhythm Stability computation.")
-        except Exception as e:
-            logger.error(f"Error computing Typing Rhythm Stability for user {user_uid}: {e}")
-            return {"status": "error", "error": str(e)}
-
-    def _compute_and_store_cognitive_processing_index(self, user_uid: str, typing_sessions, baseline_values_for_metric):
+    def _compute_and_store_typing_metrics(self, user_uid: str, typing_sessions, baselines: dict, day_analyzed: date):
         """
-        This function computes the cognitive processing index for a user.
+        This function computes the typing metrics (pressure intensity, effort to output ratio, typing rhythm stability,
+        cognitive processing index, pause to production ratio, correction efficiency, net production rate and
+        cognitive processing efficiency) of the typing sessions of a user and stores them in Supabase.
         Args:
             user_uid: str - The user's unique identifier
             typing_sessions: list - A list of typing sessions
-            baseline_values_for_metric: dict - A dictionary containing the baseline values for the metric
+            baselines: dict - The baseline values of each metric (None for the metrics without a baseline)
+            day_analyzed: date - The day of the sessions, the daily states of the typing baselines are updated with the stored metrics
         Returns:
             dict - A dictionary containing the status and error message
         """
-        logger.info(f"Computing Cognitive Processing Index for user {user_uid}")
+        logger.info(f"Computing the typing metrics of {len(typing_sessions)} sessions for user {user_uid}")
 
         try:
-            for typing_session in typing_sessions:
-                logger.info(f"Processing session {typing_session.typing_session_id} for user {user_uid}")
-                max_pause_wtw = typing_session.max_pause_wtw_duration
-                avg_pause_wtw = typing_session.avg_pause_wtw_duration
-                max_pause_ctc = typing_session.max_pause_ctc_duration
-                avg_pause_ctc = typing_session.avg_pause_ctc_duration
-
-                if max_pause_wtw and avg_pause_wtw and max_pause_ctc and avg_pause_ctc:
-                    cpi = log(1 + (max_pause_wtw / avg_pause_wtw)) + log(1 + (max_pause_ctc / avg_pause_ctc))
-
-                    if baseline_values_for_metric is not None:
-                        z_score = self._calc_modified_z_score(cpi.real, baseline_values_for_metric.get('baseline_median'),
-                                                          baseline_values_for_metric.get('baseline_mad'))
-                    else:
-                        z_score = 0
-
-                    payload = {
-                        'session_uid': typing_session.typing_session_id,
-                        'analysis_date': datetime.now().isoformat(),
-                        'value': cpi.real,  # keep the real part
-                        'modified_z_score': z_score,
-                        'included_baseline_metric': baseline_values_for_metric.get('id') if baseline_values_for_metric is not None else None
+            results = TypingMetricsEngine(typing_sessions).compute(baselines)
+            analysis_date = datetime.now().isoformat()
+            stored_tables = []
+
+            # Store the results of all the sessions in Supabase, in batches (one table per metric)
+            for table_name, table_results in results.groupby('table_name', sort=False):
+                payloads = [
+                    {
+                        'session_uid': session_uid,
+                        'analysis_date': analysis_date,
+                        'value': float(value),
+                        'modified_z_score': float(z_score),
+                        'included_baseline_metric': included_baseline_metric
                     }
-
-                    result = self.supabase_service.send_data(
-                        "Cognitive_Processing_Index_Data",
-                        'session_uid',
-                        typing_session.typing_session_id,
-                        payload
-                    )
-
-                    if result:
-                        logger.info(
-                            f"Cognitive Processing Index for session {typing_session.typing_session_id} stored successfully.")
-                    else:
-                        logger.error(
-                            f"Failed to store Cognitive Processing Index for session {typing_session.typing_session_id}.")
+                    for session_uid, value, z_score, included_baseline_metric in zip(
+                        table_results['session_uid'], table_results['value'],
+                        table_results['modified_z_score'], table_results['included_baseline_metric'])
+                ]
+                result = self.supabase_service.send_data_batch(table_name, payloads, on_conflict="session_uid")
+                if result is not None:
+                    logger.info(f"{table_name} for {len(payloads)} sessions of user {user_uid} stored successfully.")
+                    stored_tables.append(table_name)
                 else:
-                    logger.info(f"Insufficient data in session {typing_session.typing_session_id} for user {user_uid}. Skipping Cognitive Processing Index computation.")
-        except Exception as e:
-            logger.error(f"Error computing Cognitive Processing Index for user {user_uid}: {e}")
-            return {"status": "error", "error": str(e)}
-
-    def _compute_and_store_pause_to_production_ratio(self, user_uid: str, typing_sessions, baseline_values_for_metric):
-        """
-        This function computes the pause to production ratio for a user.
-        Args:
-            user_uid: str - The user's unique identifier
-            typing_sessions: list - A list of typing sessions
-            baseline_values_for_metric: dict - A dictionary containing the baseline values for the metric
-        Returns:
-            dict - A dictionary containing the status and error message
-        """
-        logger.info(f"Computing Pause to Production Ratio for user {user_uid}")
-
-        try:
-            for typing_session in typing_sessions:
-                logger.info(f"Processing session {typing_session.typing_session_id} for user {user_uid}")
-
-                iki_list_size = typing_session.iki_list_size
-                avg_iki = typing_session.mean_iki
-                session_duration = typing_session.duration
-
-                if iki_list_size and avg_iki and session_duration and session_duration > 0:
-                    ppr = iki_list_size * avg_iki / session_duration
-
-                    if baseline_values_for_metric is not None:
-                        z_score = self._calc_modified_z_score(ppr, baseline_values_for_metric.get('baseline_median'), baseline_values_for_metric.get("baseline_mad"))
-                    else:
-                        z_score = 0
-
-                    payload = {
-                        'session_uid': typing_session.typing_session_id,
-                        'analysis_date': datetime.now().isoformat(),
-                        'value': ppr,
-                        'modified_z_score': z_score,
-                        'included_baseline_metric': baseline_values_for_metric.get('id') if baseline_values_for_metric is not None else None
-                    }
-
-                    result = self.supabase_service.send_data(
-                        "Pause_To_Production_Ratio_Data",
-                        "session_uid",
-                        typing_session.typing_session_id,
-                        payload
-                    )
+                    logger.error(f"Failed to store {table_name} for the sessions of user {user_uid}.")
 
-                    if result:
-                        logger.info(f"Pause to Production Ratio for session {typing_session.typing_session_id} stored successfully.")
-                    else:
-                        logger.error(f"Failed to store Pause to Production Ratio for session {typing_session.typing_session_id}.")
-                else:
-                    logger.info(f"Insufficient data in session {typing_session.typing_session_id}. Skipping Pause to Production Ratio computation.")
+            # Update the daily states of the typing baselines with the metrics that were stored
+            if settings.TYPING_BASELINE_ENGINE and not TypingBaselineEngine(self.db_service).update_day(user_uid, day_analyzed, results[results['table_name'].isin(stored_tables)]):
+                logger.error(f"Failed to update the typing baseline states of user {user_uid} for {day_analyzed}.")
         except Exception as e:
-            logger.error(f"Error computing Pause to Production Ratio for user {user_uid}: {e}")
-            return {"status": "error", "error": str(e)}
-
-    def _compute_and_store_correction_efficiency(self, user_uid: str, typing_sessions, baseline_values_for_metric):
-        """
-        This function computes the correction efficiency for a user.
-        Args:
-            user_uid: str - The user's unique identifier
-            typing_sessions: list - A list of typing sessions
-            baseline_values_for_metric: dict - A dictionary containing the baseline values for the metric
-        Returns:
-            dict - A dictionary containing the status and error message
-        """
-        logger.info(f"Computing Correction Efficiency for user {user_uid}")
-
-        try:
-            for typing_session in typing_sessions:
-                logger.info(f"Processing session {typing_session.typing_session_id} for user {user_uid}")
-
-                total_chars_deleted = typing_session.total_characters_deleted
-                total_chars_typed = typing_session.characters_typed
-
-                if total_chars_typed and total_chars_typed > 0 and total_chars_deleted:
-                    ce = 1 - (total_chars_deleted / total_chars_typed)
-
-                    if baseline_values_for_metric is not None:
-                        z_score = self._calc_modified_z_score(ce, baseline_values_for_metric.get('baseline_median'), baseline_values_for_metric.get('baseline_mad'))
-                    else:
-                        z_score = 0
-
-                    payload = {
-                        'session_uid': typing_session.typing_session_id,
-                        'analysis_date': datetime.now().isoformat(),
-                        'value': ce,
-                        'modified_z_score': z_score,
-                        'included_baseline_metric': baseline_values_for_metric.get('id') if baseline_values_for_metric is not None else None
-                    }
-
-                    result = self.supabase_service.send_data(
-                        "Correction_Efficiency_Data",
-                        "session_uid",
-                        typing_session.typing_session_id,
-                        payload
-                    )
-
-                    if result:
-                        logger.info(f"Correction Efficiency for session {typing_session.typing_session_id} stored successfully.")
-                    else:
-                        logger.error(f"Failed to store Correction Efficiency for session {typing_session.typing_session_id}.")
-                else:
-                    logger.info(f"Insufficient data in session {typing_session.typing_session_id}. Skipping Correction Efficiency computation.")
-        except Exception as e:
-            logger.error(f"Error computing Correction Efficiency for user {user_uid}: {e}")
-            return {"status": "error", "error": str(e)}
-
-    def _compute_and_store_cognitive_processing_efficiency(self, user_uid: str, typing_sessions, baseline_values_for_metric):
-        """
-        This function computes the cognitive processing efficiency for a user.
-        Args:
-            user_uid: str - The user's unique identifier
-            typing_sessions: list - A list of typing sessions
-            baseline_values_for_metric: dict - A dictionary containing the baseline values for the metric
-        Returns:
-            dict - A dictionary containing the status and error message
-        """
-        logger.info(f"Computing Cognitive Processing Efficiency for user {user_uid}")
-
-        try:
-            for typing_session in typing_sessions:
-                logger.info(f"Processing session {typing_session.typing_session_id} for user {user_uid}")
-
-                words_typed = typing_session.words_typed
-                session_duration = typing_session.duration
-                std_dev_iki = typing_session.std_dev_iki
-
-                if session_duration and session_duration > 0 and words_typed and words_typed > 0:
-                    cpe = words_typed / (session_duration * (1 + std_dev_iki))
-                
-                    if baseline_values_for_metric is None:
-                        logger.warning(f"\033[93mNo baseline data found for user {user_uid} about the metric COGNITIVE_PROCESSING_EFFICIENCY.\033[0m")
-                        z_score = 0
-                    else:
-                        # Calculate the modified z-score
-                        z_score = self._calc_modified_z_score(cpe, baseline_values_for_metric.get('baseline_median'), baseline_values_for_metric.get('baseline_mad'))
-                    
-                    # Send to Supabase
-                    payload = {
-                        'session_uid': typing_session.typing_session_id,
-                        'analysis_date': datetime.now().isoformat(),
-                        'value': cpe,
-                        'modified_z_score': z_score,
-                        'included_baseline_metric': baseline_values_for_metric.get('id') if baseline_values_for_metric is not None else None
-                    }
-                    result = self.supabase_service.send_data(
-                        "Cognitive_Processing_Efficiency_Data",
-                        'session_uid',
-                        typing_session.typing_session_id,
-                        payload
-                    )
-                    if result:
-                        logger.info(f"Cognitive Processing Efficiency for session {typing_session.typing_session_id} stored successfully.")
-                    else:
-                        logger.error(f"Failed to store Cognitive Processing Efficiency for session {typing_session.typing_session_id}.")
-                else:
-                    logger.info(f"Insufficient data in session {typing_session.typing_session_id} for user {user_uid}. Skipping Cognitive Processing Efficiency computation.")
-        except Exception as e:
-            logger.error(f"Error computing Cognitive Processing Efficiency for user {user_uid}: {e}")
-            return {"status": "error", "error": str(e)}
-
-    def _compute_and_store_net_production_rate(self, user_uid: str, typing_sessions, baseline_values_for_metric):
-        """
-        This function computes the net production rate for a user.
-        Args:
-            user_uid: str - The user's unique identifier
-            typing_sessions: list - A list of typing sessions
-            baseline_values_for_metric: dict - A dictionary containing the baseline values for the metric
-        Returns:
-            dict - A dictionary containing the status and error message
-        """
-        logger.info(f"Computing Net Production Rate for user {user_uid}")
-
-        try:
-            for typing_session in typing_sessions:
-                logger.info(f"Processing session {typing_session.typing_session_id} for user {user_uid}")
-
-                characters_typed = typing_session.characters_typed
-                characters_deleted = typing_session.total_characters_deleted
-                session_duration = typing_session.duration
-
-                if session_duration and session_duration > 0 and characters_deleted <= characters_typed:
-                    npr = (characters_typed - characters_deleted) / session_duration
-
-                    if baseline_values_for_metric is not None:
-                        z_score = self._calc_modified_z_score(npr, baseline_values_for_metric.get('baseline_median'), baseline_values_for_metric.get('baseline_mad'))
-                    else:
-                        z_score = 0
-
-                    payload = {
-                        'session_uid': typing_session.typing_session_id,
-                        'analysis_date': datetime.now().isoformat(),
-                        'value': npr,
-                        'modified_z_score': z_score,
-                        'included_baseline_metric': baseline_values_for_metric.get('id') if baseline_values_for_metric is not None else None
-                    }
-
-                    result = self.supabase_service.send_data(
-                        "Net_Production_Rate_Data",
-                        "session_uid",
-                        typing_session.typing_session_id,   
-                        payload
-                    )
-
-                    if result:
-                        logger.info(f"Net Production Rate for session {typing_session.typing_session_id} stored successfully.")
-                    else:
-                        logger.error(f"Failed to store Net Production Rate for session {typing_session.typing_session_id}.")
-                else:
-                    logger.info(f"Insufficient data in session {typing_session.typing_session_id}. Skipping Net Production Rate computation.")
-        except Exception as e:
-            logger.error(f"Error computing Net Production Rate for user {user_uid}: {e}")
+            logger.error(f"Error computing the typing metrics for user {user_uid}: {e}")
             return {"status": "error", "error": str(e)}
 
     @staticmethod
@@ -2559,6 +2224,7 @@ class AnalysisService:
             
             EPS_METERS = 50
             MIN_SAMPLES = 60
+            GRID_FRACTION = 0.1  # The key locations are clustered on a grid of 5 meter cells (see _identify_key_locations)
             ACCURACY_EXCL = 50
             GPS_POINTS_SAMPLE_RATE = 30
 
@@ -2579,7 +2245,8 @@ class AnalysisService:
                 gps_data_df, 
                 EPS_METERS, 
                 MIN_SAMPLES,
-                GPS_POINTS_SAMPLE_RATE
+                GPS_POINTS_SAMPLE_RATE,
+                GRID_FRACTION
             )
 
             if key_loc_info_df is None:
@@ -2602,8 +2269,11 @@ class AnalysisService:
                 logger.error("No GPS data found after fixing wrong key-locs.")
                 return None
 
+            # Segment the route once (visits of the key-locations and transitions between them)
+            route_segments = GPSRouteSegments(gps_data_df)
+
             # Now for each key-location (cluster) find the necessary information
-            key_loc_clusters_info_unique = self._compute_info_of_key_locations_clusters(gps_data_df)
+            key_loc_clusters_info_unique = self._compute_info_of_key_locations_clusters(gps_data_df, route_segments)
 
             if key_loc_clusters_info_unique is None:
                 logger.error("No key-locations clusters info found.")
@@ -2624,7 +2294,7 @@ class AnalysisService:
             # EX. The user stayed in HOME all day, so we cannot compute the transitions between HOME and other key-locations.
             if len(key_loc_clusters_info_unique) > 1:
                 # Now find the transitions clusters between the key-locations
-                key_loc_transitions_info = self._compute_transitions_info_of_key_locations_clusters(gps_data_df)
+                key_loc_transitions_info = self._compute_transitions_info_of_key_locations_clusters(gps_data_df, route_segments)
 
                 if key_loc_transitions_info is None:
                     logger.error("No key-locations transitions info found.")
@@ -2636,8 +2306,11 @@ class AnalysisService:
                 logger.info("Only one key-location found. Cannot compute transitions between key-locations.")
                 key_loc_transitions_info = None
 
+            # Project the GPS points to meters once for the convex hull and the SDE
+            gps_geometry = GPSGeometry(gps_data_df)
+
             # Compute convex hull
-            convex_hull_info = self._compute_convex_hull(gps_data_df)
+            convex_hull_info = self._compute_convex_hull(gps_data_df, gps_geometry)
 
             if convex_hull_info is None:
                 logger.error("No convex hull info found.")
@@ -2651,7 +2324,7 @@ class AnalysisService:
                 return None
 
             # Compute SDE (Standard Deviational Ellipse)
-            sde_info = self._compute_sde(gps_data_df)
+            sde_info = self._compute_sde(gps_data_df, geometry=gps_geometry)
 
             if sde_info is None:
                 logger.error("No SDE info found.")
@@ -2883,21 +2556,16 @@ class AnalysisService:
             logger.error(f"Error computing max distance from home: {e}")
             return None
 
-    def _compute_sde(self, df: pd.DataFrame, scale: int=1) -> dict | None:
+    def _compute_sde(self, df: pd.DataFrame, scale: int=1, geometry: GPSGeometry | None = None) -> dict | None:
         try:
             if df.empty or len(df) < 2:
                 logger.warning("Insufficient GPS points for SDE calculation")
                 return None
 
-            # Use UTM projection based on mean longitude
-            mean_lon = df['longitude'].mean()
-            mean_lat = df['latitude'].mean()
-            zone_number = int((mean_lon + 180) / 6) + 1
-            is_northern = mean_lat >= 0
-
-            proj = pyproj.Proj(proj='utm', zone=zone_number, ellps='WGS84', south=not is_northern)
-            xs, ys = proj(df['longitude'].values, df['latitude'].values)
-            coords = np.column_stack((xs, ys))
+            # Use UTM projection based on mean longitude (the projected points are shared with the convex hull)
+            geometry = geometry if geometry is not None else GPSGeometry(df)
+            xs, ys = geometry.xs, geometry.ys
+            coords = geometry.coords
 
             # Check for spatial diversity
             x_range = np.max(xs) - np.min(xs)
@@ -2906,7 +2574,7 @@ class AnalysisService:
             # If the spatial spread is very small, return minimal SDE values
             if x_range < 1 and y_range < 1:  # Less than 1 meter spread
                 logger.info(f"GPS points have minimal spatial spread for SDE (x_range: {x_range:.2f}m, y_range: {y_range:.2f}m)")
-                center_lon, center_lat = proj(np.mean(xs), np.mean(ys), inverse=True)
+                center_lat, center_lon = geometry.to_lat_lon(np.mean(xs), np.mean(ys))
                 return {
                     'mean_center': (center_lat, center_lon),
                     'width_m': 0.0,
@@ -2922,7 +2590,7 @@ class AnalysisService:
             # Check if all points are the same (zero variance)
             if np.allclose(centered_coords, 0, atol=1e-6):
                 logger.info("All GPS points are at the same location for SDE calculation")
-                center_lon, center_lat = proj(center[0], center[1], inverse=True)
+                center_lat, center_lon = geometry.to_lat_lon(center[0], center[1])
                 return {
                     'mean_center': (center_lat, center_lon),
                     'width_m': 0.0,
@@ -2946,7 +2614,7 @@ class AnalysisService:
             area = np.pi * (width / 2) * (height / 2)
 
             # Convert center back to lat/lon
-            center_lon, center_lat = proj(center[0], center[1], inverse=True)
+            center_lat, center_lon = geometry.to_lat_lon(center[0], center[1])
 
             logger.info(f"SDE computed: width={width:.2f}m, height={height:.2f}m, area={area:.2f}m²")
             return {
@@ -2993,11 +2661,12 @@ class AnalysisService:
             logger.error(f"Error computing gravimetric compactness: {e}")
             return 0.0
 
-    def _compute_convex_hull(self, df: pd.DataFrame) -> dict | None:
+    def _compute_convex_hull(self, df: pd.DataFrame, geometry: GPSGeometry | None = None) -> dict | None:
         """
         Compute the convex hull the user has created.
         Args:
                 : DataFrame with the GPS data
+            geometry: The GPS points projected to meters (UTM zone of the mean longitude), projected from df if not given
         Returns:
             Dict with the convex hull area and perimeter, or default values if insufficient spatial spread
         """
@@ -3006,17 +2675,10 @@ class AnalysisService:
                 logger.warning("Insufficient GPS points for convex hull calculation")
                 return {'area': 0.0, 'perimeter': 0.0}
 
-            # Calculate the central longitude to determine UTM zone
-            mean_lon = df['longitude'].mean()
-            zone_number = int((mean_lon + 180) / 6) + 1
-            is_northern = df['latitude'].mean() >= 0
-
-            # Define UTM projection for local area
-            proj = pyproj.Proj(proj='utm', zone=zone_number, ellps='WGS84', south=not is_northern)
-
-            # Convert lat/lon to projected coordinates (in meters)
-            xs, ys = proj(df['longitude'].values, df['latitude'].values)
-            coords = np.column_stack((xs, ys))
+            # Projected coordinates (in meters) of the local UTM zone
+            geometry = geometry if geometry is not None else GPSGeometry(df)
+            xs, ys = geometry.xs, geometry.ys
+            coords = geometry.coords
             
             # Check for spatial diversity - if all points are too close, convex hull will fail
             x_range = np.max(xs) - np.min(xs)
@@ -3079,114 +2741,31 @@ class AnalysisService:
         else:
             logger.info(f"Total time spent in key locations and transitions is less than 24 hours: {total_time:.3f}, data might be missing for {24 - total_time:.3f} hours.")
 
-    def _compute_transitions_info_of_key_locations_clusters(self, df: pd.DataFrame):
+    def _compute_transitions_info_of_key_locations_clusters(self, df: pd.DataFrame, segments: GPSRouteSegments | None = None):
         """
         Compute the transitions info of the key-locations clusters.
         A transition is a movement from one key-location to another (or the same).
         Args:
             df: DataFrame with the GPS data
+            segments: GPSRouteSegments - The segments of the GPS data (computed from df if None)
         Returns:
             DataFrame with the transitions info of the key-locations clusters
         """
         try:
-            df = df.sort_values(by='timestamp_now')
-
-            transition_cluster = []
-            transition_cluster_basic_info = [] # holds the basic info of each key transition cluster
-            recording = False
-            transition_clusters_list = []
-
-            for idx, gps_event in df.iterrows():
-                if np.isnan(gps_event['belonging_key_loc']) == True and recording is False:
-                    transition_cluster.append(gps_event)
-                    recording = True
-                elif np.isnan(gps_event['belonging_key_loc']) == True and recording is True:
-                    transition_cluster.append(gps_event)
-                elif np.isnan(gps_event['belonging_key_loc']) == False and recording is True:
-                    transition_cluster_df = pd.DataFrame(transition_cluster)
-
-                    time_distance = self._compute_total_time_from_timestamps(transition_cluster_df)
+            if segments is None:
+                segments = GPSRouteSegments(df)
 
-                    transition_cluster_start_time = transition_cluster_df['timestamp_now'].iloc[0]
-                    transition_cluster_end_time = transition_cluster_df['timestamp_now'].iloc[-1]
-                    
-                    try:
-                        key_loc_start_index = df[df['gps_event_id'] == transition_cluster_df['gps_event_id'].iloc[0]].index - 1
-                    except IndexError:
-                        key_loc_start_index = df[df['gps_event_id'] == transition_cluster_df['gps_event_id'].iloc[0]].index
-
-                    try:
-                        key_loc_end_index = df[df['gps_event_id'] == transition_cluster_df['gps_event_id'].iloc[-1]].index + 1
-                    except IndexError:
-                        key_loc_end_index = df[df['gps_event_id'] == transition_cluster_df['gps_event_id'].iloc[-1]].index
-
-                    total_distance_km = self._compute_length_of_route(transition_cluster_df)
-                    
-                    transition_cluster_basic_info.append({
-                            'key_loc_start_id': df['belonging_key_loc'].iloc[key_loc_start_index[0]],
-                            'key_loc_end_id': df['belonging_key_loc'].iloc[key_loc_end_index[0]],
-                            'transition_cluster_start_time': transition_cluster_start_time,
-                            'transition_cluster_end_time': transition_cluster_end_time,
-                            'trans_cluster_start_latitude': transition_cluster_df['latitude'].iloc[0],
-                            'trans_cluster_start_longitude': transition_cluster_df['longitude'].iloc[0],
-                            'trans_cluster_end_latitude': transition_cluster_df['latitude'].iloc[-1],
-                            'trans_cluster_end_longitude': transition_cluster_df['longitude'].iloc[-1],
-                            'time_spent_seconds': time_distance,
-                            'total_distance_km': total_distance_km,
-                            'num_of_gps_events': len(transition_cluster_df)
-                    })
-
-                    transition_clusters_list.append(transition_cluster_df)
-                    transition_cluster = []
-                    recording = False
-
-            # Compute the lasts sub-route info
-            if len(transition_cluster) > 0:
-                transition_cluster_df = pd.DataFrame(transition_cluster)
-                    
-                time_distance = self._compute_total_time_from_timestamps(transition_cluster_df)
-
-                transition_cluster_start_time = transition_cluster_df['timestamp_now'].iloc[0]
-                transition_cluster_end_time = transition_cluster_df['timestamp_now'].iloc[-1]
-
-                try:
-                    key_loc_start_index = df[df['gps_event_id'] == transition_cluster_df['gps_event_id'].iloc[0]].index - 1
-                    type_of_start_key_loc = df['belonging_key_loc'].iloc[key_loc_start_index[0]]
-                except IndexError:
-                    key_loc_start_index = df[df['gps_event_id'] == transition_cluster_df['gps_event_id'].iloc[0]].index
-                    type_of_start_key_loc = df['belonging_key_loc'].iloc[key_loc_start_index[0]]
+            # The transition clusters are the runs of GPS events that do not belong to a key location
+            transition_clusters = segments.transitions
 
-                try:
-                    key_loc_end_index = df[df['gps_event_id'] == transition_cluster_df['gps_event_id'].iloc[-1]].index + 1
-                    type_of_end_key_loc = df['belonging_key_loc'].iloc[key_loc_end_index[0]]
-                except IndexError:
-                    key_loc_end_index = df[df['gps_event_id'] == transition_cluster_df['gps_event_id'].iloc[-1]].index
-                    type_of_end_key_loc = df['belonging_key_loc'].iloc[key_loc_end_index[0] - 1]
-
-                total_distance_km = self._compute_length_of_route(transition_cluster_df)
-                transition_cluster_basic_info.append({
-                    'key_loc_start_id': type_of_start_key_loc,
-                    'key_loc_end_id': type_of_end_key_loc,
-                    'transition_cluster_start_time': transition_cluster_start_time,
-                    'transition_cluster_end_time': transition_cluster_end_time,
-                    'trans_cluster_start_latitude': transition_cluster_df['latitude'].iloc[0],
-                    'trans_cluster_start_longitude': transition_cluster_df['longitude'].iloc[0],
-                    'trans_cluster_end_latitude': transition_cluster_df['latitude'].iloc[-1],
-                    'trans_cluster_end_longitude': transition_cluster_df['longitude'].iloc[-1],
-                    'time_spent_seconds': time_distance,
-                    'total_distance_km': total_distance_km,
-                    'num_of_gps_events': len(transition_cluster_df)
-                })
-                transition_clusters_list.append(transition_cluster_df)
+            logger.info(f"Length of transition_clusters_list: {len(transition_clusters)}")
 
-            logger.info(f"Length of transition_clusters_list: {len(transition_clusters_list)}")
-
-            if len(transition_cluster_basic_info) == 0:
+            if transition_clusters.empty:
                 logger.error("No transition cluster basic info found.")
                 return None
 
             # Construct the final list of transitions based on the computed basic info
-            transitions_final_df = self._constract_final_list_of_transitions(transition_cluster_basic_info)
+            transitions_final_df = self._constract_final_list_of_transitions(transition_clusters)
 
             if transitions_final_df is None:
                 logger.error("No transitions final list found.")
@@ -3197,86 +2776,54 @@ class AnalysisService:
             logger.error(f"Error computing transitions info of key locations clusters: {e}")
             return None
 
-    def _constract_final_list_of_transitions(self, transition_cluster_basic_info: list) -> pd.DataFrame | None:
+    def _constract_final_list_of_transitions(self, transition_clusters: pd.DataFrame) -> pd.DataFrame | None:
         """
         Construct the final list of transitions 
         Args:
-            transition_cluster_basic_info: List with the basic info of each key transition cluster
+            transition_clusters: DataFrame with the basic info of each transition cluster (GPSRouteSegments.transitions)
         Returns:
             DataFrame with the final list of transitions
         """
         try:
-            start_key_loc_id = transition_cluster_basic_info[0]['key_loc_start_id']
-            transitions_final_list = []
-
-            for idx, trans_cluster_info in enumerate(transition_cluster_basic_info):
-
-                if idx == len(transition_cluster_basic_info) - 1: # we are at the last transition cluster and we can not found any change in the key location
-                    total_time_transition_cluster = trans_cluster_info['time_spent_seconds']
-                    total_distance_traveled_transition_cluster = trans_cluster_info['total_distance_km']
-                    total_events_in_transition_cluster = trans_cluster_info['num_of_gps_events']
-
-                    transitions_final_list.append({
-                            'key_loc_start_id': start_key_loc_id,
-                            'key_loc_end_id': trans_cluster_info['key_loc_end_id'],
-                            'start_time_of_transition': trans_cluster_info['transition_cluster_start_time'],
-                            'end_time_of_transition': trans_cluster_info['transition_cluster_end_time'],
-                            'total_time_travel_seconds': total_time_transition_cluster,
-                            'total_distance_traveled_km': total_distance_traveled_transition_cluster,
-                            'total_events_in_transition_cluster': total_events_in_transition_cluster,
-                    })
-                    start_key_loc_id = trans_cluster_info['key_loc_end_id']
-
-                if start_key_loc_id != trans_cluster_info['key_loc_end_id']:
-                    total_time_transition_cluster = trans_cluster_info['time_spent_seconds']
-                    total_distance_traveled_transition_cluster = trans_cluster_info['total_distance_km']
-                    total_events_in_transition_cluster = trans_cluster_info['num_of_gps_events']
-
-                    transitions_final_list.append({
-                            'key_loc_start_id': start_key_loc_id,
-                            'key_loc_end_id': trans_cluster_info['key_loc_end_id'],
-                            'start_time_of_transition': trans_cluster_info['transition_cluster_start_time'],
-                            'end_time_of_transition': trans_cluster_info['transition_cluster_end_time'],
-                            'total_time_travel_seconds': total_time_transition_cluster,
-                            'total_distance_traveled_km': total_distance_traveled_transition_cluster,
-                            'total_events_in_transition_cluster': total_events_in_transition_cluster,
-                    })
-                    start_key_loc_id = trans_cluster_info['key_loc_end_id']
+            end_key_loc_ids = transition_clusters['key_loc_end_id'].to_numpy()
+            start_key_loc_id = transition_clusters['key_loc_start_id'].iloc[0]
+            last_cluster = len(transition_clusters) - 1
+
+            # The start key location and the position of the transition cluster of each final transition
+            start_key_loc_ids = []
+            cluster_positions = []
+            for position, end_key_loc_id in enumerate(end_key_loc_ids):
+                if position == last_cluster: # we are at the last transition cluster and we can not found any change in the key location
+                    start_key_loc_ids.append(start_key_loc_id)
+                    cluster_positions.append(position)
+                    start_key_loc_id = end_key_loc_id
+
+                if start_key_loc_id != end_key_loc_id:
+                    start_key_loc_ids.append(start_key_loc_id)
+                    cluster_positions.append(position)
+                    start_key_loc_id = end_key_loc_id
 
                 # If the final transition cluster has the same start and end, then it means it belongs to the previous transition cluster
-                if len(transitions_final_list) > 1 and transitions_final_list[-1]['key_loc_start_id'] == transitions_final_list[-1]['key_loc_end_id']:
+                if len(cluster_positions) > 1 and start_key_loc_ids[-1] == end_key_loc_ids[cluster_positions[-1]]:
                     # Remove the last transition cluster info
-                    transitions_final_list.pop()
-
-            return pd.DataFrame(transitions_final_list)
+                    start_key_loc_ids.pop()
+                    cluster_positions.pop()
+
+            clusters = transition_clusters.iloc[cluster_positions].reset_index(drop=True)
+            return pd.DataFrame({
+                'key_loc_start_id': start_key_loc_ids,
+                'key_loc_end_id': clusters['key_loc_end_id'],
+                'start_time_of_transition': clusters['transition_cluster_start_time'],
+                'end_time_of_transition': clusters['transition_cluster_end_time'],
+                'total_time_travel_seconds': clusters['time_spent_seconds'],
+                'total_distance_traveled_km': clusters['total_distance_km'],
+                'total_events_in_transition_cluster': clusters['num_of_gps_events'],
+            })
         except Exception as e:
             logger.error(f"Error constructing final list of transitions: {e}")
             return None
 
- 
-    def _compute_length_of_route(self, df: pd.DataFrame) -> float:
-        """
-        Compute the length of the route based on the GPS points.
-        Args:
-            df: DataFrame with the GPS data
-        Returns:
-            Length of the route in kilometers
-        """
-        df = df.sort_values(by='timestamp_now')
-
-        if df.shape[0] < 2:
-            return 0
-
-        total_distance = 0.0 
-        for i in range(1, len(df)):
-            point_1 = df.iloc[i - 1]['latitude'], df.iloc[i - 1]['longitude']
-            point_2 = df.iloc[i]['latitude'], df.iloc[i]['longitude']
-            distance = haversine(point_1, point_2, Unit.KILOMETERS)
-            total_distance += distance
-
-        return total_distance
-    
-    def _compute_info_of_key_locations_clusters(self, df: pd.DataFrame) -> pd.DataFrame | None:
+    def _compute_info_of_key_locations_clusters(self, df: pd.DataFrame, segments: GPSRouteSegments | None = None) -> pd.DataFrame | None:
         """
             Compute the basic info of each key-location cluster, that will include:
                 - Total time spent in the key-location
@@ -3287,107 +2834,34 @@ class AnalysisService:
                 - Latitude and longitude of the key-location cluster
             Args:
                 df: DataFrame with the GPS data
+                segments: GPSRouteSegments - The segments of the GPS data (computed from df if None)
             Returns:
                 DataFrame with the basic info of each key-location cluster
         """
         try:
-            df = df.sort_values(by='timestamp_now')
+            if segments is None:
+                segments = GPSRouteSegments(df)
 
-            key_locs_in_cluster = [] # holds the GPS events that belong to the same key location cluster
-            key_loc_clusters_basic_info = [] # holds the basic info of each key location cluster
-            key_loc_point_tracked = [] # holds the last key location point tracked
-            recording = False # holds the recording state
-
-            for _, gps_event in df.iterrows():
-                if np.isnan(gps_event['belonging_key_loc']) == False and recording is False:
-                    key_locs_in_cluster.append(gps_event)
-                    key_loc_point_tracked = [gps_event['latitude'], gps_event['longitude']]
-                    recording = True
-                elif (
-                        np.isnan(gps_event['belonging_key_loc']) == False and
-                        gps_event['latitude'] == key_loc_point_tracked[0] and
-                        gps_event['longitude'] == key_loc_point_tracked[1] and
-                        recording is True
-                    ):  
-                    key_locs_in_cluster.append(gps_event)
-                elif (
-                        np.isnan(gps_event['belonging_key_loc']) == False and
-                        gps_event['latitude'] != key_loc_point_tracked[0] and
-                        gps_event['longitude'] != key_loc_point_tracked[1] and
-                        recording is True
-                    ):  
-                    time_distance = self._compute_total_time_from_timestamps(pd.DataFrame(key_locs_in_cluster))
-
-                    key_loc_clusters_basic_info.append({
-                            'belonging_key_loc': key_locs_in_cluster[0]['belonging_key_loc'],
-                            'longitude': key_locs_in_cluster[0]['longitude'],
-                            'latitude': key_locs_in_cluster[0]['latitude'],
-                            'time_spent_seconds': time_distance,
-                            'num_of_gps_events': len(key_locs_in_cluster),
-                            'key_loc_type': key_locs_in_cluster[0]['type']
-                    }) 
-
-                    key_locs_in_cluster = [gps_event]
-                    key_loc_point_tracked = [gps_event['latitude'], gps_event['longitude']]
-                    recording = False
-                
-            # Compute the last key-location cluster info
-            if len(key_locs_in_cluster) > 0:
-                time_distance = self._compute_total_time_from_timestamps(pd.DataFrame(key_locs_in_cluster))
-
-                key_loc_clusters_basic_info.append({
-                    'belonging_key_loc': key_locs_in_cluster[0]['belonging_key_loc'],
-                    'longitude': key_locs_in_cluster[0]['longitude'],
-                    'latitude': key_locs_in_cluster[0]['latitude'],
-                    'time_spent_seconds': time_distance,
-                    'num_of_gps_events': len(key_locs_in_cluster),
-                    'key_loc_type': key_locs_in_cluster[0]['type'] 
-                })
-            
-            key_loc_clusters_basic_info_df = pd.DataFrame(key_loc_clusters_basic_info)
+            # The visits are the runs of GPS events in the same key location
+            key_loc_clusters_basic_info_df = segments.visits
+            if key_loc_clusters_basic_info_df.empty:
+                logger.error("No key-location clusters found.")
+                return None
 
             # Now group the key location clusters by their belonging_key_loc and add their total time spent
-            key_loc_unique_clusters_list = []
-            for key_loc_id, group in key_loc_clusters_basic_info_df.groupby('belonging_key_loc'):
-                total_time_spent = group['time_spent_seconds'].sum()
-                num_of_gps_events = group['num_of_gps_events'].sum()
-                key_loc_unique_clusters_list.append({
-                    'belonging_key_loc': key_loc_id,
-                    'latitude': group['latitude'].iloc[0],  # take the first latitude
-                    'longitude': group['longitude'].iloc[0],  # take the first longitude
-                    'total_time_spent_seconds': total_time_spent,
-                    'num_of_gps_events': num_of_gps_events,
-                    'key_loc_type': group['key_loc_type'].iloc[0] # to take only the type
-                })
-            
-            # Create a dataframe with the unique key location
-            key_loc_unique_clusters_df = pd.DataFrame(key_loc_unique_clusters_list)
-                
+            key_loc_unique_clusters_df = key_loc_clusters_basic_info_df.groupby('belonging_key_loc', as_index=False).agg(
+                latitude=('latitude', 'first'),  # take the first latitude
+                longitude=('longitude', 'first'),  # take the first longitude
+                total_time_spent_seconds=('time_spent_seconds', 'sum'),
+                num_of_gps_events=('num_of_gps_events', 'sum'),
+                key_loc_type=('key_loc_type', 'first')  # to take only the type
+            )
+
             return key_loc_unique_clusters_df
         except Exception as e:
             logger.error(f"Error computing info of key locations clusters: {e}")
             return None
 
-    def _compute_total_time_from_timestamps(self, df: pd.DataFrame, timestamp_column_name='timestamp_now') -> float:
-
-        """
-        Compute the total time from the timestamps of a dataframe.
-        Args:
-            df: DataFrame with the timestamps
-            timestamp_column_name: Name of the column with the timestamps
-        Returns:
-            Total time in seconds
-        """
-
-        df[timestamp_column_name] = pd.to_datetime(df[timestamp_column_name])
-        df = df.sort_values(by=timestamp_column_name)
-
-        start_time = df[timestamp_column_name].iloc[0]
-        end_time = df[timestamp_column_name].iloc[-1]
-        total_duration = (end_time - start_time).total_seconds()
-
-        return round(total_duration, 3)  # rounded to 3 decimal places
-
     def _fix_wrong_key_locs(self, df: pd.DataFrame) -> pd.DataFrame | None:
         """
         This function find GPS points that belong to a key location, but the cluster that they form
@@ -3412,44 +2886,14 @@ class AnalysisService:
                 logger.warning("Empty DataFrame provided to _fix_wrong_key_locs")
                 return df
 
-            df = df.sort_values(by='timestamp_now')
-            
-            sub_route = []
-            key_loc_point_tracked = []
-            recording = False
-            sub_route_to_fix_list = []
-            for _, gps_event in df.iterrows():
-                    
-                    if np.isnan(gps_event['belonging_key_loc']) == False and recording is False:
-                        sub_route.append(gps_event)
-                        key_loc_point_tracked = [gps_event['latitude'], gps_event['longitude']]
-                        recording = True
-                    elif (
-                            np.isnan(gps_event['belonging_key_loc']) == False and
-                            gps_event['latitude'] == key_loc_point_tracked[0] and
-                            gps_event['longitude'] == key_loc_point_tracked[1] and
-                            recording is True
-                    ):  
-                        sub_route.append(gps_event)
-                    elif (
-                            np.isnan(gps_event['belonging_key_loc']) == False and
-                            gps_event['latitude'] != key_loc_point_tracked[0] and
-                            gps_event['longitude'] != key_loc_point_tracked[1] and
-                            recording is True
-                    ):
-                        time_distance = self._compute_total_time_from_timestamps(pd.DataFrame(sub_route))
-                        if time_distance <= 1800:  # 30 minutes
-                            sub_route_to_fix_list.append(pd.DataFrame(sub_route))
-                        sub_route = []
-                        sub_route.append(gps_event)
-                        key_loc_point_tracked = []
-                        recording = False
-            
-            for sub_route_df in sub_route_to_fix_list:
-                # Get indices from the original dataframe to update
-                indices_to_fix = sub_route_df.index.tolist()
-                df.loc[indices_to_fix, 'belonging_key_loc'] = np.nan
-                df.loc[indices_to_fix, 'type'] = np.nan
+            segments = GPSRouteSegments(df)
+            df = segments.route
+
+            # The visits of 30 minutes or less, but not the last one (the user may still be there at the end of the data)
+            short_visits = np.flatnonzero(segments.visits['time_spent_seconds'].to_numpy()[:-1] <= 1800)  # 30 minutes
+            indices_to_fix = df.index[segments.points_of_visits(short_visits)]
+            df.loc[indices_to_fix, 'belonging_key_loc'] = np.nan
+            df.loc[indices_to_fix, 'type'] = np.nan
 
             return df
         except Exception as e:
@@ -3472,70 +2916,82 @@ class AnalysisService:
             Reconstructed dataframe with the GPS data smoothed out
         """
         try:
-            for _, key_loc_point in key_locs_coords.iterrows():
-                near_gps_points = self._get_gps_points_near_key_loc(df, key_loc_point, eps)
+            if key_locs_coords.empty:
+                return df
 
-                if near_gps_points.empty:
+            # The key locations are applied in order and a point that is moved to a key location is compared with
+            # the next key locations from its new coordinates (the key location), a later key location overwrites an earlier one.
+            # The points that have not been moved are found with a BallTree of their coordinates (one query per key location),
+            # the moved ones with the distances between the key locations.
+            coords = df[['latitude', 'longitude']].to_numpy(dtype=float)
+            valid_positions = np.flatnonzero(~np.isnan(coords).any(axis=1))
+            tree = BallTree(np.radians(coords[valid_positions]), metric='haversine')
+            # The radius of the tree is a bit larger (it uses another earth radius), the candidates are checked with haversine
+            tree_radius = eps / 6371000 * 1.001
+
+            key_coords = key_locs_coords[['latitude', 'longitude']].to_numpy(dtype=float)
+            key_loc_distances = haversine_vector(key_coords, key_coords, Unit.METERS, comb=True)
+            assigned_key_locs = np.full(len(df), -1)  # The position of the key location of each point, -1 for none
+
+            for k, key_loc_point in enumerate(key_locs_coords.itertuples(index=False)):
+                candidates = valid_positions[tree.query_radius(np.radians(key_coords[k:k + 1]), r=tree_radius)[0]]
+                candidates = candidates[assigned_key_locs[candidates] == -1]
+                distances = haversine_vector(coords[candidates], np.broadcast_to(key_coords[k], (len(candidates), 2)), Unit.METERS) if len(candidates) else np.empty(0)
+                moved = np.flatnonzero(assigned_key_locs >= 0)
+                near_positions = np.concatenate([
+                    candidates[distances <= eps],
+                    moved[key_loc_distances[assigned_key_locs[moved], k] <= eps]
+                ])
+
+                if len(near_positions) == 0:
                     print(f"No GPS events near the key location: {key_loc_point}")
                     continue
+                assigned_key_locs[near_positions] = k
 
-                for idx in near_gps_points.index:
-                    df.loc[idx, 'latitude'] = key_loc_point['latitude']
-                    df.loc[idx, 'longitude'] = key_loc_point['longitude']
-                    df.loc[idx, 'belonging_key_loc'] = key_loc_point['key_location_id']
-
-                    # Each GPS point event that is close to the HOME location
-                    # Is set as HOME, else it is set as NOT_IDENTIFIED
-                    if key_loc_point['type'] == 'HOME':
-                        df.loc[idx, 'type'] = 'HOME'
-                    else:
-                        df.loc[idx, 'type'] = 'NOT_IDENTIFIED'
+            near = assigned_key_locs >= 0
+            if not near.any():
+                return df
+            key_locs_of_points = assigned_key_locs[near]
+            near_index = df.index[near]
+            df.loc[near_index, 'latitude'] = key_coords[key_locs_of_points, 0]
+            df.loc[near_index, 'longitude'] = key_coords[key_locs_of_points, 1]
+            df.loc[near_index, 'belonging_key_loc'] = key_locs_coords['key_location_id'].to_numpy()[key_locs_of_points]
+
+            # Each GPS point event that is close to the HOME location
+            # Is set as HOME, else it is set as NOT_IDENTIFIED
+            key_loc_types = np.where(key_locs_coords['type'].to_numpy() == 'HOME', 'HOME', 'NOT_IDENTIFIED').astype(object)
+            df.loc[near_index, 'type'] = key_loc_types[key_locs_of_points]
             return df
         except Exception as e:
             logger.error(f"Error computing main GPS route: {e}")
             return None
-    
-    def _get_gps_points_near_key_loc(self, df: pd.DataFrame, key_loc_coords: pd.Series, eps: int) -> pd.DataFrame | None:
+
+    def _identify_key_locations(self, df: pd.DataFrame, eps: int, samples: int, gps_points_sample_rate: int, grid_fraction: float = 0) -> pd.DataFrame | None:
         """
-        Get all GPS points that are within a certain distance from a key location.
+        Find the key locations (the DBSCAN clusters of the GPS points) and the HOME key location.
+        With grid_fraction the points are first snapped to a grid of cells of grid_fraction * eps meters and DBSCAN
+        runs on the occupied cells (at the mean of their points) weighted by their number of points, so the cost depends
+        on the places visited and not on the number of points (ex. the thousands of points of a night at home).
         Args:
-            key_loc_coords: Series with the key location coordinates
-            eps: Epsilon value that has been used to identify the key locations (distance in meters that a point is considered to be in a key location)
+            df: DataFrame with the cleaned GPS data
+            eps: int - The DBSCAN radius in meters
+            samples: int - The DBSCAN minimum number of points of a key location
+            gps_points_sample_rate: int - The GPS sample rate in seconds
+            grid_fraction: float - The grid cell size as a fraction of eps, 0 to cluster the points without the grid
         Returns:
-            DataFrame with the GPS points that are near the key location
+            DataFrame with the key locations (key_location_id, latitude, longitude, type)
         """
         try:
-            if key_loc_coords.empty:
-                return df
-
-            near_gps_rows = []
-
-            for _, gps_event in df.iterrows():
-                gps_event_lat = gps_event['latitude']
-                gps_event_lon = gps_event['longitude']
-
-                gps_point = (gps_event_lat, gps_event_lon)
-                key_loc_point = (key_loc_coords['latitude'], key_loc_coords['longitude'])
-
-                distance = haversine(gps_point, key_loc_point, unit=Unit.METERS)
-
-                if distance <= eps and gps_event.notna().any():
-                    near_gps_rows.append(gps_event)
-
-            near_gps_points_df = pd.DataFrame(near_gps_rows, columns=df.columns)
-            return near_gps_points_df
-        except Exception as e:
-            logger.error(f"Error getting GPS points near key location: {e}")
-            return None
-
-    def _identify_key_locations(self, df: pd.DataFrame, eps: int, samples: int, gps_points_sample_rate: int) -> pd.DataFrame | None:
-        try:
-            coords = df[['latitude', 'longitude']].map(radians).values  # Convert degrees to radians
+            coords = np.radians(df[['latitude', 'longitude']].to_numpy(dtype=float))  # Convert degrees to radians
 
             eps = eps / 6371000  # Earth's radius in meters (6371000 meters)
 
             db = DBSCAN(eps=eps, min_samples=samples, metric='haversine')
-            labels = db.fit_predict(coords)
+            if grid_fraction > 0 and len(coords):
+                cell_coords, cell_counts, cell_of_point = self._snap_to_grid(coords, eps * grid_fraction)
+                labels = db.fit_predict(cell_coords, sample_weight=cell_counts)[cell_of_point]
+            else:
+                labels = db.fit_predict(coords)
 
             # Construct key locations dataframe
             df['cluster'] = labels
@@ -3568,6 +3024,28 @@ class AnalysisService:
             logger.error(f"Error identifying key locations: {e}")
             return None
 
+    @staticmethod
+    def _snap_to_grid(coords: np.ndarray, cell_size: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Snap GPS points to an (equirectangular) grid.
+        Args:
+            coords: np.ndarray - The (latitude, longitude) of the points in radians
+            cell_size: float - The size of a cell in radians of the earth's surface
+        Returns:
+            (np.ndarray, np.ndarray, np.ndarray) - The mean coordinates of the points of each occupied cell, the number of points of each cell and the cell of each point
+        """
+        # The longitude cells are wider in degrees away from the equator, the points of a day are in the same area
+        lon_cell_size = cell_size / max(np.cos(coords[:, 0].mean()), 1e-6)
+        cells = np.floor(coords / [cell_size, lon_cell_size]).astype(np.int64)
+        _, cell_of_point, cell_counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+        cell_of_point = cell_of_point.ravel()
+
+        cell_coords = np.column_stack([
+            np.bincount(cell_of_point, weights=coords[:, 0]) / cell_counts,
+            np.bincount(cell_of_point, weights=coords[:, 1]) / cell_counts,
+        ])
+        return cell_coords, cell_counts, cell_of_point
+
     def _find_home_key_location(self, key_locs_df: pd.DataFrame, gps_points_sample_rate: int, home_period_valid_start_time=time(22, 0), home_period_valid_end_time=time(6, 0)) -> pd.DataFrame | None:
         max_percentage = 0
         home_idx = None
@@ -3696,11 +3174,11 @@ class AnalysisService:
 
             coords_rad = np.radians(coords)
 
-            dist_matrix = haversine_distances(coords_rad) * 6371000  # in meters 
-
-            # For each point, check if there's at least one other point within the threshold
-            np.fill_diagonal(dist_matrix, np.inf)  # Ignore self-distance
-            has_neighbor = (dist_matrix < min_distance).any(axis=1)
+            # For each point, check if there's at least one other point within the threshold:
+            # the nearest point other than itself is the second nearest (the first one is the point itself, or a duplicate at 0 meters).
+            # A BallTree query is O(N log N) time and O(N) memory, instead of the N x N distance matrix (see scripts/gps_benchmarks.py)
+            distances, _ = BallTree(coords_rad, metric='haversine').query(coords_rad, k=2)
+            has_neighbor = distances[:, 1] * 6371000 < min_distance  # in meters
 
             # Keep only those with at least one close neighbor
             cleaned_df = df[has_neighbor].reset_index(drop=True)
@@ -3746,158 +3224,84 @@ class AnalysisService:
             return None
 
 
-    def _find_clusters_of_same_GPS_events(self, df: pd.DataFrame) -> List[List[pd.Series]]:
-        try:
-            df = df.sort_values(by='timestamp_now')
-
-            clusters = []
-            current_cluster = []
-
-            prev_gps_evt = df.iloc[0]
-            current_cluster.append(prev_gps_evt)
-
-            for _, gps_event in df.iloc[1:].iterrows():
-                if prev_gps_evt['latitude'] == gps_event['latitude'] and prev_gps_evt['longitude'] == gps_event['longitude']:
-                    current_cluster.append(gps_event)
-                else:
-                    if len(current_cluster) >= 2:
-                        clusters.append(current_cluster)
-                    current_cluster = [gps_event]
-                prev_gps_evt = gps_event
-
-            if len(current_cluster) >= 2:
-                clusters.append(current_cluster)
-
-            return clusters
-        except Exception as e:
-            logger.error(f"Error finding clusters of same GPS events: {e}")
-            return None
-    
-    def _create_cluster_unique_id(self, df: pd.DataFrame) -> str | None:
-
+    def _find_clusters_of_same_GPS_events(self, df: pd.DataFrame) -> pd.Series | None:
         """
-        Generates a 30-character unique ID using characters from a randomly selected GPS events in the dataset
-        This is used to identify the GPS events that are part of the same cluster
-
+        Find the clusters of consecutive (in time) GPS events that have the same latitude and longitude.
+        The runs of same coordinates are found with diff/cumsum, the runs of at least 2 GPS events are the clusters.
         Args:
             df: DataFrame with the GPS data
-        
         Returns:
-            String with the unique ID
+            Series with the cluster of each GPS event (with the index of df), -1 for the GPS events that are not in a cluster
         """
-
         try:
-            # Remove NaN values in 'gps_event_id' column
-            # because it will cause issues when generating a unique ID
-            df = df.dropna(subset=['gps_event_id'])
+            df = df.sort_values(by='timestamp_now')
+            latitudes = df['latitude'].to_numpy(dtype=float)
+            longitudes = df['longitude'].to_numpy(dtype=float)
 
-            if len(df) == 0:
-                print("No GPS events found to create a unique ID.")
-                return None
+            starts_run = np.ones(len(df), dtype=bool)
+            starts_run[1:] = (latitudes[1:] != latitudes[:-1]) | (longitudes[1:] != longitudes[:-1])
+            run_ids = np.cumsum(starts_run) - 1
 
-            random_event = df.sample(1).iloc[0]
-            random_id = random_event['gps_event_id']
-            
-            unique_id = ''.join(np.random.choice(list(random_id), size=30))
+            in_cluster = np.bincount(run_ids)[run_ids] >= 2 if len(df) else np.zeros(0, dtype=bool)
+            cluster_ids = np.where(in_cluster, np.cumsum(starts_run & in_cluster) - 1, -1)
 
-            return unique_id
+            return pd.Series(cluster_ids, index=df.index)
         except Exception as e:
-            logger.error(f"Error creating unique UID: {e}")
+            logger.error(f"Error finding clusters of same GPS events: {e}")
             return None
 
-    def _construct_median_dataframe(self, df: pd.DataFrame, main_point: list) -> pd.DataFrame:
+    @staticmethod
+    def _create_cluster_unique_id(gps_event_ids: pd.Series) -> str:
         """
-        Function to construct a dataframe that represents a GPS event with median values of the whole dataframe;
-        this dataframe will have the same columns as the main dataframe (that contains the GPS event points).
+        Generates a 30-character unique ID from the IDs of the GPS events of a cluster.
+        This is used to identify the GPS events that are part of the same cluster, the same cluster always gets the same ID.
+
         Args:
-            main_point: List with the GPS points (longitude, latitude) of the main point
-            df: DataFrame with the GPS event points
+            gps_event_ids: Series with the IDs of the GPS events of the cluster
+
         Returns:
-            DataFrame with the median values of the whole dataframe
+            String with the unique ID
         """
+        return hashlib.sha1("|".join(gps_event_ids.dropna().astype(str)).encode()).hexdigest()[:30]
 
-        try:
-            # Preparation
-            df['timestamp_now'] = pd.to_datetime(df['timestamp_now'])
-            df = df.sort_values(by='timestamp_now')
-
-            # Median values
-            median_timestamp = df['timestamp_now'].median()
-            median_accuracy = df['accuracy'].median()
-            median_bearing = df['bearing'].median()
-            median_speed = df['speed'].median()
-            median_speed_accuracy_meters_per_second = df['speed_accuracy_meters_per_second'].median()
-
-            # New values
-            longitude = main_point[1]
-            latitude = main_point[0]
-
-            rand_UID = self._create_cluster_unique_id(df)
-            
-            if rand_UID is None:
-                logger.error("Cannot create a unique ID, returning an empty DataFrame.")
-                return None
-
-            # Construct the median key location dataframe
-            median_gps_event_df = pd.DataFrame([{
-                'id': 0,
-                'gps_event_id': rand_UID,
-                'latitude': latitude,
-                'longitude': longitude,
-                'timestamp_now': median_timestamp,
-                'accuracy': median_accuracy,
-                'bearing': median_bearing,
-                'speed': median_speed,
-                'speed_accuracy_meters_per_second': median_speed_accuracy_meters_per_second
-            }])
-
-            return median_gps_event_df
-        except Exception as e:
-            logger.error(f"Error constructing median dataframe: {e}")
-            return None
-
-    def _transform_duplicate_gps_events(self, df: pd.DataFrame, clusters: List[List[pd.Series]]) -> pd.DataFrame | None:
+    def _transform_duplicate_gps_events(self, df: pd.DataFrame, clusters: pd.Series) -> pd.DataFrame | None:
         """
         This function transforms the duplicate GPS events into a single event with median values of the whole dataframe.
+        Each cluster is replaced by one GPS event at the coordinates of its first event, with the median timestamp, accuracy,
+        bearing, speed and speed accuracy of its events (one groupby aggregation for all the clusters).
         Args:
-            clusters: List of lists of clusters of same GPS events
+            df: DataFrame with the GPS data
+            clusters: Series with the cluster of each GPS event (see _find_clusters_of_same_GPS_events)
         Returns:
             DataFrame with the transformed GPS event points
         """
         try:
             df = df.sort_values(by='timestamp_now')
 
-            ids_to_remove = set()
-            new_rows = []
-
-            for cluster in clusters:
-                cluster_df = pd.DataFrame(cluster)
-
-                # Get the gps_event_ids from the cluster
-                cluster_ids = cluster_df['gps_event_id'].tolist()
-                ids_to_remove.update(cluster_ids)
-
-                first_point = cluster[0]
-                representative_point = [first_point['latitude'], first_point['longitude']]
-
-                new_event = self._construct_median_dataframe(cluster_df, representative_point)
-
-                if new_event is not None:
-                    new_rows.append(new_event) 
-                else:
-                    logger.error(f"Error occurred while constructing the median dataframe for the representative point {representative_point}.")
-                    continue
-
-            df =  df[~df['gps_event_id'].isin(ids_to_remove)]
+            cluster_ids = clusters.reindex(df.index).fillna(-1).to_numpy()
+            in_cluster = cluster_ids >= 0
+            if not in_cluster.any():
+                return df
 
-            # Add the new representative rows to the dataframe
-            if new_rows:
-                if len(new_rows) == 1:
-                    new_events_df = pd.DataFrame(new_rows[0])
-                else:
-                    new_events_df = pd.concat([pd.DataFrame(r) for r in new_rows])
+            cluster_events = df[in_cluster].assign(
+                cluster=cluster_ids[in_cluster],
+                timestamp_now=pd.to_datetime(df.loc[in_cluster, 'timestamp_now'])
+            )
+            grouped = cluster_events.groupby('cluster', sort=True)
+            new_events_df = grouped.agg(
+                latitude=('latitude', 'first'),
+                longitude=('longitude', 'first'),
+                timestamp_now=('timestamp_now', 'median'),
+                accuracy=('accuracy', 'median'),
+                bearing=('bearing', 'median'),
+                speed=('speed', 'median'),
+                speed_accuracy_meters_per_second=('speed_accuracy_meters_per_second', 'median')
+            )
+            new_events_df.insert(0, 'gps_event_id', grouped['gps_event_id'].agg(self._create_cluster_unique_id))
+            new_events_df.insert(0, 'id', 0)
 
-                df = pd.concat([df, new_events_df], ignore_index=True)
+            # Replace the GPS events of the clusters with the new representative events
+            df = pd.concat([df[~in_cluster], new_events_df], ignore_index=True)
 
             return df.sort_values(by='timestamp_now')
         except Exception as e:
@@ -4690,43 +4094,31 @@ class AnalysisService:
         #     "std_ppr", "mean_ppr", "std_trs", "mean_trs"
         # ] # Columns of the table in Supabase (Daily_Analysis_Typing_Data)
 
-        results_list = []
-        session_decision_set = set() # This will hold the (unique values) sessions id's together with the cognitive decision made for them
-
         logger.info(f"\033[92m\n\n-----------Calculating typing stats for user {user_uid} for day {day_to_analyze}-----------\033[0m\n\n")
 
         try:
-            # For each high-level metric, calculate the mean and std for the current day
-            for metric_table_name in HIGH_LEVEL_METRICS_TABLE_NAMES:
+            # The sessions of the day with the value of each high-level metric and their cognitive decision, in one read
+            typing_sessions_metrics = self.supabase_service.retrieve_metrics_of_typing_sessions(HIGH_LEVEL_METRICS_TABLE_NAMES, user_uid, day_to_analyze)
+            if not typing_sessions_metrics:
+                logger.error(f"No typing sessions found for user {user_uid} on {day_to_analyze}")
+                return False
 
-                typing_sessions_decisions_info = self.supabase_service.retrieve_cognitive_info_of_typing_sessions(metric_table_name, user_uid, day_to_analyze)
+            sessions_df = pd.DataFrame(typing_sessions_metrics)
+            metric_values = sessions_df[HIGH_LEVEL_METRICS_TABLE_NAMES].to_numpy(dtype=float)
 
-                if not typing_sessions_decisions_info:
-                    logger.warning(f"No data retrieved for metric {metric_table_name}")
-                    continue
-                
-                metric_stats = self._calculate_metric_statistics(typing_sessions_decisions_info, metric_table_name)
-                if metric_stats:
-                    results_list.append(metric_stats)
-
-                # Collect cognitive decisions
-                for session in typing_sessions_decisions_info:
-                    if "cognitive_decision" in session and "session_uid" in session:
-                        session_decision_set.add((session["session_uid"], session["cognitive_decision"]))
-            
-            if not session_decision_set:
+            # For each high-level metric, calculate the mean and std for the current day
+            results_list = self._calculate_metrics_statistics(metric_values, HIGH_LEVEL_METRICS_TABLE_NAMES)
+
+            # Only the sessions with at least one metric value are counted in the decisions
+            decisions = sessions_df.loc[~np.isnan(metric_values).all(axis=1), 'cognitive_decision']
+            if decisions.empty:
                 logger.error(f"No typing sessions found for user {user_uid} on {day_to_analyze}")
                 return False
 
             # Calculate decision distribution percentages
-            percentages = self._calculate_percentages(
-                DECISION_CATEGORIES,
-                [decision[1] for decision in session_decision_set]
-            )
-
-            if not percentages:
-                logger.error(f"No cognitive decisions found for user {user_uid} on {day_to_analyze}")
-                return False
+            decision_counts = decisions.value_counts()
+            percentages = {category: float(decision_counts.get(category, 0) / len(decisions) * 100) for category in DECISION_CATEGORIES}
+            logger.info(f"Calculated percentages: {percentages}")
 
             # Calculate the total typing cognitive score
             total_typing_cognitive_score = self._calculate_total_typing_cognitive_score(percentages)
@@ -4807,24 +4199,22 @@ class AnalysisService:
             logger.error(f"Error calculating total typing cognitive score: {e}")
             return None
 
-    def _calculate_metric_statistics(self, typing_sessions_decisions_info: list, metric_table_name: str) -> dict | None:
-        """Calculate mean and std for a metric from typing sessions data."""
-        try:
-            values = [session["value"] for session in typing_sessions_decisions_info]
-            if not values:
-                return None
-                
-            mean_value = np.mean(values)
-            std_value = np.std(values)
-            
-            return {
-                "description": metric_table_name,
-                "std": std_value,
-                "mean": mean_value
-            }
-        except (KeyError, ValueError) as e:
-            logger.error(f"Error calculating statistics for {metric_table_name}: {e}")
-            return None
+    def _calculate_metrics_statistics(self, metric_values: np.ndarray, metric_table_names: list) -> list:
+        """Calculate the mean and std of each metric (column) of the typing sessions (rows), ignoring the missing values."""
+        results_list = []
+        has_values = ~np.isnan(metric_values).all(axis=0)
+        for metric_table_name in np.array(metric_table_names)[~has_values]:
+            logger.warning(f"No data retrieved for metric {metric_table_name}")
+        if has_values.any():
+            mean_values = np.nanmean(metric_values[:, has_values], axis=0)
+            std_values = np.nanstd(metric_values[:, has_values], axis=0)
+            for metric_table_name, mean_value, std_value in zip(np.array(metric_table_names)[has_values], mean_values, std_values):
+                results_list.append({
+                    "description": metric_table_name,
+                    "std": std_value,
+                    "mean": mean_value
+                })
+        return results_list
 
     def _calculate_percentages(self, categories: list, decisions: list) -> dict | None:
 
@@ -0,0 +1,176 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import redis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class BaselineCache:
+    """
+    Cache of the latest baseline records, keyed by (user_uid, metric_name), shared by the tasks:
+        - an in-process LRU, so the tasks of a process (ex. the days of a backfill) do not read the same rows again
+        - Redis (the broker), so the processes and the workers share the records
+    A record expires when its baseline can be refreshed (date_created + BASELINE_CACHE_REFRESH_DAYS), and the records
+    of a user are invalidated when new baselines are saved: the version of the user in Redis is incremented, which
+    invalidates the LRU entries of every process (they are stored with the version) and the Redis keys (the version is part of the key).
+    If Redis is not available the cache works with the LRU only (Redis is tried again after a minute).
+    """
+
+    # Stored for the metrics without a baseline, so that they are not read again until the next baseline
+    MISSING = {'__missing__': True}
+
+    def __init__(self, redis_url: str | None = None, max_entries: int | None = None):
+        self.max_entries = max_entries or settings.BASELINE_CACHE_MAX_ENTRIES
+        self._entries: OrderedDict = OrderedDict()  # (user_uid, metric_name) -> (version, expires_at, record)
+        self._local_versions: dict = {}  # user_uid -> version, used when Redis is not available
+        self._lock = threading.Lock()
+        self._redis = redis.Redis.from_url(redis_url or settings.broker_url, socket_timeout=1, socket_connect_timeout=1)
+        self._redis_retry_at = 0.0  # Redis is not used until this time after an error
+
+    @property
+    def _redis_available(self) -> bool:
+        return time.time() >= self._redis_retry_at
+
+    def get_many(self, user_uid: str, metric_names: list, version: int | None = None) -> tuple[dict, list]:
+        """
+        Get the cached records of metrics of a user.
+        Args:
+            user_uid: str - The user's unique identifier
+            metric_names: list - The names of the metrics
+            version: int | None - The version of the user (see get_version), read now if not given
+        Returns:
+            (dict, list) - metric name -> record (None for a metric without a baseline) of the cached metrics, and the metrics that are not cached
+        """
+        version = self.get_version(user_uid) if version is None else version
+        now = time.time()
+        records, misses = {}, []
+        with self._lock:
+            for metric_name in metric_names:
+                entry = self._entries.get((user_uid, metric_name))
+                if entry is not None and entry[0] == version and entry[1] > now:
+                    self._entries.move_to_end((user_uid, metric_name))
+                    records[metric_name] = entry[2]
+                else:
+                    misses.append(metric_name)
+
+        if misses and self._redis_available:
+            try:
+                values = self._redis.mget([self._redis_key(user_uid, version, metric_name) for metric_name in misses])
+                still_missing = []
+                for metric_name, value in zip(misses, values):
+                    if value is None:
+                        still_missing.append(metric_name)
+                        continue
+                    cached = json.loads(value)
+                    self._store_local(user_uid, metric_name, version, cached['expires_at'], cached['record'])
+                    records[metric_name] = cached['record']
+                misses = still_missing
+            except redis.RedisError as e:
+                self._redis_unavailable(e)
+
+        return {metric_name: (None if record == self.MISSING else record) for metric_name, record in records.items()}, misses
+
+    def set_many(self, user_uid: str, records: dict, version: int | None = None):
+        """
+        Cache the records of metrics of a user.
+        Args:
+            user_uid: str - The user's unique identifier
+            records: dict - metric name -> the latest baseline record (with its date_created), None if there is no baseline
+            version: int | None - The version of the user when the records were read (see get_version), the records are not
+                     cached if the user was invalidated since then. The current version is used if not given.
+        """
+        current_version = self.get_version(user_uid)
+        if version is None:
+            version = current_version
+        elif version != current_version:
+            logger.info(f"The baselines of user {user_uid} changed while they were read, they are not cached")
+            return
+        now = time.time()
+        pipeline = self._redis.pipeline() if self._redis_available else None
+        for metric_name, record in records.items():
+            ttl = self._ttl_seconds(record)
+            record = self.MISSING if record is None else record
+            self._store_local(user_uid, metric_name, version, now + ttl, record)
+            if pipeline is not None:
+                cached = {'expires_at': now + ttl, 'record': record}
+                pipeline.set(self._redis_key(user_uid, version, metric_name), json.dumps(cached, default=str), ex=ttl)
+        if pipeline is not None:
+            try:
+                pipeline.execute()
+            except redis.RedisError as e:
+                self._redis_unavailable(e)
+
+    def invalidate_user(self, user_uid: str):
+        """Invalidate the cached records of a user in every process (called when new baselines are saved)."""
+        with self._lock:
+            self._local_versions[user_uid] = self._local_versions.get(user_uid, 0) + 1
+            for key in [key for key in self._entries if key[0] == user_uid]:
+                del self._entries[key]
+        if self._redis_available:
+            try:
+                self._redis.incr(self._version_key(user_uid))
+            except redis.RedisError as e:
+                self._redis_unavailable(e)
+        logger.info(f"Invalidated the cached baselines of user {user_uid}")
+
+    def get_version(self, user_uid: str) -> int:
+        """The version of the cached records of a user, it is incremented by invalidate_user."""
+        if self._redis_available:
+            try:
+                return int(self._redis.get(self._version_key(user_uid)) or 0)
+            except redis.RedisError as e:
+                self._redis_unavailable(e)
+        return self._local_versions.get(user_uid, 0)
+
+    def _store_local(self, user_uid: str, metric_name: str, version: int, expires_at: float, record: dict):
+        with self._lock:
+            self._entries[(user_uid, metric_name)] = (version, expires_at, record)
+            self._entries.move_to_end((user_uid, metric_name))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _redis_unavailable(self, error: Exception):
+        logger.error(f"Redis is not available for the baseline cache, using the in-process cache only for a minute: {error}")
+        self._redis_retry_at = time.time() + 60
+
+    @staticmethod
+    def _ttl_seconds(record: dict | None) -> int:
+        """Seconds until the baseline can be refreshed (date_created + BASELINE_CACHE_REFRESH_DAYS), at least BASELINE_CACHE_MIN_TTL_SECONDS."""
+        min_ttl = settings.BASELINE_CACHE_MIN_TTL_SECONDS
+        date_created = record.get('date_created') if record is not None else None
+        if date_created is None:
+            return min_ttl
+        if isinstance(date_created, str):
+            date_created = datetime.fromisoformat(date_created)
+        elif isinstance(date_created, date) and not isinstance(date_created, datetime):
+            date_created = datetime.combine(date_created, datetime.min.time())
+        refresh_at = date_created.replace(tzinfo=None) + timedelta(days=settings.BASELINE_CACHE_REFRESH_DAYS)
+        return max(int((refresh_at - datetime.now()).total_seconds()), min_ttl)
+
+    @staticmethod
+    def _version_key(user_uid: str) -> str:
+        return f"baseline_cache:version:{user_uid}"
+
+    @staticmethod
+    def _redis_key(user_uid: str, version: int, metric_name: str) -> str:
+        return f"baseline_cache:{user_uid}:{version}:{metric_name}"
+
+_cache: BaselineCache | None = None
+_cache_lock = threading.Lock()
+
+def get_baseline_cache() -> BaselineCache | None:
+    """Get the baseline cache of the process, None if it is disabled (BASELINE_CACHE_ENABLED)."""
+    global _cache
+    if not settings.BASELINE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = BaselineCache()
+    return _cache
@@ -0,0 +1,214 @@
+import logging
+import math
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+from app.services.database_service import DatabaseService
+
+logger = logging.getLogger(__name__)
+
+class QuantileSketch:
+    """
+    Mergeable sketch of the distribution of a metric: sorted centroids (mean, weight) of the values.
+    While there are at most max_size values the sketch keeps them all (the quantiles are exact), after that
+    neighbouring values are merged into centroids of equal weight, so the sketch has a bounded size.
+    """
+
+    def __init__(self, means=None, weights=None, max_size: int | None = None):
+        self.max_size = max_size or settings.TYPING_BASELINE_SKETCH_SIZE
+        self.means = np.asarray(means if means is not None else [], dtype=float)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=float)
+
+    @classmethod
+    def from_values(cls, values, max_size: int | None = None) -> "QuantileSketch":
+        values = np.sort(np.asarray(values, dtype=float))
+        sketch = cls(values, np.ones(len(values)), max_size)
+        sketch._compress()
+        return sketch
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        means = np.concatenate([self.means, other.means])
+        weights = np.concatenate([self.weights, other.weights])
+        order = np.argsort(means, kind='stable')
+        sketch = QuantileSketch(means[order], weights[order], self.max_size)
+        sketch._compress()
+        return sketch
+
+    def _compress(self):
+        """Merge the centroids into max_size centroids of (about) equal weight."""
+        if len(self.means) <= self.max_size:
+            return
+        cumulative = np.cumsum(self.weights) - self.weights
+        bins = np.minimum((cumulative / self.count * self.max_size).astype(int), self.max_size - 1)
+        weights = np.bincount(bins, weights=self.weights, minlength=self.max_size)
+        weighted_means = np.bincount(bins, weights=self.means * self.weights, minlength=self.max_size)
+        non_empty = weights > 0
+        self.means = weighted_means[non_empty] / weights[non_empty]
+        self.weights = weights[non_empty]
+
+    def quantile(self, q: float) -> float | None:
+        """
+        The q quantile, interpolated between the centres of the centroids.
+        For unit weights (the values themselves) the median is exact, like np.median/percentile_cont(0.5).
+        """
+        if len(self.means) == 0:
+            return None
+        centres = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.count, centres, self.means))
+
+    def median(self) -> float | None:
+        return self.quantile(0.5)
+
+    def mad(self) -> float | None:
+        """The median absolute deviation from the median."""
+        median = self.median()
+        if median is None:
+            return None
+        deviations = np.abs(self.means - median)
+        order = np.argsort(deviations, kind='stable')
+        return QuantileSketch(deviations[order], self.weights[order], self.max_size).median()
+
+    def to_dict(self) -> dict:
+        return {'means': self.means.tolist(), 'weights': self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict, max_size: int | None = None) -> "QuantileSketch":
+        return cls(data.get('means', []), data.get('weights', []), max_size)
+
+class MetricState:
+    """
+    The state of a metric over a set of sessions: count, mean and M2 (sum of squared deviations, Welford/Chan)
+    and the quantile sketch. Two states are merged without the values, so a baseline is the merge of the daily states.
+    """
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0, sketch: QuantileSketch | None = None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.sketch = sketch if sketch is not None else QuantileSketch()
+
+    @classmethod
+    def from_values(cls, values) -> "MetricState":
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return cls()
+        mean = float(values.mean())
+        return cls(len(values), mean, float(((values - mean) ** 2).sum()), QuantileSketch.from_values(values))
+
+    def merge(self, other: "MetricState") -> "MetricState":
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        mean = self.mean + delta * other.count / count
+        m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        return MetricState(count, mean, m2, self.sketch.merge(other.sketch))
+
+    def std(self) -> float | None:
+        """The sample standard deviation (like the stddev of Postgres), None for less than 2 values."""
+        if self.count < 2:
+            return None
+        return math.sqrt(self.m2 / (self.count - 1))
+
+class TypingBaselineEngine:
+    """
+    Computes the typing baselines (mean, std, median and MAD of each metric) from daily states that are kept in
+    the local database, instead of the get_baseline_metrics RPC that rescans all the sessions of the baseline period.
+    The state of a day is stored when the sessions of the day are analyzed (an analysis of the same day replaces it),
+    so a baseline refresh only merges the states of the days of the period.
+    """
+
+    def __init__(self, db_service: DatabaseService):
+        self.db_service = db_service
+
+    def update_day(self, user_uid: str, day: date, results: pd.DataFrame | None = None) -> bool:
+        """
+        Store the states of the metrics of a day, the day is recorded as covered by the states.
+        Args:
+            user_uid: str - The user's unique identifier
+            day: date - The day of the sessions
+            results: pd.DataFrame - The results of TypingMetricsEngine.compute (columns metric and value), None for a day without sessions
+        Returns:
+            bool - True if the states were stored successfully, False otherwise
+        """
+        states = {
+            metric_name: MetricState.from_values(metric_results['value'].to_numpy())
+            for metric_name, metric_results in results.groupby('metric', sort=False)
+        } if results is not None else {}
+        return self.db_service.store_typing_baseline_states(user_uid, day, {
+            metric_name: {'count': state.count, 'mean': state.mean, 'm2': state.m2, 'sketch': state.sketch.to_dict()}
+            for metric_name, state in states.items()
+        })
+
+    def compute_baseline(self, user_uid: str, start_date, end_date, metrics: list, last_analyzed_day=None) -> list | None:
+        """
+        Compute the baseline of a period, in the format of the get_baseline_metrics RPC.
+        Every day of the period up to the last analyzed day must be recorded (see TypingBaselineDay), a missing day
+        (ex. analyzed while the engine was disabled, or its states failed to be stored) would be left out of the baseline.
+        Args:
+            user_uid: str - The user's unique identifier
+            start_date: date/datetime/str - The first day of the period
+            end_date: date/datetime/str - The last day of the period
+            metrics: list - (metric name, mean key, std key, median key, mad key) of each metric
+            last_analyzed_day: date/datetime/str - The day that is analyzed (the later days have no analyzed sessions yet), end_date if not given
+        Returns:
+            [dict] - The values of each key, first_session and last_session,
+            None if the daily states do not cover the period or an error occurs
+        """
+        start_date, end_date = self._to_date(start_date), self._to_date(end_date)
+        covered_until = min(end_date, self._to_date(last_analyzed_day)) if last_analyzed_day is not None else end_date
+        missing_days = self._missing_days(user_uid, start_date, covered_until)
+        if missing_days is None:
+            return None
+        if missing_days:
+            logger.info(f"The typing baseline states of user {user_uid} do not cover {len(missing_days)} days of the period {start_date} - {covered_until} (first: {missing_days[0]})")
+            return None
+
+        rows = self.db_service.get_typing_baseline_states(user_uid, start_date, end_date)
+        if rows is None:
+            return None
+
+        states = {}
+        session_days = []
+        for row in rows:
+            state = MetricState(row['count'], row['mean'], row['m2'], QuantileSketch.from_dict(row['sketch']))
+            states[row['metric_name']] = states.get(row['metric_name'], MetricState()).merge(state)
+            if row['count'] > 0:
+                session_days.append(row['day'])
+
+        baseline = {
+            'first_session': min(session_days).isoformat() if session_days else None,
+            'last_session': max(session_days).isoformat() if session_days else None,
+        }
+        for metric_name, mean_key, std_key, median_key, mad_key in metrics:
+            state = states.get(metric_name, MetricState())
+            baseline[mean_key] = state.mean if state.count > 0 else None
+            baseline[std_key] = state.std()
+            baseline[median_key] = state.sketch.median()
+            baseline[mad_key] = state.sketch.mad()
+        return [baseline]
+
+    def _missing_days(self, user_uid: str, start_date: date, end_date: date) -> list | None:
+        """The days of the period (inclusive) that are not recorded, None if an error occurs."""
+        recorded_days = self.db_service.get_typing_baseline_days(user_uid, start_date, end_date)
+        if recorded_days is None:
+            return None
+        period = pd.date_range(start_date, end_date, freq='D').date
+        return [day for day in period if day not in recorded_days]
+
+    @staticmethod
+    def _to_date(value) -> date:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if isinstance(value, datetime):
+            return value.date()
+        return value
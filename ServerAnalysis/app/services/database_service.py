@@ -1,394 +1,794 @@
 from typing import Dict, Any, Sequence
+from datetime import date, timedelta
 
 import pytz
-from sqlalchemy import text, Row
+from sqlalchemy import text, Row, delete, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from app.local_database.models import *
 import logging
 import pandas as pd
 
+from app.config import settings
+
 from app.services.helper_service import HelperService
+from app.services.typing_timings import TIMINGS_ENCODING, TIMING_SERIES, TypingTimingsBatch, encode_timings
 
 logger = logging.getLogger(__name__)
 
 class DatabaseService:
     """Service for handling database operations."""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, partition_key: str | None = None):
+        """
+        Args:
+            db: Session - The SQLAlchemy session to use
+            partition_key: str - The partition (analysis day, user) that the reads and writes are scoped to,
+                           if None the service works on the whole local store
+        """
         self.db = db
+        self.partition_key = partition_key
 
-    def store_user(self, user_uid: str, user_email: str, app_origin: str) -> bool:
-        """Store user in database."""
+    @staticmethod
+    def build_partition_key(user_uid: str, analysis_day: date) -> str:
+        """Build the partition key of a (analysis day, user) pair."""
+        return f"{analysis_day.isoformat()}:{user_uid}"
+
+    def _partition_clause(self, model) -> list:
+        """Filter conditions that scope a query on a partitioned model to the partition of this service."""
+        if self.partition_key is None:
+            return []
+        return [model.partition_key == self.partition_key]
+
+    def register_partition(self, user_uid: str, analysis_day: date) -> bool:
+        """
+        Register (or refresh) the partition of this service, so that the TTL sweeper knows when it was last used.
+        Args:
+            user_uid: str - The user's unique identifier
+            analysis_day: date - The day that is analyzed
+        Returns:
+            True if the partition was registered, False otherwise
+        """
+        if self.partition_key is None:
+            logger.error("Cannot register a partition without a partition key.")
+            return False
         try:
-            user = User(
-                uid=user_uid,
-                email=user_email,
-                app_origin=app_origin
-            )
-            self.db.add(user)
+            partition = self.db.query(AnalysisPartition).filter(
+                AnalysisPartition.partition_key == self.partition_key
+            ).first()
+
+            if partition:
+                partition.last_used_at = datetime.utcnow()
+            else:
+                self.db.add(AnalysisPartition(
+                    partition_key=self.partition_key,
+                    user_uid=user_uid,
+                    analysis_day=analysis_day,
+                ))
             self.db.commit()
-            logger.info(f"User {user_uid} with origin {app_origin} and email {user_email} stored successfully.")
             return True
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error storing user {user_uid}: {e}")
+            logger.error(f"Error registering partition {self.partition_key}: {e}")
             return False
 
-    def check_if_user_exists(self, user_uid: str) -> bool:
-        """Check if user exists in local database."""
+    def purge_expired_partitions(self, ttl_hours: int) -> int | None:
+        """
+        Delete all the partitions (and their data) that have not been used for more than ttl_hours.
+        Args:
+            ttl_hours: int - The time to live of a partition in hours
+        Returns:
+            The number of partitions deleted, None if an error occurs
+        """
         try:
-            user = self.db.query(User).filter(User.uid == user_uid).first()
-            return user is not None
-        except Exception as e:
-            logger.error(f"Error checking if user {user_uid} exists: {e}")
-            return False
+            cutoff = datetime.utcnow() - timedelta(hours=ttl_hours)
+            expired_keys = self.db.execute(
+                select(AnalysisPartition.partition_key).where(AnalysisPartition.last_used_at < cutoff)
+            ).scalars().all()
 
-    def check_if_typing_session_exists(self, session_uid: str) -> bool:
-        """Check if typing session exists."""
-        try:
-            session = self.db.query(TypingSession).filter(
-                TypingSession.typing_session_id == session_uid
-            ).first()
-            return session is not None
-        except Exception as e:
-            logger.error(f"Error checking if typing session {session_uid}: {e}")
-            return False
+            if not expired_keys:
+                return 0
 
-    def check_if_user_has_typing_sessions(self, user_uid: str) -> bool:
-        """Check if a user has any (at least one) typing session."""
-        try:
-            sessions = self.db.query(TypingSession).filter(
-                TypingSession.user_id == user_uid
-            ).all()
-            return len(sessions) > 0
+            for model in PARTITIONED_MODELS:
+                self.db.execute(delete(model).where(model.partition_key.in_(expired_keys)))
+            self.db.execute(delete(AnalysisPartition).where(AnalysisPartition.partition_key.in_(expired_keys)))
+            self.db.commit()
+
+            logger.info(f"Purged {len(expired_keys)} expired partitions from the local database.")
+            return len(expired_keys)
         except Exception as e:
-            logger.error(f"Error checking if user {user_uid} has typing sessions: {e}")
-            return False
+            self.db.rollback()
+            logger.error(f"Error purging expired partitions: {e}")
+            return None
 
-    def store_typing_session_and_data(self, user_uid: str, session_uid: str, session_data: dict):
+    def create_analysis_run(self, run_id: str, analysis_day: date, users_total: int) -> bool:
+        """
+        Create the record of a daily analysis run, at the time it is dispatched.
+        Args:
+            run_id: str - The unique identifier of the run
+            analysis_day: date - The day that is analyzed
+            users_total: int - The number of users dispatched in the run
+        Returns:
+            True if the run was created, False otherwise
+        """
         try:
-            if self.check_if_typing_session_exists(session_uid):
-                logger.info(f"Typing session {session_uid} already exists for user {user_uid}")
-                return True
-
-            # Session not exists, create a new one
-            typing_session = TypingSession(
-                user_id=user_uid,
-                typing_session_id=session_uid
-            )
-            self.db.add(typing_session)
-            self.db.commit()
-            logger.info(f"Typing session (basic info) {session_uid} stored successfully for user {user_uid}")
-
-            # Parse dataTime
-            raw_date_created = session_data.get("dateCreated")
-            # Convert it back to the real date
-            # The dateCreate in Date format (from Java) so firebase applied UTC format.
-            # This is not something very handy to work with, so we need to convert it to the local time.
-            athens = pytz.timezone("Europe/Athens")  # We suppose the user is in Athens
-            date_created = raw_date_created.astimezone(athens)
-
-            # Parse startTime and endTime
-            start_time_obj = HelperService.parse_time_field(session_data, 'startTime', session_uid)
-            end_time_obj = HelperService.parse_time_field(session_data, 'endTime', session_uid)
-
-            typing_session_data = TypingSessionData(
-                typing_session_id=session_uid,
-                avg_pause_ctc_duration=session_data.get('avgPauseCtCDuration'),
-                avg_pause_wtw_duration=session_data.get('avgPauseWtWDuration'),
-                characters_typed=session_data.get('charactersTyped'),
-                date_created=date_created,
-                duration=session_data.get('duration'),
-                end_time=end_time_obj,
-                iki_list_size=session_data.get('ikiListSize'),
-                max_backspace_burst_count=session_data.get('maxBackspaceBurstCount'),
-                max_pause_ctc_duration=session_data.get('maxPauseCtCDuration'),
-                max_pause_wtw_duration=session_data.get('maxPauseWtWDuration'),
-                mean_iki=session_data.get('meanIKI'),
-                pause_ctc_list_size=session_data.get('pauseCtCListSize'),
-                pause_wtw_list_size=session_data.get('pauseWtWListSize'),
-                start_time=start_time_obj,
-                std_dev_iki=session_data.get('stdDevIKI'),
-                total_backspace_burst_count=session_data.get('totalBackspaceBurstCount'),
-                total_backspaces=session_data.get('totalBackspaces'),
-                total_cps=session_data.get('totalCPS'),
-                total_characters_deleted=session_data.get('totalCharactersDeleted'),
-                total_pressure_by_times_counter=session_data.get('totalPressureByTimesCounter'),
-                total_wps=session_data.get('totalWPS'),
-                total_word_or_sentence_deletions=session_data.get('totalWordOrSentenceDeletions'),
-                words_typed=session_data.get('wordsTyped')
-            )
-            self.db.add(typing_session_data)
+            self.db.add(AnalysisRun(
+                run_id=run_id,
+                analysis_day=analysis_day,
+                status="RUNNING",
+                started_at=datetime.utcnow(),
+                users_total=users_total,
+            ))
             self.db.commit()
-            logger.info(f"Typing session (analytic info) for {session_uid} stored successfully")
             return True
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error storing typing session {session_uid} for user {user_uid}: {e}")
+            logger.error(f"Error creating analysis run {run_id}: {e}")
             return False
 
-    def store_gps_event(self, user_uid: str, event_id: str, event_data: Dict[str, Any]) -> bool:
-        """Store GPS event in database."""
+    def complete_analysis_run(self, run_id: str, run_summary: Dict[str, Any]) -> dict | None:
+        """
+        Complete the record of a daily analysis run with the aggregated results of its user tasks.
+        The makespan and the throughput are computed from the time the run was dispatched.
+        Args:
+            run_id: str - The unique identifier of the run
+            run_summary: dict - The aggregated results (users_succeeded, users_failed, failures_total, stage_timings, user_results)
+        Returns:
+            The completed run as a dict, None if an error occurs
+        """
         try:
-            # First, check if the event already exists
-            existing_event = self.db.query(GPSEvent).filter(
-                GPSEvent.gps_event_id == event_id
-            ).first()
+            run = self.db.query(AnalysisRun).filter(AnalysisRun.run_id == run_id).first()
+            if run is None:
+                logger.error(f"Analysis run {run_id} not found")
+                return None
 
-            if existing_event:
-                logger.info(f"GPS event {event_id} already exists for user {user_uid}")
-                return True
-
-            event = GPSEvent(
-                gps_event_id=event_id,
-                user_uid=user_uid,
-                latitude=event_data.get('latitude'),
-                longitude=event_data.get('longitude'),
-                accuracy=event_data.get('accuracy'),
-                bearing=event_data.get('bearing'),
-                speed=event_data.get('speed'),
-                speed_accuracy_meters_per_second=event_data.get('speedAccuracyMetersPerSecond'),
-                timestamp_now=event_data.get('timestampNow').astimezone(pytz.timezone("Europe/Athens"))
+            run.finished_at = datetime.utcnow()
+            run.makespan_seconds = round((run.finished_at - run.started_at).total_seconds(), 3)
+            run.throughput_users_per_minute = (
+                round(run.users_total / run.makespan_seconds * 60, 3) if run.makespan_seconds > 0 else None
             )
-            self.db.add(event)
+            run.users_succeeded = run_summary.get('users_succeeded')
+            run.users_failed = run_summary.get('users_failed')
+            run.failures_total = run_summary.get('failures_total')
+            run.stage_timings = run_summary.get('stage_timings')
+            run.user_results = run_summary.get('user_results')
+            run.status = "COMPLETED"
             self.db.commit()
-            # logger.info(f"GPS event {event_id} stored successfully")
-            return True
+
+            return self.get_analysis_run(run_id)
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error storing GPS event {event_id}: {e}")
-            return False
+            logger.error(f"Error completing analysis run {run_id}: {e}")
+            return None
 
-    def store_sleep_event(self, user_uid: str, event_id: str, event_data: Dict[str, Any]) -> bool:
-        """Store sleep event in database."""
+    def get_analysis_run(self, run_id: str) -> dict | None:
+        """Get the record of a daily analysis run as a dict, None if it does not exist or an error occurs."""
         try:
-            # First, check if the event already exists
-            existing_event = self.db.query(SleepData).filter(
-                SleepData.sleep_event_id == event_id
-            ).first()
-            if existing_event:
-                logger.info(f"Sleep event {event_id} already exists for user {user_uid}")
-                return True
-
-            # Validate required fields
-            required_fields = ['confidence', 'light', 'motion', 'screenOnDuration', 'timestampPrevious', 'timestampNow']
-            for field in required_fields:
-                if event_data.get(field) is None:
-                    logger.error(f"Missing required field '{field}' for sleep event {event_id}")
-                    return False
-
-            event = SleepData(
-                sleep_event_id=event_id,
-                user_id=user_uid,
-                confidence=event_data.get('confidence'),
-                light=event_data.get('light'),
-                motion=event_data.get('motion'),
-                screenOnDuration=event_data.get('screenOnDuration'),
-                timestamp_previous=event_data.get('timestampPrevious').astimezone(pytz.timezone("Europe/Athens")),
-                timestamp_now=event_data.get('timestampNow').astimezone(pytz.timezone("Europe/Athens"))
-            )
-            self.db.add(event)
-            
-            # Flush to get the sleep event committed before adding apps
-            self.db.flush()
-
-            # Store the used apps during the sleep event
-            used_apps_list = event_data.get('usedApps')
-            if used_apps_list:
-                for app_name, time_used in used_apps_list.items():
-                    app_entry = AppsSleepData(
-                        sleep_id=event_id,
-                        app_name=app_name,
-                        time_used=time_used
-                    )
-                    self.db.add(app_entry)
+            run = self.db.query(AnalysisRun).filter(AnalysisRun.run_id == run_id).first()
+            if run is None:
+                return None
+
+            return {
+                'run_id': run.run_id,
+                'analysis_day': run.analysis_day.isoformat(),
+                'status': run.status,
+                'started_at': run.started_at.isoformat(),
+                'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+                'users_total': run.users_total,
+                'users_succeeded': run.users_succeeded,
+                'users_failed': run.users_failed,
+                'failures_total': run.failures_total,
+                'makespan_seconds': run.makespan_seconds,
+                'throughput_users_per_minute': run.throughput_users_per_minute,
+                'stage_timings': run.stage_timings,
+                'user_results': run.user_results,
+            }
+        except Exception as e:
+            logger.error(f"Error getting analysis run {run_id}: {e}")
+            return None
 
+    def create_range_run(self, run_id: str, start_date: date, end_date: date) -> bool:
+        """
+        Create the record of a range analysis run (backfill), at the time it is requested.
+        Args:
+            run_id: str - The unique identifier of the range run
+            start_date: date - The first day of the range
+            end_date: date - The last day of the range (inclusive)
+        Returns:
+            True if the range run was created, False otherwise
+        """
+        try:
+            self.db.add(AnalysisRangeRun(
+                run_id=run_id,
+                start_date=start_date,
+                end_date=end_date,
+                status="PENDING",
+                started_at=datetime.utcnow(),
+                users_total=0,
+                days_total=0,
+                pairs_total=0,
+                pairs_succeeded=0,
+                pairs_failed=0,
+            ))
             self.db.commit()
             return True
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error storing sleep event {event_id}: {e}")
+            logger.error(f"Error creating range run {run_id}: {e}")
             return False
 
-    def store_screen_time_event(self, user_uid: str, event_id: str, event_data: Dict[str, Any]) -> bool:
-        """Store screen time event in database."""
+    def start_range_run(self, run_id: str, users_total: int, days_total: int) -> bool:
+        """
+        Mark a range analysis run as RUNNING, at the time its (user, day) pairs are dispatched.
+        Args:
+            run_id: str - The unique identifier of the range run
+            users_total: int - The number of users of the range run
+            days_total: int - The number of days of the range
+        Returns:
+            True if the range run was updated, False otherwise
+        """
         try:
-            # First, check if the event already exists
-            existing_event = self.db.query(ScreenTimeEvent).filter(
-                ScreenTimeEvent.screen_time_event_id == event_id
-            ).first()
-
-            if existing_event:
-                logger.info(f"Screen time event {event_id} already exists for user {user_uid}")
-                return True
-
-            end_time = event_data.get('timeEnd').astimezone(pytz.timezone("Europe/Athens"))
-            start_time = event_data.get('timeStart').astimezone(pytz.timezone("Europe/Athens"))
-
-            event = ScreenTimeEvent(
-                screen_time_event_id=event_id,
-                user_uid=user_uid,
-                start_time=start_time,
-                end_time=end_time,
-                duration_ms=event_data.get('duration')
+            result = self.db.execute(
+                update(AnalysisRangeRun)
+                .where(AnalysisRangeRun.run_id == run_id)
+                .values(status="RUNNING", users_total=users_total, days_total=days_total, pairs_total=users_total * days_total)
             )
-            self.db.add(event)
             self.db.commit()
-            return True
+            return result.rowcount > 0
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error storing screen time event {event_id}: {e}")
+            logger.error(f"Error starting range run {run_id}: {e}")
             return False
 
-    def store_device_unlock_event(self, user_uid: str, event_id: str, event_data: Dict[str, Any]) -> bool:
-        """Store device unlock event in database."""
+    def fail_range_run(self, run_id: str, error: str) -> bool:
+        """Mark a range analysis run as FAILED (ex. it could not be dispatched), returns True if the range run was updated."""
         try:
-            # First, check if the event already exists
-            existing_event = self.db.query(DeviceUnlockEvent).filter(
-                DeviceUnlockEvent.device_unlock_event_id == event_id
-            ).first()
-
-            if existing_event:
-                logger.info(f"Device unlock event {event_id} already exists for user {user_uid}")
-                return True
-
-            event = DeviceUnlockEvent(
-                device_unlock_event_id=event_id,
-                user_uid=user_uid,
-                timestamp=event_data.get('timestamp').astimezone(pytz.timezone("Europe/Athens")),
+            result = self.db.execute(
+                update(AnalysisRangeRun)
+                .where(AnalysisRangeRun.run_id == run_id)
+                .values(status="FAILED", error=error, finished_at=datetime.utcnow())
             )
-            self.db.add(event)
             self.db.commit()
-            return True
+            return result.rowcount > 0
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error storing device unlock event {event_id}: {e}")
+            logger.error(f"Error failing range run {run_id}: {e}")
             return False
 
-    def store_user_activity_event(self, user_uid: str, event_id: str, event_data: Dict[str, Any]) -> bool:
-        """Store user activity event in database."""
+    def record_range_progress(self, run_id: str, success: bool) -> dict | None:
+        """
+        Count one (user, day) pair of a range analysis run as finished, the range run is COMPLETED when all its pairs are finished.
+        NOTE: The counters are incremented in the database, so the lanes of the range run can report at the same time.
+        Args:
+            run_id: str - The unique identifier of the range run
+            success: bool - True if the analysis of the (user, day) pair succeeded
+        Returns:
+            The range run as a dict, None if an error occurs
+        """
         try:
-            # First, check if the event already exists
-            existing_event = self.db.query(UserActivityEvent).filter(
-                UserActivityEvent.user_activity_event_id == event_id
-            ).first()
-
-            if existing_event:
-                logger.info(f"User activity event {event_id} already exists for user {user_uid}")
-                return True
-
-            timestamp = event_data.get('timestamp').astimezone(pytz.timezone("Europe/Athens"))
-
-            event = UserActivityEvent(
-                user_activity_event_id=event_id,
-                user_uid=user_uid,
-                timestamp=timestamp,
-                activity_type=event_data.get('activityType'),
-                confidence=event_data.get('confidence')
+            counter = AnalysisRangeRun.pairs_succeeded if success else AnalysisRangeRun.pairs_failed
+            self.db.execute(
+                update(AnalysisRangeRun)
+                .where(AnalysisRangeRun.run_id == run_id)
+                .values({counter: counter + 1})
+            )
+            self.db.execute(
+                update(AnalysisRangeRun)
+                .where(
+                    AnalysisRangeRun.run_id == run_id,
+                    AnalysisRangeRun.status == "RUNNING",
+                    AnalysisRangeRun.pairs_succeeded + AnalysisRangeRun.pairs_failed >= AnalysisRangeRun.pairs_total
+                )
+                .values(status="COMPLETED", finished_at=datetime.utcnow())
             )
-            self.db.add(event)
             self.db.commit()
-            return True
+            return self.get_range_run(run_id)
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error storing user activity event {event_id}: {e}")
-            return False
+            logger.error(f"Error recording the progress of range run {run_id}: {e}")
+            return None
 
-    def store_call_event(self, user_uid: str, event_id: str, event_data: Dict[str, Any]) -> bool:
-        """Store call event in database."""
-        # First, check if the event already exists
-        existing_event = self.db.query(CallEvent).filter(
-            CallEvent.call_event_id == event_id
-        ).first()
+    def get_range_run(self, run_id: str) -> dict | None:
+        """Get the record of a range analysis run (with its progress) as a dict, None if it does not exist or an error occurs."""
+        try:
+            run = self.db.query(AnalysisRangeRun).filter(AnalysisRangeRun.run_id == run_id).first()
+            if run is None:
+                return None
 
-        if existing_event:
-            logger.info(f"Call event {event_id} already exists for user {user_uid}")
-            return True
+            pairs_finished = run.pairs_succeeded + run.pairs_failed
+            return {
+                'run_id': run.run_id,
+                'start_date': run.start_date.isoformat(),
+                'end_date': run.end_date.isoformat(),
+                'status': run.status,
+                'error': run.error,
+                'started_at': run.started_at.isoformat(),
+                'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+                'users_total': run.users_total,
+                'days_total': run.days_total,
+                'pairs_total': run.pairs_total,
+                'pairs_succeeded': run.pairs_succeeded,
+                'pairs_failed': run.pairs_failed,
+                'progress': round(pairs_finished / run.pairs_total, 3) if run.pairs_total else 0.0,
+            }
+        except Exception as e:
+            logger.error(f"Error getting range run {run_id}: {e}")
+            return None
 
+    def store_typing_baseline_states(self, user_uid: str, day: date, states: Dict[str, Dict[str, Any]]) -> bool:
+        """
+        Store the states of the typing metrics of a user for a day, the states of a day that is analyzed again are replaced.
+        The day is recorded as analyzed (TypingBaselineDay) in the same transaction, also when it has no states (no sessions).
+        Args:
+            user_uid: str - The user's unique identifier
+            day: date - The day of the sessions
+            states: dict - metric name -> {'count', 'mean', 'm2', 'sketch'}
+        Returns:
+            bool - True if the states were stored successfully, False otherwise
+        """
         try:
-            event = CallEvent(
-                call_event_id=event_id,
-                user_uid=user_uid,
-                call_date=event_data.get('callDate').astimezone(pytz.timezone("Europe/Athens")),
-                call_type=event_data.get('callType'),
-                call_description=event_data.get('callDescription'),
-                call_duration_sec=event_data.get('callDuration')
-            )
-            self.db.add(event)
+            updated_at = datetime.utcnow()
+            if states:
+                rows = [
+                    {'user_uid': user_uid, 'metric_name': metric_name, 'day': day, 'updated_at': updated_at, **state}
+                    for metric_name, state in states.items()
+                ]
+                statement = self._insert(TypingBaselineState).values(rows)
+                statement = statement.on_conflict_do_update(
+                    index_elements=['user_uid', 'metric_name', 'day'],
+                    set_={column: statement.excluded[column] for column in ('count', 'mean', 'm2', 'sketch', 'updated_at')}
+                )
+                self.db.execute(statement)
+
+            statement = self._insert(TypingBaselineDay).values(user_uid=user_uid, day=day, updated_at=updated_at)
+            statement = statement.on_conflict_do_update(index_elements=['user_uid', 'day'], set_={'updated_at': statement.excluded.updated_at})
+            self.db.execute(statement)
             self.db.commit()
             return True
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error storing call event {event_id}: {e}")
+            logger.error(f"Error storing the typing baseline states of user {user_uid} for {day}: {e}")
             return False
 
-    def store_device_drop_event(self, user_uid: str, event_id: str, event_data: Dict[str, Any]) -> bool:
-        """Store device drop event in database."""
-        # First, check if the event already exists
-        existing_event = self.db.query(DeviceDropEvent).filter(
-            DeviceDropEvent.device_drop_event_id == event_id
-        ).first()
+    def get_typing_baseline_states(self, user_uid: str, start_day: date, end_day: date) -> list | None:
+        """Get the typing metric states of a user for the days of a period (inclusive) as dicts, None if an error occurs."""
+        try:
+            states = self.db.query(TypingBaselineState).filter(
+                TypingBaselineState.user_uid == user_uid,
+                TypingBaselineState.day >= start_day,
+                TypingBaselineState.day <= end_day
+            ).order_by(TypingBaselineState.day).all()
+            return [
+                {
+                    'metric_name': state.metric_name,
+                    'day': state.day,
+                    'count': state.count,
+                    'mean': state.mean,
+                    'm2': state.m2,
+                    'sketch': state.sketch
+                }
+                for state in states
+            ]
+        except Exception as e:
+            logger.error(f"Error getting the typing baseline states of user {user_uid}: {e}")
+            return None
 
-        if existing_event:
-            logger.info(f"Device drop event {event_id} already exists for user {user_uid}")
-            return True
+    def get_typing_baseline_days(self, user_uid: str, start_day: date, end_day: date) -> set | None:
+        """
+        Get the days of a period (inclusive) whose typing sessions of a user are in the daily states:
+        the recorded days (TypingBaselineDay) and the days with states (stored before the days were recorded).
+        Returns:
+            set - The days, None if an error occurs
+        """
+        try:
+            recorded_days = self.db.query(TypingBaselineDay.day).filter(
+                TypingBaselineDay.user_uid == user_uid,
+                TypingBaselineDay.day >= start_day,
+                TypingBaselineDay.day <= end_day
+            )
+            state_days = self.db.query(TypingBaselineState.day).filter(
+                TypingBaselineState.user_uid == user_uid,
+                TypingBaselineState.day >= start_day,
+                TypingBaselineState.day <= end_day
+            )
+            return {day for (day,) in recorded_days.union(state_days).all()}
+        except Exception as e:
+            logger.error(f"Error getting the typing baseline days of user {user_uid}: {e}")
+            return None
 
+    def store_user(self, user_uid: str, user_email: str, app_origin: str) -> bool:
+        """Store user in database."""
         try:
-            event = DeviceDropEvent(
-                device_drop_event_id=event_id,
-                user_uid=user_uid,
-                detected_fall_duration=event_data.get('detectedFallDuration'),
-                detected_magnitude=event_data.get('detectedMagnitude'),
-                timestamp=event_data.get('timestamp').astimezone(pytz.timezone("Europe/Athens"))
+            user = User(
+                uid=user_uid,
+                email=user_email,
+                app_origin=app_origin
             )
-            self.db.add(event)
+            self.db.add(user)
             self.db.commit()
+            logger.info(f"User {user_uid} with origin {app_origin} and email {user_email} stored successfully.")
             return True
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error storing device drop event {event_id}: {e}")
+            logger.error(f"Error storing user {user_uid}: {e}")
+            return False
+
+    def check_if_user_exists(self, user_uid: str) -> bool:
+        """Check if user exists in local database."""
+        try:
+            user = self.db.query(User).filter(User.uid == user_uid).first()
+            return user is not None
+        except Exception as e:
+            logger.error(f"Error checking if user {user_uid} exists: {e}")
             return False
 
-    def store_low_light_event(self, user_uid: str, event_id: str, event_data: Dict[str, Any]) -> bool:
-        """Store low light event in database."""
+    def check_if_typing_session_exists(self, session_uid: str) -> bool:
+        """Check if typing session exists."""
         try:
-            # First, check if the event already exists
-            existing_event = self.db.query(LowLightEvent).filter(
-                LowLightEvent.low_light_event_id == event_id
+            session = self.db.query(TypingSession).filter(
+                TypingSession.typing_session_id == session_uid,
+                *self._partition_clause(TypingSession)
             ).first()
+            return session is not None
+        except Exception as e:
+            logger.error(f"Error checking if typing session {session_uid}: {e}")
+            return False
 
-            if existing_event:
-                logger.info(f"Low light event {event_id} already exists for user {user_uid}")
-                return True
-
-            event = LowLightEvent(
-                low_light_event_id=event_id,
-                user_uid=user_uid,
-                start_time=event_data.get('startTime').astimezone(pytz.timezone("Europe/Athens")),
-                end_time= event_data.get('endTime').astimezone(pytz.timezone("Europe/Athens")),
-                duration_ms=event_data.get('duration'),
-                low_light_threshold_used=event_data.get('lowLightThreshold'),
-            )
-            self.db.add(event)
-            self.db.commit()
-            return True
+    def check_if_user_has_typing_sessions(self, user_uid: str) -> bool:
+        """Check if a user has any (at least one) typing session."""
+        try:
+            sessions = self.db.query(TypingSession).filter(
+                TypingSession.user_id == user_uid,
+                *self._partition_clause(TypingSession)
+            ).all()
+            return len(sessions) > 0
         except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error storing low light event {event_id}: {e}")
+            logger.error(f"Error checking if user {user_uid} has typing sessions: {e}")
             return False
 
+    def store_typing_session_and_data(self, user_uid: str, session_uid: str, session_data: dict):
+        """Store a typing session (see bulk_store_typing_sessions), True if it is stored or it already exists."""
+        stored_session_uids, _ = self.bulk_store_typing_sessions(user_uid, [{**session_data, 'session_uid': session_uid}])
+        return session_uid in stored_session_uids
+
+    def bulk_store_typing_sessions(self, user_uid: str, sessions: list[Dict[str, Any]]) -> tuple[list, int]:
+        """
+        Store the typing sessions of a user (TypingSession, TypingSessionData and the raw timings if enabled) with
+        multi-row INSERT ... ON CONFLICT statements, one transaction for each batch of LOCAL_BULK_INSERT_BATCH_SIZE sessions
+        (instead of an existence check and two commits per session).
+        The sessions that already exist in the partition are kept, their data is updated (an interrupted ingestion is repaired).
+        Args:
+            user_uid: str - The unique identifier of the user
+            sessions: list[dict] - The typing sessions from Firebase, with their session_uid
+        Returns:
+            (list, int) - The sessions that are stored (new or existing), and the number of sessions that failed to be stored
+        """
+        failures = sum(1 for session in sessions if not session.get('session_uid'))
+        sessions = [session for session in sessions if session.get('session_uid')]
+        start_times = HelperService.parse_time_fields(sessions, 'startTime')
+        end_times = HelperService.parse_time_fields(sessions, 'endTime')
+        # The dateCreate in Date format (from Java) so firebase applied UTC format.
+        # This is not something very handy to work with, so we need to convert it to the local time.
+        athens = pytz.timezone("Europe/Athens")  # We suppose the user is in Athens
+
+        rows = {}
+        for session_data, start_time, end_time in zip(sessions, start_times, end_times):
+            session_uid = session_data['session_uid']
+            try:
+                data_row = self._typing_session_data_row(session_data, start_time, end_time, athens)
+            except Exception as e:
+                logger.error(f"Invalid typing session {session_uid} for user {user_uid}: {e}")
+                failures += 1
+                continue
+            if data_row is None:
+                failures += 1
+                continue
+            data_row['partition_key'] = self.partition_key
+            data_row['typing_session_id'] = session_uid
+            timings_row = self._typing_session_timings_row(session_data) if settings.TYPING_RAW_TIMINGS_ENABLED else None
+            if timings_row is not None:
+                timings_row['partition_key'] = self.partition_key
+                timings_row['typing_session_id'] = session_uid
+            rows[session_uid] = (data_row, timings_row)
+
+        stored_session_uids = []
+        session_uids = list(rows)
+        batch_size = settings.LOCAL_BULK_INSERT_BATCH_SIZE
+        for batch_start in range(0, len(session_uids), batch_size):
+            batch = session_uids[batch_start:batch_start + batch_size]
+            try:
+                self.db.execute(self._insert(TypingSession).values([
+                    {'partition_key': self.partition_key, 'user_id': user_uid, 'typing_session_id': session_uid}
+                    for session_uid in batch
+                ]).on_conflict_do_nothing(index_elements=['partition_key', 'typing_session_id']))
+                self._upsert_typing_session_rows(TypingSessionData, [rows[session_uid][0] for session_uid in batch])
+                timings_rows = [rows[session_uid][1] for session_uid in batch if rows[session_uid][1] is not None]
+                if timings_rows:
+                    self._upsert_typing_session_rows(TypingSessionTimings, timings_rows)
+                self.db.commit()
+                stored_session_uids.extend(batch)
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"Error storing a batch of {len(batch)} typing sessions for user {user_uid}: {e}")
+                failures += len(batch)
+
+        logger.info(f"Stored {len(stored_session_uids)} typing sessions for user {user_uid} ({failures} failed)")
+        return stored_session_uids, failures
+
+    def _upsert_typing_session_rows(self, model, rows: list):
+        """INSERT ... ON CONFLICT DO UPDATE of rows of a model keyed by (partition_key, typing_session_id)."""
+        statement = self._insert(model).values(rows)
+        updated_columns = {
+            column: statement.excluded[column]
+            for column in rows[0] if column not in ('partition_key', 'typing_session_id')
+        }
+        self.db.execute(statement.on_conflict_do_update(
+            index_elements=['partition_key', 'typing_session_id'],
+            set_=updated_columns
+        ))
+
+    @staticmethod
+    def _typing_session_data_row(session_data: Dict[str, Any], start_time, end_time, tz) -> dict | None:
+        """The TypingSessionData row of a typing session document, None if a required field is missing."""
+        row = {
+            'avg_pause_ctc_duration': session_data.get('avgPauseCtCDuration'),
+            'avg_pause_wtw_duration': session_data.get('avgPauseWtWDuration'),
+            'characters_typed': session_data.get('charactersTyped'),
+            'date_created': session_data.get('dateCreated').astimezone(tz),
+            'duration': session_data.get('duration'),
+            'end_time': end_time,
+            'iki_list_size': session_data.get('ikiListSize'),
+            'max_backspace_burst_count': session_data.get('maxBackspaceBurstCount'),
+            'max_pause_ctc_duration': session_data.get('maxPauseCtCDuration'),
+            'max_pause_wtw_duration': session_data.get('maxPauseWtWDuration'),
+            'mean_iki': session_data.get('meanIKI'),
+            'pause_ctc_list_size': session_data.get('pauseCtCListSize'),
+            'pause_wtw_list_size': session_data.get('pauseWtWListSize'),
+            'start_time': start_time,
+            'std_dev_iki': session_data.get('stdDevIKI'),
+            'total_backspace_burst_count': session_data.get('totalBackspaceBurstCount'),
+            'total_backspaces': session_data.get('totalBackspaces'),
+            'total_cps': session_data.get('totalCPS'),
+            'total_characters_deleted': session_data.get('totalCharactersDeleted'),
+            'total_pressure_by_times_counter': session_data.get('totalPressureByTimesCounter'),
+            'total_wps': session_data.get('totalWPS'),
+            'total_word_or_sentence_deletions': session_data.get('totalWordOrSentenceDeletions'),
+            'words_typed': session_data.get('wordsTyped')
+        }
+        missing_fields = [field for field, value in row.items() if value is None]
+        if missing_fields:
+            logger.error(f"Missing required fields {missing_fields} for typing session {session_data.get('session_uid')}")
+            return None
+        return row
+
+    @staticmethod
+    def _typing_session_timings_row(session_data: Dict[str, Any]) -> dict | None:
+        """
+        Encode the raw timing arrays of a typing session document (ikiList, pauseCtCList and pauseWtWList, durations in seconds).
+        Returns:
+            dict - The TypingSessionTimings row of the session, None if the document has none of the arrays
+        """
+        if not any(session_data.get(field) is not None for field in TIMING_SERIES):
+            return None
+        row = {'encoding': TIMINGS_ENCODING}
+        for field, series_name in TIMING_SERIES.items():
+            values = session_data.get(field) or []
+            row[f'{series_name}_count'] = len(values)
+            row[f'{series_name}_deltas'] = encode_timings(values)
+        return row
+
+    def get_typing_session_timings(self, session_uids: list | None = None) -> TypingTimingsBatch | None:
+        """
+        Load the raw timing arrays of typing sessions, decoded in bulk (see TypingTimingsBatch).
+        Args:
+            session_uids: list | None - The sessions to load, all the sessions of the partition if None
+        Returns:
+            TypingTimingsBatch - The timings of the sessions that have them, None if an error occurs
+        """
+        try:
+            query = self.db.query(TypingSessionTimings).filter(*self._partition_clause(TypingSessionTimings))
+            if session_uids is not None:
+                query = query.filter(TypingSessionTimings.typing_session_id.in_(session_uids))
+            rows = query.order_by(TypingSessionTimings.id).all()
+
+            unknown_encodings = {row.encoding for row in rows} - {TIMINGS_ENCODING}
+            if unknown_encodings:
+                logger.error(f"Unknown encodings of typing session timings: {unknown_encodings}")
+                return None
+            return TypingTimingsBatch.from_rows(rows)
+        except Exception as e:
+            logger.error(f"Error getting typing session timings: {e}")
+            return None
+
+    def bulk_store_events(self, kind: str, user_uid: str, events: list[Dict[str, Any]]) -> int:
+        """
+        Store the events of a LogMyself collection in database with multi-row INSERT ... ON CONFLICT DO NOTHING,
+        one transaction for each batch of LOCAL_BULK_INSERT_BATCH_SIZE events (instead of one query and commit per event).
+        The events that already exist in the partition are skipped.
+        Args:
+            kind: str - The collection of the events (ex. gps_events, sleep_events), one of BULK_EVENT_KINDS
+            user_uid: str - The unique identifier of the user
+            events: list[dict] - The events from Firebase, with their event_id
+        Returns:
+            The number of events that failed to be stored (invalid events and events of failed batches)
+        """
+        model, event_id_column, build_row = self._bulk_event_kinds()[kind]
+        tz = pytz.timezone("Europe/Athens")
+
+        failures = 0
+        rows = {}
+        used_apps = {}
+        for event_data in events:
+            event_id = event_data.get('event_id')
+            if not event_id:
+                continue
+            try:
+                row = build_row(user_uid, event_data, tz)
+            except Exception as e:
+                logger.error(f"Invalid {kind} event {event_id} for user {user_uid}: {e}")
+                failures += 1
+                continue
+            if row is None:
+                failures += 1
+                continue
+
+            row[event_id_column] = event_id
+            row['partition_key'] = self.partition_key
+            rows[event_id] = row
+            if kind == 'sleep_events' and event_data.get('usedApps'):
+                used_apps[event_id] = event_data.get('usedApps')
+
+        batch_rows = list(rows.values())
+        batch_size = settings.LOCAL_BULK_INSERT_BATCH_SIZE
+        for batch_start in range(0, len(batch_rows), batch_size):
+            batch = batch_rows[batch_start:batch_start + batch_size]
+            try:
+                statement = self._insert(model).values(batch).on_conflict_do_nothing(
+                    index_elements=['partition_key', event_id_column]
+                )
+
+                if kind == 'sleep_events':
+                    # Store the used apps only for the sleep events that were inserted now
+                    inserted_ids = self.db.execute(statement.returning(model.sleep_event_id)).scalars().all()
+                    app_rows = [
+                        {'partition_key': self.partition_key, 'sleep_id': sleep_id, 'app_name': app_name, 'time_used': time_used}
+                        for sleep_id in inserted_ids
+                        for app_name, time_used in used_apps.get(sleep_id, {}).items()
+                    ]
+                    if app_rows:
+                        self.db.execute(self._insert(AppsSleepData).values(app_rows))
+                else:
+                    self.db.execute(statement)
+
+                self.db.commit()
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"Error storing a batch of {len(batch)} {kind} for user {user_uid}: {e}")
+                failures += len(batch)
+
+        logger.info(f"Stored {len(batch_rows)} {kind} for user {user_uid} ({failures} failed)")
+        return failures
+
+    def _insert(self, model):
+        """The INSERT statement of the database dialect, it supports ON CONFLICT DO NOTHING (Postgres or sqlite)."""
+        if self.db.get_bind().dialect.name == "sqlite":
+            return sqlite_insert(model)
+        return postgresql_insert(model)
+
+    def _bulk_event_kinds(self) -> dict:
+        """The model, event id column and row builder of each kind of event that can be stored with bulk_store_events."""
+        return {
+            'gps_events': (GPSEvent, 'gps_event_id', self._gps_event_row),
+            'sleep_events': (SleepData, 'sleep_event_id', self._sleep_event_row),
+            'screen_time_events': (ScreenTimeEvent, 'screen_time_event_id', self._screen_time_event_row),
+            'device_unlock_events': (DeviceUnlockEvent, 'device_unlock_event_id', self._device_unlock_event_row),
+            'user_activities_events': (UserActivityEvent, 'user_activity_event_id', self._user_activity_event_row),
+            'call_events': (CallEvent, 'call_event_id', self._call_event_row),
+            'device_drop_events': (DeviceDropEvent, 'device_drop_event_id', self._device_drop_event_row),
+            'low_light_events': (LowLightEvent, 'low_light_event_id', self._low_light_event_row),
+        }
+
+    @staticmethod
+    def _gps_event_row(user_uid: str, event_data: Dict[str, Any], tz) -> dict:
+        return {
+            'user_uid': user_uid,
+            'latitude': event_data.get('latitude'),
+            'longitude': event_data.get('longitude'),
+            'accuracy': event_data.get('accuracy'),
+            'bearing': event_data.get('bearing'),
+            'speed': event_data.get('speed'),
+            'speed_accuracy_meters_per_second': event_data.get('speedAccuracyMetersPerSecond'),
+            'timestamp_now': event_data.get('timestampNow').astimezone(tz),
+        }
+
+    @staticmethod
+    def _sleep_event_row(user_uid: str, event_data: Dict[str, Any], tz) -> dict | None:
+        # Validate required fields
+        required_fields = ['confidence', 'light', 'motion', 'screenOnDuration', 'timestampPrevious', 'timestampNow']
+        for field in required_fields:
+            if event_data.get(field) is None:
+                logger.error(f"Missing required field '{field}' for sleep event {event_data.get('event_id')}")
+                return None
+
+        return {
+            'user_id': user_uid,
+            'confidence': event_data.get('confidence'),
+            'light': event_data.get('light'),
+            'motion': event_data.get('motion'),
+            'screenOnDuration': event_data.get('screenOnDuration'),
+            'timestamp_previous': event_data.get('timestampPrevious').astimezone(tz),
+            'timestamp_now': event_data.get('timestampNow').astimezone(tz),
+        }
+
+    @staticmethod
+    def _screen_time_event_row(user_uid: str, event_data: Dict[str, Any], tz) -> dict:
+        return {
+            'user_uid': user_uid,
+            'start_time': event_data.get('timeStart').astimezone(tz),
+            'end_time': event_data.get('timeEnd').astimezone(tz),
+            'duration_ms': event_data.get('duration'),
+        }
+
+    @staticmethod
+    def _device_unlock_event_row(user_uid: str, event_data: Dict[str, Any], tz) -> dict:
+        return {
+            'user_uid': user_uid,
+            'timestamp': event_data.get('timestamp').astimezone(tz),
+        }
+
+    @staticmethod
+    def _user_activity_event_row(user_uid: str, event_data: Dict[str, Any], tz) -> dict:
+        return {
+            'user_uid': user_uid,
+            'timestamp': event_data.get('timestamp').astimezone(tz),
+            'activity_type': event_data.get('activityType'),
+            'confidence': event_data.get('confidence'),
+        }
+
+    @staticmethod
+    def _call_event_row(user_uid: str, event_data: Dict[str, Any], tz) -> dict:
+        return {
+            'user_uid': user_uid,
+            'call_date': event_data.get('callDate').astimezone(tz),
+            'call_type': event_data.get('callType'),
+            'call_description': event_data.get('callDescription'),
+            'call_duration_sec': event_data.get('callDuration'),
+        }
+
+    @staticmethod
+    def _device_drop_event_row(user_uid: str, event_data: Dict[str, Any], tz) -> dict:
+        return {
+            'user_uid': user_uid,
+            'detected_fall_duration': event_data.get('detectedFallDuration'),
+            'detected_magnitude': event_data.get('detectedMagnitude'),
+            'timestamp': event_data.get('timestamp').astimezone(tz),
+        }
+
+    @staticmethod
+    def _low_light_event_row(user_uid: str, event_data: Dict[str, Any], tz) -> dict:
+        return {
+            'user_uid': user_uid,
+            'start_time': event_data.get('startTime').astimezone(tz),
+            'end_time': event_data.get('endTime').astimezone(tz),
+            'duration_ms': event_data.get('duration'),
+            'low_light_threshold_used': event_data.get('lowLightThreshold'),
+        }
+
     def get_typing_sessions_of_a_user(self, user_uid: str, start_datetime: datetime, end_datetime: datetime) -> Sequence[Row[tuple[Any, ...] | Any]] | list[Any]:
         """Get typing sessions of a user after a specific date."""
         try:
             query = text("""
                 SELECT * FROM typing_session_data AS tsd
                 JOIN typing_sessions AS ts ON tsd.typing_session_id = ts.typing_session_id
+                    AND tsd.partition_key IS NOT DISTINCT FROM ts.partition_key
                 JOIN users AS usr ON ts.user_id = usr.uid
                 WHERE usr.uid = :user_id
                 AND tsd.date_created >= :start_datetime
                 AND tsd.date_created <= :end_datetime
+                AND (CAST(:partition_key AS VARCHAR) IS NULL OR ts.partition_key = :partition_key)
             """)
-            sessions = self.db.execute(query, {"user_id": user_uid, "start_datetime": start_datetime, "end_datetime": end_datetime}).fetchall()
+            sessions = self.db.execute(query, {"user_id": user_uid, "start_datetime": start_datetime, "end_datetime": end_datetime, "partition_key": self.partition_key}).fetchall()
             return sessions
         except Exception as e:
             logger.error(f"Error getting typing sessions for user {user_uid}: {e}")
@@ -408,7 +808,8 @@ class DatabaseService:
             sleep_events = self.db.query(SleepData).filter(
                 SleepData.user_id == user_uid,
                 SleepData.timestamp_now >= start_datetime,
-                SleepData.timestamp_now <= end_datetime
+                SleepData.timestamp_now <= end_datetime,
+                *self._partition_clause(SleepData)
             ).all()
             
             if not sleep_events:
@@ -448,7 +849,8 @@ class DatabaseService:
             screen_time_events = self.db.query(ScreenTimeEvent).filter(
                 ScreenTimeEvent.user_uid == user_uid,
                 ScreenTimeEvent.start_time >= start_datetime,
-                ScreenTimeEvent.end_time <= end_datetime
+                ScreenTimeEvent.end_time <= end_datetime,
+                *self._partition_clause(ScreenTimeEvent)
             ).all()
             if not screen_time_events:
                 return None
@@ -483,7 +885,8 @@ class DatabaseService:
             low_light_events = self.db.query(LowLightEvent).filter(
                 LowLightEvent.user_uid == user_uid,
                 LowLightEvent.start_time >= start_datetime,
-                LowLightEvent.end_time <= end_datetime
+                LowLightEvent.end_time <= end_datetime,
+                *self._partition_clause(LowLightEvent)
             ).all()
             return low_light_events
         except Exception as e:
@@ -503,7 +906,8 @@ class DatabaseService:
             device_drop_events = self.db.query(DeviceDropEvent).filter(
                 DeviceDropEvent.user_uid == user_uid,
                 DeviceDropEvent.timestamp >= start_datetime,
-                DeviceDropEvent.timestamp <= end_datetime
+                DeviceDropEvent.timestamp <= end_datetime,
+                *self._partition_clause(DeviceDropEvent)
             ).all()
             return device_drop_events
         except Exception as e:
@@ -526,11 +930,13 @@ class DatabaseService:
             select_query = text("""
                 select at.* from apps_table as at
                 JOIN sleep_data as sd on sd.sleep_event_id = at.sleep_id
+                    and sd.partition_key is not distinct from at.partition_key
                 where sd.timestamp_previous >= :start_datetime
                     and sd.timestamp_now <= :end_datetime
                     and sd.user_id = :user_id
+                    and (cast(:partition_key as varchar) is null or sd.partition_key = :partition_key)
             """)
-            app_usage = self.db.execute(select_query, {"user_id": user_uid, "start_datetime": start_datetime, "end_datetime": end_datetime}).fetchall()
+            app_usage = self.db.execute(select_query, {"user_id": user_uid, "start_datetime": start_datetime, "end_datetime": end_datetime, "partition_key": self.partition_key}).fetchall()
             return app_usage
         except Exception as e:
             logger.error(f"Error getting app usage for user {user_uid}: {e}")
@@ -549,7 +955,8 @@ class DatabaseService:
             activity_data = self.db.query(UserActivityEvent).filter(
                 UserActivityEvent.user_uid == user_uid,
                 UserActivityEvent.timestamp >= start_datetime,
-                UserActivityEvent.timestamp <= end_datetime
+                UserActivityEvent.timestamp <= end_datetime,
+                *self._partition_clause(UserActivityEvent)
             ).all()
 
             return activity_data
@@ -570,7 +977,8 @@ class DatabaseService:
             call_data = self.db.query(CallEvent).filter(
                 CallEvent.user_uid == user_uid,
                 CallEvent.call_date >= start_datetime,
-                CallEvent.call_date <= end_datetime
+                CallEvent.call_date <= end_datetime,
+                *self._partition_clause(CallEvent)
             ).all()
             return call_data
         except Exception as e:
@@ -590,7 +998,8 @@ class DatabaseService:
             gps_data = self.db.query(GPSEvent).filter(
                 GPSEvent.user_uid == user_uid,
                 GPSEvent.timestamp_now >= start_datetime,  # Changed from timestamp to timestamp_now
-                GPSEvent.timestamp_now <= end_datetime     # Changed from timestamp to timestamp_now
+                GPSEvent.timestamp_now <= end_datetime,     # Changed from timestamp to timestamp_now
+                *self._partition_clause(GPSEvent)
             ).all()
             return gps_data
         except Exception as e:
@@ -610,7 +1019,8 @@ class DatabaseService:
             device_unlock_events = self.db.query(DeviceUnlockEvent).filter(
                 DeviceUnlockEvent.user_uid == user_uid,
                 DeviceUnlockEvent.timestamp >= start_datetime,
-                DeviceUnlockEvent.timestamp <= end_datetime
+                DeviceUnlockEvent.timestamp <= end_datetime,
+                *self._partition_clause(DeviceUnlockEvent)
             ).all()
             return device_unlock_events
         except Exception as e:
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Any, List
+
+from firebase_admin import credentials
+from google.auth.credentials import AnonymousCredentials
+from google.cloud.firestore_v1 import AsyncClient, FieldFilter
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# The queries of the LogMyself collections, the same ones of the FirebaseService.fetch_* methods:
+# (collection, start field, end field, end extended to the next day at 17:59, minimum events setting)
+LOGMYSELF_COLLECTION_QUERIES = {
+    'gps_events': ('gps_events', 'timestampNow', 'timestampNow', False, 'MINIMUM_GPS_EVENTS'),
+    'sleep_events': ('sleep_events', 'timestampNow', 'timestampNow', True, 'MINIMUM_SLEEP_EVENTS'),
+    'screen_time_events': ('screen_time_events', 'timeStart', 'timeEnd', True, 'MINIMUM_SCREEN_TIME_EVENTS'),
+    'device_unlock_events': ('device_unlocks_events', 'timestamp', 'timestamp', True, 'MINIMUM_DEVICE_UNLOCK_EVENTS'),
+    'user_activities_events': ('user_activities_events', 'timestamp', 'timestamp', True, 'MINIMUM_USER_ACTIVITY_EVENTS'),
+    'call_events': ('call_events', 'callDate', 'callDate', True, 'MINIMUM_CALL_EVENTS'),
+    'device_drop_events': ('drop_events', 'timestamp', 'timestamp', False, 'MINIMUM_DEVICE_DROP_EVENTS'),
+    'low_light_events': ('low_light_events', 'startTime', 'endTime', False, 'MINIMUM_LOW_LIGHTS_EVENTS'),
+}
+
+class AsyncFirebaseService:
+    """
+    Async Firestore client of LogMyself, the events are streamed page by page so that the caller can
+    store a page while the next one is fetched, instead of holding the whole result in memory.
+    NOTE: The async client is bound to the event loop that uses it, so create the service inside the
+    coroutine and close it at the end (async with AsyncFirebaseService() as firebase: ...).
+    """
+
+    def __init__(self, page_size: int | None = None):
+        self.page_size = page_size or settings.FIREBASE_PAGE_SIZE
+        self.db_logMyself = self._create_logmyself_client()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @staticmethod
+    def _create_logmyself_client() -> AsyncClient:
+        """Create the async client of LogMyself, on the emulator if USE_FIREBASE_EMULATOR is set (like FirebaseService)."""
+        if settings.USE_FIREBASE_EMULATOR:
+            client = AsyncClient(project="YOUR-LOCAL-EMULATOR-PROJECT-ID", credentials=AnonymousCredentials())
+            client._emulator_host = f"{settings.FIREBASE_EMULATOR_HOST}:{settings.FIREBASE_EMULATOR_PORT}"
+            logger.info("LogMyself async Firebase emulator client initialized")
+            return client
+
+        cred_logMyself = credentials.Certificate(settings.FIREBASE_LOGMYSELF_CREDENTIALS_PATH)
+        client = AsyncClient(project=cred_logMyself.project_id, credentials=cred_logMyself.get_credential())
+        logger.info("LogMyself async Firebase client initialized")
+        return client
+
+    async def close(self):
+        """Close the gRPC channel of the client (it is created on the first query)."""
+        try:
+            firestore_api = self.db_logMyself._firestore_api_internal
+            if firestore_api is not None:
+                await firestore_api.transport.close()
+        except Exception as e:
+            logger.error(f"Error closing the LogMyself async Firebase client: {e}")
+
+    async def stream_logmyself_events(self, collection_key: str, user_uid: str, start_dt: datetime, end_dt: datetime) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Stream the events of a LogMyself collection of a user, one page (list of event dicts) at a time.
+        The next page is requested before the current one is yielded, so the network overlaps with the caller.
+        Nothing is yielded if the collection has no more events than its minimum (ex. MINIMUM_GPS_EVENTS).
+        Args:
+            collection_key: str - The key of the collection in LOGMYSELF_COLLECTION_QUERIES (ex. gps_events)
+            user_uid: str - The unique identifier of the user
+            start_dt: datetime - The start of the analysis window
+            end_dt: datetime - The end of the analysis window
+        Yields:
+            The events of each page, with their event_id
+        """
+        collection, start_field, end_field, extend_end, minimum_setting = LOGMYSELF_COLLECTION_QUERIES[collection_key]
+        minimum_events = getattr(settings, minimum_setting)
+
+        if extend_end:
+            # Extend end time to include next day until 17:59
+            end_dt = (end_dt + timedelta(days=1)).replace(hour=17, minute=59, second=59, microsecond=999999)
+
+        query = self.db_logMyself.collection(f'users/{user_uid}/{collection}') \
+            .where(filter=FieldFilter(start_field, ">=", start_dt)) \
+            .where(filter=FieldFilter(end_field, "<=", end_dt)) \
+            .order_by(start_field) \
+            .limit(self.page_size)
+
+        # The events are held back until there are more than the minimum, then they are yielded page by page
+        held_events = []
+        total_events = 0
+        next_page = asyncio.ensure_future(self._fetch_page(query, None))
+        try:
+            while next_page is not None:
+                snapshots = await next_page
+                next_page = asyncio.ensure_future(self._fetch_page(query, snapshots[-1])) if len(snapshots) == self.page_size else None
+
+                events = []
+                for snapshot in snapshots:
+                    event_data = snapshot.to_dict()
+                    event_data['event_id'] = snapshot.id
+                    events.append(event_data)
+                total_events += len(events)
+
+                if total_events <= minimum_events:
+                    held_events.extend(events)
+                    continue
+
+                if held_events:
+                    events = held_events + events
+                    held_events = []
+                if events:
+                    yield events
+        finally:
+            if next_page is not None and not next_page.done():
+                next_page.cancel()
+
+        if total_events <= minimum_events:
+            logger.info(f"User {user_uid} has less than {minimum_events} {collection_key.replace('_', ' ')}")
+        else:
+            logger.info(f"Streamed {total_events} {collection_key.replace('_', ' ')} for user {user_uid}")
+
+    @staticmethod
+    async def _fetch_page(query, last_snapshot) -> list:
+        """Fetch the page of a query after the last snapshot of the previous page."""
+        if last_snapshot is not None:
+            query = query.start_after(last_snapshot)
+        return [snapshot async for snapshot in query.stream()]
@@ -4,19 +4,39 @@ import firebase_admin
 from app.config import settings
 from datetime import datetime
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from google.cloud.firestore_v1 import FieldFilter
 from typing import List, Tuple, Dict, Any
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class LogMyselfEvents:
+    """The events of a LogMyself user for an analysis window, one list of event dicts for each collection."""
+    gps_events: List[Dict[str, Any]] = field(default_factory=list)
+    sleep_events: List[Dict[str, Any]] = field(default_factory=list)
+    screen_time_events: List[Dict[str, Any]] = field(default_factory=list)
+    device_unlock_events: List[Dict[str, Any]] = field(default_factory=list)
+    user_activities_events: List[Dict[str, Any]] = field(default_factory=list)
+    call_events: List[Dict[str, Any]] = field(default_factory=list)
+    device_drop_events: List[Dict[str, Any]] = field(default_factory=list)
+    low_light_events: List[Dict[str, Any]] = field(default_factory=list)
+
 class FirebaseService:
     _instance = None
 
     def __new__(cls):
-        if cls._instance is None:
+        # One instance per process, a forked worker process must not reuse the gRPC channels of its parent
+        if cls._instance is None or cls._instance._pid != os.getpid():
             cls._instance = super(FirebaseService, cls).__new__(cls)
+            cls._instance._pid = os.getpid()
             cls._instance.db_logBoard = None
             cls._instance.db_logMyself = None
+            cls._instance._fetch_executor = None
+            cls._instance._fetch_executor_lock = threading.Lock()
             cls._instance._initialize_firebase()
         return cls._instance
 
@@ -106,11 +126,12 @@ class FirebaseService:
             return []
 
     def fetch_typing_sessions(self, user_uid: str, start_dt: datetime, end_dt: datetime):
+        """The typing sessions of the window, [] if there are too few to analyze and None if they failed to be fetched."""
         sessions = []
         try:
             if self.db_logBoard is None:
                 logger.error("Firebase client not initialized. Skipping typing sessions fetch operation.")
-                return []
+                return None
 
             sessions_ref = self.db_logBoard.collection(f'users/{user_uid}/typing_session_data')
             query = sessions_ref.where(filter=FieldFilter("dateCreated", ">=", start_dt)).where(filter=FieldFilter("dateCreated", "<=", end_dt))
@@ -129,7 +150,55 @@ class FirebaseService:
             return sessions
         except Exception as e:
             logger.error(f"Error fetching typing sessions: {e}")
-            return []
+            return None
+
+    def fetch_all_logmyself_events(self, user_uid: str, start_dt: datetime, end_dt: datetime) -> LogMyselfEvents:
+        """
+        Fetch the events of all the LogMyself collections of a user at the same time.
+        The queries run on a thread pool shared by the process (FIREBASE_FETCH_MAX_WORKERS threads), so the latency is
+        about the one of the slowest collection and the number of concurrent Firestore queries of a worker is bounded.
+        Args:
+            user_uid: str - The unique identifier of the user
+            start_dt: datetime - The start of the analysis window
+            end_dt: datetime - The end of the analysis window
+        Returns:
+            The events of each collection, a collection that failed to be fetched has no events
+        """
+        fetchers = {
+            'gps_events': self.fetch_gps_events,
+            'sleep_events': self.fetch_sleep_events,
+            'screen_time_events': self.fetch_screen_time_events,
+            'device_unlock_events': self.fetch_device_unlock_events,
+            'user_activities_events': self.fetch_user_activities_events,
+            'call_events': self.fetch_call_events,
+            'device_drop_events': self.fetch_device_drop_events,
+            'low_light_events': self.fetch_low_light_events,
+        }
+
+        executor = self._get_fetch_executor()
+        futures = {name: executor.submit(fetcher, user_uid, start_dt, end_dt) for name, fetcher in fetchers.items()}
+
+        events = {}
+        for name, future in futures.items():
+            try:
+                events[name] = future.result()
+            except Exception as e:
+                # The fetch methods handle their errors, this is only for errors of the executor
+                logger.error(f"Error fetching {name} for user {user_uid}: {e}")
+                events[name] = []
+
+        return LogMyselfEvents(**events)
+
+    def _get_fetch_executor(self) -> ThreadPoolExecutor:
+        """Get the thread pool of the concurrent Firestore queries, it is created on first use."""
+        if self._fetch_executor is None:
+            with self._fetch_executor_lock:
+                if self._fetch_executor is None:
+                    self._fetch_executor = ThreadPoolExecutor(
+                        max_workers=settings.FIREBASE_FETCH_MAX_WORKERS,
+                        thread_name_prefix="firestore-fetch"
+                    )
+        return self._fetch_executor
 
     def fetch_gps_events(self, user_uid: str, start_dt: datetime, end_dt: datetime) -> List[Dict[str, Any]]:
         """Fetch GPS events for a user from LogMyself."""
@@ -0,0 +1,49 @@
+import logging
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyproj
+from pyproj.enums import TransformDirection
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=32)
+def _utm_transformer(zone_number: int, south: bool) -> pyproj.Transformer:
+    """
+    The lat/lon (WGS84) -> UTM transformer of a zone, created once per zone and hemisphere in a process.
+    (Creating the transformer is most of the cost of projecting the points of a small day.)
+    """
+    utm = pyproj.CRS.from_dict({'proj': 'utm', 'zone': zone_number, 'ellps': 'WGS84', 'south': south})
+    return pyproj.Transformer.from_crs(pyproj.CRS.from_epsg(4326), utm, always_xy=True)
+
+class GPSGeometry:
+    """
+    The GPS points of a day projected to meters (the UTM zone of their mean longitude), computed once per analysis
+    and shared by the metric-space steps of the GPS analysis (convex hull, SDE and the gravimetric compactness).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        Args:
+            df: DataFrame with the GPS data (latitude, longitude)
+        """
+        self.latitudes = df['latitude'].to_numpy(dtype=float)
+        self.longitudes = df['longitude'].to_numpy(dtype=float)
+
+        # The UTM zone of the mean longitude, in the hemisphere of the mean latitude
+        self.zone_number = int((self.longitudes.mean() + 180) / 6) + 1 if len(df) else 1
+        self.south = bool(self.latitudes.mean() < 0) if len(df) else False
+        self._transformer = _utm_transformer(self.zone_number, self.south)
+
+        self.xs, self.ys = self._transformer.transform(self.longitudes, self.latitudes)
+        self.xs, self.ys = np.asarray(self.xs, dtype=float), np.asarray(self.ys, dtype=float)
+        self.coords = np.column_stack((self.xs, self.ys))
+
+    def __len__(self):
+        return len(self.xs)
+
+    def to_lat_lon(self, x: float, y: float) -> tuple[float, float]:
+        """The latitude and longitude of a projected point (ex. the center of the SDE)."""
+        lon, lat = self._transformer.transform(x, y, direction=TransformDirection.INVERSE)
+        return lat, lon
@@ -0,0 +1,117 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from haversine import haversine_vector, Unit
+
+logger = logging.getLogger(__name__)
+
+class GPSRouteSegments:
+    """
+    Run-length segmentation of a GPS route (the GPS points with their belonging_key_loc, sorted by time):
+        - visits: the runs of consecutive points at the same key location (same belonging_key_loc and coordinates),
+          the points that do not belong to a key location between them are skipped
+        - transitions: the runs of consecutive points that do not belong to a key location
+    The runs are found once with diff/cumsum over the columns and each segment is a row of a columnar frame,
+    so the key-location steps of the GPS analysis (fix of the wrong key locations, visits info, transitions info)
+    do not walk the route point by point.
+    """
+
+    VISIT_COLUMNS = [
+        'belonging_key_loc', 'start_position', 'end_position', 'start_time', 'end_time',
+        'time_spent_seconds', 'num_of_gps_events', 'latitude', 'longitude', 'key_loc_type',
+    ]
+
+    TRANSITION_COLUMNS = [
+        'key_loc_start_id', 'key_loc_end_id', 'transition_cluster_start_time', 'transition_cluster_end_time',
+        'trans_cluster_start_latitude', 'trans_cluster_start_longitude', 'trans_cluster_end_latitude', 'trans_cluster_end_longitude',
+        'time_spent_seconds', 'total_distance_km', 'num_of_gps_events',
+    ]
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        Args:
+            df: DataFrame with the GPS data (latitude, longitude, timestamp_now, belonging_key_loc and type)
+        """
+        self.route = df.sort_values(by='timestamp_now')
+        self.key_locs = self.route['belonging_key_loc'].to_numpy(dtype=float)
+        self.latitudes = self.route['latitude'].to_numpy(dtype=float)
+        self.longitudes = self.route['longitude'].to_numpy(dtype=float)
+        self.timestamps = pd.to_datetime(self.route['timestamp_now']).reset_index(drop=True)
+        # Seconds from the first point, the durations are rounded to milliseconds
+        self.seconds = (self.timestamps - self.timestamps.iloc[0]).dt.total_seconds().to_numpy() if len(self.route) else np.empty(0)
+
+        # The visit of each point of the route, -1 for the points that do not belong to a key location
+        self.visit_ids = np.full(len(self.route), -1)
+        self.visits = self._segment_visits()
+        self.transitions = self._segment_transitions()
+
+    def _segment_visits(self) -> pd.DataFrame:
+        positions = np.flatnonzero(~np.isnan(self.key_locs))
+        # A visit starts at the first point of a key location and where the key location or the coordinates change
+        starts_visit = np.ones(len(positions), dtype=bool)
+        starts_visit[1:] = (
+            (np.diff(self.key_locs[positions]) != 0)
+            | (np.diff(self.latitudes[positions]) != 0)
+            | (np.diff(self.longitudes[positions]) != 0)
+        )
+        self.visit_ids[positions] = np.cumsum(starts_visit) - 1
+
+        first_points = np.flatnonzero(starts_visit)
+        last_points = np.append(first_points[1:], len(positions))[:len(first_points)] - 1
+        start_positions = positions[first_points]
+        end_positions = positions[last_points]
+        return pd.DataFrame({
+            'belonging_key_loc': self.key_locs[start_positions],
+            'start_position': start_positions,
+            'end_position': end_positions,
+            'start_time': self.timestamps.iloc[start_positions].reset_index(drop=True),
+            'end_time': self.timestamps.iloc[end_positions].reset_index(drop=True),
+            'time_spent_seconds': np.round(self.seconds[end_positions] - self.seconds[start_positions], 3),
+            'num_of_gps_events': last_points - first_points + 1,
+            'latitude': self.latitudes[start_positions],
+            'longitude': self.longitudes[start_positions],
+            'key_loc_type': self.route['type'].to_numpy()[start_positions] if 'type' in self.route else None,
+        }, columns=self.VISIT_COLUMNS)
+
+    def _segment_transitions(self) -> pd.DataFrame:
+        n_points = len(self.route)
+        outside = np.isnan(self.key_locs)
+        edges = np.diff(np.concatenate([[0], outside.astype(np.int8), [0]]))
+        start_positions = np.flatnonzero(edges == 1)
+        end_positions = np.flatnonzero(edges == -1) - 1
+
+        # The key location before the transition (the first point of the route takes the last one, like iloc[-1]),
+        # and the key location after it (the last transition of the route takes the point before its last point)
+        key_loc_start_ids = self.key_locs[start_positions - 1] if n_points else np.empty(0)
+        after_end = np.minimum(end_positions + 1, n_points - 1)
+        key_loc_end_ids = np.where(end_positions + 1 < n_points, self.key_locs[after_end], self.key_locs[end_positions - 1]) if n_points else np.empty(0)
+
+        # The length of each transition: the distances between its consecutive points, summed in order
+        total_distance_km = np.zeros(len(start_positions))
+        if n_points > 1 and len(start_positions):
+            inside_transition = outside[:-1] & outside[1:]
+            transition_of_point = np.cumsum(edges[:-1] == 1) - 1
+            steps = np.flatnonzero(inside_transition)
+            if len(steps):
+                coords = np.column_stack([self.latitudes, self.longitudes])
+                step_distances = haversine_vector(coords[steps], coords[steps + 1], Unit.KILOMETERS)
+                total_distance_km = np.bincount(transition_of_point[steps], weights=step_distances, minlength=len(start_positions))
+
+        return pd.DataFrame({
+            'key_loc_start_id': key_loc_start_ids,
+            'key_loc_end_id': key_loc_end_ids,
+            'transition_cluster_start_time': self.timestamps.iloc[start_positions].reset_index(drop=True),
+            'transition_cluster_end_time': self.timestamps.iloc[end_positions].reset_index(drop=True),
+            'trans_cluster_start_latitude': self.latitudes[start_positions],
+            'trans_cluster_start_longitude': self.longitudes[start_positions],
+            'trans_cluster_end_latitude': self.latitudes[end_positions],
+            'trans_cluster_end_longitude': self.longitudes[end_positions],
+            'time_spent_seconds': np.round(self.seconds[end_positions] - self.seconds[start_positions], 3),
+            'total_distance_km': total_distance_km,
+            'num_of_gps_events': end_positions - start_positions + 1,
+        }, columns=self.TRANSITION_COLUMNS)
+
+    def points_of_visits(self, visit_ids) -> np.ndarray:
+        """The positions in the route of the points of some visits."""
+        return np.flatnonzero(np.isin(self.visit_ids, visit_ids))
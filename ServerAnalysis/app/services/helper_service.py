@@ -1,4 +1,7 @@
-from datetime import time
+from datetime import time, timedelta
+
+import numpy as np
+import pandas as pd
 
 class HelperService:
     """Helper service for parsing and formatting data."""
@@ -33,4 +36,105 @@ class HelperService:
             )
         except (TypeError, ValueError) as e:
             print(f"\033[93mWarning: Could not parse {field_name} for session {session_id}: {e}\033[0m")
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def parse_time_fields(sessions_data: list, field_name: str) -> list:
+        """Vectorized parse_time_field for many sessions: the components are parsed and validated as arrays.
+
+        Args:
+            sessions_data: List of the session data dictionaries (with their session_uid)
+            field_name: Name of the field containing time data
+
+        Returns:
+            List of datetime.time objects (None for the sessions where parsing fails), in the order of sessions_data
+        """
+        components = ('hour', 'minute', 'second', 'nano')
+        raw = np.full((len(sessions_data), len(components)), np.nan)
+        for i, session_data in enumerate(sessions_data):
+            time_data = session_data.get(field_name) if session_data else None
+            if not time_data:
+                continue
+            try:
+                raw[i] = [float(time_data.get(component, 0)) for component in components]
+            except (AttributeError, TypeError, ValueError):
+                pass  # Stays NaN, it is reported below
+
+        hours, minutes, seconds, nanos = raw.T
+        valid = (
+            ~np.isnan(raw).any(axis=1)
+            & (hours >= 0) & (hours < 24)
+            & (minutes >= 0) & (minutes < 60)
+            & (seconds >= 0) & (seconds < 60)
+            & (nanos >= 0) & (nanos < 1e9)
+        )
+        invalid_sessions = [(sessions_data[i] or {}).get('session_uid') for i in np.flatnonzero(~valid)]
+        if invalid_sessions:
+            print(f"\033[93mWarning: Could not parse {field_name} for sessions {invalid_sessions}\033[0m")
+
+        # Truncate like int(), the invalid rows are zeroed so that the conversion is defined
+        parsed = np.where(valid[:, None], raw, 0).astype(np.int64)
+        parsed[:, 3] //= 1000  # Convert nano to micro
+        return [
+            time(hour=h, minute=m, second=s, microsecond=us) if ok else None
+            for (h, m, s, us), ok in zip(parsed.tolist(), valid.tolist())
+        ]
+
+    @staticmethod
+    def to_json_value(value):
+        """Convert a computed result (ex. a LogMyself category result) to values that the JSON task serializer accepts.
+
+        The numpy values become Python values, the pandas timestamps become datetimes (the serializer keeps the datetimes)
+        and the DataFrames and timedeltas are tagged, so that from_json_value can restore them.
+
+        Args:
+            value: The result (dicts, lists, tuples, numpy/pandas values, DataFrames)
+
+        Returns:
+            The result with plain Python values
+        """
+        if isinstance(value, dict):
+            return {key: HelperService.to_json_value(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [HelperService.to_json_value(item) for item in value]
+        if isinstance(value, pd.DataFrame):
+            split = value.to_dict(orient='split')
+            return {'__dataframe__': {
+                'index': HelperService.to_json_value(split['index']),
+                'columns': HelperService.to_json_value(split['columns']),
+                'data': HelperService.to_json_value(split['data']),
+            }}
+        if isinstance(value, pd.Series):
+            return HelperService.to_json_value(value.to_dict())
+        if isinstance(value, np.ndarray):
+            return HelperService.to_json_value(value.tolist())
+        if value is pd.NaT:
+            return None
+        if isinstance(value, pd.Timestamp):
+            return value.to_pydatetime()
+        if isinstance(value, (timedelta, np.timedelta64)):
+            return {'__timedelta__': pd.Timedelta(value).total_seconds()}
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    @staticmethod
+    def from_json_value(value):
+        """Restore the DataFrames and timedeltas of a result converted with to_json_value.
+
+        Args:
+            value: The converted result (after the JSON task serializer)
+
+        Returns:
+            The result with its DataFrames and timedeltas
+        """
+        if isinstance(value, list):
+            return [HelperService.from_json_value(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if value.keys() == {'__dataframe__'}:
+            split = HelperService.from_json_value(value['__dataframe__'])
+            return pd.DataFrame(split['data'], index=split['index'], columns=split['columns'])
+        if value.keys() == {'__timedelta__'}:
+            return timedelta(seconds=value['__timedelta__'])
+        return {key: HelperService.from_json_value(item) for key, item in value.items()}
@@ -1,12 +1,14 @@
-from app.services.firebase_service import FirebaseService
-from app.services.supabase_service import SupabaseService
 from app.services.analysis_service import AnalysisService
 from app.services.database_service import DatabaseService
-from app.local_database.connection import drop_tables, create_tables
-from datetime import datetime
+from app.services.service_container import get_service_container
+from app.local_database.connection import create_tables
+from datetime import datetime, timedelta
+from celery import chain, chord, group
+from app.config import settings
 from app.core import tasks as core_tasks
 import logging
 import pytz
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -14,29 +16,28 @@ class OrchestrationService:
     """Main orchestration service that coordinates all analysis operations."""
 
     def __init__(self, db_service: DatabaseService):
-        self.firebase_service = FirebaseService()
-        self.supabase_service = SupabaseService()
+        # The Firebase and Supabase clients are shared by the whole process
+        services = get_service_container()
+        self.firebase_service = services.firebase_service
+        self.supabase_service = services.supabase_service
         self.db_service = db_service
 
     def run_daily_analysis(self, date_analysis: str):
-        # Before starting the analysis, ensure the local database is cleaned up and recreated
-        logger.info("Cleaning up and recreating local database before starting daily analysis...")
+        # Before starting the analysis, ensure the local database tables exist.
+        # NOTE: The tables are not dropped anymore, each analysis task writes and reads only its own
+        # partition (analysis day, user), old partitions are purged by the sweeper task.
         try:
-            drop_tables()
             create_tables()
-            logger.info("Local database cleaned up and recreated successfully.")
         except Exception as e:
-            logger.error(f"Failed to clean up and recreate local database before starting daily analysis: {e}")
-            return {"success": False, "error": f"Failed to clean up and recreate local database before starting daily analysis: {e}"}
+            logger.error(f"Failed to create the local database tables before starting daily analysis: {e}")
+            return {"success": False, "error": f"Failed to create the local database tables before starting daily analysis: {e}"}
 
         # Convert the date string to a datetime object
-        try:
-            athens_tz = pytz.timezone("Europe/Athens")
-            analysis_start_datetime = athens_tz.localize(datetime.strptime(f"{date_analysis} 00:00:00", "%Y-%m-%d %H:%M:%S"))
-            analysis_end_datetime = athens_tz.localize(datetime.strptime(f"{date_analysis} 23:59:59", "%Y-%m-%d %H:%M:%S"))
-        except ValueError:
+        analysis_window = self._analysis_window(date_analysis)
+        if analysis_window is None:
             print("\033[91mInvalid date format. Please provide a date in YYYY-MM-DD format.\033[0m")
             return {"success": False, "error": "Cannot convert date string to datetime object. Please provide a date in YYYY-MM-DD format."}
+        analysis_start_datetime, analysis_end_datetime = analysis_window
 
         logger.info(f"Running daily analysis for {date_analysis}: with start time {analysis_start_datetime} and end time {analysis_end_datetime}")
 
@@ -47,6 +48,142 @@ class OrchestrationService:
             return {"success": False, "error": "No users found in the system."}
 
         # Store users in local database and send them to Supabase
+        self._store_users(users)
+
+        logger.info(f"\033[94m\n\nFinished storing users for daily analysis on {date_analysis} at local database and Supabase.\033[0m")
+
+        # Process each user with Celery workers, all the user tasks form a chord whose callback
+        # aggregates their results into the run record (status, timings, failures, makespan and throughput)
+        run_id = uuid.uuid4().hex
+        if not self.db_service.create_analysis_run(run_id, analysis_start_datetime.date(), len(users)):
+            return {"success": False, "error": f"Failed to create the record of the daily run for {date_analysis}."}
+
+        # Each user is analyzed by a workflow of stage tasks (ingest on the 'io' queue, analysis on the 'cpu' queue, publish on the 'io' queue)
+        user_tasks = group(
+            core_tasks.user_analysis_tasks.build_user_analysis_workflow(
+                user_uid,
+                app_origin,
+                user_email,
+                analysis_start_datetime.isoformat(),  # Convert to ISO string for serialization
+                analysis_end_datetime.isoformat()     # Convert to ISO string for serialization
+            )
+            for user_uid, app_origin, user_email in users
+        )
+
+        results = []
+        try:
+            run_job = chord(user_tasks)(core_tasks.user_analysis_tasks.finalize_daily_analysis_run.s(run_id))
+            logger.info(f"Dispatched daily run {run_id} with {len(users)} user tasks, callback job ID: {run_job.id}")
+
+            user_jobs = run_job.parent.results if run_job.parent is not None else []
+            for (user_uid, _, _), job in zip(users, user_jobs):
+                results.append({
+                    "user_uid": user_uid,
+                    "success": True,
+                    "job_id": job.id
+                })
+        except Exception as e:
+            logger.error(f"Error dispatching daily run {run_id}: {e}")
+            return {"success": False, "error": f"Error dispatching daily run {run_id}: {e}", "run_id": run_id}
+
+        logger.info(f"\033[94m\n\nFinished dispatching daily analysis for {date_analysis}.\033[0m")
+        return {
+            'success': True,
+            'message': f"Daily analysis for {date_analysis} dispatched successfully.",
+            'run_id': run_id,
+            'run_job_id': run_job.id,
+            'results': results
+        }
+
+    def run_range_analysis(self, run_id: str, start_date: str, end_date: str, users: list[str] | None = None):
+        """
+        Run the analysis of a range of days (backfill) for all the users, or only for the given users.
+        The (user, day) pairs are split in at most RANGE_ANALYSIS_CONCURRENCY lanes, each lane is a Celery chain
+        that analyzes its users one after the other and the days of each user in order (the baselines of a day
+        depend on the previous days). Every finished (user, day) pair updates the progress of the range run.
+
+        Args:
+            run_id: str - The unique identifier of the range run (its record is created when the backfill is requested)
+            start_date: str - The first day of the range in YYYY-MM-DD format
+            end_date: str - The last day of the range (inclusive) in YYYY-MM-DD format
+            users: list[str] | None - The uids of the users to analyze, None for all the users
+
+        Returns:
+            dict: Result of the dispatch (number of users, days and lanes)
+        """
+        try:
+            create_tables()
+        except Exception as e:
+            logger.error(f"Failed to create the local database tables before starting range analysis: {e}")
+            self.db_service.fail_range_run(run_id, f"Failed to create the local database tables: {e}")
+            return {"success": False, "error": f"Failed to create the local database tables before starting range analysis: {e}"}
+
+        analysis_days = self._analysis_days(start_date, end_date)
+        if not analysis_days:
+            self.db_service.fail_range_run(run_id, "Invalid date range")
+            return {"success": False, "error": "Invalid date range. Please provide dates in YYYY-MM-DD format with start_date <= end_date."}
+
+        # Fetch and store users
+        all_users = self.firebase_service.fetch_users() or []
+        if users is not None:
+            requested_users = set(users)
+            selected_users = [user for user in all_users if user[0] in requested_users]
+            unknown_users = requested_users - {user_uid for user_uid, _, _ in selected_users}
+            if unknown_users:
+                logger.warning(f"Skipping unknown users in range analysis {run_id}: {sorted(unknown_users)}")
+        else:
+            selected_users = all_users
+
+        if not selected_users:
+            logger.error("No users found")
+            self.db_service.fail_range_run(run_id, "No users found")
+            return {"success": False, "error": "No users found in the system."}
+
+        self._store_users(selected_users)
+
+        # Split the users in lanes, the number of lanes bounds the (user, day) pairs that are analyzed at the same time
+        lanes_count = max(1, min(settings.RANGE_ANALYSIS_CONCURRENCY, len(selected_users)))
+        lanes = [selected_users[lane::lanes_count] for lane in range(lanes_count)]
+
+        lane_workflows = []
+        for lane_users in lanes:
+            lane_tasks = []
+            for user_uid, app_origin, user_email in lane_users:
+                for analysis_start_datetime, analysis_end_datetime in analysis_days:
+                    lane_tasks.append(core_tasks.user_analysis_tasks.build_user_analysis_workflow(
+                        user_uid,
+                        app_origin,
+                        user_email,
+                        analysis_start_datetime.isoformat(),
+                        analysis_end_datetime.isoformat()
+                    ))
+                    lane_tasks.append(core_tasks.user_analysis_tasks.record_range_progress.s(run_id))
+            lane_workflows.append(chain(*lane_tasks))
+
+        if not self.db_service.start_range_run(run_id, len(selected_users), len(analysis_days)):
+            return {"success": False, "error": f"Failed to start the record of range run {run_id}."}
+
+        try:
+            lane_jobs = [lane_workflow.apply_async() for lane_workflow in lane_workflows]
+        except Exception as e:
+            logger.error(f"Error dispatching range run {run_id}: {e}")
+            self.db_service.fail_range_run(run_id, f"Error dispatching range run: {e}")
+            return {"success": False, "error": f"Error dispatching range run {run_id}: {e}", "run_id": run_id}
+
+        logger.info(f"\033[94m\n\nDispatched range analysis {run_id} from {start_date} to {end_date}: "
+                    f"{len(selected_users)} users, {len(analysis_days)} days, {lanes_count} lanes.\033[0m")
+        return {
+            'success': True,
+            'message': f"Range analysis from {start_date} to {end_date} dispatched successfully.",
+            'run_id': run_id,
+            'users_total': len(selected_users),
+            'days_total': len(analysis_days),
+            'lanes': lanes_count,
+            'lane_job_ids': [lane_job.id for lane_job in lane_jobs],
+        }
+
+    def _store_users(self, users: list):
+        """Store the users that do not exist in the local database and send them to Supabase."""
         for user_uid, app_origin, user_email in users:
             logger.info(f"\n\nStoring user {user_uid} with app origin {app_origin} and email {user_email} in local database and Supabase")
 
@@ -63,39 +200,32 @@ class OrchestrationService:
                 else:
                     logger.error(f"Failed to store user {user_uid} in local database")
 
-        logger.info(f"\033[94m\n\nFinished storing users for daily analysis on {date_analysis} at local database and Supabase.\033[0m")
-
-        # Process each user with Celery workers
-        results = []
-        for user_uid, app_origin, user_email in users:
-            try: 
-                # Dispatch Celery task for each user (datetime objects need to be serialized to ISO strings)
-                job = core_tasks.user_analysis_tasks.analyze_user_data.delay(
-                    user_uid, 
-                    app_origin, 
-                    user_email, 
-                    analysis_start_datetime.isoformat(),  # Convert to ISO string for serialization
-                    analysis_end_datetime.isoformat()     # Convert to ISO string for serialization
-                )
-                
-                logger.info(f"Dispatched Celery task for user {user_uid} with job ID: {job.id}")
-                
-                results.append({
-                    "user_uid": user_uid,
-                    "success": True,
-                    "job_id": job.id
-                })
-            except Exception as e:
-                logger.error(f"Error dispatching task for user {user_uid}: {e}")
-                results.append({
-                    "user_uid": user_uid,
-                    "success": False,
-                    "error": str(e),
-                    "job_id": None
-                })
+    @staticmethod
+    def _analysis_window(date_analysis: str):
+        """Get the start and end datetime (Europe/Athens) of a day in YYYY-MM-DD format, None if the date is invalid."""
+        try:
+            athens_tz = pytz.timezone("Europe/Athens")
+            analysis_start_datetime = athens_tz.localize(datetime.strptime(f"{date_analysis} 00:00:00", "%Y-%m-%d %H:%M:%S"))
+            analysis_end_datetime = athens_tz.localize(datetime.strptime(f"{date_analysis} 23:59:59", "%Y-%m-%d %H:%M:%S"))
+        except ValueError:
+            return None
+        return analysis_start_datetime, analysis_end_datetime
 
-        logger.info(f"\033[94m\n\nFinished running daily analysis for {date_analysis}.\033[0m")
-        return {'success': True, 'message': f"Daily analysis for {date_analysis} completed successfully.", 'results': results}
+    @classmethod
+    def _analysis_days(cls, start_date: str, end_date: str) -> list:
+        """Get the start and end datetime of each day of a range (in order), empty list if the range is invalid."""
+        try:
+            first_day = datetime.strptime(start_date, "%Y-%m-%d").date()
+            last_day = datetime.strptime(end_date, "%Y-%m-%d").date()
+        except ValueError:
+            return []
+
+        analysis_days = []
+        day = first_day
+        while day <= last_day:
+            analysis_days.append(cls._analysis_window(day.isoformat()))
+            day += timedelta(days=1)
+        return analysis_days
 
     # NOTE: The code bellow is the old code that was used to process user data without using Celery workers.
     # def _process_user_data(self, user_uid: str, app_origin: str, user_email: str, analysis_start_datetime: datetime, analysis_end_datetime: datetime):
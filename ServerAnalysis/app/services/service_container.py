@@ -0,0 +1,73 @@
+import logging
+import os
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, Session
+
+from app.config import settings
+from app.services.firebase_service import FirebaseService
+from app.services.supabase_service import SupabaseService
+
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """
+    The long-lived services of a process (Celery worker process or API), created once and reused by every task:
+        - the Firebase clients (gRPC channels) and the Supabase client (HTTP session), so that the
+          connection setup and the TLS handshakes are not repeated for each user task
+        - a SQLAlchemy engine (connection pool) of the process, a forked worker must not reuse the
+          connections of the parent process
+    The services are thread safe, so the container is shared by the threads of a threads worker.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.engine = create_engine(
+            settings.DATABASE_URL,
+            pool_pre_ping=True,
+            pool_size=settings.WORKER_DB_POOL_SIZE,
+            max_overflow=settings.WORKER_DB_MAX_OVERFLOW,
+        )
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.firebase_service = FirebaseService()
+        self.supabase_service = SupabaseService()
+        logger.info(f"Service container initialized for process {self.pid}")
+
+    def session(self) -> Session:
+        """Get a new database session from the connection pool of the process, the caller must close it."""
+        return self.SessionLocal()
+
+    def close(self):
+        """Close the connections of the process."""
+        self.engine.dispose()
+        logger.info(f"Service container closed for process {self.pid}")
+
+_container: ServiceContainer | None = None
+_container_lock = threading.Lock()
+
+def init_service_container() -> ServiceContainer:
+    """
+    Initialize the service container of the current process, called on worker_process_init for the prefork workers.
+    A container inherited from the parent process (fork) is replaced, without closing the connections of the parent.
+    """
+    global _container
+    with _container_lock:
+        if _container is None or _container.pid != os.getpid():
+            _container = ServiceContainer()
+        return _container
+
+def get_service_container() -> ServiceContainer:
+    """Get the service container of the current process, it is initialized on first use (ex. threads/solo workers and the API)."""
+    container = _container
+    if container is not None and container.pid == os.getpid():
+        return container
+    return init_service_container()
+
+def close_service_container():
+    """Close the service container of the current process, called on worker_process_shutdown."""
+    global _container
+    with _container_lock:
+        if _container is not None and _container.pid == os.getpid():
+            _container.close()
+        _container = None
@@ -2,12 +2,17 @@ from app.config import settings
 import logging
 from supabase import create_client
 from datetime import date, datetime
+from app.services.baseline_cache import get_baseline_cache
 
 logger = logging.getLogger(__name__)
 
 class SupabaseService:
 
     def __init__(self):
+        # Tables that have no unique constraint on the on_conflict field of send_data_batch
+        self._tables_without_unique_constraint = set()
+        # Set if the get_latest_baselines function is not deployed in Supabase
+        self._latest_baselines_rpc_missing = False
         self._initialize_supabase()
 
     def _initialize_supabase(self):
@@ -69,27 +74,169 @@ class SupabaseService:
                 logger.error(f"Error sending data to Supabase: {e}")
                 return False
 
-    def get_user_baseline_metric_values(self, user_uid, metric_name):
-        """Get the latest baseline values for a user and a specific metric."""
+    def send_data_batch(self, table_name: str, rows: list, on_conflict: str | None = None, chunk_size: int | None = None) -> list | None:
+        """
+        Batched version of send_data, one request for each chunk of rows instead of a select and an insert for each row.
+        Args:
+            table_name: str - The Supabase table
+            rows: list[dict] - The rows to insert (all of them with the same fields)
+            on_conflict: str | None - The unique field of the rows, the rows that already exist are skipped (like send_data).
+                If the table has no unique constraint on this field, the existing rows of each chunk are found with a select.
+            chunk_size: int | None - The rows of each request (default SUPABASE_BATCH_CHUNK_SIZE)
+        Returns:
+            The ids of the inserted rows in the order of the rows (None for the skipped rows), None if an error occurs
+        """
+        chunk_size = chunk_size or settings.SUPABASE_BATCH_CHUNK_SIZE
+        ids = []
         try:
-            select_str = "id, baseline_median, baseline_mad, Users(user_uid)"
-            response = self.client.table('Baseline_Metrics') \
-                .select(select_str) \
-                .eq("user_uid", user_uid) \
-                .eq("metric_name", metric_name) \
-                .order('date_created', desc=True) \
-                .limit(1) \
-                .execute()
-            data = response.data
-            if data:
-                baseline_data = data[0]
-                return baseline_data
-            else:
-                logger.info(f"No baseline metric values found for user {user_uid} and metric {metric_name}.")
+            for chunk_start in range(0, len(rows), chunk_size):
+                chunk = rows[chunk_start:chunk_start + chunk_size]
+                ids.extend(self._send_chunk(table_name, chunk, on_conflict))
+            return ids
+        except Exception as e:
+            logger.error(f"Error sending a batch of {len(rows)} rows to {table_name} in Supabase: {e}")
+            return None
+
+    def _send_chunk(self, table_name: str, chunk: list, on_conflict: str | None) -> list:
+        """Send a chunk of rows of send_data_batch, returns the ids of the rows (None for the skipped rows)."""
+        if on_conflict is None:
+            try:
+                inserted = self.client.table(table_name).insert(chunk).execute().data
+                return [row.get('id') for row in inserted]
+            except Exception as e:
+                if '23505' not in str(e):  # 23505 is the code for duplicate key constraint violation
+                    raise
+                # A row of the chunk already exists, send the rows one by one to skip only the duplicates
+                logger.warning(f"Duplicate rows in a chunk of {table_name}, sending its rows one by one")
+                return [self._send_row(table_name, row) for row in chunk]
+
+        if table_name not in self._tables_without_unique_constraint:
+            try:
+                inserted = self.client.table(table_name) \
+                    .upsert(chunk, on_conflict=on_conflict, ignore_duplicates=True) \
+                    .execute().data
+                return self._ids_by_unique_field(chunk, inserted, on_conflict)
+            except Exception as e:
+                if '42P10' not in str(e):  # 42P10 is the code for no unique constraint matching the ON CONFLICT
+                    raise
+                logger.warning(f"No unique constraint on {table_name}.{on_conflict}, checking the existing rows before inserting")
+                self._tables_without_unique_constraint.add(table_name)
+
+        # The values are sent in the URL of the select, so they are checked in small groups
+        values = list({row[on_conflict] for row in chunk})
+        existing_values = set()
+        for values_start in range(0, len(values), 100):
+            existing = self.client.table(table_name) \
+                .select(on_conflict) \
+                .in_(on_conflict, values[values_start:values_start + 100]) \
+                .execute().data
+            existing_values.update(row[on_conflict] for row in existing)
+
+        new_rows = []
+        seen_values = set(existing_values)
+        for row in chunk:
+            if row[on_conflict] not in seen_values:
+                seen_values.add(row[on_conflict])
+                new_rows.append(row)
+        if existing_values:
+            logger.warning(f"{len(chunk) - len(new_rows)} records already exist in {table_name}, skipping them")
+        if not new_rows:
+            return [None] * len(chunk)
+
+        inserted = self._send_chunk(table_name, new_rows, None)
+        inserted_ids = {id(row): row_id for row, row_id in zip(new_rows, inserted)}
+        return [inserted_ids.get(id(row)) for row in chunk]
+
+    def _send_row(self, table_name: str, row: dict):
+        """Insert one row, returns its id, or None if it already exists (23505)."""
+        try:
+            inserted = self.client.table(table_name).insert(row).execute().data
+            return inserted[0].get('id') if inserted else None
+        except Exception as e:
+            if '23505' in str(e):
+                logger.warning(f"Record already exists in {table_name}, skipping insertion (duplicate key constraint)")
                 return None
+            raise
+
+    @staticmethod
+    def _ids_by_unique_field(chunk: list, inserted: list, unique_field: str) -> list:
+        """Map the inserted rows of an upsert back to the rows of the chunk, by their unique field."""
+        inserted_ids = {row[unique_field]: row.get('id') for row in inserted}
+        ids = []
+        for row in chunk:
+            # Only the first row with a value is inserted, the next ones with the same value are skipped
+            ids.append(inserted_ids.pop(row[unique_field], None))
+        return ids
+
+    def _insert_rows(self, table_name: str, rows: list, write_buffer=None):
+        """Insert rows with one request, or add them to the write buffer of the task (SupabaseWriteBuffer) if given."""
+        if write_buffer is not None:
+            return [write_buffer.add(table_name, row) for row in rows]
+        if not rows:
+            return []
+        inserted = self.client.table(table_name).insert(rows).execute().data
+        return [row.get('id') for row in inserted]
+
+    def get_latest_baselines(self, user_uid: str, metric_names: list) -> dict:
+        """
+        Get the latest baseline values of a user for several metrics in one request.
+        The latest row of each metric is selected with the get_latest_baselines RPC (DISTINCT ON, see db_schema.sql),
+        if the function is not deployed the rows of the metrics are read with one query and the latest ones are kept.
+        The records are cached (see BaselineCache), only the metrics that are not cached are requested.
+        Args:
+            user_uid: str - The user's unique identifier
+            metric_names: list - The names of the metrics (ex. SLEEP_TIME)
+        Returns:
+            dict - metric name -> the latest baseline record of the metric (id, baseline_median, baseline_mad), None if there is none
+        """
+        baselines = dict.fromkeys(metric_names)
+        try:
+            baseline_cache = get_baseline_cache()
+            metrics_to_fetch = list(metric_names)
+            if baseline_cache is not None:
+                # The version is read before the query, so that the rows are not cached if new baselines are saved meanwhile
+                cache_version = baseline_cache.get_version(user_uid)
+                cached, metrics_to_fetch = baseline_cache.get_many(user_uid, metric_names, version=cache_version)
+                baselines.update(cached)
+                if not metrics_to_fetch:
+                    return baselines
+
+            if not self._latest_baselines_rpc_missing:
+                try:
+                    rows = self.client.rpc('get_latest_baselines', {
+                        "input_user_uid_param": user_uid,
+                        "metric_names_param": metrics_to_fetch
+                    }).execute().data
+                except Exception as e:
+                    if 'PGRST202' not in str(e):  # PGRST202 is the code for a function that does not exist
+                        raise
+                    logger.warning("The get_latest_baselines function does not exist in Supabase, selecting the baselines with a query")
+                    self._latest_baselines_rpc_missing = True
+
+            if self._latest_baselines_rpc_missing:
+                rows = self.client.table('Baseline_Metrics') \
+                    .select("id, metric_name, baseline_median, baseline_mad, date_created") \
+                    .eq("user_uid", user_uid) \
+                    .in_("metric_name", metrics_to_fetch) \
+                    .order('date_created', desc=True) \
+                    .order('id', desc=True) \
+                    .execute().data
+
+            for row in rows or []:
+                # The rows are ordered from the latest, so the first row of each metric is kept
+                if baselines.get(row['metric_name']) is None:
+                    baselines[row['metric_name']] = row
+
+            if baseline_cache is not None:
+                baseline_cache.set_many(user_uid, {metric_name: baselines[metric_name] for metric_name in metrics_to_fetch}, version=cache_version)
+
+            missing_metrics = [metric_name for metric_name, baseline in baselines.items() if baseline is None]
+            if missing_metrics:
+                logger.info(f"No baseline metric values found for user {user_uid} and metrics {missing_metrics}.")
+            return baselines
         except Exception as e:
             logger.error(f"Error fetching baseline metric values for user {user_uid}: {e}")
-            return None
+            return dict.fromkeys(metric_names)
 
     def _get_baseline_metrics_rpc_function(self, user_uid: str, sess_end_date: datetime, current_date_time: datetime):
         try:
@@ -129,40 +276,39 @@ class SupabaseService:
                 None,
                 payload
             )
+
+        # The cached baselines of the user are not the latest anymore
+        baseline_cache = get_baseline_cache()
+        if baseline_cache is not None:
+            baseline_cache.invalidate_user(user_uid)
         
-    def get_z_scores_of_a_typing_session(self, session_uid: str):
-        """""
-        Get the z-scores for a typing session
+    def get_z_scores_of_typing_sessions(self, session_uids: list, metric_tables: list) -> dict | None:
+        """
+        Get the z-scores of many typing sessions, with one request per metric table for each group of sessions.
         Args:
-            session_uid: str - The unique identifier of the typing session
+            session_uids: list - The unique identifiers of the typing sessions
+            metric_tables: list - The metric tables (ex. Effort_To_Output_Ratio_Data)
         Returns:
-            dict - The z-scores for the typing session (ex. {"Effort_To_Output_Ratio_Data": 0.5, "Typing_Rhythm_Stability_Data": 0.5, "Cognitive_Processing_Index_Data": 0.5, "Pause_To_Production_Ratio_Data": 0.5, "Correction_Efficiency_Data": 0.5, "Net_Production_Rate_Data": 0.5, "Cognitive_Processing_Efficiency_Data": 0.5, "Pressure_Intensity_Data": 0.5})
+            dict - metric table -> {session_uid: z-score} (the sessions without a z-score are missing), None if an error occurs
         """
         try:
-            logger.info(f"Retrieving z-scores for session {session_uid}...")
-            metrics = [
-                "Effort_To_Output_Ratio_Data",
-                "Typing_Rhythm_Stability_Data",
-                "Cognitive_Processing_Index_Data",
-                "Pause_To_Production_Ratio_Data",
-                "Correction_Efficiency_Data",
-                "Net_Production_Rate_Data",
-                "Cognitive_Processing_Efficiency_Data",
-                "Pressure_Intensity_Data",
-            ]
-            z_scores = {}
-            for metric in metrics:
-                response = self.client.table(metric) \
-                    .select('modified_z_score') \
-                    .eq('session_uid', session_uid) \
-                    .execute()
-                if response.data:
-                    z_scores[metric] = response.data[0]['modified_z_score']
+            logger.info(f"Retrieving z-scores for {len(session_uids)} sessions...")
+            z_scores = {metric: {} for metric in metric_tables}
+            # The session ids are sent in the URL of the select, so they are requested in small groups
+            for uids_start in range(0, len(session_uids), 100):
+                uids = session_uids[uids_start:uids_start + 100]
+                for metric in metric_tables:
+                    response = self.client.table(metric) \
+                        .select('session_uid, modified_z_score') \
+                        .in_('session_uid', uids) \
+                        .execute()
+                    for row in response.data:
+                        z_scores[metric].setdefault(row['session_uid'], row['modified_z_score'])
             return z_scores
         except Exception as e:
             logger.error(f"Error retrieving z-scores: {e}")
             return None
-    
+
     def get_z_scores_info_for_sleep_data(self, user_uid: str, day_analyzed: date, metrics_names: list):
         """
         Get the z-scores for a sleep data
@@ -411,22 +557,48 @@ class SupabaseService:
             logger.error(f"Error updating the scores and decisions of a behavioral data analysis: {e}")
             return False
 
-    def update_scores_and_decisions_of_a_typing_session(self, session_id: str, score: float, decision: str):
+    def update_scores_and_decisions_of_typing_sessions(self, scores: dict, decisions: dict) -> bool:
+        """
+        Update the cognitive score and decision of many typing sessions, with a select and an upsert on session_uid
+        for each group of sessions.
+        Only the sessions that exist in Supabase are updated.
+        Args:
+            scores: dict - session_uid -> cognitive score
+            decisions: dict - session_uid -> cognitive decision
+        Returns:
+            bool - True if the scores were updated successfully, False otherwise
+        """
         try:
-            self.client.table('Typing_Sessions') \
-            .update({
-                'cognitive_score': score,
-                'cognitive_decision': decision
-            }) \
-            .eq('session_uid', session_id) \
-            .execute()
-            logger.info(f"\033[92mUpdated the cognitive score and final decision for session {session_id} successfully\033[0m")
+            session_uids = list(scores)
+            updated = 0
+            for uids_start in range(0, len(session_uids), 100):
+                # The upsert needs the required fields of the sessions, so they are read first
+                existing = self.client.table('Typing_Sessions') \
+                    .select('session_uid, user_uid, session_date') \
+                    .in_('session_uid', session_uids[uids_start:uids_start + 100]) \
+                    .execute().data
+                rows = [
+                    {
+                        **session,
+                        'cognitive_score': scores[session['session_uid']],
+                        'cognitive_decision': decisions[session['session_uid']]
+                    }
+                    for session in existing
+                ]
+                if rows:
+                    self.client.table('Typing_Sessions') \
+                        .upsert(rows, on_conflict='session_uid') \
+                        .execute()
+                    updated += len(rows)
+            if updated < len(session_uids):
+                logger.warning(f"{len(session_uids) - updated} typing sessions were not found in Supabase, their cognitive score was not updated")
+            logger.info(f"\033[92mUpdated the cognitive score and final decision for {updated} sessions successfully\033[0m")
             return True
         except Exception as e:
-            logger.error(f"Error updating the cognitive score and final decision for session {session_id}: {e}")
+            logger.error(f"Error updating the cognitive score and final decision for {len(scores)} sessions: {e}")
             return False
 
-    def send_computed_sleep_info(self, user_uid: str, sleep_data, day_analyzed: date) -> int | list[int] | None:
+    def send_computed_sleep_info(self, user_uid: str, sleep_data, day_analyzed: date, write_buffer=None) -> int | list[int] | None:
         """
         Send computed sleep info to Supabase.
         Args:
@@ -444,8 +616,9 @@ class SupabaseService:
                 - sqs: float
                 - type: str
             day_analyzed: date - The day of the analysis (day that is analyzed)
+            write_buffer: SupabaseWriteBuffer | None - The write buffer of the task, the rows are added to it instead of being sent now
         Returns:
-            int | list[int] | None - The id(s) of the sleep data analysis if created successfully, None otherwise
+            int | list[int] | None - The id(s) of the sleep data analysis (their PendingRow with a write buffer) if created successfully, None otherwise
         """
         try:
             # Handle both single sleep data (dict) and multiple sleep data (list)
@@ -453,7 +626,7 @@ class SupabaseService:
                 # Multiple sleep records - process each one
                 sleep_ids = []
                 for single_sleep_data in sleep_data:
-                    sleep_id = self._send_single_sleep_info(user_uid, single_sleep_data, day_analyzed)
+                    sleep_id = self._send_single_sleep_info(user_uid, single_sleep_data, day_analyzed, write_buffer)
                     if sleep_id is not None:
                         sleep_ids.append(sleep_id)
                     else:
@@ -463,20 +636,21 @@ class SupabaseService:
                 return sleep_ids if sleep_ids else None
             else:
                 # Single sleep record - use original logic
-                return self._send_single_sleep_info(user_uid, sleep_data, day_analyzed)
+                return self._send_single_sleep_info(user_uid, sleep_data, day_analyzed, write_buffer)
         except Exception as e:
             logger.error(f"Error sending computed sleep info for user {user_uid}: {e}")
             return None
 
-    def _send_single_sleep_info(self, user_uid: str, sleep_data: dict, day_analyzed: date) -> int | None:
+    def _send_single_sleep_info(self, user_uid: str, sleep_data: dict, day_analyzed: date, write_buffer=None) -> int | None:
         """
         Send a single sleep record to Supabase.
         Args:
             user_uid: str - The user's unique identifier
             sleep_data: dict - The sleep data to be sent
             day_analyzed: date - The day of the analysis (day that is analyzed)
+            write_buffer: SupabaseWriteBuffer | None - The write buffer of the task, the row is added to it instead of being sent now
         Returns:
-            int | None - The id of the sleep data analysis if it was created successfully, None otherwise
+            int | None - The id of the sleep data analysis (its PendingRow with a write buffer) if it was created successfully, None otherwise
         """
         try:
             existing = self.client.table('Sleep_Data_Analysis') \
@@ -505,6 +679,9 @@ class SupabaseService:
                 'sleep_quality_score': sleep_data['sqs'],
                 'type': sleep_data['type']
             }
+            if write_buffer is not None:
+                logger.info(f"{sleep_data['type']} sleep info for user {user_uid} added to the write buffer")
+                return write_buffer.add('Sleep_Data_Analysis', payload)
             result = self.client.table('Sleep_Data_Analysis').insert(payload).execute()
             logger.info(f"\033[92mSent {sleep_data['type']} sleep info for user {user_uid} successfully\033[0m")
             return result.data[0].get('id')
@@ -512,15 +689,16 @@ class SupabaseService:
             logger.error(f"Error sending single sleep info for user {user_uid}: {e}")
             return None
         
-    def send_computed_gps_info(self, user_uid: str, gps_data: dict, day_analyzed: date) -> int | None:
+    def send_computed_gps_info(self, user_uid: str, gps_data: dict, day_analyzed: date, write_buffer=None):
         """
         Send computed GPS info to Supabase.
         Args:
             user_uid: str - The user's unique identifier
             gps_data: dict - The GPS data to be sent
             day_analyzed: date - The day of the analysis (day that is analyzed)
+            write_buffer: SupabaseWriteBuffer | None - The write buffer of the task, the rows are added to it instead of being sent now
         Returns:
-            bool - True if the data was sent successfully, False otherwise
+            The id of the GPS_Data_Analysis row (its PendingRow with a write buffer), None if an error occurs
         """
         try:
             # Check if an analysis is already for the given day and user
@@ -549,17 +727,22 @@ class SupabaseService:
                 'time_period_active': gps_data.get('time_period_active', 0),
                 'user_uid': user_uid
             }
-            result = self.client.table('GPS_Data_Analysis').insert(payload).execute()
-            if result.data:
-                gps_data_analysis_id = result.data[0].get('id')
+            if write_buffer is not None:
+                # The child rows reference the pending row, the buffer sends GPS_Data_Analysis before them
+                gps_data_analysis_id = write_buffer.add('GPS_Data_Analysis', payload)
             else:
-                logger.error(f"Failed to create a daily GPS data analysis event for user {user_uid} on {day_analyzed}")
-                return None
+                result = self.client.table('GPS_Data_Analysis').insert(payload).execute()
+                if result.data:
+                    gps_data_analysis_id = result.data[0].get('id')
+                else:
+                    logger.error(f"Failed to create a daily GPS data analysis event for user {user_uid} on {day_analyzed}")
+                    return None
 
             # Now insert into gps_key_locations table
             gps_key_locations_list = gps_data.get('key_locations_clusters_info')
+            key_location_rows = []
             for location_data in gps_key_locations_list:
-                payload = {
+                key_location_rows.append({
                     'key_location_id': location_data['key_location_id'],
                     'latitude': location_data['latitude'],
                     'longitude': location_data['longitude'],
@@ -567,13 +750,14 @@ class SupabaseService:
                     'num_of_gps_events': location_data['num_of_gps_events'],
                     'key_loc_type': location_data['key_loc_type'],
                     'gps_data_analysis_id': gps_data_analysis_id
-                }
-                self.client.table('GPS_Key_Locations').insert(payload).execute()
+                })
+            self._insert_rows('GPS_Key_Locations', key_location_rows, write_buffer)
 
             # Now insert into gps_transitions
             gps_transitions_list = gps_data.get('key_locations_transitions_info')
+            transition_rows = []
             for transition_data in gps_transitions_list:
-                payload = {
+                transition_rows.append({
                     'key_loc_start_id': transition_data['key_loc_start_id'],
                     'key_loc_end_id': transition_data['key_loc_end_id'],
                     'start_time_of_transition': transition_data['start_time_of_transition'],
@@ -582,8 +766,8 @@ class SupabaseService:
                     'total_distance_traveled_km': transition_data['total_distance_traveled_km'],
                     'total_gps_events_in_transition_cluster': transition_data['total_events_in_transition_cluster'],
                     'gps_data_analysis_id': gps_data_analysis_id
-                }
-                self.client.table('GPS_Transitions').insert(payload).execute()
+                })
+            self._insert_rows('GPS_Transitions', transition_rows, write_buffer)
 
             # Safely extract values with proper error handling
             convex_hull = gps_data.get('convex_hull', {})
@@ -619,24 +803,28 @@ class SupabaseService:
                 'max_distance_lon': coords_lon,
                 'gps_data_analysis_id': gps_data_analysis_id
             }
-            self.client.table('GPS_Spatial_Features').insert(payload).execute()
+            self._insert_rows('GPS_Spatial_Features', [payload], write_buffer)
             
-            logger.info(f"\033[92mSent GPS info for user {user_uid} successfully\033[0m")
+            if write_buffer is not None:
+                logger.info(f"GPS info for user {user_uid} added to the write buffer")
+            else:
+                logger.info(f"\033[92mSent GPS info for user {user_uid} successfully\033[0m")
             return gps_data_analysis_id
         
         except Exception as e:
             logger.error(f"Error sending computed GPS info for user {user_uid}: {e}")
             return None
 
-    def send_computed_call_info(self, user_uid: str, call_data: dict, day_analyzed: date) -> int | None:
+    def send_computed_call_info(self, user_uid: str, call_data: dict, day_analyzed: date, write_buffer=None) -> int | None:
         """
         Send computed call info to Supabase.
         Args:
             user_uid: str - The user's unique identifier
             call_data: dict - The call data to be sent
             day_analyzed: date - The day of the analysis (day that is analyzed)
+            write_buffer: SupabaseWriteBuffer | None - The write buffer of the task, the row is added to it instead of being sent now
         Returns:
-            int | None - The id of the call data analysis if it was created successfully, None otherwise
+            int | None - The id of the call data analysis (its PendingRow with a write buffer) if it was created successfully, None otherwise
         """
         try:
             # Check if an analysis is already for the given day and user
@@ -660,6 +848,9 @@ class SupabaseService:
                 'total_calls_in_a_day': call_data.get('total_calls_in_a_day', 0),
                 'user_uid': user_uid
             }
+            if write_buffer is not None:
+                logger.info(f"Call info for user {user_uid} added to the write buffer")
+                return write_buffer.add('Call_Data_Analysis', payload)
             result = self.client.table('Call_Data_Analysis').insert(payload).execute()
             logger.info(f"\033[92mSent call info for user {user_uid} successfully\033[0m")
             return result.data[0].get('id')
@@ -668,13 +859,14 @@ class SupabaseService:
             return None
         
     
-    def send_computed_activity_info(self, user_uid: str, activity_data: dict, day_analyzed: date) -> int | None:
+    def send_computed_activity_info(self, user_uid: str, activity_data: dict, day_analyzed: date, write_buffer=None) -> int | None:
         """
         Send computed activity info to Supabase.
         Args:
             user_uid: str - The user's unique identifier
             activity_data: dict - The activity data to be sent
             day_analyzed: date - The day of the analysis (day that is analyzed)
+            write_buffer: SupabaseWriteBuffer | None - The write buffer of the task, the rows are added to it instead of being sent now
         Returns:
             bool - True if the data was sent successfully, False otherwise
         """
@@ -699,18 +891,22 @@ class SupabaseService:
                 'inactivity_percentage': activity_data.get('inactivity_percentage', 0),
                 'user_uid': user_uid
             }
-            result = self.client.table('Activity_Data_Analysis').insert(payload).execute()
-            if result.data:
-                activity_data_analysis_id = result.data[0].get('id')
+            if write_buffer is not None:
+                # The child rows reference the pending row, the buffer sends Activity_Data_Analysis before them
+                activity_data_analysis_id = write_buffer.add('Activity_Data_Analysis', payload)
             else:
-                logger.error(f"Failed to create a daily activity data analysis event for user {user_uid} on {day_analyzed}")
-                return None
+                result = self.client.table('Activity_Data_Analysis').insert(payload).execute()
+                if result.data:
+                    activity_data_analysis_id = result.data[0].get('id')
+                else:
+                    logger.error(f"Failed to create a daily activity data analysis event for user {user_uid} on {day_analyzed}")
+                    return None
             
             # Now insert into Activity_Distribution_Per_Day_Section_Analysis table
             activity_distribution_per_day_section_df = activity_data.get('activity_percentages_per_day_sections')
-
+            day_section_rows = []
             for day_section, row in activity_distribution_per_day_section_df.iterrows():
-                payload = {
+                day_section_rows.append({
                     'day_section': day_section,
                     'in_vehicle': row.get('in_vehicle', 0),
                     'on_bicycle': row.get('on_bicycle', 0),
@@ -719,24 +915,28 @@ class SupabaseService:
                     'tilting': row.get('tilting', 0),
                     'unknown': row.get('unknown', 0),
                     'activity_data_analysis_id': activity_data_analysis_id
-                }
-                self.client.table('Activity_Distribution_Per_Day_Section_Analysis').insert(payload).execute()
+                })
+            self._insert_rows('Activity_Distribution_Per_Day_Section_Analysis', day_section_rows, write_buffer)
 
-            logger.info(f"\033[92mSent activity info for user {user_uid} successfully\033[0m")
+            if write_buffer is not None:
+                logger.info(f"Activity info for user {user_uid} added to the write buffer")
+            else:
+                logger.info(f"\033[92mSent activity info for user {user_uid} successfully\033[0m")
             return activity_data_analysis_id
         except Exception as e:
             logger.error(f"Error sending computed activity info for user {user_uid}: {e}")
             return None
 
-    def send_computed_device_interaction_info(self, user_uid: str, interaction_data: dict, day_analyzed: date) -> int | None:
+    def send_computed_device_interaction_info(self, user_uid: str, interaction_data: dict, day_analyzed: date, write_buffer=None) -> int | None:
         """
         Send computed device interaction info to Supabase.
         Args:
             user_uid: str - The user's unique identifier
             interaction_data: dict - The interaction data to be sent
             day_analyzed: date - The day of the analysis (day that is analyzed)
+            write_buffer: SupabaseWriteBuffer | None - The write buffer of the task, the rows are added to it instead of being sent now
         Returns:
-            int | None - The id of the device interaction data analysis if it was created successfully, None otherwise
+            int | None - The id of the device interaction data analysis (its PendingRow with a write buffer) if it was created successfully, None otherwise
         """
         try:
 
@@ -759,37 +959,46 @@ class SupabaseService:
                 'total_device_drop_events': interaction_data.get('device_drop_events_result', 0) or 0,
                 "user_uid": user_uid
             }
-            result = self.client.table('Device_Interaction_Data_Analysis').insert(payload).execute()
-            if result.data:
-                interaction_data_analysis_id = result.data[0].get('id')
+            if write_buffer is not None:
+                # The child rows reference the pending row, the buffer sends Device_Interaction_Data_Analysis before them
+                interaction_data_analysis_id = write_buffer.add('Device_Interaction_Data_Analysis', payload)
             else:
-                logger.error(f"Failed to create a daily interaction data analysis event for user {user_uid} on {day_analyzed}")
-                return None
+                result = self.client.table('Device_Interaction_Data_Analysis').insert(payload).execute()
+                if result.data:
+                    interaction_data_analysis_id = result.data[0].get('id')
+                else:
+                    logger.error(f"Failed to create a daily interaction data analysis event for user {user_uid} on {day_analyzed}")
+                    return None
 
             # Now insert into Circadian_Screen_Time_Analysis table
             circadian_screen_time_list = interaction_data.get('screen_time_circadian_hours_result')
             if circadian_screen_time_list is not None:
+                circadian_screen_time_rows = []
                 for circadian_screen_time in circadian_screen_time_list:
-                    payload = {
+                    circadian_screen_time_rows.append({
                         'day_section': circadian_screen_time['day_section'],
                         'duration': circadian_screen_time['duration'] or 0,
                         'percentage': circadian_screen_time['percentage'] or 0,
                         'daily_interaction_data_analysis_id': interaction_data_analysis_id
-                    }
-                    self.client.table('Circadian_Screen_Time_Analysis').insert(payload).execute()
+                    })
+                self._insert_rows('Circadian_Screen_Time_Analysis', circadian_screen_time_rows, write_buffer)
 
             # Now insert into App_Usage_Analysis table
             app_usage_df = interaction_data.get('app_usage_result')
             if app_usage_df is not None:
+                app_usage_rows = []
                 for index, row in app_usage_df.iterrows():
-                    payload = {
+                    app_usage_rows.append({
                         'app_name': row['app_name'],
                         'time_used_sec': row['time_used'] or 0, # seconds
                         'daily_interaction_data_analysis_id': interaction_data_analysis_id
-                    }
-                    self.client.table('App_Usage_Analysis').insert(payload).execute()
+                    })
+                self._insert_rows('App_Usage_Analysis', app_usage_rows, write_buffer)
 
-            logger.info(f"\033[92mSent device interaction info for user {user_uid} successfully\033[0m")
+            if write_buffer is not None:
+                logger.info(f"Device interaction info for user {user_uid} added to the write buffer")
+            else:
+                logger.info(f"\033[92mSent device interaction info for user {user_uid} successfully\033[0m")
             return interaction_data_analysis_id
         except Exception as e:
             logger.error(f"Error sending device interaction info for user {user_uid}: {e}")
@@ -839,145 +1048,123 @@ class SupabaseService:
             logger.error(f"Error creating a daily analysis event for user {user_uid} on {day_analyzed}: {e}")
             return None
 
-    def retrieve_cognitive_info_of_typing_sessions(self, table_name: str, user_uid: str, date_to_analyze: str) -> list | None:
+    def retrieve_metrics_of_typing_sessions(self, metric_tables: list, user_uid: str, date_to_analyze: str) -> list | None:
         """
-        Retrieve the cognitive info (score and decision) made for typing sessions of a user for a given day.
-        Also, this function will return the session UID's.
+        Retrieve the typing sessions of a user for a given day with their cognitive decision and the value of each
+        metric, with one JOIN select of all the metric tables.
 
         Args:
-            table_name: str - The name of the table to retrieve the data from, it helps with the construction of the JOIN select query
+            metric_tables: list - The metric tables to join (ex. Pressure_Intensity_Data)
             user_uid: str - The user's unique identifier
             date_to_analyze: str - The day of the analysis (day that is analyzed)
 
         Returns:
-            list - A list of dictionaries, each containing the session UID and the cognitive info (score and decision)
-            None: If the cognitive info could not be retrieved
+            list - A row per session: {'session_uid', 'cognitive_decision', <metric table>: value or None, ...}
+            None: If the sessions could not be retrieved
         """
-
         try:
-            
-            select_query = f"cognitive_decision, {table_name}(session_uid, value)"
+            select_query = "session_uid, cognitive_decision, " + ", ".join(f"{table_name}(value)" for table_name in metric_tables)
             response = self.client.table('Typing_Sessions') \
                 .select(select_query) \
                 .eq('user_uid', user_uid) \
                 .eq('session_date', date_to_analyze) \
                 .execute()
-            
+
             if not response.data:
                 logger.info(f"No typing sessions found for user {user_uid} on {date_to_analyze}")
                 return None
 
-            # Flatten the response
-            flat_data = []
+            rows = []
             for session in response.data:
-                data = session.get(table_name)
-                cognitive_decision = session.get('cognitive_decision')
-
-                if data:
-                    # Handle both single item and list cases
+                row = {'session_uid': session.get('session_uid'), 'cognitive_decision': session.get('cognitive_decision')}
+                for table_name in metric_tables:
+                    # The metric table is embedded as a list (one-to-many) or as a single item (one-to-one)
+                    data = session.get(table_name)
                     if isinstance(data, list):
-                        for item in data:
-                            # Add cognitive_decision to each metric data item
-                            item_with_decision = item.copy()  # Copy to avoid modifying original
-                            item_with_decision['cognitive_decision'] = cognitive_decision
-                            flat_data.append(item_with_decision)
-                    else:
-                        # Add cognitive_decision to the single metric data item
-                        data_with_decision = data.copy()
-                        data_with_decision['cognitive_decision'] = cognitive_decision
-                        flat_data.append(data_with_decision)
-
-            return flat_data
+                        data = data[0] if data else None
+                    row[table_name] = data.get('value') if data else None
+                rows.append(row)
+            return rows
         except Exception as e:
-            logger.error(f"Error retrieving cognitive decisions of typing sessions for user {user_uid} on {date_to_analyze}: {e}")
+            logger.error(f"Error retrieving the metrics of typing sessions for user {user_uid} on {date_to_analyze}: {e}")
             return None
 
-    def create_z_scores_for_sleep_data(self, user_uid: str, sleep_data_analysis_id: int, z_score_sleep_time: float, z_score_sqs: float, z_score_sleep_start_time: float, z_score_sleep_end_time: float):
+    def create_z_scores_for_sleep_data(self, user_uid: str, sleep_data_analysis_id: int, z_score_sleep_time: float, z_score_sqs: float, z_score_sleep_start_time: float, z_score_sleep_end_time: float, write_buffer=None):
         """Create the z-scores for each sleep data that requires it"""
         # Create table Sleep_Data_Z_Scores
         try:
-            self.client.table('Sleep_Data_Z_Scores') \
-                .insert({
-                    'sleep_data_analysis_id': sleep_data_analysis_id,
-                    'sleep_time_z_score': z_score_sleep_time,
-                    'sqs_z_score': z_score_sqs,
-                    'sleep_start_time_z_score': z_score_sleep_start_time,
-                    'sleep_end_time_z_score': z_score_sleep_end_time
-                }) \
-                .execute()
+            self._insert_rows('Sleep_Data_Z_Scores', [{
+                'sleep_data_analysis_id': sleep_data_analysis_id,
+                'sleep_time_z_score': z_score_sleep_time,
+                'sqs_z_score': z_score_sqs,
+                'sleep_start_time_z_score': z_score_sleep_start_time,
+                'sleep_end_time_z_score': z_score_sleep_end_time
+            }], write_buffer)
             logger.info(f"\033[92mCreated the z-scores for sleep data for user {user_uid} successfully\033[0m")
             return True
         except Exception as e:
             logger.error(f"Error creating z-scores for sleep data for user {user_uid}: {e}")
             return False
     
-    def create_z_scores_for_device_interaction_data(self, user_uid: str, device_interaction_data_analysis_id: int, z_score_screen_time: float, z_score_low_light_day_time: float, z_score_device_drop_events: float):
+    def create_z_scores_for_device_interaction_data(self, user_uid: str, device_interaction_data_analysis_id: int, z_score_screen_time: float, z_score_low_light_day_time: float, z_score_device_drop_events: float, write_buffer=None):
         """Create the z-scores for the device interaction data"""
         try:
-            self.client.table('Device_Interaction_Data_Z_Scores') \
-                .insert({
-                    'device_interaction_data_analysis_id': device_interaction_data_analysis_id,
-                    'screen_time_z_score': z_score_screen_time,
-                    'low_light_day_time_z_score': z_score_low_light_day_time,
-                    'device_drop_events_z_score': z_score_device_drop_events
-                }) \
-                .execute()
+            self._insert_rows('Device_Interaction_Data_Z_Scores', [{
+                'device_interaction_data_analysis_id': device_interaction_data_analysis_id,
+                'screen_time_z_score': z_score_screen_time,
+                'low_light_day_time_z_score': z_score_low_light_day_time,
+                'device_drop_events_z_score': z_score_device_drop_events
+            }], write_buffer)
             logger.info(f"\033[92mCreated the z-scores for device interaction data for user {user_uid} successfully\033[0m")
             return True
         except Exception as e:
             logger.error(f"Error creating z-scores for device interaction data for user {user_uid}: {e}")
             return False
     
-    def create_z_scores_for_activity_data(self, user_uid: str, activity_data_analysis_id: int, z_score_daily_active_minutes: float):
+    def create_z_scores_for_activity_data(self, user_uid: str, activity_data_analysis_id: int, z_score_daily_active_minutes: float, write_buffer=None):
         """Create the z-scores for the activity data"""
         try:
-            self.client.table('Activity_Data_Z_Scores') \
-                .insert({
-                    'activity_data_analysis_id': activity_data_analysis_id,
-                    'daily_active_minutes_z_score': z_score_daily_active_minutes
-                }) \
-                .execute()
+            self._insert_rows('Activity_Data_Z_Scores', [{
+                'activity_data_analysis_id': activity_data_analysis_id,
+                'daily_active_minutes_z_score': z_score_daily_active_minutes
+            }], write_buffer)
             logger.info(f"\033[92mCreated the z-scores for activity data for user {user_uid} successfully\033[0m")
             return True
         except Exception as e:
             logger.error(f"Error creating z-scores for activity data for user {user_uid}: {e}")
             return False
 
-    def create_z_scores_for_call_data(self, user_uid: str, call_data_analysis_id: int, z_score_missed_call_ratio: float, z_score_avg_call_duration: float, z_score_total_calls_in_a_day: int):
+    def create_z_scores_for_call_data(self, user_uid: str, call_data_analysis_id: int, z_score_missed_call_ratio: float, z_score_avg_call_duration: float, z_score_total_calls_in_a_day: int, write_buffer=None):
         """Create the z-scores for the call data"""
         try:
-            self.client.table('Call_Data_Z_Scores') \
-                .insert({
-                    'call_data_analysis_id': call_data_analysis_id,
-                    'missed_call_ratio_z_score': z_score_missed_call_ratio,
-                    'avg_call_duration_z_score': z_score_avg_call_duration,
-                    'total_calls_in_a_day_z_score': z_score_total_calls_in_a_day
-                }) \
-                .execute()
+            self._insert_rows('Call_Data_Z_Scores', [{
+                'call_data_analysis_id': call_data_analysis_id,
+                'missed_call_ratio_z_score': z_score_missed_call_ratio,
+                'avg_call_duration_z_score': z_score_avg_call_duration,
+                'total_calls_in_a_day_z_score': z_score_total_calls_in_a_day
+            }], write_buffer)
             logger.info(f"\033[92mCreated the z-scores for call data for user {user_uid} successfully\033[0m")
             return True
         except Exception as e:
             logger.error(f"Error creating z-scores for call data for user {user_uid}: {e}")
             return False
     
-    def create_z_scores_for_gps_data(self, user_uid: str, gps_data_analysis_id: int, z_score_total_time_spend_in_home_seconds: float, z_score_total_time_spend_traveling_seconds: float, z_score_total_time_spend_out_of_home_seconds: float, z_score_total_distance_traveled_km: float, z_score_average_time_spend_in_locations_hours: float, z_score_number_of_unique_locations: float, z_score_convex_hull_area_m2: float, z_score_standard_deviation_ellipse_area_m2: float, z_score_max_distance_from_home_timestamp: float, z_score_entropy: float):
+    def create_z_scores_for_gps_data(self, user_uid: str, gps_data_analysis_id: int, z_score_total_time_spend_in_home_seconds: float, z_score_total_time_spend_traveling_seconds: float, z_score_total_time_spend_out_of_home_seconds: float, z_score_total_distance_traveled_km: float, z_score_average_time_spend_in_locations_hours: float, z_score_number_of_unique_locations: float, z_score_convex_hull_area_m2: float, z_score_standard_deviation_ellipse_area_m2: float, z_score_max_distance_from_home_timestamp: float, z_score_entropy: float, write_buffer=None):
         """Create the z-scores for the GPS data"""
         try:
-            self.client.table('GPS_Data_Z_Scores') \
-                .insert({
-                    'gps_data_analysis_id': gps_data_analysis_id,
-                    'total_time_spend_in_home_seconds_z_score': z_score_total_time_spend_in_home_seconds,
-                    'total_time_spend_travelling_seconds_z_score': z_score_total_time_spend_traveling_seconds,
-                    'total_time_spend_out_of_home_seconds_z_score': z_score_total_time_spend_out_of_home_seconds,
-                    'total_distance_traveled_km_z_score': z_score_total_distance_traveled_km,
-                    'average_time_spend_in_locations_hours_z_score': z_score_average_time_spend_in_locations_hours,
-                    'number_of_unique_locations_z_score': z_score_number_of_unique_locations,
-                    'convex_hull_area_m2_z_score': z_score_convex_hull_area_m2,
-                    'sde_area_m2_z_score': z_score_standard_deviation_ellipse_area_m2,
-                    'max_distance_from_home_time_z_score': z_score_max_distance_from_home_timestamp,
-                    'entropy_z_score': z_score_entropy
-                }) \
-                .execute()
+            self._insert_rows('GPS_Data_Z_Scores', [{
+                'gps_data_analysis_id': gps_data_analysis_id,
+                'total_time_spend_in_home_seconds_z_score': z_score_total_time_spend_in_home_seconds,
+                'total_time_spend_travelling_seconds_z_score': z_score_total_time_spend_traveling_seconds,
+                'total_time_spend_out_of_home_seconds_z_score': z_score_total_time_spend_out_of_home_seconds,
+                'total_distance_traveled_km_z_score': z_score_total_distance_traveled_km,
+                'average_time_spend_in_locations_hours_z_score': z_score_average_time_spend_in_locations_hours,
+                'number_of_unique_locations_z_score': z_score_number_of_unique_locations,
+                'convex_hull_area_m2_z_score': z_score_convex_hull_area_m2,
+                'sde_area_m2_z_score': z_score_standard_deviation_ellipse_area_m2,
+                'max_distance_from_home_time_z_score': z_score_max_distance_from_home_timestamp,
+                'entropy_z_score': z_score_entropy
+            }], write_buffer)
             logger.info(f"\033[92mCreated the z-scores for GPS data for user {user_uid} successfully\033[0m")
             return True
         except Exception as e:
@@ -0,0 +1,189 @@
+import logging
+
+from app.config import settings
+from app.services.supabase_service import SupabaseService
+
+logger = logging.getLogger(__name__)
+
+class PendingRow:
+    """
+    A row added to a SupabaseWriteBuffer, its id is set when the buffer is flushed.
+    It can be used as the value of a foreign key of another buffered row (ex. the gps_data_analysis_id of
+    the GPS_Key_Locations rows), the buffer sends its table first and replaces it with the id.
+    """
+
+    __slots__ = ('table_name', 'id', 'failed')
+
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+        self.id = None
+        self.failed = False
+
+    @property
+    def sent(self) -> bool:
+        return self.id is not None
+
+    def __repr__(self):
+        return f"PendingRow({self.table_name}, id={self.id}, failed={self.failed})"
+
+class SupabaseWriteBuffer:
+    """
+    Write-behind buffer of the Supabase rows of a user task: the rows are collected per table and sent
+    with one SupabaseService.send_data_batch call per table, instead of one request per row.
+    The buffer is flushed at the stage boundaries (ex. before the LogMyself data analysis is finalized,
+    because it reads back the published rows) and when it holds max_rows rows.
+    NOTE: A buffer belongs to one task, it is not thread safe.
+    """
+
+    def __init__(self, supabase_service: SupabaseService, max_rows: int | None = None):
+        self.supabase_service = supabase_service
+        self.max_rows = max_rows or settings.SUPABASE_WRITE_BUFFER_MAX_ROWS
+        # table -> [(row, handle)], in the order that the tables were first added
+        self._rows: dict[str, list] = {}
+        self._on_conflict: dict[str, str | None] = {}
+        # table -> {'sent': int, 'skipped': int, 'failed': int}, accumulated over the flushes
+        self.stats: dict[str, dict] = {}
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._rows.values())
+
+    def add(self, table_name: str, row: dict, on_conflict: str | None = None) -> PendingRow:
+        """
+        Add a row to the buffer, it is flushed with the size threshold if needed.
+        Args:
+            table_name: str - The Supabase table
+            row: dict - The row, the values can be PendingRow of other tables (foreign keys)
+            on_conflict: str | None - The unique field of the table, the rows that already exist are skipped
+        Returns:
+            The PendingRow of the row
+        """
+        handle = PendingRow(table_name)
+        self._rows.setdefault(table_name, []).append((row, handle))
+        self._on_conflict.setdefault(table_name, on_conflict)
+        if len(self) >= self.max_rows:
+            self.flush()
+        return handle
+
+    def flush(self) -> dict:
+        """
+        Send the buffered rows, one batch per table, the parent tables before the tables that reference them.
+        The rows that reference a row that was not sent are not sent (they are counted as failed).
+        Returns:
+            dict - The tables with failed rows in this flush ({table: failed rows})
+        """
+        if not self._rows:
+            return {}
+
+        failures = {}
+        buffered_rows = self._rows
+        self._rows = {}
+        for table_name in self._flush_order(buffered_rows):
+            rows_to_send, handles = [], []
+            failed = 0
+            for row, handle in buffered_rows[table_name]:
+                resolved_row = self._resolve_row(row)
+                if resolved_row is None:
+                    handle.failed = True
+                    failed += 1
+                    continue
+                rows_to_send.append(resolved_row)
+                handles.append(handle)
+
+            sent = skipped = 0
+            if rows_to_send:
+                on_conflict = self._on_conflict.get(table_name)
+                ids = self.supabase_service.send_data_batch(table_name, rows_to_send, on_conflict=on_conflict)
+                if ids is None:
+                    for handle in handles:
+                        handle.failed = True
+                    failed += len(handles)
+                else:
+                    for handle, row_id in zip(handles, ids):
+                        handle.id = row_id
+                        if row_id is not None:
+                            sent += 1
+                        elif on_conflict is not None:
+                            skipped += 1  # The row already exists
+                        else:
+                            handle.failed = True
+                            failed += 1
+
+            table_stats = self.stats.setdefault(table_name, {'sent': 0, 'skipped': 0, 'failed': 0})
+            table_stats['sent'] += sent
+            table_stats['skipped'] += skipped
+            table_stats['failed'] += failed
+            if failed:
+                failures[table_name] = failed
+                logger.error(f"Failed to send {failed}/{len(buffered_rows[table_name])} rows to {table_name}")
+
+        if failures:
+            logger.error(f"Supabase write buffer flushed with failures: {failures}")
+        else:
+            logger.info(f"\033[92mSupabase write buffer flushed {sum(len(rows) for rows in buffered_rows.values())} rows to {len(buffered_rows)} tables\033[0m")
+        return failures
+
+    def discard(self) -> int:
+        """
+        Drop the buffered rows without sending them (ex. the task failed before the flush), they are counted as failed.
+        Returns:
+            int - The number of dropped rows
+        """
+        dropped = 0
+        for table_name, rows in self._rows.items():
+            for _, handle in rows:
+                handle.failed = True
+            self.stats.setdefault(table_name, {'sent': 0, 'skipped': 0, 'failed': 0})['failed'] += len(rows)
+            dropped += len(rows)
+        self._rows = {}
+        if dropped:
+            logger.error(f"Supabase write buffer dropped {dropped} rows that were not sent")
+        return dropped
+
+    def failures(self) -> dict:
+        """The tables with failed rows over all the flushes ({table: failed rows})."""
+        return {table_name: table_stats['failed'] for table_name, table_stats in self.stats.items() if table_stats['failed']}
+
+    @staticmethod
+    def _resolve_row(row: dict) -> dict | None:
+        """Replace the PendingRow values of a row with their ids, None if one of them was not sent."""
+        resolved_row = {}
+        for field, value in row.items():
+            if isinstance(value, PendingRow):
+                if not value.sent:
+                    return None
+                value = value.id
+            resolved_row[field] = value
+        return resolved_row
+
+    @staticmethod
+    def _flush_order(buffered_rows: dict) -> list:
+        """
+        Order the tables so that each table is sent after the tables that its rows reference,
+        the other tables are kept in the order that they were first added.
+        """
+        # The parents of each table, as a dict to keep the order deterministic
+        dependencies = {table_name: {} for table_name in buffered_rows}
+        for table_name, rows in buffered_rows.items():
+            for row, _ in rows:
+                for value in row.values():
+                    # A reference to a row of a previous flush is already resolved
+                    if isinstance(value, PendingRow) and value.table_name in buffered_rows and value.table_name != table_name:
+                        dependencies[table_name][value.table_name] = None
+
+        order, visiting, visited = [], set(), set()
+
+        def visit(table_name):
+            if table_name in visited:
+                return
+            if table_name in visiting:
+                raise ValueError(f"Circular foreign keys between the buffered tables at {table_name}")
+            visiting.add(table_name)
+            for parent in dependencies[table_name]:
+                visit(parent)
+            visiting.discard(table_name)
+            visited.add(table_name)
+            order.append(table_name)
+
+        for table_name in buffered_rows:
+            visit(table_name)
+        return order
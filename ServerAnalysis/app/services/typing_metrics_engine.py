@@ -0,0 +1,130 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+class TypingMetricsEngine:
+    """
+    Computes the LogBoard typing metrics of the typing sessions of a user in one pass: the sessions are loaded once
+    into a column frame and every metric (and its modified z-score) is an array expression over all the sessions.
+    The result is one table with a row for each (session, metric) that could be computed.
+    """
+
+    # The typing metrics: name of the baseline metric -> Supabase table of the values
+    METRIC_TABLES = {
+        'PRESSURE_INTENSITY': 'Pressure_Intensity_Data',
+        'EFFORT_TO_OUTPUT_RATIO': 'Effort_To_Output_Ratio_Data',
+        'TYPING_RHYTHM_STABILITY': 'Typing_Rhythm_Stability_Data',
+        'COGNITIVE_PROCESSING_INDEX': 'Cognitive_Processing_Index_Data',
+        'PAUSE_TO_PRODUCTION_RATIO': 'Pause_To_Production_Ratio_Data',
+        'CORRECTION_EFFICIENCY': 'Correction_Efficiency_Data',
+        'NET_PRODUCTION_RATE': 'Net_Production_Rate_Data',
+        'COGNITIVE_PROCESSING_EFFICIENCY': 'Cognitive_Processing_Efficiency_Data',
+    }
+
+    # The columns of the typing sessions that the metrics use
+    SESSION_COLUMNS = [
+        'total_pressure_by_times_counter', 'characters_typed', 'total_characters_deleted', 'words_typed',
+        'mean_iki', 'std_dev_iki', 'iki_list_size', 'duration',
+        'max_pause_wtw_duration', 'avg_pause_wtw_duration', 'max_pause_ctc_duration', 'avg_pause_ctc_duration',
+    ]
+
+    RESULT_COLUMNS = ['session_uid', 'metric', 'table_name', 'value', 'modified_z_score', 'included_baseline_metric']
+
+    def __init__(self, typing_sessions: list):
+        self.sessions = self._load_sessions(typing_sessions)
+
+    @classmethod
+    def _load_sessions(cls, typing_sessions: list) -> pd.DataFrame:
+        """Load the typing sessions (TypingSession rows) into a frame with a float column for each metric input."""
+        columns = {'session_uid': [typing_session.typing_session_id for typing_session in typing_sessions]}
+        for column in cls.SESSION_COLUMNS:
+            columns[column] = np.array([getattr(typing_session, column) for typing_session in typing_sessions], dtype=float)
+        return pd.DataFrame(columns)
+
+    def compute_metric_values(self) -> dict:
+        """
+        Compute the value of each metric for all the sessions.
+        Returns:
+            dict - metric name -> (values, valid), the values of the sessions and the sessions that have enough data
+        """
+        s = self.sessions
+        pressure = s['total_pressure_by_times_counter'].to_numpy()
+        typed = s['characters_typed'].to_numpy()
+        deleted = s['total_characters_deleted'].to_numpy()
+        words = s['words_typed'].to_numpy()
+        mean_iki = s['mean_iki'].to_numpy()
+        std_iki = s['std_dev_iki'].to_numpy()
+        iki_size = s['iki_list_size'].to_numpy()
+        duration = s['duration'].to_numpy()
+        max_wtw, avg_wtw = s['max_pause_wtw_duration'].to_numpy(), s['avg_pause_wtw_duration'].to_numpy()
+        max_ctc, avg_ctc = s['max_pause_ctc_duration'].to_numpy(), s['avg_pause_ctc_duration'].to_numpy()
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics = {
+                'PRESSURE_INTENSITY': (pressure / typed, typed > 0),
+                'EFFORT_TO_OUTPUT_RATIO': (pressure / (typed - deleted), (typed > 0) & (deleted > 0)),
+                'TYPING_RHYTHM_STABILITY': (mean_iki / (mean_iki + std_iki), (mean_iki != 0) & (std_iki != 0) & (mean_iki + std_iki > 0)),
+                # The real part of the complex log of the sessions (log|x|), like cmath.log(...).real
+                'COGNITIVE_PROCESSING_INDEX': (
+                    np.log(np.abs(1 + max_wtw / avg_wtw)) + np.log(np.abs(1 + max_ctc / avg_ctc)),
+                    (max_wtw != 0) & (avg_wtw != 0) & (max_ctc != 0) & (avg_ctc != 0),
+                ),
+                'PAUSE_TO_PRODUCTION_RATIO': (iki_size * mean_iki / duration, (iki_size != 0) & (mean_iki != 0) & (duration > 0)),
+                'CORRECTION_EFFICIENCY': (1 - deleted / typed, (typed > 0) & (deleted != 0)),
+                'NET_PRODUCTION_RATE': ((typed - deleted) / duration, (duration > 0) & (deleted <= typed)),
+                'COGNITIVE_PROCESSING_EFFICIENCY': (words / (duration * (1 + std_iki)), (duration > 0) & (words > 0)),
+            }
+
+        # A session with enough data can still give a non-finite value (ex. characters typed == characters deleted)
+        for metric_name, (values, valid) in metrics.items():
+            invalid_values = valid & ~np.isfinite(values)
+            if invalid_values.any():
+                logger.warning(f"{int(invalid_values.sum())} sessions have a non-finite {metric_name}, skipping them")
+                metrics[metric_name] = (values, valid & ~invalid_values)
+        return metrics
+
+    @staticmethod
+    def modified_z_scores(values: np.ndarray, baseline_values_for_metric: dict | None) -> np.ndarray:
+        """
+        Vectorized AnalysisService._calc_modified_z_score: (x - median) / (MAD * 1.4826),
+        0 if there is no baseline (or it has no median/MAD).
+        """
+        if baseline_values_for_metric is None:
+            return np.zeros(len(values))
+        median = baseline_values_for_metric.get('baseline_median')
+        mad = baseline_values_for_metric.get('baseline_mad')
+        if median is None or mad is None:
+            logger.warning("Z-score calculation: median or mad is None, returning 0.0")
+            return np.zeros(len(values))
+        mad = float(mad) or 1e-10
+        return (values - float(median)) / (mad * 1.4826)
+
+    def compute(self, baselines: dict) -> pd.DataFrame:
+        """
+        Compute all the metrics and their modified z-scores.
+        Args:
+            baselines: dict - metric name -> the latest baseline record of the metric (None if there is no baseline)
+        Returns:
+            pd.DataFrame - The results, one row per (session, metric) with the columns of RESULT_COLUMNS
+        """
+        results = []
+        for metric_name, (values, valid) in self.compute_metric_values().items():
+            if not valid.any():
+                continue
+            baseline_values_for_metric = baselines.get(metric_name)
+            metric_values = values[valid]
+            results.append(pd.DataFrame({
+                'session_uid': self.sessions['session_uid'].to_numpy()[valid],
+                'metric': metric_name,
+                'table_name': self.METRIC_TABLES[metric_name],
+                'value': metric_values,
+                'modified_z_score': self.modified_z_scores(metric_values, baseline_values_for_metric),
+                'included_baseline_metric': baseline_values_for_metric.get('id') if baseline_values_for_metric is not None else None,
+            }))
+
+        if not results:
+            return pd.DataFrame(columns=self.RESULT_COLUMNS)
+        return pd.concat(results, ignore_index=True)
@@ -0,0 +1,106 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# The encoding of the timing blobs: little-endian float32 deltas (the first delta is the first value)
+TIMINGS_ENCODING = 'delta-f32le'
+_DELTA_DTYPE = np.dtype('<f4')
+
+# The raw timing arrays of a LogBoard typing session document -> the column of TypingSessionTimings
+TIMING_SERIES = {
+    'ikiList': 'iki',
+    'pauseCtCList': 'pause_ctc',
+    'pauseWtWList': 'pause_wtw',
+}
+
+def encode_timings(values) -> bytes:
+    """
+    Encode a timing array (ex. the IKI durations of a session, in seconds) as float32 deltas.
+    Each delta is taken from the decoded previous value (not the exact one), so the float32 rounding
+    does not accumulate: every decoded value is within one float32 rounding of the original.
+    Args:
+        values: list/np.ndarray - The timing values
+    Returns:
+        bytes - The blob (4 bytes per value)
+    """
+    values = np.asarray(values, dtype=float)
+    deltas = np.empty(len(values), dtype=_DELTA_DTYPE)
+    decoded = 0.0
+    for i, value in enumerate(values.tolist()):
+        deltas[i] = value - decoded
+        decoded += float(deltas[i])
+    return deltas.tobytes()
+
+def decode_timings(blob: bytes, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Decode a timing blob of encode_timings.
+    The deltas are read in place (np.frombuffer, no copy of the blob), the values are accumulated in float64.
+    Args:
+        blob: bytes - The blob
+        out: np.ndarray - A float64 array to write the values into (ex. a slice of a bulk array)
+    Returns:
+        np.ndarray - The values
+    """
+    deltas = np.frombuffer(blob, dtype=_DELTA_DTYPE)
+    return np.cumsum(deltas, dtype=np.float64, out=out)
+
+class TypingTimingsBatch:
+    """
+    The raw timing arrays of many typing sessions, decoded into one flat float64 array per series
+    with offsets (CSR layout): the values of session i are values[offsets[i]:offsets[i + 1]].
+    The arrays of a session are views of the flat array, so the rhythm metrics of all the sessions can be
+    computed with array operations (ex. np.add.reduceat) without one row per value in the database.
+    """
+
+    def __init__(self, session_uids: list, series: dict):
+        """
+        Args:
+            session_uids: list - The sessions, in the order of the offsets
+            series: dict - series name (ex. iki) -> (values, offsets)
+        """
+        self.session_uids = session_uids
+        self.series = series
+        self._index = {session_uid: i for i, session_uid in enumerate(session_uids)}
+
+    @classmethod
+    def from_rows(cls, rows: list) -> "TypingTimingsBatch":
+        """
+        Decode the rows of TypingSessionTimings (or dicts with the same fields).
+        Each series is decoded into one preallocated array, without an intermediate array per session.
+        """
+        session_uids = [cls._field(row, 'typing_session_id') for row in rows]
+        series = {}
+        for series_name in TIMING_SERIES.values():
+            counts = np.array([cls._field(row, f'{series_name}_count') or 0 for row in rows], dtype=np.int64)
+            offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            values = np.empty(offsets[-1], dtype=np.float64)
+            for i, row in enumerate(rows):
+                if counts[i]:
+                    decode_timings(cls._field(row, f'{series_name}_deltas'), out=values[offsets[i]:offsets[i + 1]])
+            series[series_name] = (values, offsets)
+        return cls(session_uids, series)
+
+    def values(self, series_name: str) -> np.ndarray:
+        """The flat array of the values of a series (ex. iki) of all the sessions."""
+        return self.series[series_name][0]
+
+    def offsets(self, series_name: str) -> np.ndarray:
+        return self.series[series_name][1]
+
+    def session_values(self, series_name: str, session_uid: str) -> np.ndarray | None:
+        """The values of a series of a session (a view of the flat array), None if the session is not in the batch."""
+        i = self._index.get(session_uid)
+        if i is None:
+            return None
+        values, offsets = self.series[series_name]
+        return values[offsets[i]:offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.session_uids)
+
+    @staticmethod
+    def _field(row, field: str):
+        return row[field] if isinstance(row, dict) else getattr(row, field)
@@ -368,4 +368,15 @@ CREATE TABLE public.Users (
   user_email text,
   app_origin text,
   CONSTRAINT Users_pkey PRIMARY KEY (id)
-);
\ No newline at end of file
+);
+-- Latest baseline of each metric of a user, used by SupabaseService.get_latest_baselines
+CREATE INDEX Baseline_Metrics_user_metric_date_idx ON public.Baseline_Metrics (user_uid, metric_name, date_created DESC, id DESC);
+CREATE OR REPLACE FUNCTION public.get_latest_baselines(input_user_uid_param text, metric_names_param text[])
+RETURNS TABLE (id bigint, metric_name text, baseline_median double precision, baseline_mad double precision, date_created date)
+LANGUAGE sql STABLE AS $$
+  SELECT DISTINCT ON (bm.metric_name) bm.id, bm.metric_name, bm.baseline_median, bm.baseline_mad, bm.date_created
+  FROM public.Baseline_Metrics bm
+  WHERE bm.user_uid = input_user_uid_param
+    AND bm.metric_name = ANY(metric_names_param)
+  ORDER BY bm.metric_name, bm.date_created DESC, bm.id DESC;
+$$;
@@ -0,0 +1,203 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from haversine import haversine, Unit
+from sklearn.metrics.pairwise import haversine_distances
+
+# Run from the ServerAnalysis directory (python scripts/gps_benchmarks.py), the settings need SUPABASE_URL and SUPABASE_KEY
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.services.analysis_service import AnalysisService
+from app.services.gps_segmentation import GPSRouteSegments
+
+SAMPLE_SECONDS = 30  # The GPS sample rate of LogMyself
+
+def synthetic_gps_day(n_points: int, seed: int = 0) -> pd.DataFrame:
+    """GPS points around a few places of a city (the key locations) with some far away outliers."""
+    rng = np.random.default_rng(seed)
+    places = np.array([37.98, 23.72]) + rng.normal(0, 0.02, (5, 2))
+    coords = places[rng.integers(0, len(places), n_points)] + rng.normal(0, 0.0015, (n_points, 2))
+    outliers = rng.random(n_points) < 0.01
+    coords[outliers] += rng.normal(0, 0.5, (outliers.sum(), 2))
+    return pd.DataFrame({
+        'latitude': coords[:, 0],
+        'longitude': coords[:, 1],
+        'timestamp_now': pd.date_range("2025-07-01", periods=n_points, freq=f"{SAMPLE_SECONDS}s"),
+    })
+
+def remove_outliers_with_distance_matrix(df: pd.DataFrame, min_distance: int) -> pd.DataFrame:
+    """The previous _remove_outliers_near_gps_points, with the N x N haversine distance matrix."""
+    coords_rad = np.radians(df[['latitude', 'longitude']].to_numpy())
+    dist_matrix = haversine_distances(coords_rad) * 6371000
+    np.fill_diagonal(dist_matrix, np.inf)
+    return df[(dist_matrix < min_distance).any(axis=1)].reset_index(drop=True)
+
+def _best_time(function, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_outlier_filter(sizes: list | None = None, min_distance: int = 500, repeats: int = 3, max_matrix_points: int = 12000):
+    """
+    Compare the neighbor outlier filter (BallTree) with the distance matrix for growing numbers of points
+    (2880 points is one day of 30 second samples), and print where the BallTree becomes faster.
+    The distance matrix is skipped above max_matrix_points, it needs 8 * N^2 bytes.
+    """
+    sizes = sizes or [100, 250, 500, 1000, 2880, 5760, 11520, 20160, 86400]
+    analysis_service = AnalysisService.__new__(AnalysisService)  # The filter does not use the services
+
+    print(f"{'points':>8} {'matrix MB':>10} {'matrix ms':>10} {'tree ms':>10} {'same result':>12}")
+    print("-" * 56)
+    crossover = None
+    for n_points in sizes:
+        df = synthetic_gps_day(n_points)
+        tree_seconds = _best_time(lambda: analysis_service._remove_outliers_near_gps_points(df, min_distance), repeats)
+        matrix_mb = 8 * n_points ** 2 / 1e6
+
+        if n_points <= max_matrix_points:
+            matrix_seconds = _best_time(lambda: remove_outliers_with_distance_matrix(df, min_distance), repeats)
+            same = analysis_service._remove_outliers_near_gps_points(df, min_distance).equals(
+                remove_outliers_with_distance_matrix(df, min_distance)
+            )
+            # The crossover is the first size from which the BallTree stays faster
+            if tree_seconds >= matrix_seconds:
+                crossover = None
+            elif crossover is None:
+                crossover = n_points
+            print(f"{n_points:>8} {matrix_mb:>10.1f} {matrix_seconds * 1000:>10.1f} {tree_seconds * 1000:>10.1f} {str(same):>12}")
+        else:
+            print(f"{n_points:>8} {matrix_mb:>10.1f} {'skipped':>10} {tree_seconds * 1000:>10.1f} {'-':>12}")
+
+    print("-" * 56)
+    print(f"The BallTree is faster from {crossover} points" if crossover else "The BallTree was not faster for these sizes")
+
+def synthetic_commuter_day(n_stops: int, points_per_stop: int = 6, points_per_transition: int = 4, seed: int = 0) -> pd.DataFrame:
+    """
+    A route with many short stops (a dense-transition day, ex. a courier or a commuter): the points of a stop
+    are at its key location (belonging_key_loc), the points between the stops do not belong to a key location.
+    The route is indexed by position in time, like the GPS data after the cleaning.
+    """
+    rng = np.random.default_rng(seed)
+    key_locs = np.array([37.98, 23.72]) + rng.normal(0, 0.03, (max(n_stops // 3, 2), 2))
+    rows = []
+    for stop in range(n_stops):
+        key_loc = stop % len(key_locs)
+        rows += [(key_locs[key_loc, 0], key_locs[key_loc, 1], float(key_loc), 'NOT_IDENTIFIED')] * points_per_stop
+        start, end = key_locs[key_loc], key_locs[(stop + 1) % len(key_locs)]
+        for step in range(1, points_per_transition + 1):
+            point = start + (end - start) * step / (points_per_transition + 1) + rng.normal(0, 0.0005, 2)
+            rows.append((point[0], point[1], np.nan, np.nan))
+    df = pd.DataFrame(rows, columns=['latitude', 'longitude', 'belonging_key_loc', 'type'])
+    df['timestamp_now'] = pd.date_range("2025-07-01", periods=len(df), freq=f"{SAMPLE_SECONDS}s", tz="Europe/Athens")
+    df['gps_event_id'] = [f"gps_event_{i}" for i in range(len(df))]
+    return df
+
+def transitions_with_event_id_lookups(df: pd.DataFrame) -> list:
+    """
+    The transition clusters of the previous _compute_transitions_info_of_key_locations_clusters (the reference of the benchmark):
+    an iterrows pass where the neighbour key locations of each transition are found by scanning the gps_event_id column.
+    """
+    df = df.sort_values(by='timestamp_now')
+
+    def transition_info(cluster: list, last: bool) -> dict:
+        cluster_df = pd.DataFrame(cluster)
+        start_index = df[df['gps_event_id'] == cluster_df['gps_event_id'].iloc[0]].index - 1
+        end_index = df[df['gps_event_id'] == cluster_df['gps_event_id'].iloc[-1]].index + (0 if last else 1)
+        distance_km = sum(
+            haversine(tuple(cluster_df.iloc[i - 1][['latitude', 'longitude']]), tuple(cluster_df.iloc[i][['latitude', 'longitude']]), Unit.KILOMETERS)
+            for i in range(1, len(cluster_df))
+        )
+        return {
+            'key_loc_start_id': df['belonging_key_loc'].iloc[start_index[0]],
+            'key_loc_end_id': df['belonging_key_loc'].iloc[end_index[0] - (1 if last else 0)],
+            'time_spent_seconds': round((cluster_df['timestamp_now'].iloc[-1] - cluster_df['timestamp_now'].iloc[0]).total_seconds(), 3),
+            'total_distance_km': distance_km,
+            'num_of_gps_events': len(cluster_df),
+        }
+
+    transitions, cluster = [], []
+    for _, gps_event in df.iterrows():
+        if np.isnan(gps_event['belonging_key_loc']):
+            cluster.append(gps_event)
+        elif cluster:
+            transitions.append(transition_info(cluster, last=False))
+            cluster = []
+    if cluster:
+        transitions.append(transition_info(cluster, last=True))
+    return transitions
+
+def benchmark_transitions(stops: list | None = None, repeats: int = 3, max_reference_stops: int = 800):
+    """
+    Regression benchmark of the transition extraction on dense-transition days: the run-length segmentation
+    (GPSRouteSegments and the positional transition builder) against the previous gps_event_id lookups.
+    The reference is skipped above max_reference_stops, its cost grows with (transitions x points).
+    """
+    stops = stops or [25, 50, 100, 200, 400, 800, 1600]
+    analysis_service = AnalysisService.__new__(AnalysisService)
+    columns = ['key_loc_start_id', 'key_loc_end_id', 'time_spent_seconds', 'total_distance_km', 'num_of_gps_events']
+
+    print(f"{'stops':>6} {'points':>7} {'lookups ms':>11} {'segments ms':>12} {'same result':>12}")
+    print("-" * 52)
+    for n_stops in stops:
+        df = synthetic_commuter_day(n_stops)
+        segments_seconds = _best_time(lambda: analysis_service._compute_transitions_info_of_key_locations_clusters(df), repeats)
+
+        if n_stops <= max_reference_stops:
+            lookups_seconds = _best_time(lambda: transitions_with_event_id_lookups(df), 1)
+            reference = pd.DataFrame(transitions_with_event_id_lookups(df), columns=columns)
+            segmented = GPSRouteSegments(df).transitions[columns]
+            same = np.allclose(reference.to_numpy(dtype=float), segmented.to_numpy(dtype=float), equal_nan=True)
+            print(f"{n_stops:>6} {len(df):>7} {lookups_seconds * 1000:>11.1f} {segments_seconds * 1000:>12.1f} {str(same):>12}")
+        else:
+            print(f"{n_stops:>6} {len(df):>7} {'skipped':>11} {segments_seconds * 1000:>12.1f} {'-':>12}")
+
+def synthetic_stationary_day(n_points: int, n_places: int = 6, seed: int = 0) -> pd.DataFrame:
+    """
+    A day of long stays at a few places (GPS noise of about 10 meters) with short trips between them,
+    the usual day of the key location clustering (ex. a night at home is about 1000 points).
+    """
+    rng = np.random.default_rng(seed)
+    places = np.array([37.98, 23.72]) + rng.normal(0, 0.02, (n_places, 2))
+    stays = rng.integers(0, n_places, n_places * 2)
+    stay_of_point = stays[np.minimum((np.arange(n_points) * len(stays)) // n_points, len(stays) - 1)]
+    coords = places[stay_of_point] + rng.normal(0, 0.0001, (n_points, 2))
+    trips = rng.random(n_points) < 0.05
+    coords[trips] += rng.normal(0, 0.01, (trips.sum(), 2))
+    return pd.DataFrame({
+        'latitude': coords[:, 0],
+        'longitude': coords[:, 1],
+        'timestamp_now': pd.date_range("2025-07-01", periods=n_points, freq=f"{SAMPLE_SECONDS}s", tz="Europe/Athens"),
+    })
+
+def benchmark_key_locations(sizes: list | None = None, eps: int = 50, samples: int = 60, grid_fraction: float = 0.1, repeats: int = 3):
+    """
+    Compare the key location clustering on the grid cells (weighted DBSCAN) with the clustering of every point,
+    and print the share of points that are in a key location with both (the grid moves the points by at most a cell).
+    """
+    sizes = sizes or [500, 1000, 2880, 5760, 11520, 20160]
+    analysis_service = AnalysisService.__new__(AnalysisService)
+
+    print(f"{'points':>8} {'cells':>7} {'points ms':>10} {'grid ms':>10} {'key locs':>9} {'same points':>12}")
+    print("-" * 62)
+    for n_points in sizes:
+        df = synthetic_stationary_day(n_points)
+        points_df, grid_df = df.copy(), df.copy()
+        points_seconds = _best_time(lambda: analysis_service._identify_key_locations(points_df, eps, samples, SAMPLE_SECONDS), repeats)
+        grid_seconds = _best_time(lambda: analysis_service._identify_key_locations(grid_df, eps, samples, SAMPLE_SECONDS, grid_fraction), repeats)
+
+        n_cells = len(analysis_service._snap_to_grid(np.radians(df[['latitude', 'longitude']].to_numpy()), eps / 6371000 * grid_fraction)[1])
+        key_locs = f"{points_df['cluster'].max() + 1}/{grid_df['cluster'].max() + 1}"
+        same = ((points_df['cluster'] == -1) == (grid_df['cluster'] == -1)).mean()
+        print(f"{n_points:>8} {n_cells:>7} {points_seconds * 1000:>10.1f} {grid_seconds * 1000:>10.1f} {key_locs:>9} {same:>12.2%}")
+
+if __name__ == "__main__":
+    benchmark_outlier_filter()
+    print()
+    benchmark_transitions()
+    print()
+    benchmark_key_locations()
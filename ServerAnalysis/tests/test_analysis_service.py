@@ -0,0 +1,125 @@
+"""
+Test module for AnalysisService.calc_and_store_typing_stats.
+
+The Typing_Sessions select of Supabase is answered by a stub that embeds the metric tables like PostgREST:
+these tests compare the decision percentages of the joined select with the ones of the former
+per-table reads (a set of (session_uid, decision) of every metric table).
+"""
+
+import re
+import pytest
+from unittest.mock import Mock
+
+from app.services.analysis_service import AnalysisService
+from app.services.supabase_service import SupabaseService
+
+
+METRIC_TABLES = [
+    'Pressure_Intensity_Data',
+    'Cognitive_Processing_Efficiency_Data',
+    'Cognitive_Processing_Index_Data',
+    'Correction_Efficiency_Data',
+    'Effort_To_Output_Ratio_Data',
+    'Net_Production_Rate_Data',
+    'Pause_To_Production_Ratio_Data',
+    'Typing_Rhythm_Stability_Data',
+]
+
+DECISION_CATEGORIES = ["Critical", "Very Bad", "Normal", "Very Good", "Excellent"]
+
+
+class StubTypingSessionsQuery:
+    """A select of Typing_Sessions, the embedded tables (ex. Pressure_Intensity_Data(value)) are lists of the rows of the session."""
+
+    def __init__(self, sessions: list):
+        self.sessions = sessions
+        self.columns = []
+        self.embedded = {}
+
+    def select(self, select_query: str):
+        self.embedded = {table_name: [column.strip() for column in columns.split(',')] for table_name, columns in re.findall(r"(\w+)\(([^)]*)\)", select_query)}
+        self.columns = [column.strip() for column in re.sub(r"\w+\([^)]*\)", "", select_query).split(',') if column.strip()]
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def execute(self):
+        data = []
+        for session in self.sessions:
+            row = {column: session[column] for column in self.columns}
+            for table_name, columns in self.embedded.items():
+                value = session['values'].get(table_name)
+                row[table_name] = [] if value is None else [{'session_uid': session['session_uid'], 'value': value}]
+            data.append(row)
+        return Mock(data=data)
+
+
+def per_table_percentages(sessions: list) -> dict:
+    """The former percentages: the set of (session_uid, decision) of the rows of every metric table, over all its decisions."""
+    session_decision_set = set()
+    for table_name in METRIC_TABLES:
+        for session in sessions:
+            if session['values'].get(table_name) is not None:
+                session_decision_set.add((session['session_uid'], session['cognitive_decision']))
+    decisions = [decision for _, decision in session_decision_set]
+    return {category: decisions.count(category) / len(decisions) * 100 for category in DECISION_CATEGORIES}
+
+
+class TestCalcAndStoreTypingStats:
+    """Test class for the decision percentages of AnalysisService.calc_and_store_typing_stats."""
+
+    def setup_method(self):
+        """Set up an AnalysisService with a SupabaseService whose client is a stub."""
+        self.sessions = [
+            {'session_uid': "s1", 'cognitive_decision': "Normal", 'values': dict.fromkeys(METRIC_TABLES, 1.0)},
+            {'session_uid': "s2", 'cognitive_decision': "Critical", 'values': {'Pressure_Intensity_Data': 3.5}},
+            {'session_uid': "s3", 'cognitive_decision': "Excellent", 'values': {'Typing_Rhythm_Stability_Data': 0.7, 'Net_Production_Rate_Data': 2.0}},
+            {'session_uid': "s4", 'cognitive_decision': "Very Good", 'values': {}},  # No metric values, not counted
+            {'session_uid': "s5", 'cognitive_decision': "Normal", 'values': {'Correction_Efficiency_Data': 0.9}},
+            {'session_uid': "s6", 'cognitive_decision': None, 'values': {'Pressure_Intensity_Data': 4.0}},  # Not decided yet
+        ]
+        supabase_service = SupabaseService.__new__(SupabaseService)
+        supabase_service.client = Mock()
+        supabase_service.client.table.side_effect = lambda table_name: StubTypingSessionsQuery(self.sessions)
+        supabase_service.send_data = Mock(return_value=True)
+
+        self.analysis_service = AnalysisService.__new__(AnalysisService)
+        self.analysis_service.supabase_service = supabase_service
+
+    def _sent_payload(self) -> dict:
+        return self.analysis_service.supabase_service.send_data.call_args.args[3]
+
+    def test_percentages_match_the_per_table_decisions(self):
+        """The sessions with some metric values missing are counted once, like in the per-table set of decisions."""
+        # Arrange
+        expected = per_table_percentages(self.sessions)
+
+        # Act
+        status = self.analysis_service.calc_and_store_typing_stats("test_user_123", 7, "2024-01-01")
+
+        # Assert
+        assert status is True
+        payload = self._sent_payload()
+        assert payload['analysis_id'] == 7
+        assert payload['percentage_critical'] == pytest.approx(expected["Critical"])
+        assert payload['percentage_very_bad'] == pytest.approx(expected["Very Bad"])
+        assert payload['percentage_normal'] == pytest.approx(expected["Normal"])
+        assert payload['percentage_very_good'] == pytest.approx(expected["Very Good"])
+        assert payload['percentage_excellent'] == pytest.approx(expected["Excellent"])
+        # s4 has no values, s6 has no decision but is in the total
+        assert payload['percentage_normal'] == pytest.approx(40.0)
+        assert payload['percentage_very_good'] == 0
+        assert payload['total_typing_cognitive_score'] == pytest.approx((2 * 20.0 - 2 * 20.0) / 100)
+
+    def test_day_without_metric_values_is_not_stored(self):
+        """If no session has a metric value there are no decisions to count."""
+        # Arrange
+        self.sessions[:] = [session for session in self.sessions if not session['values']]
+
+        # Act
+        status = self.analysis_service.calc_and_store_typing_stats("test_user_123", 7, "2024-01-01")
+
+        # Assert
+        assert status is False
+        self.analysis_service.supabase_service.send_data.assert_not_called()
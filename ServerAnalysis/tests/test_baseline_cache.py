@@ -0,0 +1,306 @@
+"""
+Test module for BaselineCache.
+
+Redis is replaced by an in-memory fake (shared by the caches of a test, like the processes share Redis),
+or by a client that always fails to test the in-process path.
+"""
+
+import pytest
+import redis
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+
+from app.config import settings
+from app.services import baseline_cache as baseline_cache_module
+from app.services.baseline_cache import BaselineCache
+from app.services import supabase_service as supabase_service_module
+from app.services.supabase_service import SupabaseService
+
+
+class FakeRedis:
+    """The Redis commands used by BaselineCache, in memory (the expiry is not simulated)."""
+
+    def __init__(self):
+        self.values = {}
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        return self.values.get(key)
+
+    def mget(self, keys):
+        self.calls += 1
+        return [self.values.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.calls += 1
+        self.values[key] = value.encode() if isinstance(value, str) else value
+
+    def incr(self, key):
+        self.calls += 1
+        self.values[key] = str(int(self.values.get(key) or 0) + 1).encode()
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, fake_redis: FakeRedis):
+        self.fake_redis = fake_redis
+        self.commands = []
+
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value, ex))
+
+    def execute(self):
+        for key, value, ex in self.commands:
+            self.fake_redis.set(key, value, ex=ex)
+
+
+class FailingRedis(FakeRedis):
+    """A Redis that is not available."""
+
+    def get(self, key):
+        self.calls += 1
+        raise redis.ConnectionError("Redis is down")
+
+    def mget(self, keys):
+        self.calls += 1
+        raise redis.ConnectionError("Redis is down")
+
+    def incr(self, key):
+        self.calls += 1
+        raise redis.ConnectionError("Redis is down")
+
+    def pipeline(self):
+        failing = self
+
+        class FailingPipeline(FakePipeline):
+            def execute(self):
+                failing.calls += 1
+                raise redis.ConnectionError("Redis is down")
+
+        return FailingPipeline(self)
+
+
+def make_cache(fake_redis, max_entries: int = 100) -> BaselineCache:
+    cache = BaselineCache(redis_url="redis://localhost:6379/0", max_entries=max_entries)
+    cache._redis = fake_redis
+    return cache
+
+
+class TestBaselineCache:
+    """Test class for the records, the versions and the TTL of BaselineCache."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.fake_redis = FakeRedis()
+        self.cache = make_cache(self.fake_redis)
+        self.user_uid = "test_user_123"
+        self.record = {'id': 1, 'baseline_median': 420.0, 'baseline_mad': 30.0, 'date_created': datetime.now().isoformat()}
+
+    def test_records_are_cached_and_missing_metrics_are_reported(self):
+        """The cached records are returned (None for a metric without baseline), the others are misses."""
+        # Arrange
+        self.cache.set_many(self.user_uid, {'SLEEP_TIME': self.record, 'CALL_DURATION': None})
+
+        # Act
+        records, misses = self.cache.get_many(self.user_uid, ['SLEEP_TIME', 'CALL_DURATION', 'ENTROPY'])
+
+        # Assert
+        assert records == {'SLEEP_TIME': self.record, 'CALL_DURATION': None}
+        assert misses == ['ENTROPY']
+
+    def test_records_are_shared_through_redis(self):
+        """Another process (another cache with the same Redis) reads the records from Redis."""
+        # Arrange
+        self.cache.set_many(self.user_uid, {'SLEEP_TIME': self.record})
+        other_process = make_cache(self.fake_redis)
+
+        # Act
+        records, misses = other_process.get_many(self.user_uid, ['SLEEP_TIME'])
+
+        # Assert
+        assert misses == []
+        assert records['SLEEP_TIME']['baseline_median'] == 420.0
+
+    def test_invalidate_user_invalidates_every_process(self):
+        """Incrementing the version of the user in Redis invalidates the in-process entries of the other processes."""
+        # Arrange
+        self.cache.set_many(self.user_uid, {'SLEEP_TIME': self.record})
+        other_process = make_cache(self.fake_redis)
+
+        # Act
+        other_process.invalidate_user(self.user_uid)
+        records, misses = self.cache.get_many(self.user_uid, ['SLEEP_TIME'])
+
+        # Assert
+        assert records == {}
+        assert misses == ['SLEEP_TIME']
+
+    def test_records_read_before_an_invalidation_are_not_cached(self):
+        """The records read with a version that was invalidated meanwhile are not stored under the new version."""
+        # Arrange
+        version = self.cache.get_version(self.user_uid)
+        self.cache.invalidate_user(self.user_uid)  # New baselines saved while the old ones were read
+
+        # Act
+        self.cache.set_many(self.user_uid, {'SLEEP_TIME': self.record}, version=version)
+        records, misses = self.cache.get_many(self.user_uid, ['SLEEP_TIME'])
+
+        # Assert
+        assert misses == ['SLEEP_TIME']
+        assert not any(key.startswith("baseline_cache:test_user_123:") for key in self.fake_redis.values)
+
+    def test_expired_records_are_misses(self):
+        """A record expires when its baseline can be refreshed."""
+        # Arrange
+        self.cache.set_many(self.user_uid, {'SLEEP_TIME': self.record})
+        self.fake_redis.values = {}  # Only the in-process entry is left
+
+        # Act
+        ttl = BaselineCache._ttl_seconds(self.record)
+        with patch.object(baseline_cache_module.time, 'time', return_value=baseline_cache_module.time.time() + ttl + 1):
+            records, misses = self.cache.get_many(self.user_uid, ['SLEEP_TIME'])
+
+        # Assert
+        assert misses == ['SLEEP_TIME']
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """The in-process cache keeps at most max_entries records."""
+        # Arrange
+        cache = make_cache(FailingRedis(), max_entries=2)
+
+        # Act
+        cache.set_many(self.user_uid, {'A': self.record, 'B': self.record})
+        cache.get_many(self.user_uid, ['A'])
+        cache.set_many(self.user_uid, {'C': self.record})
+
+        # Assert
+        assert list(cache._entries) == [(self.user_uid, 'A'), (self.user_uid, 'C')]
+
+
+class TestBaselineCacheTtl:
+    """Test class for BaselineCache._ttl_seconds."""
+
+    def test_ttl_is_until_the_baseline_can_be_refreshed(self):
+        """The TTL ends BASELINE_CACHE_REFRESH_DAYS after the baseline was created."""
+        # Arrange
+        date_created = datetime.now() - timedelta(days=settings.BASELINE_CACHE_REFRESH_DAYS - 2)
+
+        # Act
+        ttl = BaselineCache._ttl_seconds({'date_created': date_created.isoformat()})
+
+        # Assert
+        assert ttl == pytest.approx(timedelta(days=2).total_seconds(), abs=5)
+
+    def test_ttl_accepts_dates_and_aware_datetimes(self):
+        """The date_created of Supabase can be a date or a datetime with a timezone."""
+        # Act
+        ttl_from_date = BaselineCache._ttl_seconds({'date_created': datetime.now().date()})
+        ttl_from_aware = BaselineCache._ttl_seconds({'date_created': "2999-01-01T00:00:00+02:00"})
+
+        # Assert
+        assert ttl_from_date > timedelta(days=settings.BASELINE_CACHE_REFRESH_DAYS - 1).total_seconds()
+        assert ttl_from_aware > timedelta(days=365).total_seconds()
+
+    def test_refreshable_and_missing_baselines_use_the_minimum_ttl(self):
+        """A baseline that can already be refreshed, or no baseline, is cached for the minimum TTL."""
+        # Arrange
+        old_record = {'date_created': (datetime.now() - timedelta(days=100)).isoformat()}
+
+        # Act & Assert
+        assert BaselineCache._ttl_seconds(old_record) == settings.BASELINE_CACHE_MIN_TTL_SECONDS
+        assert BaselineCache._ttl_seconds(None) == settings.BASELINE_CACHE_MIN_TTL_SECONDS
+        assert BaselineCache._ttl_seconds({'id': 1}) == settings.BASELINE_CACHE_MIN_TTL_SECONDS
+
+
+class TestBaselineCacheWithoutRedis:
+    """Test class for the in-process path when Redis is not available."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.failing_redis = FailingRedis()
+        self.cache = make_cache(self.failing_redis)
+        self.user_uid = "test_user_123"
+        self.record = {'id': 1, 'baseline_median': 420.0, 'date_created': datetime.now().isoformat()}
+
+    def test_in_process_cache_works_without_redis(self):
+        """The records and the invalidations work in the process when Redis fails."""
+        # Act
+        self.cache.set_many(self.user_uid, {'SLEEP_TIME': self.record})
+        records, misses = self.cache.get_many(self.user_uid, ['SLEEP_TIME'])
+
+        # Assert
+        assert records == {'SLEEP_TIME': self.record}
+        assert misses == []
+
+        self.cache.invalidate_user(self.user_uid)
+        assert self.cache.get_many(self.user_uid, ['SLEEP_TIME']) == ({}, ['SLEEP_TIME'])
+
+    def test_redis_is_not_used_for_a_minute_after_an_error(self):
+        """After an error Redis is skipped, and it is tried again after a minute."""
+        # Arrange
+        now = baseline_cache_module.time.time()
+        with patch.object(baseline_cache_module.time, 'time', return_value=now):
+            self.cache.get_version(self.user_uid)
+            calls_after_error = self.failing_redis.calls
+
+            # Act
+            self.cache.set_many(self.user_uid, {'SLEEP_TIME': self.record})
+            self.cache.get_many(self.user_uid, ['ENTROPY'])
+            self.cache.invalidate_user(self.user_uid)
+
+        # Assert
+        assert calls_after_error == 1
+        assert self.failing_redis.calls == 1
+        assert self.cache._redis_retry_at == pytest.approx(now + 60)
+
+        with patch.object(baseline_cache_module.time, 'time', return_value=now + 61):
+            self.cache.get_version(self.user_uid)
+        assert self.failing_redis.calls == 2
+
+
+class TestLatestBaselinesCaching:
+    """Test class for the use of the cache by SupabaseService.get_latest_baselines."""
+
+    def setup_method(self):
+        """Set up a SupabaseService with a mocked client and a cache with a fake Redis."""
+        self.cache = make_cache(FakeRedis())
+        self.user_uid = "test_user_123"
+        self.row = {'id': 1, 'metric_name': 'SLEEP_TIME', 'baseline_median': 420.0, 'baseline_mad': 30.0, 'date_created': datetime.now().isoformat()}
+
+        self.supabase_service = SupabaseService.__new__(SupabaseService)
+        self.supabase_service._latest_baselines_rpc_missing = False
+        self.supabase_service.client = Mock()
+
+    def test_cached_metrics_are_not_requested_again(self):
+        """The second call is served by the cache."""
+        # Arrange
+        self.supabase_service.client.rpc.return_value.execute.return_value.data = [self.row]
+
+        # Act
+        with patch.object(supabase_service_module, 'get_baseline_cache', return_value=self.cache):
+            first = self.supabase_service.get_latest_baselines(self.user_uid, ['SLEEP_TIME'])
+            second = self.supabase_service.get_latest_baselines(self.user_uid, ['SLEEP_TIME'])
+
+        # Assert
+        assert first == second == {'SLEEP_TIME': self.row}
+        assert self.supabase_service.client.rpc.call_count == 1
+
+    def test_rows_read_during_an_invalidation_are_not_cached(self):
+        """If new baselines are saved while the rows are read, the old rows are not cached."""
+        # Arrange
+        def read_rows_and_save_new_baselines():
+            self.cache.invalidate_user(self.user_uid)
+            return Mock(data=[self.row])
+
+        self.supabase_service.client.rpc.return_value.execute.side_effect = read_rows_and_save_new_baselines
+
+        # Act
+        with patch.object(supabase_service_module, 'get_baseline_cache', return_value=self.cache):
+            baselines = self.supabase_service.get_latest_baselines(self.user_uid, ['SLEEP_TIME'])
+
+        # Assert
+        assert baselines == {'SLEEP_TIME': self.row}
+        assert self.cache.get_many(self.user_uid, ['SLEEP_TIME']) == ({}, ['SLEEP_TIME'])
@@ -0,0 +1,170 @@
+"""
+Test module for TypingBaselineEngine.
+
+The daily states are stored in an in-memory SQLite database: these tests compare the baselines
+merged from the states with the ones of the get_baseline_metrics RPC (computed here with numpy)
+and check when the states do not cover a period, so the RPC is used instead.
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import date
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.local_database.connection import Base
+from app.services.baseline_engine import TypingBaselineEngine
+from app.services.database_service import DatabaseService
+
+
+class TestTypingBaselineEngine:
+    """Test class for the typing baselines computed from the local daily states (TypingBaselineEngine)."""
+
+    METRICS = [("PRESSURE_INTENSITY", "avg_pi", "std_pi", "median_pi", "mad_pi")]
+
+    def setup_method(self):
+        """Set up an in-memory database."""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        self.db_session = sessionmaker(bind=engine)()
+        self.test_user_uid = "test_user_123"
+        self.engine = TypingBaselineEngine(DatabaseService(self.db_session))
+
+    def teardown_method(self):
+        self.db_session.close()
+
+    def _store_days(self, days_values, first_day: int = 1):
+        for day_index, values in enumerate(days_values):
+            results = pd.DataFrame({'metric': "PRESSURE_INTENSITY", 'value': values})
+            assert self.engine.update_day(self.test_user_uid, date(2024, 1, first_day + day_index), results)
+
+    @staticmethod
+    def _rpc_baseline(values):
+        """The baseline of the get_baseline_metrics RPC: avg, stddev (sample), median and MAD of the values."""
+        values = np.concatenate(values)
+        median = np.median(values)
+        return values.mean(), values.std(ddof=1), median, np.median(np.abs(values - median))
+
+    def test_baseline_within_the_sketch_size_is_exact(self):
+        """While the values of the period fit in the sketch (255 <= 256 values), the baseline is the one of the RPC."""
+        # Arrange
+        rng = np.random.default_rng(0)
+        days_values = [rng.lognormal(0, 0.5, size) for size in (40, 75, 80, 60)]
+        assert sum(len(values) for values in days_values) <= settings.TYPING_BASELINE_SKETCH_SIZE
+        self._store_days(days_values)
+
+        # Act
+        baseline = self.engine.compute_baseline(self.test_user_uid, "2024-01-01", "2024-01-04", self.METRICS)[0]
+
+        # Assert
+        for key, expected in zip(("avg_pi", "std_pi", "median_pi", "mad_pi"), self._rpc_baseline(days_values)):
+            assert baseline[key] == pytest.approx(expected, rel=1e-9)
+        assert baseline['first_session'] == "2024-01-01"
+        assert baseline['last_session'] == "2024-01-04"
+
+    def test_baseline_over_the_sketch_size_is_approximate(self):
+        """Over the sketch size the mean and std stay exact and the median and MAD are approximate."""
+        # Arrange
+        rng = np.random.default_rng(1)
+        days_values = [rng.lognormal(0, 0.5, size) for size in (300, 450, 250)]
+
+        # Act
+        with patch.object(settings, 'TYPING_BASELINE_SKETCH_SIZE', 64):
+            self._store_days(days_values)
+            baseline = self.engine.compute_baseline(self.test_user_uid, "2024-01-01", "2024-01-03", self.METRICS)[0]
+
+        # Assert
+        expected_mean, expected_std, expected_median, expected_mad = self._rpc_baseline(days_values)
+        assert baseline['avg_pi'] == pytest.approx(expected_mean, rel=1e-9)
+        assert baseline['std_pi'] == pytest.approx(expected_std, rel=1e-9)
+        assert baseline['median_pi'] == pytest.approx(expected_median, rel=0.05)
+        assert baseline['mad_pi'] == pytest.approx(expected_mad, rel=0.05)
+
+    def test_states_of_a_day_analyzed_again_are_replaced(self):
+        """The states of a day that is analyzed again replace the previous ones."""
+        # Arrange
+        self._store_days([[1.0, 2.0, 3.0]])
+
+        # Act
+        self._store_days([[10.0, 20.0, 30.0]])
+        baseline = self.engine.compute_baseline(self.test_user_uid, "2024-01-01", "2024-01-01", self.METRICS)[0]
+
+        # Assert
+        assert baseline['median_pi'] == 20.0
+        assert baseline['avg_pi'] == pytest.approx(20.0)
+
+
+class TestTypingBaselineEngineCoverage:
+    """Test class for the days that the daily states must cover (else the RPC is used)."""
+
+    METRICS = TestTypingBaselineEngine.METRICS
+
+    def setup_method(self):
+        """Set up an in-memory database."""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        self.db_session = sessionmaker(bind=engine)()
+        self.test_user_uid = "test_user_123"
+        self.engine = TypingBaselineEngine(DatabaseService(self.db_session))
+
+    def teardown_method(self):
+        self.db_session.close()
+
+    def _store_day(self, day: date, values=None):
+        results = pd.DataFrame({'metric': "PRESSURE_INTENSITY", 'value': values}) if values is not None else None
+        assert self.engine.update_day(self.test_user_uid, day, results)
+
+    def test_period_before_the_first_state_is_not_covered(self):
+        """A period that starts before the first recorded day falls back to the RPC (None)."""
+        # Arrange
+        assert self.engine.compute_baseline(self.test_user_uid, "2024-01-01", "2024-01-01", self.METRICS) is None
+        self._store_day(date(2024, 1, 1), [1.0, 2.0, 3.0])
+
+        # Act & Assert
+        assert self.engine.compute_baseline(self.test_user_uid, "2023-12-31", "2024-01-01", self.METRICS) is None
+        assert self.engine.compute_baseline(self.test_user_uid, "2024-01-01", "2024-01-01", self.METRICS)[0]['median_pi'] == 2.0
+
+    def test_missing_day_inside_the_period_is_not_covered(self):
+        """A day of the period without states (ex. analyzed while the engine was disabled) falls back to the RPC."""
+        # Arrange
+        self._store_day(date(2024, 1, 1), [1.0, 2.0])
+        self._store_day(date(2024, 1, 3), [3.0, 4.0])
+
+        # Act
+        baseline = self.engine.compute_baseline(self.test_user_uid, "2024-01-01", "2024-01-03", self.METRICS)
+
+        # Assert
+        assert baseline is None
+
+    def test_recorded_day_without_sessions_is_covered(self):
+        """A day analyzed without sessions is recorded, it covers its day without adding values."""
+        # Arrange
+        self._store_day(date(2024, 1, 1), [1.0, 2.0])
+        self._store_day(date(2024, 1, 2))
+        self._store_day(date(2024, 1, 3), [3.0, 4.0])
+
+        # Act
+        baseline = self.engine.compute_baseline(self.test_user_uid, "2024-01-01", "2024-01-03", self.METRICS)[0]
+
+        # Assert
+        assert baseline['avg_pi'] == pytest.approx(2.5)
+        assert baseline['median_pi'] == 2.5
+        assert baseline['first_session'] == "2024-01-01"
+        assert baseline['last_session'] == "2024-01-03"
+
+    def test_days_after_the_analyzed_day_are_not_required(self):
+        """The period ends now, the days after the analyzed day are not analyzed yet and are not required."""
+        # Arrange
+        self._store_day(date(2024, 1, 1), [1.0, 2.0])
+        self._store_day(date(2024, 1, 2), [3.0, 4.0])
+
+        # Act
+        baseline = self.engine.compute_baseline(self.test_user_uid, "2024-01-01", "2024-01-05T10:00:00", self.METRICS, date(2024, 1, 2))
+        without_analyzed_day = self.engine.compute_baseline(self.test_user_uid, "2024-01-01", "2024-01-05T10:00:00", self.METRICS)
+
+        # Assert
+        assert baseline[0]['median_pi'] == 2.5
+        assert without_analyzed_day is None
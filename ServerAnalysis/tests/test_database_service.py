@@ -14,7 +14,7 @@ from sqlalchemy.orm import Session
 
 # Import the classes and functions to test
 from app.services.database_service import DatabaseService
-from app.local_database.models import ScreenTimeEvent, SleepData
+from app.local_database.models import ScreenTimeEvent, SleepData, AppsSleepData, TypingSession, TypingSessionData
 
 
 class TestDatabaseServiceScreenTimeEvents:
@@ -418,6 +418,177 @@ class TestDatabaseServiceSleepData:
         assert self.test_user_uid in logged_message
 
 
+class TestDatabaseServicePartitions:
+    """Test class for the (analysis day, user) partitions of the local database."""
+
+    def setup_method(self):
+        """Set up an in-memory database with one user."""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app.local_database.connection import Base
+
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        self.db_session = sessionmaker(bind=engine)()
+
+        self.test_user_uid = "test_user_123"
+        DatabaseService(self.db_session).store_user(self.test_user_uid, "test@test.com", "LogMyself")
+
+        self.event = {
+            'event_id': "event_001",
+            'timeStart': datetime(2024, 1, 1, 9, 0, 0, tzinfo=timezone.utc),
+            'timeEnd': datetime(2024, 1, 1, 10, 0, 0, tzinfo=timezone.utc),
+            'duration': 3600000
+        }
+
+    def teardown_method(self):
+        self.db_session.close()
+
+    def _partition_service(self, day):
+        service = DatabaseService(self.db_session, DatabaseService.build_partition_key(self.test_user_uid, day))
+        assert service.register_partition(self.test_user_uid, day)
+        return service
+
+    def test_same_event_is_stored_once_per_partition(self):
+        """The same event can be ingested by two days, and each day only reads its own copy."""
+        first_day = self._partition_service(datetime(2024, 1, 1).date())
+        second_day = self._partition_service(datetime(2024, 1, 2).date())
+
+        assert first_day.bulk_store_events('screen_time_events', self.test_user_uid, [self.event]) == 0
+        assert first_day.bulk_store_events('screen_time_events', self.test_user_uid, [self.event]) == 0
+        assert second_day.bulk_store_events('screen_time_events', self.test_user_uid, [self.event]) == 0
+
+        start, end = datetime(2024, 1, 1), datetime(2024, 1, 2)
+        assert len(first_day.get_screen_time_events_of_a_user(self.test_user_uid, start, end)) == 1
+        assert len(second_day.get_screen_time_events_of_a_user(self.test_user_uid, start, end)) == 1
+        assert self.db_session.query(ScreenTimeEvent).count() == 2
+
+    def test_purge_expired_partitions(self):
+        """Expired partitions are deleted together with their data."""
+        partition = self._partition_service(datetime(2024, 1, 1).date())
+        partition.bulk_store_events('screen_time_events', self.test_user_uid, [self.event])
+
+        assert partition.purge_expired_partitions(ttl_hours=48) == 0
+        assert partition.purge_expired_partitions(ttl_hours=-1) == 1
+        assert self.db_session.query(ScreenTimeEvent).count() == 0
+
+    def test_bulk_store_events_skips_existing_and_invalid_events(self):
+        """Bulk inserts skip the events that already exist in the partition and count the invalid ones."""
+        partition = self._partition_service(datetime(2024, 1, 1).date())
+        sleep_event = {
+            'event_id': 'sleep_001',
+            'confidence': 0.9,
+            'light': 1.0,
+            'motion': 0.0,
+            'screenOnDuration': 0.0,
+            'timestampPrevious': datetime(2024, 1, 1, 23, 0, 0, tzinfo=timezone.utc),
+            'timestampNow': datetime(2024, 1, 1, 23, 30, 0, tzinfo=timezone.utc),
+            'usedApps': {'app_a': 10.0, 'app_b': 5.0}
+        }
+        invalid_event = {'event_id': 'sleep_002', 'confidence': 0.9}
+
+        assert partition.bulk_store_events('sleep_events', self.test_user_uid, [sleep_event, invalid_event]) == 1
+        assert partition.bulk_store_events('sleep_events', self.test_user_uid, [sleep_event]) == 0
+        assert self.db_session.query(SleepData).count() == 1
+        assert self.db_session.query(AppsSleepData).count() == 2
+
+    def test_range_run_is_completed_when_all_pairs_are_finished(self):
+        """The range run counts the finished (user, day) pairs and is completed after the last one."""
+        service = DatabaseService(self.db_session)
+        assert service.create_range_run("range_001", datetime(2024, 1, 1).date(), datetime(2024, 1, 2).date())
+        assert service.start_range_run("range_001", users_total=1, days_total=2)
+
+        run = service.record_range_progress("range_001", success=True)
+        assert run['status'] == "RUNNING"
+        assert run['progress'] == 0.5
+
+        run = service.record_range_progress("range_001", success=False)
+        assert run['status'] == "COMPLETED"
+        assert run['pairs_succeeded'] == 1
+        assert run['pairs_failed'] == 1
+
+    def test_typing_session_timings_are_decoded_in_bulk(self):
+        """The raw timing arrays of the typing sessions are stored as delta blobs and decoded into one array per series."""
+        partition = self._partition_service(datetime(2024, 1, 1).date())
+        session_data = {
+            'dateCreated': datetime(2024, 1, 1, 9, 0, 0, tzinfo=timezone.utc),
+            'startTime': {'hour': 11, 'minute': 0, 'second': 0, 'nano': 0},
+            'endTime': {'hour': 11, 'minute': 1, 'second': 0, 'nano': 0},
+            'avgPauseCtCDuration': 0.5, 'avgPauseWtWDuration': 1.0, 'charactersTyped': 20, 'duration': 60,
+            'ikiListSize': 3, 'maxBackspaceBurstCount': 0, 'maxPauseCtCDuration': 1.0, 'maxPauseWtWDuration': 2.0,
+            'meanIKI': 0.2, 'pauseCtCListSize': 2, 'pauseWtWListSize': 0, 'stdDevIKI': 0.1,
+            'totalBackspaceBurstCount': 0, 'totalBackspaces': 0, 'totalCPS': 0.3, 'totalCharactersDeleted': 0,
+            'totalPressureByTimesCounter': 20, 'totalWPS': 0.1, 'totalWordOrSentenceDeletions': 0, 'wordsTyped': 4,
+        }
+        first_session = {**session_data, 'ikiList': [0.1234567, 0.25, 0.2], 'pauseCtCList': [0.5, 1.0]}
+        second_session = {**session_data, 'ikiList': [0.3, 0.1]}
+
+        with patch('app.services.database_service.settings.TYPING_RAW_TIMINGS_ENABLED', True):
+            assert partition.store_typing_session_and_data(self.test_user_uid, "session_001", first_session)
+            assert partition.store_typing_session_and_data(self.test_user_uid, "session_002", second_session)
+
+        timings = partition.get_typing_session_timings()
+        assert timings.session_uids == ["session_001", "session_002"]
+        assert timings.offsets('iki').tolist() == [0, 3, 5]
+        assert timings.values('iki') == pytest.approx([0.1234567, 0.25, 0.2, 0.3, 0.1], abs=1e-7)
+        assert timings.session_values('pause_ctc', "session_001") == pytest.approx([0.5, 1.0])
+        assert len(timings.session_values('pause_wtw', "session_002")) == 0
+
+    @staticmethod
+    def _typing_session_document(session_uid: str, **overrides) -> dict:
+        """A LogBoard typing session document from Firebase, with its session_uid."""
+        document = {
+            'session_uid': session_uid,
+            'dateCreated': datetime(2024, 1, 1, 9, 0, 0, tzinfo=timezone.utc),
+            'startTime': {'hour': 11, 'minute': 0, 'second': 0, 'nano': 0},
+            'endTime': {'hour': 11, 'minute': 1, 'second': 0, 'nano': 0},
+            'avgPauseCtCDuration': 0.5, 'avgPauseWtWDuration': 1.0, 'charactersTyped': 20, 'duration': 60,
+            'ikiListSize': 3, 'maxBackspaceBurstCount': 0, 'maxPauseCtCDuration': 1.0, 'maxPauseWtWDuration': 2.0,
+            'meanIKI': 0.2, 'pauseCtCListSize': 2, 'pauseWtWListSize': 0, 'stdDevIKI': 0.1,
+            'totalBackspaceBurstCount': 0, 'totalBackspaces': 0, 'totalCPS': 0.3, 'totalCharactersDeleted': 0,
+            'totalPressureByTimesCounter': 20, 'totalWPS': 0.1, 'totalWordOrSentenceDeletions': 0, 'wordsTyped': 4,
+        }
+        document.update(overrides)
+        return document
+
+    def test_bulk_store_typing_sessions_updates_existing_and_counts_failures(self):
+        """An existing session is kept and its data is updated, the sessions without session_uid or with an invalid time fail."""
+        partition = self._partition_service(datetime(2024, 1, 1).date())
+        stored_session_uids, failures = partition.bulk_store_typing_sessions(self.test_user_uid, [
+            self._typing_session_document("session_001"),
+        ])
+        assert (stored_session_uids, failures) == (["session_001"], 0)
+
+        stored_session_uids, failures = partition.bulk_store_typing_sessions(self.test_user_uid, [
+            self._typing_session_document("session_001", charactersTyped=45, meanIKI=0.35),
+            self._typing_session_document("session_002"),
+            self._typing_session_document(None),
+            self._typing_session_document("session_003", startTime={'hour': 25}),
+        ])
+
+        assert stored_session_uids == ["session_001", "session_002"]
+        assert failures == 2
+        assert self.db_session.query(TypingSession).count() == 2
+        assert self.db_session.query(TypingSessionData).count() == 2
+        updated = self.db_session.query(TypingSessionData).filter_by(typing_session_id="session_001").one()
+        assert updated.characters_typed == 45
+        assert updated.mean_iki == pytest.approx(0.35)
+
+    def test_bulk_store_typing_sessions_in_batches(self):
+        """More sessions than LOCAL_BULK_INSERT_BATCH_SIZE are stored with one transaction per batch."""
+        partition = self._partition_service(datetime(2024, 1, 1).date())
+        documents = [self._typing_session_document(f"session_{i:03d}") for i in range(5)]
+
+        with patch('app.services.database_service.settings.LOCAL_BULK_INSERT_BATCH_SIZE', 2), \
+                patch.object(self.db_session, 'commit', wraps=self.db_session.commit) as commit:
+            stored_session_uids, failures = partition.bulk_store_typing_sessions(self.test_user_uid, documents)
+
+        assert stored_session_uids == [f"session_{i:03d}" for i in range(5)]
+        assert failures == 0
+        assert commit.call_count == 3
+        assert self.db_session.query(TypingSession).count() == 5
+        assert self.db_session.query(TypingSessionData).count() == 5
+
 # Integration test class (requires actual database setup)
 class TestDatabaseServiceIntegration:
     """Integration tests for DatabaseService (requires database setup)."""
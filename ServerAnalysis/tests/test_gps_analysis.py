@@ -0,0 +1,653 @@
+"""
+Test module for the GPS steps of AnalysisService.
+
+The steps run on a small fixed GPS day (an AnalysisService created without its services): these tests
+check their results against the former point-by-point computations (reproduced here) or against
+values worked out by hand.
+"""
+
+import hashlib
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime, timedelta
+from haversine import haversine_vector, Unit
+
+from app.services.analysis_service import AnalysisService
+from app.services.gps_geometry import GPSGeometry, _utm_transformer
+from app.services.gps_segmentation import GPSRouteSegments
+
+# A place in Athens and the size of a meter in degrees there
+BASE_LATITUDE, BASE_LONGITUDE = 37.98, 23.72
+METER_LATITUDE = 1 / 111195
+METER_LONGITUDE = 1 / (111195 * np.cos(np.radians(BASE_LATITUDE)))
+
+
+def offset(north_m: float, east_m: float) -> tuple[float, float]:
+    """The latitude and longitude of a point north_m and east_m meters from the base place."""
+    return BASE_LATITUDE + north_m * METER_LATITUDE, BASE_LONGITUDE + east_m * METER_LONGITUDE
+
+
+def make_gps_day(points: list, start: datetime = datetime(2024, 1, 1, 0, 0)) -> pd.DataFrame:
+    """The GPS events of a day from (minutes after start, north_m, east_m) points."""
+    rows = []
+    for i, (minutes, north_m, east_m) in enumerate(points):
+        latitude, longitude = offset(north_m, east_m)
+        rows.append({
+            'id': i + 1,
+            'gps_event_id': f"gps_{i:03d}",
+            'user_uid': "test_user_123",
+            'latitude': latitude,
+            'longitude': longitude,
+            'accuracy': 10.0 + i % 3,
+            'bearing': float(i % 360),
+            'speed': 0.5 * (i % 4),
+            'speed_accuracy_meters_per_second': 1.0,
+            'timestamp_now': start + timedelta(minutes=minutes),
+        })
+    return pd.DataFrame(rows)
+
+
+def make_analysis_service() -> AnalysisService:
+    """An AnalysisService without its services, the GPS steps only use the data they are given."""
+    return AnalysisService.__new__(AnalysisService)
+
+
+class TestComputeMainGpsRoute:
+    """Test class for the assignment of the GPS points to the key locations (AnalysisService._compute_main_gps_route)."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.analysis_service = make_analysis_service()
+        self.eps = 50
+        # Two key locations 80 meters apart (their 50 meters circles overlap) and one far away
+        self.key_locs = pd.DataFrame([
+            {'key_location_id': 0, 'latitude': offset(0, 0)[0], 'longitude': offset(0, 0)[1], 'type': 'HOME'},
+            {'key_location_id': 1, 'latitude': offset(0, 80)[0], 'longitude': offset(0, 80)[1], 'type': 'NOT_IDENTIFIED'},
+            {'key_location_id': 2, 'latitude': offset(2000, 0)[0], 'longitude': offset(2000, 0)[1], 'type': 'NOT_IDENTIFIED'},
+        ])
+        self.df = make_gps_day([
+            (0, 5, 5), (10, -20, 10), (20, 0, 40), (30, 0, 45), (40, 0, 70),
+            (50, 0, 140), (60, 500, 500), (70, 1990, 10), (80, 2100, 0), (90, 0, 200),
+        ])
+        self.df['belonging_key_loc'] = np.nan
+        self.df['type'] = None
+
+    def _assign_point_by_point(self, df: pd.DataFrame) -> pd.DataFrame:
+        """The former loop: for each key location, the points (at their current coordinates) within eps are moved to it."""
+        df = df.copy()
+        for key_loc in self.key_locs.itertuples(index=False):
+            coords = df[['latitude', 'longitude']].to_numpy(dtype=float)
+            distances = haversine_vector(coords, np.broadcast_to([key_loc.latitude, key_loc.longitude], coords.shape), Unit.METERS)
+            near = distances <= self.eps
+            df.loc[near, 'latitude'] = key_loc.latitude
+            df.loc[near, 'longitude'] = key_loc.longitude
+            df.loc[near, 'belonging_key_loc'] = key_loc.key_location_id
+            df.loc[near, 'type'] = 'HOME' if key_loc.type == 'HOME' else 'NOT_IDENTIFIED'
+        return df
+
+    def test_assignment_matches_the_point_by_point_loop(self):
+        """The points are moved to the same key locations, a later key location overwrites an earlier one."""
+        # Arrange
+        expected = self._assign_point_by_point(self.df)
+
+        # Act
+        route = self.analysis_service._compute_main_gps_route(self.key_locs, self.df.copy(), self.eps)
+
+        # Assert
+        pd.testing.assert_frame_equal(route, expected)
+        # The points at 40 and 45 meters are moved to the first key location, 80 meters from the second one
+        assert route['belonging_key_loc'].fillna(-1).tolist() == [0, 0, 0, 0, 1, -1, -1, 2, -1, -1]
+        assert route['type'].fillna('').tolist()[:5] == ['HOME', 'HOME', 'HOME', 'HOME', 'NOT_IDENTIFIED']
+        assert (route.loc[4, 'latitude'], route.loc[4, 'longitude']) == (self.key_locs.loc[1, 'latitude'], self.key_locs.loc[1, 'longitude'])
+
+    def test_moved_points_are_compared_from_their_key_location(self):
+        """A point moved to a key location goes to the next key location if that one is within eps of the first."""
+        # Arrange
+        self.key_locs.loc[1, ['latitude', 'longitude']] = offset(0, 45)
+        expected = self._assign_point_by_point(self.df)
+
+        # Act
+        route = self.analysis_service._compute_main_gps_route(self.key_locs, self.df.copy(), self.eps)
+
+        # Assert
+        pd.testing.assert_frame_equal(route, expected)
+        assert route['belonging_key_loc'].fillna(-1).tolist() == [1, 1, 1, 1, 1, -1, -1, 2, -1, -1]
+
+    def test_points_without_coordinates_are_not_assigned(self):
+        """A point without coordinates is left as it is."""
+        # Arrange
+        self.df.loc[3, ['latitude', 'longitude']] = np.nan
+
+        # Act
+        route = self.analysis_service._compute_main_gps_route(self.key_locs, self.df.copy(), self.eps)
+
+        # Assert
+        assert np.isnan(route.loc[3, 'belonging_key_loc'])
+        assert route.loc[0, 'belonging_key_loc'] == 0
+
+    def test_no_key_locations_returns_the_route(self):
+        """Without key locations the route is not changed."""
+        # Act
+        route = self.analysis_service._compute_main_gps_route(self.key_locs.iloc[0:0], self.df.copy(), self.eps)
+
+        # Assert
+        pd.testing.assert_frame_equal(route, self.df)
+
+
+class TestRemoveOutliersNearGpsPoints:
+    """Test class for the neighbor outlier filter (AnalysisService._remove_outliers_near_gps_points)."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.analysis_service = make_analysis_service()
+        self.df = make_gps_day([
+            (0, 0, 0), (10, 0, 300), (20, 0, 700), (30, 5000, 0), (40, 0, 1300),
+            (50, 3000, 3000), (60, 3000, 3000), (70, -100, -450), (80, -5000, 0),
+        ])
+
+    @staticmethod
+    def _remove_outliers_with_distance_matrix(df: pd.DataFrame, min_distance: int) -> pd.DataFrame:
+        """The former filter: the N x N distance matrix, a point is kept if another point is closer than min_distance."""
+        coords = df[['latitude', 'longitude']].to_numpy()
+        distances = haversine_vector(coords, coords, Unit.METERS, comb=True)
+        np.fill_diagonal(distances, np.inf)
+        return df[(distances < min_distance).any(axis=1)].reset_index(drop=True)
+
+    def test_filter_matches_the_distance_matrix(self):
+        """The same points are kept as with the distance matrix."""
+        # Act
+        cleaned = self.analysis_service._remove_outliers_near_gps_points(self.df, 500)
+
+        # Assert
+        pd.testing.assert_frame_equal(cleaned, self._remove_outliers_with_distance_matrix(self.df, 500))
+        # The chain of points 300 and 400 meters apart is kept, the isolated points are removed, the duplicates keep each other
+        assert cleaned['gps_event_id'].tolist() == ["gps_000", "gps_001", "gps_002", "gps_005", "gps_006", "gps_007"]
+
+    def test_neighbor_just_within_min_distance_keeps_the_point(self):
+        """Two points a meter closer than min_distance keep each other (the BallTree uses the haversine of the matrix)."""
+        # Arrange
+        df = make_gps_day([(0, 0, 0), (10, 0, 400), (20, 0, 10000)])
+        coords = df[['latitude', 'longitude']].to_numpy()
+        min_distance = float(haversine_vector(coords[:1], coords[1:2], Unit.METERS)[0]) + 1
+
+        # Act
+        cleaned = self.analysis_service._remove_outliers_near_gps_points(df, min_distance)
+
+        # Assert
+        pd.testing.assert_frame_equal(cleaned, self._remove_outliers_with_distance_matrix(df, min_distance))
+        assert len(cleaned) == 2
+
+    def test_less_than_two_points_are_kept(self):
+        """A day with one point has no neighbors to compare with, the point is kept."""
+        # Act
+        cleaned = self.analysis_service._remove_outliers_near_gps_points(self.df.iloc[:1], 500)
+
+        # Assert
+        assert len(cleaned) == 1
+
+
+def make_route(segments: list, start: datetime = datetime(2024, 1, 1, 8, 0)) -> pd.DataFrame:
+    """
+    A GPS route of 10 minutes steps from segments (key location or None, list of (north_m, east_m) points):
+    the points of a key location are at its coordinates, the other points do not belong to a key location.
+    """
+    points, key_locs = [], []
+    for key_loc, segment_points in segments:
+        for north_m, east_m in segment_points:
+            points.append((10 * len(points), north_m, east_m))
+            key_locs.append(key_loc)
+    df = make_gps_day(points, start)
+    df['belonging_key_loc'] = np.array(key_locs, dtype=float)
+    df['type'] = np.where(df['belonging_key_loc'] == 0, 'HOME', np.where(df['belonging_key_loc'].isna(), None, 'NOT_IDENTIFIED'))
+    return df
+
+
+# A day with two key locations: a long visit to each, a short visit back to HOME (key location 0) and a last long visit
+HOME, WORK = (0, 0), (0, 900)
+ROUTE_SEGMENTS = [
+    (0, [HOME] * 7),                 # positions 0-6, 60 minutes
+    (None, [(0, 300), (0, 600)]),    # positions 7-8
+    (1, [WORK] * 7),                 # positions 9-15, 60 minutes
+    (None, [(0, 600)]),              # position 16
+    (0, [HOME] * 2),                 # positions 17-18, 10 minutes
+    (None, [(200, 0)]),              # position 19
+    (1, [WORK] * 7),                 # positions 20-26, 60 minutes
+]
+
+
+class TestGPSRouteSegments:
+    """Test class for the run-length segmentation of the GPS route (GPSRouteSegments) and the fix of the wrong key locations."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.analysis_service = make_analysis_service()
+        self.df = make_route(ROUTE_SEGMENTS)
+
+    @staticmethod
+    def _transitions_with_event_id_lookups(df: pd.DataFrame) -> list:
+        """The former transition clusters: an iterrows pass, the neighbour key locations found by scanning the gps_event_id column."""
+        df = df.sort_values(by='timestamp_now')
+
+        def transition_info(cluster: list, last: bool) -> dict:
+            cluster_df = pd.DataFrame(cluster)
+            start_index = df[df['gps_event_id'] == cluster_df['gps_event_id'].iloc[0]].index - 1
+            end_index = df[df['gps_event_id'] == cluster_df['gps_event_id'].iloc[-1]].index + (0 if last else 1)
+            distance_km = sum(
+                haversine_vector([tuple(cluster_df.iloc[i - 1][['latitude', 'longitude']])], [tuple(cluster_df.iloc[i][['latitude', 'longitude']])], Unit.KILOMETERS)[0]
+                for i in range(1, len(cluster_df))
+            )
+            return {
+                'key_loc_start_id': df['belonging_key_loc'].iloc[start_index[0]],
+                'key_loc_end_id': df['belonging_key_loc'].iloc[end_index[0] - (1 if last else 0)],
+                'time_spent_seconds': round((cluster_df['timestamp_now'].iloc[-1] - cluster_df['timestamp_now'].iloc[0]).total_seconds(), 3),
+                'total_distance_km': distance_km,
+                'num_of_gps_events': len(cluster_df),
+            }
+
+        transitions, cluster = [], []
+        for _, gps_event in df.iterrows():
+            if np.isnan(gps_event['belonging_key_loc']):
+                cluster.append(gps_event)
+            elif cluster:
+                transitions.append(transition_info(cluster, last=False))
+                cluster = []
+        if cluster:
+            transitions.append(transition_info(cluster, last=True))
+        return transitions
+
+    def test_visits_of_the_key_locations(self):
+        """Each run of points at a key location is a visit, with its positions, duration and number of points."""
+        # Act
+        visits = GPSRouteSegments(self.df).visits
+
+        # Assert
+        assert visits['belonging_key_loc'].tolist() == [0, 1, 0, 1]
+        assert visits['start_position'].tolist() == [0, 9, 17, 20]
+        assert visits['end_position'].tolist() == [6, 15, 18, 26]
+        assert visits['time_spent_seconds'].tolist() == [3600, 3600, 600, 3600]
+        assert visits['num_of_gps_events'].tolist() == [7, 7, 2, 7]
+        assert visits['key_loc_type'].tolist() == ['HOME', 'NOT_IDENTIFIED', 'HOME', 'NOT_IDENTIFIED']
+        assert visits['start_time'].iloc[1] == datetime(2024, 1, 1, 9, 30)
+
+    def test_transitions_match_the_event_id_lookups(self):
+        """The transitions have the neighbour key locations, duration, length and points of the former lookups."""
+        # Arrange
+        columns = ['key_loc_start_id', 'key_loc_end_id', 'time_spent_seconds', 'total_distance_km', 'num_of_gps_events']
+        expected = pd.DataFrame(self._transitions_with_event_id_lookups(self.df), columns=columns)
+
+        # Act
+        transitions = GPSRouteSegments(self.df).transitions
+
+        # Assert
+        np.testing.assert_allclose(transitions[columns].to_numpy(dtype=float), expected.to_numpy(dtype=float))
+        assert transitions['key_loc_start_id'].tolist() == [0, 1, 0]
+        assert transitions['key_loc_end_id'].tolist() == [1, 0, 1]
+        assert transitions['num_of_gps_events'].tolist() == [2, 1, 1]
+        assert transitions['total_distance_km'].iloc[0] == pytest.approx(0.3, rel=1e-3)
+
+    def test_route_that_starts_and_ends_outside_the_key_locations(self):
+        """The first transition takes the key location of the last point and the last one the point before its last point."""
+        # Arrange
+        df = make_route([(None, [(0, 300)]), *ROUTE_SEGMENTS[:3], (None, [(0, 1200), (0, 1500)])])
+        columns = ['key_loc_start_id', 'key_loc_end_id', 'time_spent_seconds', 'total_distance_km', 'num_of_gps_events']
+        expected = pd.DataFrame(self._transitions_with_event_id_lookups(df), columns=columns)
+
+        # Act
+        transitions = GPSRouteSegments(df).transitions
+
+        # Assert
+        np.testing.assert_allclose(transitions[columns].to_numpy(dtype=float), expected.to_numpy(dtype=float), equal_nan=True)
+        assert len(transitions) == 3
+
+    def test_short_visits_are_removed_except_the_last_one(self):
+        """The visits of 30 minutes or less are not visits, the points of the last visit are kept."""
+        # Arrange
+        df = make_route(ROUTE_SEGMENTS[:6] + [(1, [WORK] * 2)])
+
+        # Act
+        fixed = self.analysis_service._fix_wrong_key_locs(df)
+
+        # Assert
+        assert fixed.loc[17:18, 'belonging_key_loc'].isna().all()
+        assert fixed.loc[17:18, 'type'].isna().all()
+        assert fixed.loc[20:21, 'belonging_key_loc'].tolist() == [1, 1]
+
+        segments = GPSRouteSegments(fixed)
+        # The points outside the key locations are skipped, the two visits of key location 1 are one visit
+        assert segments.visits['belonging_key_loc'].tolist() == [0, 1]
+        assert segments.visits['end_position'].tolist() == [6, 21]
+        assert segments.transitions['num_of_gps_events'].tolist() == [2, 4]
+        assert segments.transitions['key_loc_start_id'].tolist() == [0, 1]
+        assert segments.transitions['key_loc_end_id'].tolist() == [1, 1]
+
+
+def final_transitions_list(transition_clusters: list) -> pd.DataFrame:
+    """The former _constract_final_list_of_transitions over the list of the transition clusters (dicts)."""
+    start_key_loc_id = transition_clusters[0]['key_loc_start_id']
+    transitions_final_list = []
+    for idx, trans_cluster_info in enumerate(transition_clusters):
+        transition = {
+            'key_loc_start_id': start_key_loc_id,
+            'key_loc_end_id': trans_cluster_info['key_loc_end_id'],
+            'total_time_travel_seconds': trans_cluster_info['time_spent_seconds'],
+            'total_distance_traveled_km': trans_cluster_info['total_distance_km'],
+            'total_events_in_transition_cluster': trans_cluster_info['num_of_gps_events'],
+        }
+        if idx == len(transition_clusters) - 1:
+            transitions_final_list.append(transition)
+            start_key_loc_id = trans_cluster_info['key_loc_end_id']
+        if start_key_loc_id != trans_cluster_info['key_loc_end_id']:
+            transitions_final_list.append({**transition, 'key_loc_start_id': start_key_loc_id})
+            start_key_loc_id = trans_cluster_info['key_loc_end_id']
+        if len(transitions_final_list) > 1 and transitions_final_list[-1]['key_loc_start_id'] == transitions_final_list[-1]['key_loc_end_id']:
+            transitions_final_list.pop()
+    return pd.DataFrame(transitions_final_list)
+
+
+class TestTransitionsInfoOfKeyLocations:
+    """Test class for the final list of transitions (AnalysisService._compute_transitions_info_of_key_locations_clusters)."""
+
+    COLUMNS = ['key_loc_start_id', 'key_loc_end_id', 'total_time_travel_seconds', 'total_distance_traveled_km', 'total_events_in_transition_cluster']
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.analysis_service = make_analysis_service()
+
+    @staticmethod
+    def commuter_route(n_stops: int, seed: int = 0) -> pd.DataFrame:
+        """A dense-transition day: short stops at three key locations, some passes return to the same key location."""
+        rng = np.random.default_rng(seed)
+        places = [HOME, WORK, (600, 300)]
+        segments = [(0, [HOME] * 3)]
+        for _ in range(n_stops):
+            key_loc = int(rng.integers(len(places)))
+            north_m, east_m = places[key_loc]
+            segments.append((None, [(north_m + 150 + 40 * i, east_m - 100) for i in range(int(rng.integers(1, 4)))]))
+            segments.append((key_loc, [places[key_loc]] * int(rng.integers(1, 4))))
+        return make_route(segments)
+
+    def _expected(self, df: pd.DataFrame) -> pd.DataFrame:
+        """The former final list over the transition clusters of the gps_event_id lookups."""
+        transition_clusters = TestGPSRouteSegments._transitions_with_event_id_lookups(df)
+        return final_transitions_list(transition_clusters)[self.COLUMNS]
+
+    def test_transitions_between_the_visits(self):
+        """Each transition goes from the key location before it to the one after it."""
+        # Act
+        transitions = self.analysis_service._compute_transitions_info_of_key_locations_clusters(make_route(ROUTE_SEGMENTS))
+
+        # Assert
+        assert transitions['key_loc_start_id'].tolist() == [0, 1, 0]
+        assert transitions['key_loc_end_id'].tolist() == [1, 0, 1]
+        assert transitions['total_events_in_transition_cluster'].tolist() == [2, 1, 1]
+        assert transitions['total_time_travel_seconds'].tolist() == [600, 0, 0]
+        assert transitions['start_time_of_transition'].iloc[0] == datetime(2024, 1, 1, 9, 10)
+        assert transitions['end_time_of_transition'].iloc[0] == datetime(2024, 1, 1, 9, 20)
+
+    @pytest.mark.parametrize("n_stops, seed", [(10, 0), (60, 1), (150, 2)])
+    def test_dense_transition_day_matches_the_event_id_lookups(self, n_stops, seed):
+        """On a commuter day the final transitions are the ones of the former lookups and list."""
+        # Arrange
+        df = self.commuter_route(n_stops, seed)
+        expected = self._expected(df)
+
+        # Act
+        transitions = self.analysis_service._compute_transitions_info_of_key_locations_clusters(df)
+
+        # Assert
+        assert len(transitions) == len(expected)
+        np.testing.assert_allclose(transitions[self.COLUMNS].to_numpy(dtype=float), expected.to_numpy(dtype=float))
+
+    def test_passes_back_to_the_same_key_location_are_merged(self):
+        """A transition that returns to the key location it started from is dropped, the next one starts from there."""
+        # Arrange
+        df = make_route([
+            (0, [HOME] * 2), (None, [(100, 0)]), (0, [HOME] * 2), (None, [(0, 300), (0, 600)]),
+            (1, [WORK] * 2), (None, [(100, 900)]), (1, [WORK] * 2), (None, [(0, 600)]), (0, [HOME] * 2),
+        ])
+
+        # Act
+        transitions = self.analysis_service._compute_transitions_info_of_key_locations_clusters(df)
+
+        # Assert
+        np.testing.assert_allclose(transitions[self.COLUMNS].to_numpy(dtype=float), self._expected(df).to_numpy(dtype=float))
+        assert transitions['key_loc_start_id'].tolist() == [0, 1]
+        assert transitions['key_loc_end_id'].tolist() == [1, 0]
+        assert transitions['total_events_in_transition_cluster'].tolist() == [2, 1]
+
+    def test_route_without_transitions(self):
+        """A route that stays at its key locations has no transitions."""
+        # Act
+        transitions = self.analysis_service._compute_transitions_info_of_key_locations_clusters(make_route([(0, [HOME] * 4)]))
+
+        # Assert
+        assert transitions is None
+
+
+class TestDuplicateGpsEvents:
+    """Test class for the collapse of the consecutive GPS events with the same coordinates (_find_clusters_of_same_GPS_events, _transform_duplicate_gps_events)."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.analysis_service = make_analysis_service()
+        # A run of 3 fixes, two single fixes, a run of 2 fixes and a fix back at the coordinates of the first run
+        self.df = make_gps_day([(0, 0, 0), (10, 0, 0), (20, 0, 0), (30, 100, 0), (40, 100, 1), (50, 200, 0), (60, 200, 0), (70, 0, 0)])
+
+    def test_clusters_of_the_runs(self):
+        """The runs of at least 2 fixes are the clusters, in time order, the other events are not in a cluster (-1)."""
+        # Arrange
+        shuffled = self.df.sample(frac=1, random_state=0)
+
+        # Act
+        clusters = self.analysis_service._find_clusters_of_same_GPS_events(shuffled)
+
+        # Assert
+        assert clusters.sort_index().tolist() == [0, 0, 0, -1, -1, 1, 1, -1]
+
+    def test_runs_are_replaced_by_their_median_event(self):
+        """Each run is one event at its first coordinates with the median values and an id from the ids of its events."""
+        # Arrange
+        clusters = self.analysis_service._find_clusters_of_same_GPS_events(self.df)
+
+        # Act
+        result = self.analysis_service._transform_duplicate_gps_events(self.df, clusters).reset_index(drop=True)
+
+        # Assert
+        assert len(result) == 5
+        assert result['timestamp_now'].tolist() == [datetime(2024, 1, 1) + timedelta(minutes=minutes) for minutes in (10, 30, 40, 55, 70)]
+        first_run, second_run = result.iloc[0], result.iloc[3]
+        assert first_run['id'] == 0 and second_run['id'] == 0
+        assert (first_run['latitude'], first_run['longitude']) == offset(0, 0)
+        assert (second_run['latitude'], second_run['longitude']) == offset(200, 0)
+        assert (first_run['accuracy'], first_run['bearing'], first_run['speed']) == (11.0, 1.0, 0.5)
+        assert (second_run['accuracy'], second_run['bearing'], second_run['speed']) == (11.0, 5.5, 0.75)
+        assert first_run['gps_event_id'] == hashlib.sha1(b"gps_000|gps_001|gps_002").hexdigest()[:30]
+        assert second_run['gps_event_id'] == hashlib.sha1(b"gps_005|gps_006").hexdigest()[:30]
+        # The events that are not in a run are kept as they are
+        assert result['gps_event_id'].iloc[[1, 2, 4]].tolist() == ["gps_003", "gps_004", "gps_007"]
+        assert result['id'].iloc[[1, 2, 4]].tolist() == [4, 5, 8]
+
+    def test_collapse_is_deterministic(self):
+        """The same day gives the same events, whatever the order of its rows."""
+        # Act
+        first = self.analysis_service._transform_duplicate_gps_events(self.df, self.analysis_service._find_clusters_of_same_GPS_events(self.df))
+        shuffled = self.df.sample(frac=1, random_state=1)
+        second = self.analysis_service._transform_duplicate_gps_events(shuffled, self.analysis_service._find_clusters_of_same_GPS_events(shuffled))
+
+        # Assert
+        pd.testing.assert_frame_equal(first.reset_index(drop=True), second.reset_index(drop=True))
+
+    def test_day_without_duplicates_is_unchanged(self):
+        """Without runs no event is in a cluster and the day is returned as it is."""
+        # Arrange
+        df = self.df.drop(index=[1, 2, 6])
+
+        # Act
+        clusters = self.analysis_service._find_clusters_of_same_GPS_events(df)
+        result = self.analysis_service._transform_duplicate_gps_events(df, clusters)
+
+        # Assert
+        assert (clusters == -1).all()
+        pd.testing.assert_frame_equal(result, df)
+
+
+def make_stationary_day(seed: int = 0) -> pd.DataFrame:
+    """A day of GPS points every 5 minutes around a few places (with 15 meters of noise) and some points on the way between them."""
+    rng = np.random.default_rng(seed)
+    stays = [((0, 0), 0, 8 * 60), ((0, 3000), 9 * 60, 17 * 60), ((1500, 0), 18 * 60, 19 * 60), ((0, 0), 20 * 60, 24 * 60 - 5)]
+    points = []
+    for (north_m, east_m), start_minutes, end_minutes in stays:
+        for minutes in range(start_minutes, end_minutes + 1, 5):
+            points.append((minutes, north_m + rng.uniform(-15, 15), east_m + rng.uniform(-15, 15)))
+    # On the way: single points far from the places and each other
+    points += [(8 * 60 + 30, 0, 1000), (8 * 60 + 45, 0, 2000), (17 * 60 + 30, 800, 1500), (19 * 60 + 30, 700, 0)]
+    return make_gps_day(sorted(points))
+
+
+class TestKeyLocationsOnGrid:
+    """Test class for the key locations found on the grid of the GPS points (_snap_to_grid, _identify_key_locations)."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.analysis_service = make_analysis_service()
+        self.df = make_stationary_day()
+        self.eps, self.samples, self.gps_points_sample_rate = 50, 5, 300
+
+    def test_snap_to_grid_cells(self):
+        """Each point is counted in its cell and the coordinates of a cell are the mean of its points."""
+        # Arrange
+        coords = np.radians(self.df[['latitude', 'longitude']].to_numpy(dtype=float))
+        cell_size = 5 / 6371000
+
+        # Act
+        cell_coords, cell_counts, cell_of_point = AnalysisService._snap_to_grid(coords, cell_size)
+
+        # Assert
+        assert cell_of_point.shape == (len(coords),)
+        assert cell_counts.sum() == len(coords)
+        np.testing.assert_array_equal(np.bincount(cell_of_point, minlength=len(cell_counts)), cell_counts)
+        for cell in range(len(cell_counts)):
+            np.testing.assert_allclose(cell_coords[cell], coords[cell_of_point == cell].mean(axis=0), rtol=0, atol=1e-12)
+        # The points of a cell are within the cell (its diagonal is ~2 cell sizes at this latitude)
+        distances = haversine_vector(np.degrees(coords), np.degrees(cell_coords[cell_of_point]), Unit.METERS)
+        assert distances.max() <= 5 * np.sqrt(1 + 1 / np.cos(np.radians(BASE_LATITUDE)) ** 2)
+
+    def test_same_points_are_in_the_same_cell(self):
+        """Points with the same coordinates share a cell, points far apart do not."""
+        # Arrange
+        coords = np.radians([offset(0, 0), offset(0, 0), offset(0, 0), offset(100, 0), offset(0, 100)])
+
+        # Act
+        cell_coords, cell_counts, cell_of_point = AnalysisService._snap_to_grid(coords, 5 / 6371000)
+
+        # Assert
+        assert len(cell_counts) == 3
+        assert cell_of_point[0] == cell_of_point[1] == cell_of_point[2]
+        assert len(set(cell_of_point[2:])) == 3
+        assert cell_counts[cell_of_point[0]] == 3
+
+    @pytest.mark.parametrize("grid_fraction", [0.05, 0.1, 0.2])
+    def test_grid_gives_the_key_locations_of_the_points(self, grid_fraction):
+        """The weighted DBSCAN on the cells labels the points and finds the key locations (and HOME) like DBSCAN on the points."""
+        # Arrange
+        points_df, grid_df = self.df.copy(), self.df.copy()
+        expected = self.analysis_service._identify_key_locations(points_df, self.eps, self.samples, self.gps_points_sample_rate)
+
+        # Act
+        key_locs = self.analysis_service._identify_key_locations(grid_df, self.eps, self.samples, self.gps_points_sample_rate, grid_fraction)
+
+        # Assert
+        # The same partition of the points (the cluster ids may be numbered in another order)
+        np.testing.assert_array_equal(grid_df['cluster'] == -1, points_df['cluster'] == -1)
+        pairs = set(zip(points_df['cluster'], grid_df['cluster']))
+        assert len(pairs) == len({first for first, _ in pairs}) == len({second for _, second in pairs})
+        # The same key locations: three places, HOME at the place of the night
+        by_position = lambda key_locs_df: key_locs_df.sort_values(by=['latitude', 'longitude']).reset_index(drop=True)
+        pd.testing.assert_frame_equal(
+            by_position(key_locs)[['latitude', 'longitude', 'type']],
+            by_position(expected)[['latitude', 'longitude', 'type']],
+        )
+        assert len(key_locs) == 3
+        home = key_locs[key_locs['type'] == 'HOME'].iloc[0]
+        assert (home['latitude'], home['longitude']) == pytest.approx(offset(0, 0), abs=20 * METER_LATITUDE)
+        # The points on the way are not in a key location
+        assert (grid_df['cluster'] == -1).sum() == 4
+
+
+class TestGPSGeometry:
+    """Test class for the GPS points projected to meters (GPSGeometry) and the convex hull and SDE computed from them."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.analysis_service = make_analysis_service()
+        # A 100 x 100 meters square (its corners and points inside it)
+        self.square_df = make_gps_day([(i, north_m, east_m) for i, (north_m, east_m) in enumerate(
+            [(0, 0), (0, 100), (100, 100), (100, 0), (50, 50), (20, 70), (80, 30)]
+        )])
+        # A grid of points 200 meters east-west and 50 meters north-south
+        self.rectangle_df = make_gps_day([(i, north_m, east_m) for i, (north_m, east_m) in enumerate(
+            (north_m, east_m) for north_m in range(0, 51, 10) for east_m in range(0, 201, 10)
+        )])
+
+    def test_utm_zone_of_the_points(self):
+        """The points are projected to the UTM zone of their mean longitude, the transformer of a zone is created once."""
+        # Act
+        geometry = GPSGeometry(self.square_df)
+
+        # Assert
+        assert (geometry.zone_number, geometry.south) == (34, False)
+        assert len(geometry) == 7
+        assert geometry.coords.shape == (7, 2)
+        assert GPSGeometry(self.rectangle_df)._transformer is geometry._transformer
+        assert _utm_transformer(34, False) is geometry._transformer
+        # The projection goes back to the same point
+        latitude, longitude = geometry.to_lat_lon(geometry.xs[2], geometry.ys[2])
+        assert (latitude, longitude) == pytest.approx(offset(100, 100), abs=1e-9)
+
+    def test_convex_hull_of_a_square(self):
+        """The hull of the 100 meters square has its area and perimeter, with or without the projected points."""
+        # Act
+        hull = self.analysis_service._compute_convex_hull(self.square_df)
+        shared_hull = self.analysis_service._compute_convex_hull(self.square_df, GPSGeometry(self.square_df))
+
+        # Assert
+        assert hull['area'] == pytest.approx(10000, rel=0.01)
+        assert hull['perimeter'] == pytest.approx(400, rel=0.01)
+        assert shared_hull == hull
+
+    def test_convex_hull_of_a_single_place(self):
+        """Points within 10 meters or fewer than 3 points have no hull."""
+        # Arrange
+        single_place_df = make_gps_day([(0, 0, 0), (5, 3, 4), (10, 8, 1), (15, 2, 9)])
+
+        # Act & Assert
+        assert self.analysis_service._compute_convex_hull(single_place_df) == {'area': 0.0, 'perimeter': 0.0}
+        assert self.analysis_service._compute_convex_hull(self.square_df.head(2)) == {'area': 0.0, 'perimeter': 0.0}
+
+    def test_sde_of_a_rectangle(self):
+        """The ellipse of the east-west rectangle is wider than high, centered at its middle, the same with the projected points."""
+        # Act
+        sde = self.analysis_service._compute_sde(self.rectangle_df)
+        shared_sde = self.analysis_service._compute_sde(self.rectangle_df, geometry=GPSGeometry(self.rectangle_df))
+
+        # Assert
+        assert shared_sde == sde
+        # The standard deviations of 21 points 10 meters apart and of 6 points 10 meters apart
+        assert sde['width_m'] == pytest.approx(2 * np.std(np.arange(0, 201, 10)), rel=0.01)
+        assert sde['height_m'] == pytest.approx(2 * np.std(np.arange(0, 51, 10)), rel=0.01)
+        assert sde['area_m2'] == pytest.approx(np.pi * sde['width_m'] * sde['height_m'] / 4)
+        assert abs(np.sin(np.radians(sde['angle_deg']))) < 0.05
+        assert sde['mean_center'] == pytest.approx(offset(25, 100), abs=1e-6)
+
+    def test_sde_of_the_same_point(self):
+        """Points without spread have an empty ellipse at their location."""
+        # Arrange
+        df = make_gps_day([(0, 0, 0), (5, 0, 0), (10, 0, 0)])
+
+        # Act
+        sde = self.analysis_service._compute_sde(df)
+
+        # Assert
+        assert (sde['width_m'], sde['height_m'], sde['area_m2']) == (0.0, 0.0, 0.0)
+        assert sde['mean_center'] == pytest.approx(offset(0, 0), abs=1e-9)
@@ -0,0 +1,80 @@
+"""
+Test module for HelperService.to_json_value and HelperService.from_json_value.
+
+The LogMyself category results go through the JSON serializer of Celery between the analysis
+and the publish stages, these tests check that they come back with the values that the publish stage uses.
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from kombu.utils import json as kombu_json
+
+from app.services.helper_service import HelperService
+
+
+class TestHelperServiceJsonValues:
+    """Test class for the conversion of the category results to JSON values."""
+
+    def setup_method(self):
+        """Set up a result with the value types of the category results."""
+        self.result = {
+            'sleep': [{
+                'estimated_start_date_time': pd.Timestamp("2024-01-01 23:10:00", tz="Europe/Athens"),
+                'estimated_end_date_time': datetime(2024, 1, 2, 7, 0, tzinfo=timezone.utc),
+                'duration': np.int64(28200),
+                'sqs': np.float64(0.82),
+                'type': 'main_sleep',
+            }],
+            'standard_deviation_ellipse': {'mean_center': (37.98, np.float64(23.72)), 'area_m2': np.float32(12.5)},
+            'activity_percentages_per_day_sections': pd.DataFrame(
+                {'still': [80.0, 55.5], 'on_foot': [20.0, np.nan]},
+                index=pd.Index(['morning', 'evening'], name='day_section'),
+            ),
+            'hourly': np.array([1, 2, 3]),
+            'gap': timedelta(minutes=5),
+            'missing_time': pd.NaT,
+        }
+
+    def _round_trip(self, value):
+        """Convert, serialize and deserialize with the JSON serializer of Celery, then restore."""
+        payload = kombu_json.dumps(HelperService.to_json_value(value))
+        return HelperService.from_json_value(kombu_json.loads(payload))
+
+    def test_to_json_value_has_only_plain_values(self):
+        """The converted result is accepted by the standard json module (datetimes aside, the serializer handles them)."""
+        # Act
+        converted = HelperService.to_json_value(self.result)
+
+        # Assert
+        assert isinstance(converted['sleep'][0]['duration'], int)
+        assert isinstance(converted['sleep'][0]['sqs'], float)
+        assert isinstance(converted['sleep'][0]['estimated_start_date_time'], datetime)
+        assert converted['standard_deviation_ellipse']['mean_center'] == [37.98, 23.72]
+        assert converted['hourly'] == [1, 2, 3]
+        assert converted['missing_time'] is None
+
+    def test_round_trip_restores_the_values(self):
+        """The publish stage gets back datetimes, timedeltas and DataFrames."""
+        # Act
+        restored = self._round_trip(self.result)
+
+        # Assert
+        sleep = restored['sleep'][0]
+        assert sleep['estimated_start_date_time'] == self.result['sleep'][0]['estimated_start_date_time']
+        assert sleep['estimated_end_date_time'] - sleep['estimated_start_date_time'] == timedelta(hours=9, minutes=50)
+        assert sleep['duration'] == 28200
+        assert restored['gap'] == timedelta(minutes=5)
+        assert restored['standard_deviation_ellipse']['area_m2'] == 12.5
+
+        activity = restored['activity_percentages_per_day_sections']
+        assert isinstance(activity, pd.DataFrame)
+        assert list(activity.index) == ['morning', 'evening']
+        assert activity.loc['morning', 'still'] == 80.0
+        assert np.isnan(activity.loc['evening', 'on_foot'])
+
+    def test_round_trip_of_none_and_scalars(self):
+        """The categories without results and the plain values are unchanged."""
+        # Act & Assert
+        assert self._round_trip(None) is None
+        assert self._round_trip({'a': 1, 'b': 'x', 'c': [1.5, None]}) == {'a': 1, 'b': 'x', 'c': [1.5, None]}
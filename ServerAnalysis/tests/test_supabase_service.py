@@ -0,0 +1,299 @@
+"""
+Test module for the batched requests of SupabaseService (send_data_batch and the z-scores and decisions of the typing sessions).
+
+The Supabase client is a stub that keeps the tables in memory and answers the insert, upsert and select
+requests like PostgREST (23505 for a duplicate key, 42P10 for an ON CONFLICT without a unique constraint):
+these tests check the ids returned for the rows, the skipped rows and the fallbacks.
+"""
+
+from app.services.supabase_service import SupabaseService
+
+
+class StubTable:
+    """A Supabase table in memory, unique_field is the column with a UNIQUE constraint (None if there is none)."""
+
+    def __init__(self, unique_field: str | None):
+        self.unique_field = unique_field
+        self.rows = []
+
+    def insert(self, rows: list) -> list:
+        """Insert the rows in one transaction, nothing is inserted if a row violates the unique constraint."""
+        if self.unique_field is not None:
+            values = {row[self.unique_field] for row in self.rows}
+            for row in rows:
+                if row[self.unique_field] in values:
+                    raise Exception({'code': '23505', 'message': 'duplicate key value violates unique constraint'})
+                values.add(row[self.unique_field])
+        inserted = []
+        for row in rows:
+            inserted.append({**row, 'id': len(self.rows) + 1})
+            self.rows.append(inserted[-1])
+        return inserted
+
+
+class StubQuery:
+    def __init__(self, client, table_name: str):
+        self.client = client
+        self.table = client.tables[table_name]
+        self.action = None
+
+    def insert(self, rows):
+        self.action = lambda: self.table.insert(rows if isinstance(rows, list) else [rows])
+        return self
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        self.client.upserts += 1
+
+        def upsert():
+            if self.table.unique_field != on_conflict:
+                raise Exception({'code': '42P10', 'message': 'there is no unique or exclusion constraint matching the ON CONFLICT specification'})
+            if not ignore_duplicates:
+                # ON CONFLICT DO UPDATE: the existing rows are merged with the rows of the request
+                existing = {row[on_conflict]: row for row in self.table.rows}
+                merged = []
+                for row in rows:
+                    if row[on_conflict] in existing:
+                        existing[row[on_conflict]].update(row)
+                        merged.append(existing[row[on_conflict]])
+                return merged + self.table.insert([row for row in rows if row[on_conflict] not in existing])
+            # ON CONFLICT DO NOTHING: the existing values and the repeated values of the request are skipped
+            values = {row[on_conflict] for row in self.table.rows}
+            new_rows = []
+            for row in rows:
+                if row[on_conflict] not in values:
+                    values.add(row[on_conflict])
+                    new_rows.append(row)
+            # The representation is not guaranteed to be in the order of the request
+            return list(reversed(self.table.insert(new_rows)))
+
+        self.action = upsert
+        return self
+
+    def select(self, columns):
+        columns = [column.strip() for column in columns.split(',')]
+        self.action = lambda: [{column: row.get(column) for column in columns} for row in self.table.rows]
+        return self
+
+    def in_(self, column, values):
+        select = self.action
+        self.action = lambda: [row for row in select() if row[column] in values]
+        return self
+
+    def execute(self):
+        self.client.requests += 1
+        return type('Response', (), {'data': self.action()})()
+
+
+class StubSupabaseClient:
+    """The table, insert, upsert, select and in_ calls of the Supabase client used by the batched requests."""
+
+    def __init__(self, tables: dict):
+        self.tables = {table_name: StubTable(unique_field) for table_name, unique_field in tables.items()}
+        self.requests = 0
+        self.upserts = 0
+
+    def table(self, table_name: str):
+        return StubQuery(self, table_name)
+
+
+class TestSupabaseServiceSendDataBatch:
+    """Test class for SupabaseService.send_data_batch and its fallbacks."""
+
+    def setup_method(self):
+        """Set up a SupabaseService with a stub client."""
+        self.client = StubSupabaseClient({
+            'Typing_Sessions': 'session_uid',
+            'Pressure_Intensity_Data': 'session_uid',
+            'Typing_Rhythm_Stability_Data': None,  # No UNIQUE constraint on session_uid
+            'GPS_Key_Locations': None,
+        })
+        self.supabase_service = SupabaseService.__new__(SupabaseService)
+        self.supabase_service._tables_without_unique_constraint = set()
+        self.supabase_service.client = self.client
+
+    def test_ids_are_in_the_order_of_the_rows(self):
+        """The ids of the rows of all the chunks are returned in the order of the rows."""
+        # Arrange
+        rows = [{'key_location_id': i} for i in range(5)]
+
+        # Act
+        ids = self.supabase_service.send_data_batch('GPS_Key_Locations', rows, chunk_size=2)
+
+        # Assert
+        assert ids == [1, 2, 3, 4, 5]
+        assert self.client.requests == 3
+        assert [row['key_location_id'] for row in self.client.tables['GPS_Key_Locations'].rows] == [0, 1, 2, 3, 4]
+
+    def test_upsert_skips_existing_and_repeated_values(self):
+        """With on_conflict the existing rows and the repeated values of a chunk get None, the ids follow the rows."""
+        # Arrange
+        self.supabase_service.send_data_batch('Typing_Sessions', [{'session_uid': 'b'}])
+        rows = [{'session_uid': 'a'}, {'session_uid': 'b'}, {'session_uid': 'c'}, {'session_uid': 'a'}]
+
+        # Act
+        ids = self.supabase_service.send_data_batch('Typing_Sessions', rows, on_conflict='session_uid')
+
+        # Assert
+        assert ids == [2, None, 3, None]
+        assert sorted(row['session_uid'] for row in self.client.tables['Typing_Sessions'].rows) == ['a', 'b', 'c']
+
+    def test_duplicate_key_sends_the_chunk_row_by_row(self):
+        """Without on_conflict a duplicate key (23505) fails the chunk, its rows are sent one by one and only the duplicate is skipped."""
+        # Arrange
+        self.supabase_service.send_data_batch('Pressure_Intensity_Data', [{'session_uid': 'b', 'value': 1.0}])
+        rows = [{'session_uid': 'a', 'value': 2.0}, {'session_uid': 'b', 'value': 3.0}, {'session_uid': 'c', 'value': 4.0}]
+
+        # Act
+        ids = self.supabase_service.send_data_batch('Pressure_Intensity_Data', rows)
+
+        # Assert
+        assert ids == [2, None, 3]
+        stored = {row['session_uid']: row['value'] for row in self.client.tables['Pressure_Intensity_Data'].rows}
+        assert stored == {'b': 1.0, 'a': 2.0, 'c': 4.0}
+
+    def test_table_without_unique_constraint_selects_before_inserting(self):
+        """An ON CONFLICT without a unique constraint (42P10) falls back to a select of the existing values and an insert."""
+        # Arrange
+        self.client.tables['Typing_Rhythm_Stability_Data'].rows.append({'id': 1, 'session_uid': 'b'})
+        rows = [{'session_uid': 'a'}, {'session_uid': 'b'}, {'session_uid': 'a'}, {'session_uid': 'c'}]
+
+        # Act
+        ids = self.supabase_service.send_data_batch('Typing_Rhythm_Stability_Data', rows, on_conflict='session_uid')
+        next_ids = self.supabase_service.send_data_batch('Typing_Rhythm_Stability_Data', [{'session_uid': 'c'}, {'session_uid': 'd'}], on_conflict='session_uid')
+
+        # Assert
+        assert ids == [2, None, None, 3]
+        assert next_ids == [None, 4]
+        assert sorted(row['session_uid'] for row in self.client.tables['Typing_Rhythm_Stability_Data'].rows) == ['a', 'b', 'c', 'd']
+        # The upsert is not tried again for the table
+        assert self.client.upserts == 1
+        assert self.supabase_service._tables_without_unique_constraint == {'Typing_Rhythm_Stability_Data'}
+
+    def test_other_errors_fail_the_batch(self):
+        """An error that is not a duplicate key returns None."""
+        # Arrange
+        def failing_table(table_name):
+            raise Exception("connection reset")
+
+        self.client.table = failing_table
+
+        # Act
+        ids = self.supabase_service.send_data_batch('GPS_Key_Locations', [{'key_location_id': 0}])
+
+        # Assert
+        assert ids is None
+
+
+class TestSupabaseServiceIdsByUniqueField:
+    """Test class for SupabaseService._ids_by_unique_field."""
+
+    def test_ids_follow_the_rows_of_the_chunk(self):
+        """The inserted rows are mapped back by their unique field, whatever their order."""
+        # Arrange
+        chunk = [{'session_uid': 'a'}, {'session_uid': 'b'}, {'session_uid': 'c'}]
+        inserted = [{'id': 12, 'session_uid': 'c'}, {'id': 10, 'session_uid': 'a'}]
+
+        # Act
+        ids = SupabaseService._ids_by_unique_field(chunk, inserted, 'session_uid')
+
+        # Assert
+        assert ids == [10, None, 12]
+
+    def test_only_the_first_repeated_value_gets_the_id(self):
+        """A value repeated in the chunk was inserted once, the id goes to its first row."""
+        # Arrange
+        chunk = [{'session_uid': 'a'}, {'session_uid': 'a'}, {'session_uid': 'b'}]
+        inserted = [{'id': 5, 'session_uid': 'a'}, {'id': 6, 'session_uid': 'b'}]
+
+        # Act
+        ids = SupabaseService._ids_by_unique_field(chunk, inserted, 'session_uid')
+
+        # Assert
+        assert ids == [5, None, 6]
+
+
+class TestSupabaseServiceTypingSessionScores:
+    """Test class for SupabaseService.get_z_scores_of_typing_sessions and update_scores_and_decisions_of_typing_sessions."""
+
+    METRIC_TABLES = ['Pressure_Intensity_Data', 'Typing_Rhythm_Stability_Data']
+
+    def setup_method(self):
+        """Set up a SupabaseService with a stub client and the z-scores of 250 sessions."""
+        self.client = StubSupabaseClient({
+            'Typing_Sessions': 'session_uid',
+            'Pressure_Intensity_Data': 'session_uid',
+            'Typing_Rhythm_Stability_Data': None,
+        })
+        self.supabase_service = SupabaseService.__new__(SupabaseService)
+        self.supabase_service._tables_without_unique_constraint = set()
+        self.supabase_service.client = self.client
+
+        self.session_uids = [f"session_{i:03d}" for i in range(250)]
+        self.client.tables['Typing_Sessions'].insert([
+            {'session_uid': session_uid, 'user_uid': "test_user_123", 'session_date': "2024-01-01T10:00:00+02:00", 'cognitive_score': None, 'cognitive_decision': None}
+            for session_uid in self.session_uids
+        ])
+        self.client.tables['Pressure_Intensity_Data'].insert([
+            {'session_uid': session_uid, 'modified_z_score': i / 10} for i, session_uid in enumerate(self.session_uids)
+        ])
+        # Only the even sessions have a rhythm stability, a session is there twice (the table has no UNIQUE constraint)
+        self.client.tables['Typing_Rhythm_Stability_Data'].insert([
+            {'session_uid': session_uid, 'modified_z_score': -i / 10} for i, session_uid in enumerate(self.session_uids) if i % 2 == 0
+        ] + [{'session_uid': "session_000", 'modified_z_score': 99.0}])
+
+    def test_z_scores_of_all_the_sessions_by_table(self):
+        """The z-scores are read for the groups of 100 sessions, the sessions without a value are missing."""
+        # Act
+        z_scores = self.supabase_service.get_z_scores_of_typing_sessions(self.session_uids, self.METRIC_TABLES)
+
+        # Assert
+        assert self.client.requests == 3 * len(self.METRIC_TABLES)
+        assert len(z_scores['Pressure_Intensity_Data']) == 250
+        assert z_scores['Pressure_Intensity_Data']['session_123'] == 12.3
+        assert len(z_scores['Typing_Rhythm_Stability_Data']) == 125
+        assert 'session_123' not in z_scores['Typing_Rhythm_Stability_Data']
+        # The first row of a session is kept
+        assert z_scores['Typing_Rhythm_Stability_Data']['session_000'] == 0.0
+
+    def test_z_scores_error_returns_none(self):
+        """An error of a request returns None."""
+        # Act
+        z_scores = self.supabase_service.get_z_scores_of_typing_sessions(self.session_uids, ['Missing_Table'])
+
+        # Assert
+        assert z_scores is None
+
+    def test_scores_and_decisions_are_updated(self):
+        """The scores and decisions of the existing sessions are updated, the other fields are kept and no session is created."""
+        # Arrange
+        scores = {session_uid: i / 100 for i, session_uid in enumerate(self.session_uids)}
+        decisions = {session_uid: "NORMAL" if i % 3 else "ABNORMAL" for i, session_uid in enumerate(self.session_uids)}
+        scores["missing_session"], decisions["missing_session"] = 0.5, "NORMAL"
+
+        # Act
+        status = self.supabase_service.update_scores_and_decisions_of_typing_sessions(scores, decisions)
+
+        # Assert
+        assert status is True
+        sessions = {row['session_uid']: row for row in self.client.tables['Typing_Sessions'].rows}
+        assert len(sessions) == 250
+        assert sessions['session_042']['cognitive_score'] == 0.42
+        assert sessions['session_042']['cognitive_decision'] == "ABNORMAL"
+        assert sessions['session_043']['cognitive_decision'] == "NORMAL"
+        assert sessions['session_043']['user_uid'] == "test_user_123"
+        assert sessions['session_043']['session_date'] == "2024-01-01T10:00:00+02:00"
+        assert self.client.upserts == 3
+
+    def test_scores_update_error_returns_false(self):
+        """An error of a request returns False."""
+        # Arrange
+        def failing_table(table_name):
+            raise Exception("connection reset")
+
+        self.client.table = failing_table
+
+        # Act
+        status = self.supabase_service.update_scores_and_decisions_of_typing_sessions({'session_000': 0.1}, {'session_000': "NORMAL"})
+
+        # Assert
+        assert status is False
@@ -0,0 +1,255 @@
+"""
+Test module for SupabaseWriteBuffer.
+
+The Supabase service is a stub that records the batches: these tests check the order of the tables,
+the resolution of the PendingRow foreign keys and the counting of the failed rows, and that the
+send_computed_*_info publishers add their rows to the buffer instead of sending them.
+"""
+
+import pandas as pd
+from datetime import date, datetime
+from unittest.mock import Mock
+
+from app.services.supabase_service import SupabaseService
+from app.services.supabase_write_buffer import SupabaseWriteBuffer, PendingRow
+
+
+class StubSupabaseService:
+    """Records the send_data_batch calls, the ids are numbered per table (None for the failing tables)."""
+
+    def __init__(self, failing_tables: set | None = None):
+        self.failing_tables = failing_tables or set()
+        self.batches = []
+        self._next_id = 0
+
+    def send_data_batch(self, table_name: str, rows: list, on_conflict: str | None = None):
+        self.batches.append((table_name, rows))
+        if table_name in self.failing_tables:
+            return None
+        ids = list(range(self._next_id + 1, self._next_id + len(rows) + 1))
+        self._next_id += len(rows)
+        return ids
+
+
+class TestSupabaseWriteBuffer:
+    """Test class for SupabaseWriteBuffer."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.supabase_service = StubSupabaseService()
+        self.write_buffer = SupabaseWriteBuffer(self.supabase_service, max_rows=100)
+
+    def test_parent_table_is_sent_before_child_table(self):
+        """A table is sent after the tables that its rows reference, even if it was added first."""
+        # Arrange
+        self.write_buffer.add('GPS_Key_Locations', {'key_location_id': 0})
+        parent = self.write_buffer.add('GPS_Data_Analysis', {'day_analyzed': '2024-01-01'})
+        self.write_buffer.add('GPS_Key_Locations', {'key_location_id': 1, 'gps_data_analysis_id': parent})
+
+        # Act
+        failures = self.write_buffer.flush()
+
+        # Assert
+        assert failures == {}
+        assert [table_name for table_name, _ in self.supabase_service.batches] == ['GPS_Data_Analysis', 'GPS_Key_Locations']
+        assert parent.id == 1
+        child_rows = self.supabase_service.batches[1][1]
+        assert child_rows[1]['gps_data_analysis_id'] == parent.id
+        assert not any(isinstance(value, PendingRow) for row in child_rows for value in row.values())
+
+    def test_child_of_failed_parent_is_counted_as_failed(self):
+        """The rows that reference a row that was not sent are not sent and are counted as failed."""
+        # Arrange
+        self.supabase_service.failing_tables = {'GPS_Data_Analysis'}
+        parent = self.write_buffer.add('GPS_Data_Analysis', {'day_analyzed': '2024-01-01'})
+        self.write_buffer.add('GPS_Transitions', {'gps_data_analysis_id': parent})
+        self.write_buffer.add('GPS_Transitions', {'gps_data_analysis_id': parent})
+        self.write_buffer.add('GPS_Transitions', {'gps_data_analysis_id': 42})  # A row of a previous flush
+
+        # Act
+        failures = self.write_buffer.flush()
+
+        # Assert
+        assert parent.failed
+        assert failures == {'GPS_Data_Analysis': 1, 'GPS_Transitions': 2}
+        assert self.write_buffer.stats['GPS_Transitions'] == {'sent': 1, 'skipped': 0, 'failed': 2}
+        sent_transitions = [rows for table_name, rows in self.supabase_service.batches if table_name == 'GPS_Transitions']
+        assert sent_transitions == [[{'gps_data_analysis_id': 42}]]
+
+    def test_size_limit_flushes_in_the_middle_of_a_table(self):
+        """The buffer is flushed when it holds max_rows rows, the rest of the table is sent by the next flush."""
+        # Arrange
+        write_buffer = SupabaseWriteBuffer(self.supabase_service, max_rows=3)
+
+        # Act
+        handles = [write_buffer.add('App_Usage_Analysis', {'app_name': f"app_{i}"}) for i in range(5)]
+
+        # Assert
+        assert len(self.supabase_service.batches) == 1
+        assert len(self.supabase_service.batches[0][1]) == 3
+        assert [handle.sent for handle in handles] == [True, True, True, False, False]
+        assert len(write_buffer) == 2
+
+        write_buffer.flush()
+        assert [len(rows) for _, rows in self.supabase_service.batches] == [3, 2]
+        assert write_buffer.stats['App_Usage_Analysis'] == {'sent': 5, 'skipped': 0, 'failed': 0}
+        assert write_buffer.failures() == {}
+
+    def test_existing_rows_are_skipped_with_on_conflict(self):
+        """With on_conflict a row without id already exists, it is skipped and not failed."""
+        # Arrange
+        self.supabase_service.send_data_batch = lambda table_name, rows, on_conflict=None: [7, None]
+        self.write_buffer.add('Typing_Sessions', {'session_uid': 'a'}, on_conflict='session_uid')
+        self.write_buffer.add('Typing_Sessions', {'session_uid': 'b'}, on_conflict='session_uid')
+
+        # Act
+        failures = self.write_buffer.flush()
+
+        # Assert
+        assert failures == {}
+        assert self.write_buffer.stats['Typing_Sessions'] == {'sent': 1, 'skipped': 1, 'failed': 0}
+
+    def test_discard_counts_the_buffered_rows_as_failed(self):
+        """The rows that are dropped without a flush are failed rows of their tables."""
+        # Arrange
+        parent = self.write_buffer.add('GPS_Data_Analysis', {'day_analyzed': '2024-01-01'})
+        self.write_buffer.add('GPS_Key_Locations', {'gps_data_analysis_id': parent})
+
+        # Act
+        dropped = self.write_buffer.discard()
+
+        # Assert
+        assert dropped == 2
+        assert len(self.write_buffer) == 0
+        assert parent.failed
+        assert self.write_buffer.failures() == {'GPS_Data_Analysis': 1, 'GPS_Key_Locations': 1}
+        assert self.supabase_service.batches == []
+
+
+class StubNoRowsQuery:
+    """A Supabase query that finds no rows (no analysis of the day yet), the inserts are recorded."""
+
+    def __init__(self, table_name: str, inserts: list):
+        self.table_name = table_name
+        self.inserts = inserts
+
+    def __getattr__(self, name):
+        # select, eq, lte, gte: the filters of the existing-analysis checks
+        return lambda *args, **kwargs: self
+
+    def insert(self, payload):
+        self.inserts.append((self.table_name, payload))
+        return self
+
+    def execute(self):
+        return Mock(data=[])
+
+
+class TestBufferedPublishers:
+    """Test class for the send_computed_*_info methods of SupabaseService with a write buffer."""
+
+    def setup_method(self):
+        """Set up a SupabaseService whose client finds no existing analysis, and a buffer that records the batches."""
+        self.inserts = []
+        self.supabase_service = SupabaseService.__new__(SupabaseService)
+        self.supabase_service.client = Mock()
+        self.supabase_service.client.table.side_effect = lambda table_name: StubNoRowsQuery(table_name, self.inserts)
+        self.batches = StubSupabaseService()
+        self.write_buffer = SupabaseWriteBuffer(self.batches, max_rows=100)
+        self.day_analyzed = date(2024, 1, 1)
+
+    def _sent_tables(self) -> list:
+        return [(table_name, len(rows)) for table_name, rows in self.batches.batches]
+
+    def test_device_interaction_rows_are_buffered(self):
+        """The analysis, its circadian screen time and app usage rows are one batch per table, the analysis first."""
+        # Arrange
+        interaction_data = {
+            'screen_time_analysis_result': 3600, 'low_light_day_time_result': 120, 'device_drop_events_result': 1,
+            'screen_time_circadian_hours_result': [
+                {'day_section': section, 'duration': 600, 'percentage': 25.0} for section in ('morning', 'afternoon', 'evening', 'night')
+            ],
+            'app_usage_result': pd.DataFrame({'app_name': ['mail', 'maps', 'chat'], 'time_used': [1200, 300, 60]}),
+        }
+
+        # Act
+        analysis_id = self.supabase_service.send_computed_device_interaction_info("test_user_123", interaction_data, self.day_analyzed, self.write_buffer)
+        failures = self.write_buffer.flush()
+
+        # Assert
+        assert self.inserts == []
+        assert failures == {}
+        assert isinstance(analysis_id, PendingRow) and analysis_id.id == 1
+        assert self._sent_tables() == [('Device_Interaction_Data_Analysis', 1), ('Circadian_Screen_Time_Analysis', 4), ('App_Usage_Analysis', 3)]
+        app_usage_rows = self.batches.batches[2][1]
+        assert all(row['daily_interaction_data_analysis_id'] == 1 for row in app_usage_rows)
+        assert [row['time_used_sec'] for row in app_usage_rows] == [1200, 300, 60]
+
+    def test_activity_rows_are_buffered(self):
+        """The activity analysis is sent before its distribution per day section."""
+        # Arrange
+        activity_data = {
+            'activity_switching_frequency': 4, 'daily_active_minutes': 95, 'activity_entropy': 1.2, 'inactivity_percentage': 60.0,
+            'activity_percentages_per_day_sections': pd.DataFrame(
+                {'still': [80.0, 40.0], 'on_foot': [20.0, 60.0]}, index=['morning', 'afternoon']
+            ),
+        }
+
+        # Act
+        analysis_id = self.supabase_service.send_computed_activity_info("test_user_123", activity_data, self.day_analyzed, self.write_buffer)
+        self.write_buffer.flush()
+
+        # Assert
+        assert self.inserts == []
+        assert self._sent_tables() == [('Activity_Data_Analysis', 1), ('Activity_Distribution_Per_Day_Section_Analysis', 2)]
+        day_section_rows = self.batches.batches[1][1]
+        assert [row['day_section'] for row in day_section_rows] == ['morning', 'afternoon']
+        assert all(row['activity_data_analysis_id'] == analysis_id.id for row in day_section_rows)
+        assert day_section_rows[0]['in_vehicle'] == 0
+
+    def test_call_and_sleep_rows_are_buffered(self):
+        """The call analysis and each sleep record are pending rows, the sleep overlap check still reads Supabase."""
+        # Arrange
+        sleep_records = [
+            {
+                'estimated_start_date_time': datetime(2024, 1, 1, hour), 'estimated_end_date_time': datetime(2024, 1, 1, hour + 1),
+                'duration': 60, 'actual_duration': 55, 'sleep_screen_time': 2,
+                'nts': 0.5, 'nse': 0.9, 'nst': 0.1, 'nta': 0.8, 'sqs': 0.7, 'type': sleep_type,
+            }
+            for hour, sleep_type in ((1, 'main_sleep'), (14, 'nap'))
+        ]
+
+        # Act
+        call_id = self.supabase_service.send_computed_call_info("test_user_123", {'missed_call_ratio': 0.2}, self.day_analyzed, self.write_buffer)
+        sleep_ids = self.supabase_service.send_computed_sleep_info("test_user_123", sleep_records, self.day_analyzed, self.write_buffer)
+        self.write_buffer.flush()
+
+        # Assert
+        assert self.inserts == []
+        assert isinstance(call_id, PendingRow) and call_id.sent
+        assert [sleep_id.id for sleep_id in sleep_ids] == [2, 3]
+        assert self._sent_tables() == [('Call_Data_Analysis', 1), ('Sleep_Data_Analysis', 2)]
+        assert [row['type'] for row in self.batches.batches[1][1]] == ['main_sleep', 'nap']
+
+    def test_child_rows_are_sent_in_one_insert_without_a_buffer(self):
+        """Without a buffer the rows are sent now, the child rows of a table with one insert."""
+        # Arrange
+        self.supabase_service.client.table.side_effect = None
+        client_query = self.supabase_service.client.table.return_value
+        client_query.select.return_value.eq.return_value.eq.return_value.execute.return_value = Mock(data=[])
+        client_query.insert.return_value.execute.return_value = Mock(data=[{'id': 9}])
+        interaction_data = {
+            'screen_time_analysis_result': 3600,
+            'screen_time_circadian_hours_result': [{'day_section': 'morning', 'duration': 600, 'percentage': 100.0}],
+            'app_usage_result': pd.DataFrame({'app_name': ['mail', 'maps'], 'time_used': [1200, 300]}),
+        }
+
+        # Act
+        analysis_id = self.supabase_service.send_computed_device_interaction_info("test_user_123", interaction_data, self.day_analyzed)
+
+        # Assert
+        assert analysis_id == 9
+        inserted_payloads = [call.args[0] for call in client_query.insert.call_args_list]
+        assert len(inserted_payloads) == 3
+        assert [row['app_name'] for row in inserted_payloads[2]] == ['mail', 'maps']
+        assert all(row['daily_interaction_data_analysis_id'] == 9 for row in inserted_payloads[2])
@@ -0,0 +1,154 @@
+"""
+Test module for TypingMetricsEngine.
+
+The metrics of the engine are compared with the per-session formulas and guards of the
+_compute_and_store_* loops that it replaces (reproduced here), on sessions with the edge cases
+of the inputs: missing fields, characters typed == characters deleted, negative pauses and
+baselines without median/MAD or with a zero MAD.
+"""
+
+import cmath
+import math
+import pytest
+from types import SimpleNamespace
+
+from app.services.analysis_service import AnalysisService
+from app.services.typing_metrics_engine import TypingMetricsEngine
+
+
+def old_metric_value(metric_name: str, session) -> float | None:
+    """
+    The value of a metric with the guard and the formula of its former per-session loop, None if the loop skipped the session.
+    (A session that raised failed the whole metric in the loop, here it is only skipped like the engine does.)
+    """
+    pressure, typed, deleted = session.total_pressure_by_times_counter, session.characters_typed, session.total_characters_deleted
+    mean_iki, std_iki, duration = session.mean_iki, session.std_dev_iki, session.duration
+    try:
+        if metric_name == 'PRESSURE_INTENSITY':
+            return pressure / typed if typed and typed > 0 else None
+        if metric_name == 'EFFORT_TO_OUTPUT_RATIO':
+            return pressure / (typed - deleted) if typed and typed > 0 and deleted and deleted > 0 else None
+        if metric_name == 'TYPING_RHYTHM_STABILITY':
+            return mean_iki / (mean_iki + std_iki) if mean_iki and std_iki and (mean_iki + std_iki) > 0 else None
+        if metric_name == 'COGNITIVE_PROCESSING_INDEX':
+            max_wtw, avg_wtw = session.max_pause_wtw_duration, session.avg_pause_wtw_duration
+            max_ctc, avg_ctc = session.max_pause_ctc_duration, session.avg_pause_ctc_duration
+            if max_wtw and avg_wtw and max_ctc and avg_ctc:
+                return (cmath.log(1 + (max_wtw / avg_wtw)) + cmath.log(1 + (max_ctc / avg_ctc))).real
+            return None
+        if metric_name == 'PAUSE_TO_PRODUCTION_RATIO':
+            iki_size = session.iki_list_size
+            return iki_size * mean_iki / duration if iki_size and mean_iki and duration and duration > 0 else None
+        if metric_name == 'CORRECTION_EFFICIENCY':
+            return 1 - (deleted / typed) if typed and typed > 0 and deleted else None
+        if metric_name == 'NET_PRODUCTION_RATE':
+            return (typed - deleted) / duration if duration and duration > 0 and deleted <= typed else None
+        if metric_name == 'COGNITIVE_PROCESSING_EFFICIENCY':
+            words = session.words_typed
+            return words / (duration * (1 + std_iki)) if duration and duration > 0 and words and words > 0 else None
+    except (TypeError, ZeroDivisionError, ValueError):
+        return None
+    raise ValueError(f"Unknown metric {metric_name}")
+
+
+def make_session(session_uid: str, **overrides):
+    fields = {
+        'total_pressure_by_times_counter': 540, 'characters_typed': 120, 'total_characters_deleted': 15, 'words_typed': 22,
+        'mean_iki': 0.21, 'std_dev_iki': 0.08, 'iki_list_size': 119, 'duration': 65,
+        'max_pause_wtw_duration': 2.4, 'avg_pause_wtw_duration': 0.6, 'max_pause_ctc_duration': 1.8, 'avg_pause_ctc_duration': 0.3,
+    }
+    fields.update(overrides)
+    return SimpleNamespace(typing_session_id=session_uid, **fields)
+
+
+class TestTypingMetricsEngine:
+    """Test class for the equivalence of TypingMetricsEngine.compute with the former per-metric loops."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.typing_sessions = [
+            make_session("regular"),
+            make_session("slow_typist", characters_typed=40, total_characters_deleted=2, words_typed=7, duration=120, std_dev_iki=0.4),
+            make_session("missing_fields", characters_typed=None, mean_iki=None, avg_pause_ctc_duration=None, words_typed=None),
+            make_session("missing_deleted", total_characters_deleted=None, iki_list_size=None, std_dev_iki=None),
+            make_session("all_deleted", characters_typed=30, total_characters_deleted=30),
+            make_session("more_deleted", characters_typed=30, total_characters_deleted=45),
+            make_session("negative_pause", max_pause_wtw_duration=-3.0, avg_pause_wtw_duration=0.5),
+            make_session("zero_duration", duration=0),
+            make_session("nothing_typed", characters_typed=0, total_characters_deleted=0, words_typed=0, mean_iki=0.0),
+        ]
+        self.baselines = {
+            'PRESSURE_INTENSITY': {'id': 11, 'baseline_median': 4.2, 'baseline_mad': 0.7},
+            'EFFORT_TO_OUTPUT_RATIO': {'id': 12, 'baseline_median': 5.0, 'baseline_mad': 0.0},
+            'TYPING_RHYTHM_STABILITY': {'id': 13, 'baseline_median': None, 'baseline_mad': 0.1},
+            'COGNITIVE_PROCESSING_INDEX': {'id': 14, 'baseline_median': 2.5, 'baseline_mad': None},
+            'PAUSE_TO_PRODUCTION_RATIO': {'id': 15, 'baseline_median': 0.4, 'baseline_mad': 0.05},
+            'CORRECTION_EFFICIENCY': None,
+            'NET_PRODUCTION_RATE': {'id': 17, 'baseline_median': 1.6, 'baseline_mad': 0.3},
+            'COGNITIVE_PROCESSING_EFFICIENCY': {'id': 18, 'baseline_median': 0.3, 'baseline_mad': 0.04},
+        }
+
+    def _expected_rows(self) -> dict:
+        """(session, metric) -> (value, modified z-score, baseline id) of the former loops."""
+        expected = {}
+        for metric_name in TypingMetricsEngine.METRIC_TABLES:
+            baseline = self.baselines[metric_name]
+            for session in self.typing_sessions:
+                value = old_metric_value(metric_name, session)
+                if value is None or not math.isfinite(value):
+                    continue
+                z_score = AnalysisService._calc_modified_z_score(value, baseline.get('baseline_median'), baseline.get('baseline_mad')) \
+                    if baseline is not None else 0
+                expected[(session.typing_session_id, metric_name)] = (value, z_score, baseline.get('id') if baseline is not None else None)
+        return expected
+
+    def test_compute_matches_the_per_metric_loops(self):
+        """Every (session, metric) of the former loops has the same value, z-score and baseline, and there are no others."""
+        # Arrange
+        expected = self._expected_rows()
+
+        # Act
+        results = TypingMetricsEngine(self.typing_sessions).compute(self.baselines)
+
+        # Assert
+        rows = {(row.session_uid, row.metric): row for row in results.itertuples(index=False)}
+        assert set(rows) == set(expected)
+        for key, (value, z_score, baseline_id) in expected.items():
+            assert rows[key].value == pytest.approx(value, rel=1e-12), key
+            assert rows[key].modified_z_score == pytest.approx(z_score, rel=1e-12), key
+            assert rows[key].included_baseline_metric == baseline_id, key
+            assert rows[key].table_name == TypingMetricsEngine.METRIC_TABLES[key[1]]
+
+    def test_edge_cases_of_the_guards(self):
+        """The sessions of the edge cases are skipped or kept like the former loops did."""
+        # Act
+        results = TypingMetricsEngine(self.typing_sessions).compute(self.baselines)
+        metrics_of = results.groupby('session_uid')['metric'].apply(set).to_dict()
+
+        # Assert
+        # characters typed == characters deleted: the effort-to-output ratio is not finite, the net production rate is 0
+        assert 'EFFORT_TO_OUTPUT_RATIO' not in metrics_of['all_deleted']
+        assert results.query("session_uid == 'all_deleted' and metric == 'NET_PRODUCTION_RATE'")['value'].item() == 0
+        # More deleted than typed: no net production rate
+        assert 'NET_PRODUCTION_RATE' not in metrics_of['more_deleted']
+        # A negative pause ratio: the real part of the complex log, log|1 + max/avg|
+        negative_cpi = results.query("session_uid == 'negative_pause' and metric == 'COGNITIVE_PROCESSING_INDEX'")['value'].item()
+        assert negative_cpi == pytest.approx(math.log(abs(1 - 3.0 / 0.5)) + math.log(1 + 1.8 / 0.3))
+        # Missing fields: every metric uses one of the missing fields, the session has no metrics
+        assert 'missing_fields' not in metrics_of
+        assert metrics_of['missing_deleted'] == {'PRESSURE_INTENSITY', 'COGNITIVE_PROCESSING_INDEX'}
+        # No duration: no metric that divides by the duration
+        assert metrics_of['zero_duration'].isdisjoint({'PAUSE_TO_PRODUCTION_RATIO', 'NET_PRODUCTION_RATE', 'COGNITIVE_PROCESSING_EFFICIENCY'})
+
+    def test_z_scores_of_baselines_without_median_or_mad(self):
+        """A baseline without median or MAD gives 0, a zero MAD is replaced by 1e-10, no baseline gives 0 and no id."""
+        # Act
+        results = TypingMetricsEngine([make_session("regular")]).compute(self.baselines).set_index('metric')
+
+        # Assert
+        assert results.loc['TYPING_RHYTHM_STABILITY', 'modified_z_score'] == 0
+        assert results.loc['COGNITIVE_PROCESSING_INDEX', 'modified_z_score'] == 0
+        eor = results.loc['EFFORT_TO_OUTPUT_RATIO', 'value']
+        assert results.loc['EFFORT_TO_OUTPUT_RATIO', 'modified_z_score'] == pytest.approx((eor - 5.0) / (1e-10 * 1.4826))
+        assert results.loc['CORRECTION_EFFICIENCY', 'modified_z_score'] == 0
+        assert results.loc['CORRECTION_EFFICIENCY', 'included_baseline_metric'] is None
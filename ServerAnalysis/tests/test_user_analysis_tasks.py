@@ -0,0 +1,109 @@
+"""
+Test module for the LogMyself stage tasks of app.core.tasks.user_analysis_tasks.
+
+The services are mocked: these tests check how the results of the category tasks are
+turned into the status, the failures and the publish failures of the user result.
+"""
+
+import pytest
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+from app.core.tasks import user_analysis_tasks
+from app.core.tasks.user_analysis_tasks import analyze_user_category, _publish_logmyself_analysis, _new_user_result
+from app.services.analysis_service import AnalysisService
+
+
+class TestLogMyselfCategoryTasks:
+    """Test class for analyze_user_category and _publish_logmyself_analysis."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.user_uid = "test_user_123"
+        self.start = datetime(2024, 1, 1, 0, 0, 0)
+        self.user_result = _new_user_result(self.user_uid, "LogMyself")
+        self.user_result['has_data'] = True
+
+        self.analysis_service = Mock()
+        self.analysis_service.finalize_logmyself_data_analysis.return_value = None
+        self.supabase_service = Mock()
+        self.supabase_service.create_a_daily_analysis_event.return_value = 1
+
+    def _category_results(self, errors: dict | None = None) -> list:
+        errors = errors or {}
+        return [
+            {'category': category, 'result': {'value': 1}, 'seconds': 0.1, 'error': errors.get(category), 'user_result': self.user_result}
+            for category in AnalysisService.LOGMYSELF_CATEGORIES
+        ]
+
+    def _publish_all_success(self, category, user_uid, category_result, analysis_start_datetime, final_status):
+        final_status[f"{category}_analysis_success"] = True
+
+    def test_analyze_user_category_returns_the_error(self):
+        """A category analysis that raises returns its error instead of only logging it."""
+        # Arrange
+        analysis_service = Mock()
+        analysis_service.compute_logmyself_category.side_effect = RuntimeError("boom")
+        db_session = Mock()
+
+        with patch.object(user_analysis_tasks, 'get_service_container') as container, \
+                patch.object(user_analysis_tasks, '_init_services', return_value=(None, None, None, analysis_service)):
+            container.return_value.session.return_value = db_session
+
+            # Act
+            category_result = analyze_user_category.run(self.user_result, 'gps', self.start.isoformat(), self.start.isoformat())
+
+        # Assert
+        assert category_result['result'] is None
+        assert category_result['error'] == "boom"
+        db_session.close.assert_called_once()
+
+    def test_failed_category_is_counted_and_not_published(self):
+        """A category whose analysis raised is marked False, counted as a failure and fails the user."""
+        # Arrange
+        self.analysis_service.publish_logmyself_category.side_effect = self._publish_all_success
+        category_results = self._category_results({'gps': "boom"})
+
+        # Act
+        _publish_logmyself_analysis(self.user_result, self.analysis_service, self.supabase_service, category_results, self.start)
+
+        # Assert
+        published = [call.args[0] for call in self.analysis_service.publish_logmyself_category.call_args_list]
+        assert 'gps' not in published
+        assert len(published) == len(AnalysisService.LOGMYSELF_CATEGORIES) - 1
+        assert self.user_result['failures'] == 1
+        assert self.user_result['success'] is False
+        assert "gps" in self.user_result['message']
+
+    def test_successful_categories_have_no_failures(self):
+        """Without errors all the categories are published and the user succeeds."""
+        # Arrange
+        self.analysis_service.publish_logmyself_category.side_effect = self._publish_all_success
+
+        # Act
+        _publish_logmyself_analysis(self.user_result, self.analysis_service, self.supabase_service, self._category_results(), self.start)
+
+        # Assert
+        assert self.analysis_service.publish_logmyself_category.call_count == len(AnalysisService.LOGMYSELF_CATEGORIES)
+        assert self.user_result['failures'] == 0
+        assert self.user_result['success'] is True
+
+    def test_buffered_rows_of_a_failed_publish_are_counted(self):
+        """If publishing a category raises, the rows still in the write buffer are counted as failed rows."""
+        # Arrange
+        def publish_and_raise(category, user_uid, category_result, analysis_start_datetime, final_status):
+            parent = self.analysis_service.write_buffer.add('GPS_Data_Analysis', {'day_analyzed': '2024-01-01'})
+            self.analysis_service.write_buffer.add('GPS_Key_Locations', {'gps_data_analysis_id': parent})
+            raise RuntimeError("publish failed")
+
+        self.analysis_service.publish_logmyself_category.side_effect = publish_and_raise
+
+        # Act
+        with pytest.raises(RuntimeError):
+            _publish_logmyself_analysis(self.user_result, self.analysis_service, self.supabase_service, self._category_results(), self.start)
+
+        # Assert
+        assert self.user_result['publish_failures'] == {'GPS_Data_Analysis': 1, 'GPS_Key_Locations': 1}
+        assert self.user_result['failures'] == 2
+        assert self.analysis_service.write_buffer is None
+        self.supabase_service.send_data_batch.assert_not_called()